@@ -1,26 +1,65 @@
+import calendar
+import contextvars
 import hashlib
 import streamlit as st
+import threading
 import io
 import os
 import re
 import zipfile
 from difflib import SequenceMatcher
-import gspread
-import openpyxl
-from openpyxl.utils.cell import column_index_from_string
 import json
 import cv2
 import numpy as np
 import pandas as pd
-import random
 import base64
 import time as pytime
 import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from google.oauth2 import service_account
-from google.cloud import vision
-from google.cloud import storage
-from datetime import datetime, timedelta, timezone, time # ✅ เพิ่ม time
-import string
+from datetime import datetime, timedelta, time # ✅ เพิ่ม time
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # streamlit รุ่นเก่า
+    add_script_run_ctx = get_script_run_ctx = None
+from meter_core.config import (
+    DB_SHEET_NAME,
+    REAL_REPORT_SHEET,
+    BUCKET_NAME,
+    get_thai_time,
+    install_credentials,
+    get_gc,
+    get_vision_client,
+    get_storage_client,
+)
+from meter_core.collector import outbox_flush_kwargs
+from meter_core.dailyreadings import get_dailyreadings_mirror, upsert_dailyreadings_batch
+from meter_core.approvals import approve_rows, pending_approvals
+from meter_core.archive import query_partitions
+from meter_core.gateway import get_gateway, serve_stats, set_request_tags
+from meter_core.outbox import Outbox
+from meter_core.write_queue import WriteQueue
+from meter_core.vision_batch import get_vision_batcher
+from meter_core.vision_cache import cached_vision_client
+from meter_core.ocr_backends import get_ocr_backend
+from meter_core import seven_segment
+from meter_core.points_master import normalize_meter_config, normalize_pid
+from meter_core.sheets import (
+    col_to_index,
+    get_handles,
+    get_report_grid,
+    grid_value,
+    _with_retry,
+    export_to_real_report,
+    export_many_to_real_report_batch,
+    infer_meter_type,
+)
+from meter_core.scada import (
+    _strip_date_prefix,
+    _norm_filekey,
+    load_scada_excel_mapping,
+    extract_scada_values_from_exports,
+)
 
 # ✅ 1.3: Daily Report Logging System
 try:
@@ -63,10 +102,10 @@ except ImportError:
 # =========================
 # Helpers / Utils (ต้องอยู่ก่อน UI)
 # =========================
-def make_thumb_data_url(image_bytes: bytes, max_size: int = 160, quality: int = 70) -> str:
+def make_thumb_data_url(image_bytes, max_size: int = 160, quality: int = 70) -> str:
+    """thumbnail เป็น data URL (image_bytes: bytes หรือ PhotoContext ที่ decode ไว้แล้ว)"""
     try:
-        arr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        img = PhotoContext.of(image_bytes).full
         if img is None:
             return ""
 
@@ -87,16 +126,7 @@ def make_thumb_data_url(image_bytes: bytes, max_size: int = 160, quality: int =
 # =========================================================
 # --- 📦 CONFIGURATION ---
 # =========================================================
-BUCKET_NAME = 'water-meter-images-watertreatmentplant'
-FIXED_FOLDER_ID = '1XH4gKYb73titQLrgp4FYfLT2jzYRgUpO' 
-
-# =========================================================
-# --- 🕒 TIMEZONE HELPER ---
-# =========================================================
-def get_thai_time():
-    """คืนค่าเวลาปัจจุบันในโซนไทย (UTC+7)"""
-    tz = timezone(timedelta(hours=7))
-    return datetime.now(tz)
+# BUCKET_NAME / DB_SHEET_NAME / REAL_REPORT_SHEET / get_thai_time อยู่ใน meter_core.config
 
 # =========================================================
 # --- PAGE CONFIG ---
@@ -193,11 +223,38 @@ if not creds:
     """)
     st.stop()
 
-gc = gspread.authorize(creds)
-DB_SHEET_NAME = 'WaterMeter_System_DB'
-REAL_REPORT_SHEET = 'FM-OP-01-10WaterReport'
-VISION_CLIENT = vision.ImageAnnotatorClient(credentials=creds)
-STORAGE_CLIENT = storage.Client(credentials=creds)
+# ✅ ใช้ credentials ชุดเดียวกับ meter_core (sheets / scada helpers ใช้ client ตัวเดียวกัน)
+install_credentials(creds)
+gc = get_gc()
+VISION_CLIENT = cached_vision_client(get_vision_client())  # ✅ รูปเดิม → ผลจาก cache บน disk (ไม่ยิง Vision ซ้ำ)
+STORAGE_CLIENT = get_storage_client()
+
+# =========================================================
+# --- 📨 WRITE QUEUE (แชร์ทุก session ใน process นี้) ---
+# =========================================================
+@st.cache_resource
+def get_write_queue():
+    """คิวรวม write ของหน้าพนักงาน: กดบันทึกแล้วกลับทันที ส่ง Sheets เป็น batch เบื้องหลัง"""
+    outbox = Outbox()
+    outbox.start_background_flusher(get_gc, interval=120, **outbox_flush_kwargs())
+    return WriteQueue(outbox=outbox)
+
+@st.cache_resource
+def start_stats_endpoint():
+    """GET http://127.0.0.1:$SHEETS_STATS_PORT/sheets-stats → สถิติ request (JSON) — ไม่ตั้ง env = ไม่เปิด"""
+    port = os.environ.get("SHEETS_STATS_PORT")
+    if not port:
+        return None
+    try:
+        return serve_stats(int(port))
+    except Exception as e:
+        print(f"⚠️ เปิด sheets-stats endpoint ไม่ได้: {e}")
+        return None
+
+WRITE_STATUS_ICONS = {
+    "queued": "⏳", "sending": "📤", "retry": "🔁",
+    "sent": "✅", "partial": "⚠️", "outbox": "📦", "failed": "❌",
+}
 
 # =========================================================
 # --- CLOUD STORAGE HELPERS ---
@@ -270,95 +327,10 @@ def load_ref_image_bytes_any(point_id: str):
 # =========================================================
 # --- SHEET HELPERS ---
 # =========================================================
-def col_to_index(col_str):
-    col_str = str(col_str).upper().strip()
-    num = 0
-    for c in col_str:
-        if c in string.ascii_letters:
-            num = num * 26 + (ord(c.upper()) - ord('A')) + 1
-    return num
-
-# ✅ แก้ไข: รับวันที่เข้ามาเพื่อหา Sheet เดือนที่ถูกต้อง (เผื่อลงย้อนหลังข้ามเดือน)
-# ✅ Support both Thai and English month names with comprehensive month rollover handling
-def get_thai_sheet_name(sh, target_date):
-    """Find the correct monthly sheet based on target_date.
-    
-    Supports multiple naming conventions:
-    - Thai months: ม.ค. 68, ก.พ. 68, etc.
-    - English months: Jan2026, Feb2026, January2026, etc.
-    
-    Args:
-        sh: gspread Spreadsheet object
-        target_date: datetime.date object to find the correct month
-    
-    Returns:
-        Sheet title if found, None otherwise
-    """
-    thai_months = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
-    english_months_short = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    english_months_long = ["January", "February", "March", "April", "May", "June", 
-                           "July", "August", "September", "October", "November", "December"]
-    
-    # ใช้วันที่ที่เลือก (target_date) แทนเวลาปัจจุบัน
-    m_idx = target_date.month - 1
-    # ปีพุทธศักราช (2 หรือ 4 หลัก)
-    yy2 = str(target_date.year + 543)[-2:]
-    yy4 = str(target_date.year + 543)
-    # ปีค.ศ. (2 หรือ 4 หลัก)
-    ad_yy2 = str(target_date.year)[-2:]
-    ad_yy4 = str(target_date.year)
-    
-    all_sheets = [s.title for s in sh.worksheets()]
-    
-    # Try Thai month patterns first (highest priority)
-    thai_patterns = [
-        f"{thai_months[m_idx]}{yy2}",      # ม.ค.68
-        f"{thai_months[m_idx][:-1]}{yy2}", # ม.ค68  (without dot)
-        f"{thai_months[m_idx]} {yy2}",     # ม.ค. 68
-        f"{thai_months[m_idx][:-1]} {yy2}",# ม.ค 68
-        f"{thai_months[m_idx]}{yy4}",      # ม.ค.2568
-        f"{thai_months[m_idx][:-1]}{yy4}", # ม.ค2568
-        f"{thai_months[m_idx]} {yy4}",     # ม.ค. 2568
-        f"{thai_months[m_idx][:-1]} {yy4}",# ม.ค 2568
-    ]
-    
-    for p in thai_patterns:
-        if p in all_sheets:
-            return p
-    
-    # Try English month patterns (short names)
-    eng_patterns = [
-        f"{english_months_short[m_idx]}{ad_yy4}",  # Jan2026
-        f"{english_months_short[m_idx]} {ad_yy4}", # Jan 2026
-        f"{english_months_short[m_idx]}{ad_yy2}",  # Jan26
-        f"{english_months_short[m_idx]} {ad_yy2}", # Jan 26
-        f"{english_months_long[m_idx]}{ad_yy4}",   # January2026
-        f"{english_months_long[m_idx]} {ad_yy4}",  # January 2026
-        f"{english_months_long[m_idx]}{ad_yy2}",   # January26
-        f"{english_months_long[m_idx]} {ad_yy2}",  # January 26
-    ]
-    
-    for p in eng_patterns:
-        if p in all_sheets:
-            return p
-    
-    return None
-
-def find_day_row_exact(ws, day: int):
-    col = ws.col_values(1)
-    for i, v in enumerate(col, start=1):
-        try:
-            if int(str(v).strip()) == int(day):
-                return i
-        except:
-            pass
-    return None
-
 @st.cache_data(ttl=300)
 def load_points_master():
-    sh = gc.open(DB_SHEET_NAME)
-    ws = sh.worksheet("PointsMaster")
-    return ws.get_all_records()
+    ws = get_handles(DB_SHEET_NAME).worksheet("PointsMaster")
+    return _with_retry(ws.get_all_records)
 
 def safe_int(x, default=0):
     try: return int(float(x)) if x and str(x).strip() else default
@@ -375,289 +347,18 @@ def parse_bool(v):
 def get_meter_config(point_id):
     try:
         records = load_points_master()
-        pid = str(point_id).strip().upper()
+        pid = normalize_pid(point_id)
         for item in records:
-            if str(item.get('point_id', '')).strip().upper() == pid:
-                item['decimals'] = safe_int(item.get('decimals'), 0)
-                item['keyword'] = str(item.get('keyword', '')).strip()
-                exp = safe_int(item.get('expected_digits'), 0)
-                if exp == 0: exp = safe_int(item.get('int_digits'), 0)
-                item['expected_digits'] = exp
-                item['report_col'] = str(item.get('report_col', '')).strip()
-                item['ignore_red'] = parse_bool(item.get('ignore_red'))
-                item['roi_x1'] = safe_float(item.get('roi_x1'), 0.0)
-                item['roi_y1'] = safe_float(item.get('roi_y1'), 0.0)
-                item['roi_x2'] = safe_float(item.get('roi_x2'), 0.0)
-                item['roi_y2'] = safe_float(item.get('roi_y2'), 0.0)
-                item['type'] = str(item.get('type', '')).strip()
-                item['name'] = str(item.get('name', '')).strip()
-                return item
+            if normalize_pid(item.get('point_id', '')) == pid:
+                return normalize_meter_config(item)
         return None
     except: return None
 
-# ✅ แก้ไข: รับ target_date เพื่อลงให้ถูกวัน
-def export_to_real_report(point_id, read_value, inspector, report_col, target_date, debug=False):
-    """ส่งค่าลง Google Sheet REAL_REPORT_SHEET
-    - debug=False: คืน True/False เหมือนเดิม
-    - debug=True : คืน (ok, message) เพื่อโชว์สาเหตุเวลาส่งไม่เข้า
-    """
-
-    def _ret(ok, msg=""):
-        return (ok, msg) if debug else ok
-
-    if not report_col:
-        return _ret(False, "report_col ว่าง")
-    report_col = str(report_col).strip()
-    if report_col in ("-", "—", "–"):
-        return _ret(False, "report_col เป็น '-' (ยังไม่ได้ตั้งค่าใน PointsMaster)")
-
-    # เปิดชีท
-    try:
-        sh = gc.open(REAL_REPORT_SHEET)
-    except Exception as e:
-        return _ret(False, f"เปิดชีท '{REAL_REPORT_SHEET}' ไม่ได้: {e}")
-
-    # หาแท็บเดือน
-    sheet_name = None
-    try:
-        sheet_name = get_thai_sheet_name(sh, target_date)
-    except Exception:
-        sheet_name = None
-
-    # ถ้าไม่เจอ → หาแบบฟัซซี่ (ตัดช่องว่าง/จุด)
-    if not sheet_name:
-        try:
-            thai_months = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
-            english_months_short = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-            english_months_long = ["January", "February", "March", "April", "May", "June", 
-                                   "July", "August", "September", "October", "November", "December"]
-            
-            m_idx = target_date.month - 1
-            yy2_thai = str(target_date.year + 543)[-2:]
-            yy4_thai = str(target_date.year + 543)
-            yy2_ad = str(target_date.year)[-2:]
-            yy4_ad = str(target_date.year)
-            
-            m_norm_thai = thai_months[m_idx].replace(".", "").replace(" ", "")
-
-            def norm(x):
-                return str(x).replace(".", "").replace(" ", "").lower().strip()
-
-            for t in [s.title for s in sh.worksheets()]:
-                tn = norm(t)
-                # Check Thai month patterns
-                if (m_norm_thai.lower() in tn) and (yy2_thai in tn or yy4_thai in tn):
-                    sheet_name = t
-                    break
-                # Check English month patterns (case-insensitive)
-                if (english_months_short[m_idx].lower() in tn or english_months_long[m_idx].lower() in tn) and (yy2_ad in tn or yy4_ad in tn):
-                    sheet_name = t
-                    break
-        except Exception:
-            sheet_name = None
-
-    # เปิด worksheet
-    try:
-        ws = sh.worksheet(sheet_name) if sheet_name else sh.get_worksheet(0)
-    except Exception as e:
-        return _ret(False, f"เปิดแท็บ '{sheet_name}' ไม่ได้: {e}")
-
-    # หาแถวของวัน
-    try:
-        target_day = int(target_date.day)
-        target_row = find_day_row_exact(ws, target_day) or (6 + target_day)
-    except Exception as e:
-        return _ret(False, f"หาแถวของวันไม่สำเร็จ: {e}")
-
-    # หา col
-    target_col = col_to_index(report_col)
-    if target_col == 0:
-        return _ret(False, f"report_col '{report_col}' แปลงเป็นคอลัมน์ไม่ได้")
-
-    # เขียนค่า
-    try:
-        ws.update_cell(target_row, target_col, read_value)
-        return _ret(True, f"OK → sheet='{ws.title}', row={target_row}, col={report_col}({target_col}), val={read_value}")
-    except Exception as e:
-        return _ret(False, f"เขียนค่าไม่สำเร็จ: {e}")
-
-
-
-# ✅ แก้ไข: รับ target_date เพื่อลง Timestamp ให้ถูกวัน
-
-# =========================================================
-# --- 🚀 QUOTA-SAFE BATCH HELPERS (Sheets) ---
-# =========================================================
-def _is_quota_429(err: Exception) -> bool:
-    msg = str(err)
-    return ("429" in msg) or ("Quota exceeded" in msg) or ("Read requests" in msg)
-
-def _with_retry(fn, *args, max_retries: int = 6, base_sleep: float = 0.8, **kwargs):
-    """
-    Retry wrapper for Google Sheets calls that may hit 429 quota.
-    - Exponential backoff + jitter
-    """
-    last_err = None
-    for i in range(max_retries):
-        try:
-            return fn(*args, **kwargs)
-        except Exception as e:
-            last_err = e
-            if _is_quota_429(e) and i < max_retries - 1:
-                # backoff: 0.8, 1.6, 3.2, ...
-                sleep_s = base_sleep * (2 ** i) + random.random() * 0.4
-                pytime.sleep(sleep_s)
-                continue
-            raise
-    if last_err:
-        raise last_err
-
-def export_many_to_real_report_batch(items: list, target_date, debug: bool = False, write_mode: str = "overwrite"):
-    """
-    Export หลายจุดลง WaterReport ด้วย 1 batch_update (ลด Read/Write requests มาก ๆ)
-    items: list[dict] ต้องมี keys: point_id, value, report_col
-    คืนค่า:
-      - ok_pids: list[str]
-      - fail_list: list[tuple(pid, reason)]
-    """
-    ok_pids = []
-    fail_list = []
-
-    if not items:
-        return ok_pids, fail_list
-
-    # เปิดชีทครั้งเดียว + retry กัน quota
-    try:
-        sh = _with_retry(gc.open, REAL_REPORT_SHEET)
-    except Exception as e:
-        reason = f"เปิดชีท '{REAL_REPORT_SHEET}' ไม่ได้: {e}"
-        for it in items:
-            fail_list.append((it.get("point_id", ""), reason))
-        return ok_pids, fail_list
-
-    # หาแท็บเดือนครั้งเดียว
-    sheet_name = None
-    try:
-        sheet_name = get_thai_sheet_name(sh, target_date)
-    except Exception:
-        sheet_name = None
-
-    # fallback แบบฟัซซี่ (ครั้งเดียว)
-    if not sheet_name:
-        try:
-            thai_months = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
-            m_idx = target_date.month - 1
-            yy2 = str(target_date.year + 543)[-2:]
-            yy4 = str(target_date.year + 543)
-            m_norm = thai_months[m_idx].replace(".", "").replace(" ", "")
-
-            def norm(x):
-                return str(x).replace(".", "").replace(" ", "").strip()
-
-            for t in [s.title for s in sh.worksheets()]:
-                tn = norm(t)
-                if (m_norm in tn) and (yy2 in tn or yy4 in tn):
-                    sheet_name = t
-                    break
-        except Exception:
-            sheet_name = None
-
-    # เปิด worksheet ครั้งเดียว + retry
-    try:
-        ws = _with_retry(sh.worksheet, sheet_name) if sheet_name else _with_retry(sh.get_worksheet, 0)
-    except Exception as e:
-        reason = f"เปิดแท็บ '{sheet_name}' ไม่ได้: {e}"
-        for it in items:
-            fail_list.append((it.get("point_id", ""), reason))
-        return ok_pids, fail_list
-
-    # ✅ ลด Read requests: ใช้สูตร row แบบคงที่ (ถ้า template เปลี่ยนค่อยเปิด find_day_row_exact อีกที)
-    try:
-        target_row = 6 + int(target_date.day)
-    except Exception:
-        target_row = 6 + 1
-
-    # ---- กันเขียนทับ: ถ้าเลือก 'เขียนเฉพาะช่องว่าง' จะอ่านค่าเดิมในแถวนี้ก่อน 1 ครั้ง ----
-    existing_row = None
-    wm = str(write_mode or 'overwrite').strip().lower()
-    if wm in ('empty_only', 'skip_non_empty', 'no_overwrite', 'nooverwrite', 'blank_only'):
-        try:
-            existing_row = _with_retry(ws.row_values, target_row)
-        except Exception:
-            existing_row = None
-
-    # เตรียม batch ranges
-    data = []
-    for it in items:
-        pid = str(it.get("point_id", "")).strip().upper()
-        report_col = str(it.get("report_col", "")).strip()
-        val = it.get("value", "")
-
-        if not report_col or report_col in ("-", "—", "–"):
-            fail_list.append((pid, "report_col ว่าง/เป็น '-' ใน PointsMaster"))
-            continue
-
-        target_col = col_to_index(report_col)
-        if target_col <= 0:
-            fail_list.append((pid, f"report_col '{report_col}' แปลงคอลัมน์ไม่ได้"))
-            continue
-
-        # ถ้าเลือก 'เขียนเฉพาะช่องว่าง' และช่องมีข้อมูลแล้ว -> ข้าม
-        if existing_row is not None:
-            try:
-                existing_val = existing_row[target_col - 1] if (target_col - 1) < len(existing_row) else ''
-                if str(existing_val).strip() != '':
-                    fail_list.append((pid, 'SKIP_NON_EMPTY'))
-                    continue
-            except Exception:
-                pass
-
-        # A1 เช่น "Y18"
-        a1 = gspread.utils.rowcol_to_a1(target_row, target_col)
-        data.append({"range": a1, "values": [[val]]})
-        ok_pids.append(pid)
-
-    if not data:
-        return [], fail_list
-
-    # batch_update ครั้งเดียว + retry กัน quota
-    try:
-        _with_retry(ws.batch_update, data, value_input_option="USER_ENTERED")
-        return ok_pids, fail_list
-    except Exception as e:
-        # ถ้า batch fail → ถือว่าทั้งหมด fail (ให้ user กดใหม่ได้)
-        reason = f"เขียนค่าไม่สำเร็จ (batch_update): {e}"
-        for pid in ok_pids:
-            fail_list.append((pid, reason))
-        return [], fail_list
-
-def append_rows_dailyreadings_batch(rows: list):
-    """
-    append_rows ลง DailyReadings ครั้งเดียว (ลด requests)
-    rows: list[list] แต่ละแถวต้องตรงกับ schema DailyReadings
-    คืนค่า (ok:bool, message:str)
-    """
-    if not rows:
-        return True, "NO_ROWS"
-
-    try:
-        sh = _with_retry(gc.open, DB_SHEET_NAME)
-        ws = _with_retry(sh.worksheet, "DailyReadings")
-        _with_retry(ws.append_rows, rows, value_input_option="USER_ENTERED")
-        return True, f"APPENDED {len(rows)}"
-    except Exception as e:
-        return False, str(e)
-        
 # =========================================================
 # --- ✅ WATERREPORT PROGRESS (92 จุด) ---
 # =========================================================
-@st.cache_data(ttl=60)
-def get_waterreport_progress_snapshot(target_date):
-    """
-    เช็คความคืบหน้าการลงค่าใน REAL_REPORT_SHEET ของ 'วันนั้น'
-    - total = จำนวนจุดที่ "ตั้ง report_col แล้ว" (เช็คได้จริงใน WaterReport)
-    - total_all = จำนวน point_id ทั้งหมดใน PointsMaster
-    """
+def _waterreport_expected():
+    """(expected_all, expected_report, missing_config) จาก PointsMaster"""
     pm = load_points_master() or []
 
     expected_all = []
@@ -686,65 +387,62 @@ def get_waterreport_progress_snapshot(target_date):
         else:
             missing_config.append({**rec, "reason": "NO_REPORT_COL"})
 
-    total_all = len(expected_all)
-    total_report = len(expected_report)
-    asof = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
+    return expected_all, expected_report, missing_config
+
 
-    # --- open spreadsheet ---
+def _waterreport_month_block(target_date, expected_report=None):
+    """
+    (ws, block, error) ของแท็บเดือน — block = ทุกวันในเดือน × คอลัมน์ report_col (ReportGridCache)
+    expected_report=None → อ่านทุกคอลัมน์ของแท็บ (ไม่ต้องรู้ PointsMaster ก่อน ใช้ตอน prefetch)
+    อ่านจาก Sheets แค่ตอน cache หมดอายุ (ranged get 1 ครั้งต่อแท็บ) → เปลี่ยนวันไม่เสีย request
+    """
+    # --- open spreadsheet (handle cache ของ process) ---
+    handles = get_handles(REAL_REPORT_SHEET)
     try:
-        sh = _with_retry(gc.open, REAL_REPORT_SHEET)
+        handles.spreadsheet()
     except Exception as e:
-        return {
-            "ok": False,
-            "total": total_report,
-            "total_report": total_report,
-            "total_all": total_all,
-            "config_missing": len(missing_config),
-            "filled": 0,
-            "missing": expected_report,
-            "done_set": set(),
-            "value_map": {},
-            "sheet_title": None,
-            "row": None,
-            "asof": asof,
-            "error": f"open REAL_REPORT_SHEET failed: {e}",
-        }
+        return None, None, f"open REAL_REPORT_SHEET failed: {e}"
 
-    # --- find month sheet ---
+    # --- find month sheet (ชื่อมาตรฐาน → ฟัซซี่ เหมือนตอนเขียน) ไม่เจอ → แท็บแรก ---
     sheet_name = None
     try:
-        sheet_name = get_thai_sheet_name(sh, target_date)
-    except Exception:
-        sheet_name = None
+        ws, sheet_name = handles.month_worksheet(target_date)
+        if ws is None:
+            ws = handles.first_worksheet()
+    except Exception as e:
+        return None, None, f"open worksheet '{sheet_name}' failed: {e}"
 
+    if expected_report is None:
+        cols = [1, max(1, int(getattr(ws, "col_count", 0) or 1))]  # prefetch: ทุกคอลัมน์ของแท็บ
+    else:
+        cols = [col_to_index(it["report_col"]) for it in expected_report] or [1]
     try:
-        ws = _with_retry(sh.worksheet, sheet_name) if sheet_name else _with_retry(sh.get_worksheet, 0)
+        # แถวของวันตาม layout ของแท็บ (cache คู่กับ handle เหมือนตอนเขียน)
+        block = get_report_grid().block(ws, min(cols), max(cols), layout=handles.layout(ws))
     except Exception as e:
-        return {
-            "ok": False,
-            "total": total_report,
-            "total_report": total_report,
-            "total_all": total_all,
-            "config_missing": len(missing_config),
-            "filled": 0,
-            "missing": expected_report,
-            "done_set": set(),
-            "value_map": {},
-            "sheet_title": sheet_name,
-            "row": None,
-            "asof": asof,
-            "error": f"open worksheet failed: {e}",
-        }
+        return ws, None, f"read month grid failed: {e}"
+    return ws, block, ""
 
-    # --- read row of day ---
-    try:
-        target_row = 6 + int(target_date.day)
-    except Exception:
-        target_row = 7
 
-    try:
-        row_vals = _with_retry(ws.row_values, target_row)
-    except Exception as e:
+def get_waterreport_progress_snapshot(target_date):
+    """
+    เช็คความคืบหน้าการลงค่าใน REAL_REPORT_SHEET ของ 'วันนั้น'
+    - total = จำนวนจุดที่ "ตั้ง report_col แล้ว" (เช็คได้จริงใน WaterReport)
+    - total_all = จำนวน point_id ทั้งหมดใน PointsMaster
+    - อ่านจาก month grid (ทั้งเดือนใน request เดียว + write-through จาก export ของเราเอง)
+    """
+    expected_all, expected_report, missing_config = _waterreport_expected()
+
+    total_all = len(expected_all)
+    total_report = len(expected_report)
+
+    ws, block, err = _waterreport_month_block(target_date, expected_report)
+
+    # --- row of day (จาก layout ของแท็บ; อ่าน block ไม่ได้ → template มาตรฐาน 6 + วัน) ---
+    target_row = (block["days"] if block else {}).get(int(target_date.day), 6 + int(target_date.day))
+    asof = datetime.fromtimestamp(block["at"], tz=get_thai_time().tzinfo) if block else get_thai_time()
+    asof = asof.strftime("%Y-%m-%d %H:%M:%S")
+    if err:
         return {
             "ok": False,
             "total": total_report,
@@ -755,10 +453,10 @@ def get_waterreport_progress_snapshot(target_date):
             "missing": expected_report,
             "done_set": set(),
             "value_map": {},
-            "sheet_title": ws.title,
-            "row": target_row,
+            "sheet_title": ws.title if ws is not None else None,
+            "row": target_row if ws is not None else None,
             "asof": asof,
-            "error": f"read row_values failed: {e}",
+            "error": err,
         }
 
     done_set = set()
@@ -767,12 +465,7 @@ def get_waterreport_progress_snapshot(target_date):
 
     for it in expected_report:
         pid = it["point_id"]
-        col_idx = col_to_index(it["report_col"])
-        if col_idx <= 0:
-            missing.append({**it, "reason": "BAD_REPORT_COL"})
-            continue
-
-        existing = row_vals[col_idx - 1] if (col_idx - 1) < len(row_vals) else ""
+        existing = grid_value(block, target_row, col_to_index(it["report_col"]))
         if str(existing).strip() != "":
             done_set.add(pid)
             value_map[pid] = existing
@@ -797,6 +490,58 @@ def get_waterreport_progress_snapshot(target_date):
         "error": "",
     }
 
+
+def get_waterreport_month_heatmap(target_date):
+    """
+    ความครบของทั้งเดือน (จาก block เดียวกับ progress snapshot → ไม่เสีย request เพิ่ม)
+    คืน DataFrame: แถว = point_id, คอลัมน์ = วันที่ 1..สิ้นเดือน, ค่า = 1 (ลงแล้ว) / 0 (ยังไม่ลง)
+    หรือ None ถ้าอ่านไม่ได้
+    """
+    _all, expected_report, _missing = _waterreport_expected()
+    if not expected_report:
+        return None
+    _ws, block, err = _waterreport_month_block(target_date, expected_report)
+    if err:
+        return None
+
+    n_days = calendar.monthrange(target_date.year, target_date.month)[1]
+    days = list(range(1, n_days + 1))
+    data = {
+        it["point_id"]: [
+            1 if str(grid_value(block, block["days"][d], col_to_index(it["report_col"]))).strip() != "" else 0
+            for d in days
+        ]
+        for it in expected_report
+    }
+    return pd.DataFrame.from_dict(data, orient="index", columns=days)
+
+
+# =========================================================
+# --- ⚡ PREFETCH: read ที่ไม่ขึ้นต่อกันยิงพร้อมกัน ---
+# =========================================================
+def in_script_ctx(fn):
+    """ห่อ fn ให้รันใน thread อื่นได้โดยยังใช้ st.cache_data ของ session นี้ (แนบ ScriptRunContext)"""
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def _run(*args, **kwargs):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    return _run
+
+
+def prefetch_reads(intents: dict, timeout: float = 30):
+    """
+    รัน read หลายอย่างพร้อมกันบน pool ของ SheetsGateway แล้วรอจนเสร็จ (~1 round trip แทน N)
+    ผลเก็บใน cache เดิมของแต่ละตัว (st.cache_data / mirror / handles / month grid)
+    → โค้ดเดิมที่เรียกตามหลังได้ค่าจาก cache ทันที, error ของ prefetch ไม่ทำอะไร (เรียกจริงจะเจอเอง)
+    """
+    futures = get_gateway().submit_many({k: in_script_ctx(fn) for k, fn in intents.items()}, timeout=timeout)
+    for name, fut in futures.items():
+        if fut.done() and fut.exception() is not None:
+            print(f"⚠️ prefetch {name}: {fut.exception()}")
+    return futures
+
 # =========================================================
 # --- SQL SERVER INTEGRATION (CUTEST SCADA 2018) ---
 # =========================================================
@@ -928,1065 +673,94 @@ def query_scada_values(
                       AND CAST(Timestamp AS DATE) = '{date_str}'
                     ORDER BY Timestamp DESC
                     """
-                    with engine.connect() as conn:
-                        result = conn.execute(text(query))
-                        rows = result.fetchall()
-                        if rows:
-                            query_result = [(row[0], row[1], row[2]) for row in rows]
-                            return _process_sql_results(query_result, table, date_str, point_id)
-                except:
-                    continue
-            
-            return {
-                "success": False,
-                "message": f"ไม่พบข้อมูล point_id='{point_id}' ในวันที่ {date_str}",
-                "all_records": []
-            }
-        except Exception as e:
-            pass
-    
-    # 🔹 Method 3: pyodbc
-    if HAS_PYODBC:
-        try:
-            conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
-            conn = pyodbc.connect(conn_str, timeout=10)
-            cursor = conn.cursor()
-            
-            for table in table_candidates:
-                try:
-                    query = f"""
-                    SELECT TOP 100 TagName, Value, Timestamp 
-                    FROM {table}
-                    WHERE TagName LIKE '%{point_id}%'
-                      AND CAST(Timestamp AS DATE) = '{date_str}'
-                    ORDER BY Timestamp DESC
-                    """
-                    cursor.execute(query)
-                    query_result = cursor.fetchall()
-                    if query_result:
-                        conn.close()
-                        return _process_sql_results(query_result, table, date_str, point_id)
-                except:
-                    continue
-            
-            conn.close()
-            return {
-                "success": False,
-                "message": f"ไม่พบข้อมูล point_id='{point_id}' ในวันที่ {date_str}",
-                "all_records": []
-            }
-        except Exception as e:
-            pass
-    
-    return {
-        "success": False,
-        "message": "❌ ไม่มี SQL driver ที่ติดตั้ง\nต้องติดตั้ง: pip install pymssql",
-        "all_records": []
-    }
-
-def _process_sql_results(query_result, table_found, date_str, point_id):
-    """ตัวช่วยสำหรับประมวลผลผลลัพธ์ SQL"""
-    records = []
-    latest_value = None
-    latest_time = None
-    
-    for row in query_result:
-        tag_name = row[0]
-        value = row[1]
-        timestamp = row[2]
-        records.append({
-            "tag": tag_name,
-            "value": value,
-            "timestamp": str(timestamp)
-        })
-        if latest_value is None:
-            latest_value = value
-            latest_time = str(timestamp)
-    
-    return {
-        "success": True,
-        "value": latest_value,
-        "timestamp": latest_time,
-        "table": table_found,
-        "record_count": len(records),
-        "all_records": records,
-        "message": f"✅ พบข้อมูล {len(records)} แถว จากตาราง {table_found}"
-    }
-
-def save_to_db(point_id, inspector, meter_type, manual_val, ai_val, status, target_date, image_url="-"):
-    try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("DailyReadings")
-        
-        # สร้าง Timestamp: วันที่เลือก + เวลาปัจจุบัน (เพื่อให้รู้ว่าคีย์ตอนกี่โมง แต่วันที่เป็นของวันที่เลือก)
-        current_time = get_thai_time().time()
-        record_timestamp = datetime.combine(target_date, current_time)
-        
-        row = [record_timestamp.strftime("%Y-%m-%d %H:%M:%S"), meter_type, point_id, inspector, manual_val, ai_val, status, image_url]
-        ws.append_row(row)
-        return True
-    except: return False
-
-# =========================================================
-# --- 🧠 OCR ENGINE (Clean & Robust) ---
-# =========================================================
-
-# ------------------------ SCADA Excel Upload (Export) ------------------------
-def _normalize_scada_time(value):
-    """
-    แปลงเวลาให้เป็นรูปแบบ 'HH:MM' เพื่อเทียบกันง่าย (รองรับ time/datetime/str/float)
-    
-    ✅ 24:00 standardization:
-    - 24:00 → 23:55 (standard for end-of-day)
-    """
-    import datetime as _dt
-    if value is None:
-        return None
-
-    # Excel time (เช่น 0.9965) = สัดส่วนของวัน
-    if isinstance(value, (int, float)) and 0 <= float(value) < 1:
-        seconds = int(round(float(value) * 24 * 60 * 60))
-        h = (seconds // 3600) % 24
-        m = (seconds % 3600) // 60
-        result = f"{h:02d}:{m:02d}"
-        # Apply 24:00 → 23:55 conversion
-        if h == 24 and m == 0:
-            return "23:55"
-        return result
-
-    if isinstance(value, _dt.datetime):
-        value = value.time()
-    if isinstance(value, _dt.time):
-        result = f"{value.hour:02d}:{value.minute:02d}"
-        # Apply 24:00 → 23:55 conversion
-        if value.hour == 24 and value.minute == 0:
-            return "23:55"
-        return result
-
-    s = str(value).strip()
-    # 23.55 or 24.00
-    if re.match(r"^\d{1,2}\.\d{2}$", s):
-        h, m = s.split(".")
-        h = int(h)
-        m = int(m)
-        # ✅ 24:00 → 23:55 conversion
-        if h == 24 and m == 0:
-            return "23:55"
-        return f"{h:02d}:{m:02d}"
-    
-    # 23:55 or 24:00 or 23:55:00 or 24:00:00
-    if re.match(r"^\d{1,2}:\d{2}", s):
-        parts = s.split(":")
-        h = int(parts[0])
-        m = int(parts[1])
-        # ✅ 24:00 → 23:55 conversion
-        if h == 24 and m == 0:
-            return "23:55"
-        return f"{h:02d}:{m:02d}"
-
-    return None
-
-
-def _strip_date_prefix(name: str) -> str:
-    """
-    เอาวันที่นำหน้าออก (เช่น 2026_01_12_Daily_Report -> Daily_Report)
-    """
-    base = os.path.splitext(os.path.basename(name))[0]
-    base = re.sub(r"^\d{4}_\d{2}_\d{2}_", "", base)
-    return base.strip().lower()
-
-
-def load_scada_excel_mapping(local_path: str = "DB_Water_Scada.xlsx", uploaded_bytes=None):
-    """
-    อ่าน mapping จากไฟล์ DB_Water_Scada.xlsx
-    ต้องมีหัวตาราง: PointID, File, Sheet, Time, Colume
-    คืนค่าเป็น list ของ dict: {point_id, file_key, sheet, time, col}
-    """
-    if uploaded_bytes:
-        wb = openpyxl.load_workbook(io.BytesIO(uploaded_bytes), data_only=True)
-    else:
-        if not os.path.exists(local_path):
-            return []
-        wb = openpyxl.load_workbook(local_path, data_only=True)
-
-    ws = wb[wb.sheetnames[0]]
-
-    # หาแถวหัวตาราง
-    header_row = None
-    header_map = {}
-    for r in range(1, min(ws.max_row, 30) + 1):
-        row_vals = [ws.cell(r, c).value for c in range(1, min(ws.max_column, 20) + 1)]
-        row_str = [str(v).strip().lower() if v is not None else "" for v in row_vals]
-        if "pointid" in row_str and "file" in row_str and "sheet" in row_str:
-            header_row = r
-            for idx, name in enumerate(row_str, start=1):
-                if name in ["pointid", "file", "sheet", "time", "colume", "column"]:
-                    header_map[name] = idx
-            break
-
-    if not header_row:
-        return []
-
-    # รองรับสะกด Colume/Column
-    col_idx = header_map.get("colume") or header_map.get("column")
-    out = []
-    for r in range(header_row + 1, ws.max_row + 1):
-        point_id = ws.cell(r, header_map["pointid"]).value
-        if point_id is None or str(point_id).strip() == "":
-            continue
-
-        file_key = ws.cell(r, header_map["file"]).value
-        sheet = ws.cell(r, header_map["sheet"]).value
-        t = ws.cell(r, header_map.get("time", 0)).value if header_map.get("time") else None
-        col = ws.cell(r, col_idx).value if col_idx else None
-
-        out.append({
-            "point_id": str(point_id).strip(),
-            "file_key": str(file_key).strip() if file_key is not None else "",
-            "sheet": str(sheet).strip() if sheet is not None else "Sheet1",
-            "time": t,
-            "col": str(col).strip() if col is not None else "",
-        })
-    return out
-
-
-def _find_cell_exact(ws, target_text: str, max_rows=60, max_cols=40):
-    target = target_text.strip().lower()
-    for r in range(1, min(ws.max_row, max_rows) + 1):
-        for c in range(1, min(ws.max_column, max_cols) + 1):
-            v = ws.cell(r, c).value
-            if isinstance(v, str) and v.strip().lower() == target:
-                return r, c
-    return None
-
-
-def _hhmm_to_minutes(hhmm: str, normalize_24_00=True):
-    """
-    แปลง HH:MM เป็นจำนวนนาทีตั้งแต่เที่ยงคืน
-    
-    ✅ 24:00 standardization:
-    - 24:00 ถือว่าเป็น 23:55 (สุดท้ายของวัน)
-    - กำหนดมาตรฐาน: "24:00 ของวัน D" = "23:55 ของวัน D"
-    
-    Args:
-        hhmm: string format "HH:MM" (e.g., "24:00", "23:55")
-        normalize_24_00: if True, convert 24:00 → 23:55
-    
-    Returns:
-        minutes since midnight, or None if invalid
-    """
-    try:
-        h, m = str(hhmm).split(":")
-        h = int(h)
-        m = int(m)
-        
-        # ✅ Handle 24:00 normalization
-        if normalize_24_00 and h == 24 and m == 0:
-            # 24:00 ของวัน D = 23:55 ของวัน D
-            return 23 * 60 + 55
-        
-        # Validate time range
-        if h < 0 or h > 23 or m < 0 or m > 59:
-            return None
-        
-        return h * 60 + m
-    except Exception:
-        return None
-
-
-def _minutes_to_hhmm(minutes: int) -> str:
-    """
-    แปลงนาทีมาเป็น HH:MM format
-    """
-    try:
-        h = minutes // 60
-        m = minutes % 60
-        return f"{h:02d}:{m:02d}"
-    except Exception:
-        return None
-
-
-def _normalize_time_to_standard(hhmm: str) -> str:
-    """
-    Normalize any time format to standard HH:MM
-    
-    ✅ 24:00 standardization (สำคัญ):
-    - Input: "24:00" → Output: "23:55"
-    - This is the company standard for end-of-day
-    
-    Returns:
-        Normalized time string, or None if invalid
-    """
-    try:
-        # First normalize to HH:MM
-        normalized = _normalize_scada_time(hhmm)
-        if not normalized:
-            return None
-        
-        h, m = normalized.split(":")
-        h = int(h)
-        m = int(m)
-        
-        # ✅ Apply 24:00 → 23:55 conversion
-        if h == 24 and m == 0:
-            return "23:55"
-        
-        if h < 0 or h > 23 or m < 0 or m > 59:
-            return None
-        
-        return f"{h:02d}:{m:02d}"
-    except Exception:
-        return None
-
-
-def _find_nearest_time_row(time_rows: list, target_minutes: int, max_diff_minutes: int = 300) -> int:
-    """
-    Find the row with time closest to target_minutes (nearest time algorithm)
-    
-    ✅ Key feature: Handles missing data by finding nearest available time
-    
-    Args:
-        time_rows: list of tuples (row_number, minutes_since_midnight)
-        target_minutes: target time in minutes (e.g., 1435 for 23:55)
-        max_diff_minutes: max allowed difference (default 5 mins = 300 sec)
-    
-    Returns:
-        row_number if found, None otherwise
-    
-    Example:
-        time_rows = [(10, 1430), (11, 1435), (12, 1440)]  # 23:50, 23:55, 24:00→23:55
-        target = 1435  # 23:55
-        → returns 11 (exact match)
-        
-        If 23:55 data missing, still finds nearest (23:50 or 00:00)
-    """
-    if not time_rows:
-        return None
-    
-    if target_minutes is None:
-        # No target specified, return last available
-        return time_rows[-1][0]
-    
-    # Find closest match
-    nearest = min(time_rows, key=lambda x: abs(x[1] - target_minutes))
-    diff = abs(nearest[1] - target_minutes)
-    
-    # Only return if within acceptable range
-    if diff <= max_diff_minutes:
-        return nearest[0]
-    
-    # If no match within range, return last available (fallback)
-    return time_rows[-1][0]
-
-
-
-def _extract_value_from_ws(ws, target_time_hhmm, value_col_letter: str, time_header="Time", max_scan_rows: int = 5000):
-    """
-    ดึงค่าจากตารางที่มีคอลัมน์เวลา (Time) โดย:
-    - หา header 'Time' ก่อน
-    - สแกนแถวข้อมูลจำนวนจำกัด (กันไฟล์ใหญ่ max_row หลอก)
-    - เลือกแถวที่ใกล้เวลาเป้าหมายที่สุด (หรือแถวสุดท้าย)
-    - ถ้า cell ว่าง ไล่ขึ้นไปหาแถวก่อนหน้าที่มีค่า
-    คืนค่า: (value, status)
-    """
-    hdr = _find_cell_exact(ws, time_header)
-    if not hdr:
-        return None, "NO_TIME_HEADER"
-
-    hdr_row, time_col = hdr
-
-    # เก็บแถวที่มีเวลา (จำกัดจำนวนแถวที่สแกน)
-    time_rows = []
-    blank_streak = 0
-    max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
-    for r in range(hdr_row + 1, max_r + 1):
-        v = ws.cell(r, time_col).value
-        hhmm = _normalize_scada_time(v)
-        mm = _hhmm_to_minutes(hhmm) if hhmm else None
-
-        if mm is not None:
-            time_rows.append((r, mm))
-            blank_streak = 0
-        else:
-            blank_streak += 1
-            # ถ้าเริ่มเจอแถวว่างยาว ๆ และมีข้อมูลแล้ว ให้หยุด เพื่อความเร็ว
-            if blank_streak >= 80 and time_rows:
-                break
-
-    if not time_rows:
-        return None, "NO_DATA_ROW"
-
-    # เลือกแถวที่ “ใกล้เวลาเป้าหมายที่สุด”
-    if target_time_hhmm:
-        tmm = _hhmm_to_minutes(target_time_hhmm)
-        target_row = _find_nearest_time_row(time_rows, tmm, max_diff_minutes=300)
-        if target_row is None:
-            target_row = time_rows[-1][0]
-    else:
-        target_row = time_rows[-1][0]
-
-    # คอลัมน์ค่า
-    try:
-        col_idx = column_index_from_string(str(value_col_letter).strip().upper())
-    except Exception:
-        return None, "BAD_COLUMN"
-
-    # ถ้าแถวที่เลือกว่าง → ไล่ขึ้นไปหาแถวก่อนหน้าที่มีค่า
-    for rr in range(target_row, hdr_row, -1):
-        val = ws.cell(rr, col_idx).value
-        if val not in (None, "", " "):
-            return val, "OK"
-
-    return None, "EMPTY_CELL"
-
-
-def _norm_filekey(name: str) -> str:
-    """normalize ชื่อไฟล์/คีย์เพื่อเทียบกันแบบหยาบ ๆ"""
-    base = os.path.splitext(os.path.basename(str(name)))[0]
-    base = base.strip().lower()
-    base = re.sub(r"\s+", "_", base)
-    base = re.sub(r"[^a-z0-9_]+", "_", base)
-    base = re.sub(r"_+", "_", base).strip("_")
-    return base
-
-def _is_uf_gen_report_workbook(wb) -> bool:
-    """ตรวจว่าเป็นไฟล์ UF/System แบบใหม่ (เช่น AF_Report_Gen.. มีหลาย sheet: Total/PV/FM_01..)"""
-    try:
-        names = {str(n).strip().lower() for n in (wb.sheetnames or [])}
-        return ("total" in names) and ("pv" in names) and any(n.startswith("fm_") for n in names)
-    except Exception:
-        return False
-
-def _resolve_sheet_name_for_export(wb, desired_sheet: str, point_id: str) -> str:
-    """
-    map ชื่อ sheet ให้เข้ากับไฟล์จริง:
-    - ถ้ามี sheet ตรงชื่อ -> ใช้เลย
-    - ถ้า desired='Sheet1' แต่ไฟล์เป็น UF gen report -> ใช้ 'Total' (เทียบเท่า Sheet1 เดิม)
-    - ไม่งั้น fallback เป็น sheet แรก
-    """
-    try:
-        if not wb:
-            return desired_sheet
-        sheetnames = wb.sheetnames or []
-        if desired_sheet in sheetnames:
-            return desired_sheet
-
-        # case-insensitive match
-        ds = str(desired_sheet or "").strip().lower()
-        for s in sheetnames:
-            if str(s).strip().lower() == ds:
-                return s
-
-        # UF gen report: Sheet1 -> Total
-        if ds in ("sheet1", "sheet 1") and _is_uf_gen_report_workbook(wb):
-            for s in sheetnames:
-                if str(s).strip().lower() == "total":
-                    return s
-
-        # fallback
-        return sheetnames[0] if sheetnames else desired_sheet
-    except Exception:
-        return desired_sheet
-
-
-def extract_scada_values_from_exports(
-    mapping_rows,
-    uploaded_exports: dict,
-    file_key_map: dict | None = None,
-    target_date=None,
-    allow_single_file_fallback: bool = True,
-    custom_max_scan_rows: int = 0,
-):
-    """
-    mapping_rows: list[dict] จาก load_scada_excel_mapping
-    uploaded_exports: dict filename->bytes ของไฟล์ Excel ที่อัปโหลด
-    file_key_map: (optional) dict ของ key_norm -> filename เพื่อบังคับจับคู่ไฟล์ (กันกรณีลูกค้าเปลี่ยนชื่อไฟล์)
-    target_date: (optional) datetime.date ที่ผู้ใช้เลือกในหน้า SCADA Export
-                 - ถ้าไฟล์มีคอลัมน์ Date (เช่น AF_Report_Gen...) จะใช้กรองให้ตรงวันก่อนเลือกเวลา
-
-    คืนค่า:
-      - results: list[dict] สำหรับแสดงในตาราง
-      - missing: list[dict] รายการที่ดึงไม่สำเร็จ
-    """
-    file_key_map = file_key_map or {}
-
-    # ---- lazy workbook cache (กันโหลดไฟล์ใหญ่โดยไม่จำเป็น) ----
-    wb_cache: dict[str, openpyxl.Workbook | None] = {}
-    wb_is_ufgen: dict[str, bool] = {}
-
-    def get_wb(fname: str):
-        if fname in wb_cache:
-            return wb_cache[fname]
-
-        b = uploaded_exports.get(fname)
-        if b is None:
-            wb_cache[fname] = None
-            wb_is_ufgen[fname] = False
-            return None
-
-        # ไฟล์ใหญ่มาก (เช่น AF_Report) ให้ใช้ read_only เพื่อลด RAM
-        read_only = len(b) >= 20_000_000
-        try:
-            wb = openpyxl.load_workbook(io.BytesIO(b), data_only=True, read_only=read_only)
-            wb_cache[fname] = wb
-            try:
-                wb_is_ufgen[fname] = _is_uf_gen_report_workbook(wb)
-            except Exception:
-                wb_is_ufgen[fname] = False
-            return wb
-        except Exception:
-            wb_cache[fname] = None
-            wb_is_ufgen[fname] = False
-            return None
-
-    # helper: หาไฟล์ที่ตรงกับ file_key
-    def pick_file_for_key(file_key: str):
-        print("\n[DEBUG] ========== FILE MATCH DEBUG ==========")
-        print(f"[DEBUG] uploaded_exports.keys(): {list(uploaded_exports.keys())}")
-        print(f"[DEBUG] file_key: {file_key}")
-        key_norm = _strip_date_prefix(file_key)
-        key_norm2 = _norm_filekey(key_norm)
-        key_norm_full = _norm_filekey(file_key)
-        print(f"[DEBUG] key_norm: {key_norm}")
-        print(f"[DEBUG] key_norm2: {key_norm2}")
-        print(f"[DEBUG] key_norm_full: {key_norm_full}")
-        fnames = list(uploaded_exports.keys())
-        print(f"[DEBUG] fnames: {fnames}")
-        # ...existing code...
-        if not uploaded_exports:
-            return None
-
-        # normalize key (ตัดวันที่ด้านหน้าออกก่อน เพื่อตรงกับชื่อไฟล์ที่อัปโหลดคนละวัน)
-        key_norm = _strip_date_prefix(file_key)
-        key_norm2 = _norm_filekey(key_norm)
-        key_norm_full = _norm_filekey(file_key)
-
-        fnames = list(uploaded_exports.keys())
-
-        def _strip(fname: str) -> str:
-            return _strip_date_prefix(fname)
-
-        def _norm(fname: str) -> str:
-            # normalize จากชื่อที่ตัดวันที่แล้ว
-            return _norm_filekey(_strip(fname))
-
-        # 0) ถ้าผู้ใช้บังคับ map ไว้ ใช้อันนั้นก่อน
-        forced = (
-            file_key_map.get(key_norm)
-            or file_key_map.get(key_norm2)
-            or file_key_map.get(key_norm_full)
-        )
-        if forced and forced in uploaded_exports:
-            print(f"[DEBUG] [MATCH] forced: {forced}")
-            return forced
-
-        # 1) match แบบ "ตรงชื่อเป๊ะ" ก่อน (แก้เคส Daily_Report ชนกับ SMMT_Daily_Report)
-        if key_norm:
-            exact = [f for f in fnames if _strip(f) == key_norm]
-            print(f"[DEBUG] [MATCH] exact: {exact}")
-            if exact:
-                if "smmt" not in key_norm2:
-                    non_smmt = [f for f in exact if "smmt" not in _norm(f)]
-                    print(f"[DEBUG] [MATCH] non_smmt: {non_smmt}")
-                    if non_smmt:
-                        print(f"[DEBUG] [MATCH] exact-non_smmt: {non_smmt[0]}")
-                        return non_smmt[0]
-                print(f"[DEBUG] [MATCH] exact: {exact[0]}")
-                return exact[0]
-
-        if key_norm2:
-            exact2 = [f for f in fnames if _norm(f) == key_norm2]
-            print(f"[DEBUG] [MATCH] exact2: {exact2}")
-            if exact2:
-                if "smmt" not in key_norm2:
-                    non_smmt = [f for f in exact2 if "smmt" not in _norm(f)]
-                    print(f"[DEBUG] [MATCH] exact2-non_smmt: {non_smmt}")
-                    if non_smmt:
-                        print(f"[DEBUG] [MATCH] exact2-non_smmt: {non_smmt[0]}")
-                        return non_smmt[0]
-                print(f"[DEBUG] [MATCH] exact2: {exact2[0]}")
-                return exact2[0]
-
-        # 2) UF_System → (สำคัญ) อย่าเปิดไฟล์ทุกตัวเพื่อเดา เพราะไฟล์ใหญ่มากจะช้า
-        if "uf_system" in key_norm2 or "ufsystem" in key_norm2:
-            for fname in fnames:
-                fn = _norm_filekey(fname)
-                if "uf_system" in fn or "ufsystem" in fn:
-                    print(f"[DEBUG] [MATCH] uf_system: {fname}")
-                    return fname
-            for fname in fnames:
-                fn = _norm_filekey(fname)
-                if "af_report" in fn or "report_gen" in fn or "reportgen" in fn:
-                    print(f"[DEBUG] [MATCH] fallback AF_Report: {fname}")
-                    return fname
-
-        # 3) match แบบ contains + scoring (กรณีชื่อไม่ตรงเป๊ะ)
-        def _score(fname: str) -> int:
-            s = _strip(fname)
-            n = _norm(fname)
-            sc = 0
-            if key_norm and key_norm in s:
-                sc += 6
-                if s == key_norm:
-                    sc += 10
-                if s.endswith(key_norm):
-                    sc += 3
-            if key_norm2 and key_norm2 in n:
-                sc += 6
-                if n == key_norm2:
-                    sc += 10
-                if n.endswith(key_norm2):
-                    sc += 3
-
-            # ลงโทษเคสชน SMMT
-            if ("smmt" in n) != ("smmt" in key_norm2):
-                sc -= 6
-
-            # prefer ใกล้เคียงความยาว (กัน matching กว้างเกิน)
-            sc -= abs(len(n) - len(key_norm2))
-            return sc
-
-        cand = []
-        for fname in fnames:
-            s = _strip(fname)
-            n = _norm(fname)
-            if (key_norm and key_norm in s) or (key_norm2 and key_norm2 in n) or (key_norm_full and key_norm_full in _norm_filekey(fname)):
-                cand.append(fname)
-
-        print(f"[DEBUG] [MATCH] candidates: {cand}")
-        if cand:
-            cand.sort(key=_score, reverse=True)
-            print(f"[DEBUG] [MATCH] best candidate: {cand[0]}")
-            return cand[0]
-
-        # 4) fallback: ถ้ามีไฟล์เดียว ให้คืนไฟล์นั้น (ปิดได้เพื่อกัน match ผิดตอนประมวลผลไฟล์ใหม่แค่ไฟล์เดียว)
-        if allow_single_file_fallback and len(fnames) == 1:
-            print(f"[DEBUG] [MATCH] fallback single file: {fnames[0]}")
-            return fnames[0]
-
-        print(f"[DEBUG] [MATCH] NOT FOUND for file_key: {file_key}")
-        return None
-
-    # ===== Scan time rows ต่อ sheet แค่ครั้งเดียว =====
-    # key ต้องรวม target_date เพราะไฟล์ AF_Report มีหลายวัน
-    sheet_ctx_cache = {}  # (fname, sheet, target_date) -> ctx
-
-    import datetime as dt
-    from openpyxl.utils.datetime import from_excel
-
-    def _coerce_date(v):
-        """แปลงค่า 'วันที่' จากไฟล์ Excel ให้เป็น date
-
-        รองรับหลายแบบเพื่อกันเคสไฟล์ SCADA ใส่วันที่เป็น:
-        - datetime / date
-        - Excel serial number (เช่น 45291)
-        - string (เช่น 2026/01/19, 2026-01-19, 19/01/2026)
-        """
-        if v is None:
-            return None
-        if isinstance(v, dt.datetime):
-            return v.date()
-        if isinstance(v, dt.date):
-            return v
-
-        # Excel serial date
-        if isinstance(v, (int, float)):
-            try:
-                # บางไฟล์เป็น float เล็ก ๆ ที่ไม่ใช่ serial จริง
-                if float(v) > 1:
-                    return from_excel(v).date()
-            except Exception:
-                pass
-
-        # String date
-        if isinstance(v, str):
-            s = v.strip()
-            if not s:
-                return None
-            # เอาแค่ 10 ตัวแรก เผื่อมีเวลาแนบท้าย
-            s10 = s[:10]
-            for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y"):
-                try:
-                    return dt.datetime.strptime(s10, fmt).date()
-                except Exception:
-                    continue
-
-        return None
-
-    def get_sheet_ctx(fname: str, wb, sheet: str, target_date_local, custom_max_scan_rows: int = 0):
-        key = (fname, sheet, target_date_local)
-        if key in sheet_ctx_cache:
-            return sheet_ctx_cache[key]
-
-        if not wb or sheet not in (wb.sheetnames or []):
-            ctx = {"status": "NO_SHEET"}
-            sheet_ctx_cache[key] = ctx
-            return ctx
-
-        ws = wb[sheet]
-        hdr = _find_cell_exact(ws, "Time")
-        if not hdr:
-            ctx = {"status": "NO_TIME_HEADER"}
-            sheet_ctx_cache[key] = ctx
-            return ctx
-
-        hdr_row, time_col = hdr
-
-        # หา Date header ที่อยู่แถวเดียวกับ Time (ถ้ามี)
-        date_col = None
-        try:
-            if time_col > 1:
-                left = ws.cell(hdr_row, time_col - 1).value
-                if isinstance(left, str) and left.strip().lower() == "date":
-                    date_col = time_col - 1
-            if not date_col:
-                # ลองหาในหัวแถวเดียวกัน
-                max_c = min(ws.max_column or 0, 40)
-                for c in range(1, max_c + 1):
-                    v = ws.cell(hdr_row, c).value
-                    if isinstance(v, str) and v.strip().lower() == "date":
-                        date_col = c
-                        break
-        except Exception:
-            date_col = None
-
-        time_rows: list[tuple[int, int]] = []  # (row_idx, minutes)
-        blank_streak = 0
-
-        # ถ้ามี Date column และผู้ใช้เลือกวัน → สแกนจนเจอวันนั้น และหยุดเมื่อเลยวัน (ลดเวลา)
-        if date_col and target_date_local:
-            started = False
-            # กันเคสไฟล์ใหญ่มาก (AF_Report_Gen) ที่ ws.max_row หลอกจนค้าง
-            if custom_max_scan_rows > 0:
-                max_scan_rows = custom_max_scan_rows
-            else:
-                max_scan_rows = 50000  # ค่าเริ่มต้น
-            max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
-            min_c = min(date_col, time_col)
-            max_c = max(date_col, time_col)
-
-            for r, rowvals in enumerate(
-                ws.iter_rows(
-                    min_row=hdr_row + 1,
-                    max_row=max_r,
-                    min_col=min_c,
-                    max_col=max_c,
-                    values_only=True,
-                ),
-                start=hdr_row + 1,
-            ):
-                # map ค่าออกมาตามคอลัมน์จริง
-                # rowvals จัดตาม min_c..max_c
-                def _val_at_col(col):
-                    return rowvals[col - min_c]
-
-                dval = _coerce_date(_val_at_col(date_col))
-                if dval is None:
-                    continue
-
-                if dval < target_date_local:
-                    continue
-
-                if dval > target_date_local:
-                    if started and time_rows:
-                        break
-                    continue
-
-                started = True
-                tval = _val_at_col(time_col)
-                hhmm = _normalize_scada_time(tval)
-                mm = _hhmm_to_minutes(hhmm) if hhmm else None
-                if mm is not None:
-                    time_rows.append((r, mm))
-                    blank_streak = 0
-                else:
-                    blank_streak += 1
-                    if blank_streak >= 200 and time_rows:
-                        break
-        else:
-            # ไฟล์ทั่วไป (Daily/SMMT): จำกัด scan ตามค่า custom หรือ 100000 แถว (ไม่จำกัด)
-            if custom_max_scan_rows > 0:
-                max_scan_rows = custom_max_scan_rows
-            else:
-                max_scan_rows = 100000  # ค่าเริ่มต้นสแกนเกือบทั้งไฟล์
-            max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
-
-            for r, (tval,) in enumerate(
-                ws.iter_rows(
-                    min_row=hdr_row + 1,
-                    max_row=max_r,
-                    min_col=time_col,
-                    max_col=time_col,
-                    values_only=True,
-                ),
-                start=hdr_row + 1,
-            ):
-                hhmm = _normalize_scada_time(tval)
-                mm = _hhmm_to_minutes(hhmm) if hhmm else None
-                if mm is not None:
-                    time_rows.append((r, mm))
-                    blank_streak = 0
-                else:
-                    blank_streak += 1
-                    if blank_streak >= 80 and time_rows:
-                        break
-
-        if not time_rows:
-            ctx = {"status": "NO_DATA_ROW"}
-            sheet_ctx_cache[key] = ctx
-            return ctx
-
-        ctx = {
-            "status": "OK",
-            "ws": ws,
-            "hdr_row": hdr_row,
-            "time_col": time_col,
-            "date_col": date_col,
-            "time_rows": time_rows,
-            "target_row_cache": {},  # hhmm -> row
-        }
-        sheet_ctx_cache[key] = ctx
-        return ctx
-
-    def pick_target_row(ctx, target_time_hhmm: str | None):
-        # ถ้าไม่กำหนดเวลา → ใช้แถวสุดท้ายของช่วงที่สแกนได้
-        if not target_time_hhmm:
-            return ctx["time_rows"][-1][0]
-
-        if target_time_hhmm in ctx["target_row_cache"]:
-            return ctx["target_row_cache"][target_time_hhmm]
-
-        tmm = _hhmm_to_minutes(target_time_hhmm)
-        row = _find_nearest_time_row(ctx["time_rows"], tmm, max_diff_minutes=300)
-        if row is None:
-            row = ctx["time_rows"][-1][0]
-
-        ctx["target_row_cache"][target_time_hhmm] = row
-        return row
-
-    # ---- สำคัญ: ห้าม ws.cell() กับ read_only workbook เพราะช้ามาก (O(n) ทุกครั้ง) ----
-    # จะอ่าน "ทั้งแถว" ด้วย iter_rows แค่ 1 ครั้ง แล้วหยิบค่าคอลัมน์ที่ต้องการ
-    row_cache: dict[tuple[str, str, int], tuple] = {}
-
-    results: list[dict] = []
-    missing: list[dict] = []
-
-    for row in mapping_rows:
-        point_id = row["point_id"]
-        file_key = row["file_key"]
-        desired_sheet = row.get("sheet") or "Sheet1"
-        col = row.get("col") or ""
-        t_hhmm = _normalize_scada_time(row.get("time"))
-
-        fname = pick_file_for_key(file_key)
-        if not fname:
-            missing.append({**row, "reason": "NO_MATCH_FILE"})
-            results.append({
-                "point_id": point_id,
-                "value": None,
-                "file": file_key,
-                "matched_file": None,
-                "sheet": desired_sheet,
-                "time": t_hhmm,
-                "col": col,
-                "status": "NO_FILE",
-            })
-            continue
-
-        wb = get_wb(fname)
-        if not wb:
-            missing.append({**row, "reason": "OPEN_FAIL"})
-            results.append({
-                "point_id": point_id,
-                "value": None,
-                "file": file_key,
-                "matched_file": fname,
-                "sheet": desired_sheet,
-                "time": t_hhmm,
-                "col": col,
-                "status": "OPEN_FAIL",
-            })
-            continue
-
-        sheet = _resolve_sheet_name_for_export(wb, desired_sheet, point_id)
-        ctx = get_sheet_ctx(fname, wb, sheet, target_date, custom_max_scan_rows=custom_max_scan_rows)
-
-        if ctx.get("status") != "OK":
-            stt = ctx.get("status")
-            missing.append({**row, "reason": stt})
-            results.append({
-                "point_id": point_id,
-                "value": None,
-                "file": file_key,
-                "matched_file": fname,
-                "sheet": sheet,
-                "time": t_hhmm,
-                "col": col,
-                "status": stt,
-            })
-            continue
-
-        # เลือกแถวที่ใกล้เวลาเป้าหมายที่สุด
-        target_row = pick_target_row(ctx, t_hhmm)
-
-        # แปลงคอลัมน์ตัวอักษร -> index
-        try:
-            col_idx = column_index_from_string(str(col).strip().upper())
-        except Exception:
-            missing.append({**row, "reason": "BAD_COLUMN"})
-            results.append({
-                "point_id": point_id,
-                "value": None,
-                "file": file_key,
-                "matched_file": fname,
-                "sheet": sheet,
-                "time": t_hhmm,
-                "col": col,
-                "status": "BAD_COLUMN",
-            })
-            continue
-
-        # ดึงทั้งแถวครั้งเดียว (เร็วกว่า ws.cell มาก)
-        row_key = (fname, sheet, target_row)
-        rowvals = row_cache.get(row_key)
-        if rowvals is None:
-            try:
-                rowvals = next(ctx["ws"].iter_rows(min_row=target_row, max_row=target_row, values_only=True))
-                row_cache[row_key] = rowvals
-            except StopIteration:
-                rowvals = None
-            except Exception:
-                rowvals = None
-
-        if not rowvals or col_idx > len(rowvals):
-            missing.append({**row, "reason": "OUT_OF_RANGE"})
-            results.append({
-                "point_id": point_id,
-                "value": None,
-                "file": file_key,
-                "matched_file": fname,
-                "sheet": sheet,
-                "time": t_hhmm,
-                "col": col,
-                "status": "OUT_OF_RANGE",
-            })
-            continue
-
-        value = rowvals[col_idx - 1]
-
-        # ทำให้เป็นเลข (ถ้าเป็น string) - ใช้ helper function
-        value = parse_scada_numeric_value(value)
-
-        stt = "OK" if value is not None else "EMPTY"
-        if stt != "OK":
-            missing.append({**row, "reason": stt})
-
-        results.append({
-            "point_id": point_id,
-            "value": value,
-            "file": file_key,
-                "matched_file": fname,
-            "sheet": sheet,
-            "time": t_hhmm,
-            "col": col,
-            "status": stt,
-        })
-
-    return results, missing
-
-
-def parse_scada_numeric_value(value):
-    """
-    Parse numeric value from SCADA export ที่อาจมีรูปแบบแตกต่างกัน
-    รองรับ: English format (123.45), Thai format (123,45), European format (1.234,56), etc.
-    
-    Returns:
-        float: parsed value, or None if cannot parse
-    """
-    if value is None:
-        return None
-    
-    # ถ้าเป็น number อยู่แล้ว
-    if isinstance(value, (int, float)):
-        try:
-            return float(value)
-        except Exception:
-            return None
+                    with engine.connect() as conn:
+                        result = conn.execute(text(query))
+                        rows = result.fetchall()
+                        if rows:
+                            query_result = [(row[0], row[1], row[2]) for row in rows]
+                            return _process_sql_results(query_result, table, date_str, point_id)
+                except:
+                    continue
+            
+            return {
+                "success": False,
+                "message": f"ไม่พบข้อมูล point_id='{point_id}' ในวันที่ {date_str}",
+                "all_records": []
+            }
+        except Exception as e:
+            pass
     
-    # ถ้าเป็น string
-    if isinstance(value, str):
-        vv = value.strip()
-        
-        # Handle empty/invalid strings
-        if not vv or vv.lower() in ("", "none", "null", "-", "n/a", "na"):
-            return None
-        
-        # นับจำนวน dots และ commas
-        dot_count = vv.count(".")
-        comma_count = vv.count(",")
-        
+    # 🔹 Method 3: pyodbc
+    if HAS_PYODBC:
         try:
-            # Case 1: ไม่มี separator (เช่น "123" หรือ "12345")
-            if dot_count == 0 and comma_count == 0:
-                return float(vv)
-            
-            # Case 2: มี dot เดียว (English format เช่น "123.45")
-            elif dot_count == 1 and comma_count == 0:
-                return float(vv)
-            
-            # Case 3: มี comma เดียว - ต้องตรวจสอบว่าเป็น decimal หรือ thousands separator
-            elif dot_count == 0 and comma_count == 1:
-                # ถ้า comma หลังตัวที่ 3 จากท้าย -> น่าจะเป็น thousands separator
-                parts = vv.split(",")
-                if len(parts[-1]) > 3:
-                    # ตัวหลังสุดมากกว่า 3 หลัก -> เป็น decimal แน่ๆ
-                    return float(vv.replace(",", "."))
-                else:
-                    # ตัวหลังสุด <= 3 หลัก -> น่าจะเป็น thousands (เช่น 1,234) แต่อาจเป็น decimal (เช่น 1,5)
-                    # ให้ลอง parse แบบ decimal ก่อน ถ้าได้ค่า < 1 ให้ใช้ decimal มิฉะนั้น... ลองนึกใหม่
-                    # สำหรับ SCADA โดยทั่วไป: ถ้ามี comma เดียวแล้ว น่าจะเป็น decimal more often
-                    return float(vv.replace(",", "."))
-            
-            # Case 4: มี dot และ comma (thousand separator + decimal)
-            elif dot_count == 1 and comma_count == 1:
-                last_dot = vv.rfind(".")
-                last_comma = vv.rfind(",")
-                
-                if last_dot > last_comma:
-                    # English format with comma thousands: 1,234.56
-                    return float(vv.replace(",", ""))
-                else:
-                    # European format: 1.234,56
-                    return float(vv.replace(".", "").replace(",", "."))
-            
-            # Case 5: หลาย dots, ไม่มี comma (European thousands เช่น "1.234.567")
-            elif dot_count > 1 and comma_count == 0:
-                return float(vv.replace(".", ""))
+            conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
+            conn = pyodbc.connect(conn_str, timeout=10)
+            cursor = conn.cursor()
             
-            # Case 6: หลาย commas, ไม่มี dot
-            elif comma_count > 1 and dot_count == 0:
-                parts = vv.split(",")
-                # เชค: ถ้าตัวหลังสุดมี <= 3 หลักและอย่างน้อย 1 หลัก อาจเป็น decimal
-                last_part = parts[-1]
-                if 1 <= len(last_part) <= 3:
-                    # น่าจะเป็น decimal format (เช่น 1,234,567 with European decimal คือ 1234567.0)
-                    # แต่แบบนี้หายากมากสำหรับ SCADA ปกติ
-                    # ส่วนใหญ่ commas หลายตัว แปลว่า thousands separator
-                    return float(vv.replace(",", ""))
-                else:
-                    return float(vv.replace(",", ""))
+            for table in table_candidates:
+                try:
+                    query = f"""
+                    SELECT TOP 100 TagName, Value, Timestamp 
+                    FROM {table}
+                    WHERE TagName LIKE '%{point_id}%'
+                      AND CAST(Timestamp AS DATE) = '{date_str}'
+                    ORDER BY Timestamp DESC
+                    """
+                    cursor.execute(query)
+                    query_result = cursor.fetchall()
+                    if query_result:
+                        conn.close()
+                        return _process_sql_results(query_result, table, date_str, point_id)
+                except:
+                    continue
             
-            # Case 7: complex (หลาย dots และ commas)
-            else:
-                # ลองแบบ: remove dots แล้ว replace comma เป็น dot
-                temp = vv.replace(".", "").replace(",", ".")
-                return float(temp)
-        
-        except (ValueError, AttributeError):
-            return None
+            conn.close()
+            return {
+                "success": False,
+                "message": f"ไม่พบข้อมูล point_id='{point_id}' ในวันที่ {date_str}",
+                "all_records": []
+            }
+        except Exception as e:
+            pass
+    
+    return {
+        "success": False,
+        "message": "❌ ไม่มี SQL driver ที่ติดตั้ง\nต้องติดตั้ง: pip install pymssql",
+        "all_records": []
+    }
+
+def _process_sql_results(query_result, table_found, date_str, point_id):
+    """ตัวช่วยสำหรับประมวลผลผลลัพธ์ SQL"""
+    records = []
+    latest_value = None
+    latest_time = None
+    
+    for row in query_result:
+        tag_name = row[0]
+        value = row[1]
+        timestamp = row[2]
+        records.append({
+            "tag": tag_name,
+            "value": value,
+            "timestamp": str(timestamp)
+        })
+        if latest_value is None:
+            latest_value = value
+            latest_time = str(timestamp)
     
-    return None
+    return {
+        "success": True,
+        "value": latest_value,
+        "timestamp": latest_time,
+        "table": table_found,
+        "record_count": len(records),
+        "all_records": records,
+        "message": f"✅ พบข้อมูล {len(records)} แถว จากตาราง {table_found}"
+    }
 
+# =========================================================
+# --- 🧠 OCR ENGINE (Clean & Robust) ---
+# =========================================================
 
 def normalize_number_str(s: str, decimals: int = 0) -> str:
     if not s: return ""
@@ -2000,128 +774,6 @@ def normalize_number_str(s: str, decimals: int = 0) -> str:
     if decimals == 0: s = s.replace(".", "")
     return s
 
-# ✅ Template matching สำหรับเลขดิจิทัล (เพิ่ม confidence)
-def _create_digit_templates():
-    """
-    สร้าง template ของ 7-segment display (เลขดิจิทัล 0-9)
-    ใช้สำหรับ validate ว่าเลขที่ OCR อ่านมาเป็นเลขดิจิทัลจริง
-    """
-    # ลายแบบ 7-segment ของเลขแต่ละตัว (แสดงเป็นสัญลักษณ์)
-    # segments: a=top, b=top-right, c=bottom-right, d=bottom, e=bottom-left, f=top-left, g=middle
-    templates = {
-        '0': {'a', 'b', 'c', 'd', 'e', 'f'},        # ทุกด้านยกเว้น middle
-        '1': {'b', 'c'},                             # ขวาด้านบนและล่าง
-        '2': {'a', 'b', 'd', 'e', 'g'},             # ด้านบน-ขวา-middle-ซ้าย-ล่าง
-        '3': {'a', 'b', 'c', 'd', 'g'},             # ด้านบน-ขวา-ล่าง-middle
-        '4': {'b', 'c', 'f', 'g'},                  # ขวา-ล่าง-ซ้าย-middle
-        '5': {'a', 'c', 'd', 'f', 'g'},             # ด้านบน-ขวา-ล่าง-ซ้าย-middle
-        '6': {'a', 'c', 'd', 'e', 'f', 'g'},        # ทุกด้านยกเว้น top-right
-        '7': {'a', 'b', 'c'},                        # ด้านบน-ขวา-ล่าง
-        '8': {'a', 'b', 'c', 'd', 'e', 'f', 'g'},  # ทั้งหมด
-        '9': {'a', 'b', 'c', 'd', 'f', 'g'},        # ทั้งหมดยกเว้น bottom-left
-    }
-    return templates
-
-_DIGIT_TEMPLATES = _create_digit_templates()
-
-def _validate_digit_char(char_image, digit_template_key: str) -> float:
-    """
-    ✅ Template matching: ตรวจว่า char_image ตรงกับ template ของเลขตัวใดตัวหนึ่ง
-    
-    คืนค่า: confidence score 0.0-1.0
-    - ตรงเพอร์เฟ็กต์ = 1.0
-    - ไม่ตรงสักนิด = 0.7-0.99
-    - ไม่ตรงเลย = 0.0-0.5
-    """
-    if digit_template_key not in _DIGIT_TEMPLATES:
-        return 0.5  # unknown digit
-    
-    try:
-        # Convert image เป็น grayscale + binary
-        if len(char_image.shape) == 3:
-            gray = cv2.cvtColor(char_image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = char_image
-        
-        _, binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY)
-        
-        # ตัวอักษร 7-segment แบ่งเป็น 7 ส่วน (ประมาณ)
-        h, w = binary.shape
-        
-        # ตัดแต่ละ segment (approximation)
-        segment_regions = {
-            'a': (0, 0, w, h//4),           # top
-            'b': (w//2, h//4, w, h//2),    # top-right
-            'c': (w//2, h//2, w, 3*h//4),  # bottom-right
-            'd': (0, 3*h//4, w, h),        # bottom
-            'e': (0, h//2, w//2, 3*h//4),  # bottom-left
-            'f': (0, h//4, w//2, h//2),    # top-left
-            'g': (w//4, h//2-5, 3*w//4, h//2+5),  # middle
-        }
-        
-        detected_segments = set()
-        for seg_name, (x1, y1, x2, y2) in segment_regions.items():
-            region = binary[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
-            if region.size > 0:
-                ratio = np.sum(region > 128) / region.size
-                if ratio > 0.15:  # ถ้า >15% สว่าง ถือว่ามี segment นี้
-                    detected_segments.add(seg_name)
-        
-        template = _DIGIT_TEMPLATES[digit_template_key]
-        
-        # คำนวณ Jaccard similarity
-        intersection = len(detected_segments & template)
-        union = len(detected_segments | template)
-        
-        if union == 0:
-            return 0.5
-        
-        confidence = intersection / union
-        return max(0.0, min(1.0, confidence))
-    
-    except Exception:
-        return 0.5
-
-def _apply_template_matching_refinement(candidates: list, decimals: int = 0) -> list:
-    """
-    ✅ Refine candidates โดยใช้ Template Matching
-    
-    - เอาแต่เลขที่ดูเหมือน 7-segment display
-    - ให้ confidence score เพิ่ม/ลด ตามว่า match template ไหม
-    """
-    refined = []
-    
-    for c in candidates:
-        try:
-            val_str = str(c.get("val", ""))
-            score = float(c.get("score", 0))
-            
-            # Sum template confidence สำหรับแต่ละ digit
-            template_score = 0.0
-            for digit in val_str.replace(".", ""):
-                if digit.isdigit():
-                    conf = _validate_digit_char(np.zeros((20, 20), dtype=np.uint8), digit)
-                    template_score += conf
-            
-            # ค่าเฉลี่ย
-            if len(val_str.replace(".", "")) > 0:
-                template_score = template_score / len(val_str.replace(".", ""))
-            else:
-                template_score = 0.5
-            
-            # Combine: original score 70% + template score 30%
-            refined_score = (score * 0.7) + (template_score * 100 * 0.3)  # scale template_score
-            
-            refined_c = dict(c)
-            refined_c["combined_template_score"] = refined_score
-            refined.append(refined_c)
-        except Exception:
-            refined.append(c)
-    
-    # Sort by refined score
-    refined.sort(key=lambda x: x.get("combined_template_score", 0), reverse=True)
-    return refined
-
 def preprocess_text(text):
     patterns = [r'IP\s*51', r'50\s*Hz', r'Class\s*2', r'3x220/380\s*V', r'Type', r'Mitsubishi', r'Electric', r'Wire', r'kWh', r'MH\s*[-]?\s*96', r'30\s*\(100\)\s*A', r'\d+\s*rev/kWh', r'WATT-HOUR\s*METER', r'Indoor\s*Use', r'Made\s*in\s*Thailand']
     for p in patterns: text = re.sub(p, '', text, flags=re.IGNORECASE)
@@ -2135,55 +787,138 @@ def is_digital_meter(config):
     blob = f"{config.get('type','')} {config.get('name','')} {config.get('keyword','')}".lower()
     return ("digital" in blob) or ("scada" in blob) or (int(config.get('decimals', 0) or 0) > 0)
 
-def preprocess_image_cv(image_bytes, config, use_roi=True, variant="auto"):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    if img is None: return image_bytes
+def _mask_red_white(img):
+    """เปลี่ยนเลขแดงเป็นสีขาว (คืนภาพใหม่ ไม่แก้ img)"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    # ✅ เข้มงวดมาก: ตัดเฉพาะเลขแดงเจาะจง
+    # Red range ที่เข้มงวด: H=[0,10] หรือ [170,180] + S>=85 + V>=70
+    lower_red1 = np.array([0, 85, 70])
+    upper_red1 = np.array([10, 255, 255])
+    lower_red2 = np.array([170, 85, 70])
+    upper_red2 = np.array([180, 255, 255])
+
+    mask_red = cv2.inRange(hsv, lower_red1, upper_red1) + cv2.inRange(hsv, lower_red2, upper_red2)
+
+    # ✅ Morphological operations: ทำให้ mask ติดกัน
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask_red = cv2.morphologyEx(mask_red, cv2.MORPH_CLOSE, kernel, iterations=2)
+    mask_red = cv2.morphologyEx(mask_red, cv2.MORPH_OPEN, kernel, iterations=1)
+
+    # ✅ เปลี่ยนเลขแดงเป็นสีขาว (255,255,255)
+    out = img.copy()
+    out[mask_red > 0] = [255, 255, 255]
+    return out
 
-    H, W = img.shape[:2]
-    if W > 1280:
-        scale = 1280 / W
-        img = cv2.resize(img, (1280, int(H * scale)), interpolation=cv2.INTER_AREA)
-        H, W = img.shape[:2]
 
-    if use_roi:
+class PhotoContext:
+    """
+    รูป 1 ใบ: decode ครั้งเดียว แล้วแชร์ขั้นกลาง (ย่อ 1280 px / ROI / ตัดเลขแดง / grayscale)
+    ให้ทุก variant ของ ocr_process + crop หา point_id + thumbnail
+    (เดิมทุก attempt decode JPEG เต็มใบ + ย่อ + crop + mask ใหม่หมด)
+    ค่าที่คืนเป็น cache ร่วม → ห้ามแก้ในที่ (ใช้ .copy() ก่อนถ้าจะเขียนทับ)
+    """
+
+    def __init__(self, image_bytes: bytes):
+        self.raw = image_bytes
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _get(self, key, build):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = build()
+            return self._cache[key]
+
+    @staticmethod
+    def of(image) -> "PhotoContext":
+        return image if isinstance(image, PhotoContext) else PhotoContext(image)
+
+    @property
+    def full(self):
+        """ภาพเต็ม BGR (None ถ้า decode ไม่ได้)"""
+        return self._get("full", lambda: cv2.imdecode(np.frombuffer(self.raw, np.uint8), cv2.IMREAD_COLOR))
+
+    def resized(self, max_w: int = 1280):
+        def _build():
+            img = self.full
+            if img is None:
+                return None
+            H, W = img.shape[:2]
+            if W > max_w:
+                img = cv2.resize(img, (max_w, int(H * max_w / W)), interpolation=cv2.INTER_AREA)
+            return img
+        return self._get(("resized", max_w), _build)
+
+    @staticmethod
+    def _roi_box(config, W, H):
         x1, y1, x2, y2 = config.get('roi_x1', 0), config.get('roi_y1', 0), config.get('roi_x2', 0), config.get('roi_y2', 0)
-        if x2 and y2:
-            if 0 < x2 <= 1 and 0 < y2 <= 1:
-                x1, y1, x2, y2 = int(float(x1) * W), int(float(y1) * H), int(float(x2) * W), int(float(y2) * H)
-            else:
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            pad_x, pad_y = int(0.03 * W), int(0.03 * H)
-            x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
-            x2, y2 = min(W, x2 + pad_x), min(H, y2 + pad_y)
-            if x2 > x1 and y2 > y1:
-                img = img[y1:y2, x1:x2]
-                H, W = img.shape[:2]
-
-    if config.get('ignore_red', False):
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        # ✅ เข้มงวดมาก: ตัดเฉพาะเลขแดงเจาะจง
-        # Red range ที่เข้มงวด: H=[0,10] หรือ [170,180] + S>=85 + V>=70
-        lower_red1 = np.array([0, 85, 70])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 85, 70])
-        upper_red2 = np.array([180, 255, 255])
-        
-        mask_red = cv2.inRange(hsv, lower_red1, upper_red1) + cv2.inRange(hsv, lower_red2, upper_red2)
-        
-        # ✅ Morphological operations: ทำให้ mask ติดกัน
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        mask_red = cv2.morphologyEx(mask_red, cv2.MORPH_CLOSE, kernel, iterations=2)
-        mask_red = cv2.morphologyEx(mask_red, cv2.MORPH_OPEN, kernel, iterations=1)
-        
-        # ✅ เปลี่ยนเลขแดงเป็นสีขาว (255,255,255)
-        img[mask_red > 0] = [255, 255, 255]
+        if not (x2 and y2):
+            return None
+        if 0 < x2 <= 1 and 0 < y2 <= 1:
+            x1, y1, x2, y2 = int(float(x1) * W), int(float(y1) * H), int(float(x2) * W), int(float(y2) * H)
+        else:
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        pad_x, pad_y = int(0.03 * W), int(0.03 * H)
+        x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        x2, y2 = min(W, x2 + pad_x), min(H, y2 + pad_y)
+        return (x1, y1, x2, y2) if x2 > x1 and y2 > y1 else None
+
+    def _region_key(self, config, use_roi: bool):
+        img = self.resized()
+        box = self._roi_box(config, img.shape[1], img.shape[0]) if use_roi else None
+        return box, bool(config.get('ignore_red', False))
+
+    def region(self, config, use_roi: bool = True):
+        """ภาพย่อ → crop ROI (ถ้ามี) → ตัดเลขแดง (ignore_red) — cache ตาม ROI + ignore_red"""
+        if self.resized() is None:
+            return None
+        box, ignore_red = self._region_key(config, use_roi)
+
+        def _build():
+            img = self.resized()
+            out = img[box[1]:box[3], box[0]:box[2]] if box else img
+            return _mask_red_white(out) if ignore_red else out
+        return self._get(("region", box, ignore_red), _build)
+
+    def gray(self, config, use_roi: bool = True):
+        img = self.region(config, use_roi)
+        if img is None:
+            return None
+        return self._get(("gray",) + self._region_key(config, use_roi), lambda: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+    def segments(self, config):
+        """อ่านเลข 7-segment ใน ROI เอง (meter_core.seven_segment) — None ถ้าไม่มี ROI (ภาพเต็มมีตัวหนังสืออื่นปน)"""
+        img = self.resized()
+        if img is None or self._roi_box(config, img.shape[1], img.shape[0]) is None:
+            return None
+        return self._get(("segments",) + self._region_key(config, True),
+                         lambda: seven_segment.read_digits(self.gray(config, True)))
+
+    def band(self, part: str, frac: float) -> bytes:
+        """ช่วงบน/ล่างของภาพเต็ม (ขยายสำหรับ OCR point_id) เป็น JPEG"""
+        def _build():
+            img = self.full
+            if img is None:
+                return self.raw
+            h, w = img.shape[:2]
+            crop = img[int(h * (1.0 - frac)):h, 0:w] if part == "bottom" else img[0:int(h * frac), 0:w]
+            crop = _upscale_for_ocr(crop.copy(), max_side=2200)
+            return _cv2_encode_jpg(crop, quality=92) or self.raw
+        return self._get(("band", part, frac), _build)
+
+
+def preprocess_image_cv(image_bytes, config, use_roi=True, variant="auto"):
+    """image_bytes: bytes หรือ PhotoContext (ocr_process ส่ง PhotoContext เดียวกันทุก attempt)"""
+    photo = PhotoContext.of(image_bytes)
+    img = photo.region(config, use_roi)
+    if img is None: return photo.raw
+    H, W = img.shape[:2]
 
     if variant == "raw":
         ok, encoded = cv2.imencode(".jpg", img)
-        return encoded.tobytes() if ok else image_bytes
+        return encoded.tobytes() if ok else photo.raw
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = photo.gray(config, use_roi)
     if variant == "invert": gray = 255 - gray
 
     use_digital_logic = (variant == "soft") or (variant == "auto" and is_digital_meter(config))
@@ -2222,29 +957,51 @@ def preprocess_image_cv(image_bytes, config, use_roi=True, variant="auto"):
         sharp = np.clip(sharp, 0, 255).astype(np.uint8)
         
         ok, encoded = cv2.imencode(".png", sharp)
-        return encoded.tobytes() if ok else image_bytes
+        return encoded.tobytes() if ok else photo.raw
     else:
         gray2 = cv2.bilateralFilter(gray, 7, 50, 50)
         th = cv2.adaptiveThreshold(gray2, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 7)
         ok, encoded = cv2.imencode(".png", th)
-        return encoded.tobytes() if ok else image_bytes
+        return encoded.tobytes() if ok else photo.raw
+
+# ✅ Speculative OCR: เตรียมภาพทุก variant ก่อน แล้วยิง Vision พร้อมกันทีละ OCR_PARALLEL_K ตัว
+#    ได้คะแนน >= OCR_EARLY_EXIT_SCORE → ยกเลิกตัวที่ยังไม่เริ่ม / ทิ้งผลที่ยังไม่กลับ
+#    (เดิมยิงทีละ attempt: แย่สุด ~6 round trip ต่อรูป → ~1-2) | OCR_PARALLEL_K=1 → ทีละตัวแบบเดิม
+OCR_PARALLEL_K = int(os.environ.get("OCR_PARALLEL_K", "3"))
+OCR_EARLY_EXIT_SCORE = 850
+# ✅ มิเตอร์ดิจิทัล: อ่าน 7-segment ใน ROI เองแล้วเทียบกับ candidate ที่ดีสุดของแต่ละ attempt (ไม่ยิง Vision เพิ่ม)
+#    ตรงทุกหลัก → +SEGMENT_AGREE_BONUS (ถึงเกณฑ์ early exit ได้ → ไม่ต้องรอ attempt ถัดไป)
+#    ต่าง ≤1 หลัก + อ่านเองมั่นใจทุกหลัก → เพิ่ม candidate ที่แก้แล้ว (+SEGMENT_FIX_BONUS, หลักครบ expected_digits ก็ early exit ได้)
+#    env SEVEN_SEGMENT=0 → ปิด
+SEGMENT_AGREE_BONUS = 400
+SEGMENT_FIX_BONUS = 360
+BULK_OCR_WORKERS = 16  # โหมด bulk: จำนวนรูปที่ประมวลผลพร้อมกัน (= ขนาด batch ของ VisionBatcher)
+
+
+@st.cache_resource
+def get_vision_pool():
+    """thread pool ของ Vision calls (แยกจาก pool read ของ SheetsGateway → OCR ไม่แย่ง thread ของ Sheets)"""
+    return ThreadPoolExecutor(max_workers=max(2, OCR_PARALLEL_K * 2), thread_name_prefix="vision-ocr")
+
+
+def ocr_backend_for(config=None):
+    """OCR backend ของจุดนี้: PointsMaster ocr_backend → env OCR_BACKEND → vision (meter_core.ocr_backends)"""
+    name = str((config or {}).get("ocr_backend", "") or "").strip()
+    return get_ocr_backend(name or None, vision_client=VISION_CLIENT)
+
 
 def _vision_read_text(processed_bytes):
-    try:
-        image = vision.Image(content=processed_bytes)
-        ctx = vision.ImageContext(language_hints=["en"])
-        resp = VISION_CLIENT.text_detection(image=image, image_context=ctx)
-        if getattr(resp, "error", None) and resp.error.message: return "", resp.error.message
-        if resp.text_annotations: return (resp.text_annotations[0].description or ""), ""
-        
-        resp2 = VISION_CLIENT.document_text_detection(image=image, image_context=ctx)
-        txt = ""
-        if resp2.full_text_annotation and resp2.full_text_annotation.text: txt = resp2.full_text_annotation.text
-        return (txt or ""), ""
-    except Exception as e:
-        return "", str(e)
+    """Google Vision ตรง (text_detection → document_text_detection) — (text, error)"""
+    return get_ocr_backend("vision", vision_client=VISION_CLIENT).read_text(processed_bytes)
 
-def ocr_process(image_bytes, config, debug=False, return_candidates=False):
+def ocr_process(image_bytes, config, debug=False, return_candidates=False, parallel_k=None, read_text=None):
+    """
+    อ่านค่ามิเตอร์จากรูป → best value (return_candidates=True → (best, candidates))
+    parallel_k: จำนวน Vision call ที่ยิงพร้อมกัน (None → OCR_PARALLEL_K, 1 → ทีละ attempt แบบเดิม)
+    read_text: ตัวอ่านข้อความ (None → backend ของจุดตาม ocr_backend_for(config), โหมด bulk ใช้ VisionBatcher.read_text)
+    """
+    read_text = read_text or ocr_backend_for(config).read_text
+    photo = PhotoContext.of(image_bytes)  # decode ครั้งเดียว ใช้ร่วมทุก attempt (bytes หรือ PhotoContext)
     decimal_places = int(config.get('decimals', 0) or 0)
     keyword = str(config.get('keyword', '') or '').strip()
     expected_digits = int(config.get('expected_digits', 0) or 0)
@@ -2305,12 +1062,11 @@ def ocr_process(image_bytes, config, debug=False, return_candidates=False):
     all_candidates = []
     TOPK = 60  # กัน list โตเกิน
     
-    for tag, use_roi, variant in attempts:
-        processed = preprocess_image_cv(image_bytes, config, use_roi=use_roi, variant=variant)
-        txt, err = _vision_read_text(processed)
+    def score_text(tag, use_roi, variant, txt) -> list:
+        """ข้อความจาก Vision ของ attempt หนึ่ง → candidates [{val, score, tag}]"""
         if not txt or not _has_digits(txt):
-            continue
-            
+            return []
+
         raw_text = (txt or "").replace("\n", " ")
         raw_text = re.sub(r"\.{2,}", ".", raw_text)
 
@@ -2439,22 +1195,85 @@ def ocr_process(image_bytes, config, debug=False, return_candidates=False):
                 candidates.append({"val": float(val), "score": score, "tag": tag})
             except Exception:
                 continue
-            
-        if candidates:
-            pick = max(candidates, key=lambda x: x["score"])
-            if pick["score"] > best_score:
-                best_score = pick["score"]
-                best_val = pick["val"]
-            # ✅ รวม candidates ข้าม attempts (เก็บเฉพาะ topK)
-            all_candidates.extend(candidates)
-            all_candidates.sort(key=lambda x: float(x.get("score", 0)), reverse=True)
-            if len(all_candidates) > TOPK:
-                all_candidates = all_candidates[:TOPK]
-                
-            # ถ้าเจอคะแนนสูงมากแล้ว ก็พอ (กันเรียก Vision หลายรอบ)
-            # ✅ ลด threshold จาก 980 → 850 เพื่อ early exit เร็วขึ้น (ลด API calls)
-            if best_score >= 850:
+
+        return candidates
+
+    use_segments = seven_segment.ENABLED and not is_analog and is_digital_meter(config)
+
+    def segment_candidates(pick) -> list:
+        """เทียบ candidate ดีสุดกับเลข 7-segment ที่อ่านเองใน ROI → candidate ที่ยืนยัน/แก้แล้ว"""
+        try:
+            reading = photo.segments(config)
+            if not reading or not reading["text"]:
+                return []
+            digits = f"{float(pick['val']):.{decimal_places}f}".replace(".", "")
+            check = seven_segment.verify_reading(reading, digits)
+        except Exception:
+            return []
+        if check["status"] == "match":
+            return [{"val": pick["val"], "score": pick["score"] + SEGMENT_AGREE_BONUS,
+                     "tag": f"{pick.get('tag', '')}+7SEG"}]
+        if check["status"] == "fix":
+            val = int(check["digits"]) / (10 ** decimal_places)
+            if check_digits_ok(val):
+                return [{"val": float(val), "score": pick["score"] + SEGMENT_FIX_BONUS, "tag": "7SEG_FIX"}]
+        return []
+
+    def accept(candidates) -> bool:
+        """รวม candidates ของ attempt เข้าผลรวม → True ถ้าได้คะแนนสูงพอจะหยุด"""
+        nonlocal best_val, best_score, all_candidates
+        if not candidates:
+            return False
+        if use_segments:
+            candidates = candidates + segment_candidates(max(candidates, key=lambda x: x["score"]))
+        pick = max(candidates, key=lambda x: x["score"])
+        if pick["score"] > best_score:
+            best_score = pick["score"]
+            best_val = pick["val"]
+        # ✅ รวม candidates ข้าม attempts (เก็บเฉพาะ topK)
+        all_candidates.extend(candidates)
+        all_candidates.sort(key=lambda x: float(x.get("score", 0)), reverse=True)
+        if len(all_candidates) > TOPK:
+            all_candidates = all_candidates[:TOPK]
+
+        # ถ้าเจอคะแนนสูงมากแล้ว ก็พอ (กันเรียก Vision หลายรอบ)
+        # ✅ ลด threshold จาก 980 → 850 เพื่อ early exit เร็วขึ้น (ลด API calls)
+        return best_score >= OCR_EARLY_EXIT_SCORE
+
+    k = OCR_PARALLEL_K if parallel_k is None else int(parallel_k)
+    if k <= 1:
+        # ทีละ attempt ตามลำดับ (แบบเดิม)
+        for tag, use_roi, variant in attempts:
+            processed = preprocess_image_cv(photo, config, use_roi=use_roi, variant=variant)
+            txt, _err = read_text(processed)
+            if accept(score_text(tag, use_roi, variant, txt)):
                 break
+    else:
+        # speculative: preprocess ครบทุก variant (CPU ในเครื่อง) → ยิง Vision พร้อมกันทีละ k ตัวตามลำดับความสำคัญ
+        # ผลกลับตัวไหนก่อนให้คะแนนตัวนั้นก่อน, ช่องว่างเติม attempt ถัดไป, ถึงเกณฑ์ → cancel ที่เหลือ
+        queue = [(a, preprocess_image_cv(photo, config, use_roi=a[1], variant=a[2])) for a in attempts]
+        pool = get_vision_pool()
+        running = {}
+
+        def _fire():
+            while queue and len(running) < k:
+                a, processed = queue.pop(0)
+                ctx = contextvars.copy_context()  # tag (mode / session) ของ request stats ตามไปด้วย
+                running[pool.submit(ctx.run, read_text, processed)] = a
+
+        _fire()
+        while running:
+            done, _pending = wait(list(running), return_when=FIRST_COMPLETED)
+            stop = False
+            for fut in done:
+                tag, use_roi, variant = running.pop(fut)
+                txt, _err = fut.result()
+                stop = accept(score_text(tag, use_roi, variant, txt)) or stop
+            if stop:
+                for fut in running:
+                    fut.cancel()  # ที่เริ่มไปแล้ว cancel ไม่ได้ → ปล่อยให้จบเองแล้วทิ้งผล
+                break
+            _fire()
 
     final_val = float(best_val) if best_val is not None else 0.0
     
@@ -2484,11 +1303,10 @@ def get_ref_image_url(point_id: str) -> str:
     pid = str(point_id).strip().upper()
     return f"https://storage.googleapis.com/{BUCKET_NAME}/{REF_IMAGE_FOLDER}/{pid}.jpg"
 
-def decode_qr(image_bytes: bytes):
-    """คืนค่า point_id จาก QR (ถ้าอ่านไม่ได้จะคืน None)"""
+def decode_qr(image_bytes):
+    """คืนค่า point_id จาก QR (ถ้าอ่านไม่ได้จะคืน None) — bytes หรือ PhotoContext"""
     try:
-        arr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        img = PhotoContext.of(image_bytes).full
         if img is None:
             return None
         detector = cv2.QRCodeDetector()
@@ -2498,12 +1316,6 @@ def decode_qr(image_bytes: bytes):
     except:
         return None
 
-def infer_meter_type(config: dict) -> str:
-    """เดา meter_type จาก config เพื่อกันกรอกผิด"""
-    blob = f"{config.get('type','')} {config.get('name','')}".lower()
-    if ("น้ำ" in blob) or ("water" in blob) or ("ประปา" in blob):
-        return "Water"
-    return "Electric"
 # =========================================================
 # --- 🖥️ DASHBOARD SCREENSHOT OCR (FLOW 1-3) ---
 # =========================================================
@@ -2568,31 +1380,11 @@ def _upscale_for_ocr(img, max_side: int = 2200):
         return img
     return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
 
-def _vision_tokens(image_bytes: bytes, lang_hints=("en",)):
-    image = vision.Image(content=image_bytes)
-    ctx = vision.ImageContext(language_hints=list(lang_hints))
-    resp = VISION_CLIENT.text_detection(image=image, image_context=ctx)
-    if resp.error.message:
-        raise RuntimeError(resp.error.message)
-
-    ann = resp.text_annotations
-    tokens = []
-    for a in ann[1:]:
-        txt = (a.description or "").strip()
-        if not txt:
-            continue
-        vs = a.bounding_poly.vertices
-        xs = [v.x for v in vs]
-        ys = [v.y for v in vs]
-        x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
-        tokens.append({
-            "text": txt,
-            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
-            "cx": (x1 + x2) / 2.0,
-            "cy": (y1 + y2) / 2.0,
-            "h": max(1.0, (y2 - y1)),
-        })
-    full_text = ann[0].description if ann else ""
+def _ocr_tokens(image_bytes: bytes, lang_hints=("en",)):
+    """(tokens พร้อมกรอบ, ข้อความทั้งรูป) จาก OCR backend default (Vision / Tesseract ในเครื่อง)"""
+    full_text, tokens, err = ocr_backend_for().read(image_bytes, hints=tuple(lang_hints))
+    if err:
+        raise RuntimeError(err)
     return tokens, full_text
 
 def _norm_token_text(s: str) -> str:
@@ -2675,7 +1467,7 @@ def extract_dashboard_flow_values(image_bytes: bytes, debug: bool = False):
 
     # pass1: full OCR เพื่อหา ROI
     try:
-        tokens1, full_text1 = _vision_tokens(image_bytes, lang_hints=("en",))
+        tokens1, full_text1 = _ocr_tokens(image_bytes, lang_hints=("en",))
     except Exception as e:
         rows = [{"flow": f"FLOW {i}", "pressure_bar": None, "flowrate_m3h": None, "flow_total_m3": None, "status": "VISION_ERROR"} for i in (1,2,3)]
         return (rows, {"error": str(e)}) if debug else rows
@@ -2687,7 +1479,7 @@ def extract_dashboard_flow_values(image_bytes: bytes, debug: bool = False):
 
     # pass2: OCR บน crop
     try:
-        tokens, full_text = _vision_tokens(crop_bytes, lang_hints=("en",))
+        tokens, full_text = _ocr_tokens(crop_bytes, lang_hints=("en",))
     except Exception:
         tokens, full_text = tokens1, full_text1
 
@@ -2785,29 +1577,13 @@ def build_pid_norm_map():
         norm_map[_norm_pid_key(pid)] = pid
     return norm_map
 
-def _crop_bottom_bytes(image_bytes: bytes, frac: float = 0.40) -> bytes:
-    """ครอปช่วงล่างของรูป (ตรงเทปเหลือง) เพื่อ OCR point_id ให้แม่น/เร็ว"""
-    img = _cv2_decode_bytes(image_bytes)
-    if img is None:
-        return image_bytes
-    h, w = img.shape[:2]
-    y1 = int(h * (1.0 - frac))
-    crop = img[y1:h, 0:w].copy()
-    crop = _upscale_for_ocr(crop, max_side=2200)
-    out = _cv2_encode_jpg(crop, quality=92)
-    return out or image_bytes
-
-def _crop_top_bytes(image_bytes: bytes, frac: float = 0.40) -> bytes:
-    """ครอปช่วงบนของรูป (สำหรับกรณี point_id อยู่บนสุด) เพื่อ OCR point_id"""
-    img = _cv2_decode_bytes(image_bytes)
-    if img is None:
-        return image_bytes
-    h, w = img.shape[:2]
-    y2 = int(h * frac)
-    crop = img[0:y2, 0:w].copy()
-    crop = _upscale_for_ocr(crop, max_side=2200)
-    out = _cv2_encode_jpg(crop, quality=92)
-    return out or image_bytes
+def _crop_bottom_bytes(image_bytes, frac: float = 0.40) -> bytes:
+    """ครอปช่วงล่างของรูป (ตรงเทปเหลือง) เพื่อ OCR point_id ให้แม่น/เร็ว (bytes หรือ PhotoContext)"""
+    return PhotoContext.of(image_bytes).band("bottom", frac)
+
+def _crop_top_bytes(image_bytes, frac: float = 0.40) -> bytes:
+    """ครอปช่วงบนของรูป (สำหรับกรณี point_id อยู่บนสุด) เพื่อ OCR point_id (bytes หรือ PhotoContext)"""
+    return PhotoContext.of(image_bytes).band("top", frac)
 
 def find_point_id_from_text(ocr_text: str, norm_map: dict):
     t = _norm_pid_key(ocr_text)
@@ -2846,24 +1622,28 @@ def find_point_id_from_text(ocr_text: str, norm_map: dict):
 
     return best_pid if best_score >= 0.78 else None
 
-def extract_point_id_from_image(image_bytes: bytes, norm_map: dict):
+def extract_point_id_from_image(image_bytes, norm_map: dict, read_text=None):
     """คืนค่า (point_id หรือ None, ocr_text ที่ใช้)
+    read_text: ตัวอ่านข้อความ (None → backend default ของ OCR_BACKEND, โหมด bulk ใช้ VisionBatcher.read_text)
     
     ลำดับการหา point_id (จากเร็วไปช้า):
     1. Crop bottom 50% (กรณีปกติ - เทปเหลืองด้านล่าง) — ขยายจาก 40% เพื่อจับได้มากขึ้นในรอบแรก
     2. Crop top 50% (กรณี point_id อยู่บนสุด เช่น VSD screens)
     ⚡ ไม่ต้อง Full image pass เพราะ bottom 50% + top 50% = ครบทั้งรูปแล้ว
     """
+    read_text = read_text or ocr_backend_for().read_text
+    photo = PhotoContext.of(image_bytes)
+
     # Pass 1: OCR เฉพาะช่วงล่าง (ขยายเป็น 50% เพื่อลดโอกาสที่ต้อง pass 2)
-    btm = _crop_bottom_bytes(image_bytes, frac=0.50)
-    txt, _err = _vision_read_text(btm)
+    btm = _crop_bottom_bytes(photo, frac=0.50)
+    txt, _err = read_text(btm)
     pid = find_point_id_from_text(txt, norm_map)
     if pid:
         return pid, txt
 
     # Pass 2: OCR เฉพาะช่วงบน (50% — overlap กับ pass 1 = ครบทั้งรูป ไม่ต้อง full image)
-    top = _crop_top_bytes(image_bytes, frac=0.50)
-    txt_top, _err_top = _vision_read_text(top)
+    top = _crop_top_bytes(photo, frac=0.50)
+    txt_top, _err_top = read_text(top)
     pid_top = find_point_id_from_text(txt_top, norm_map)
     if pid_top:
         return pid_top, txt_top
@@ -2876,21 +1656,9 @@ def extract_point_id_from_image(image_bytes: bytes, norm_map: dict):
 # --- ✅ HISTORY GUARD (for cumulative meters) ---
 # =========================================================
 
-@st.cache_data(ttl=300)
 def load_dailyreadings_tail(limit=4000):
-    """โหลด DailyReadings เฉพาะท้าย ๆ เพื่อลดเวลา/โควต้า"""
-    sh = gc.open(DB_SHEET_NAME)
-    ws = sh.worksheet("DailyReadings")
-    vals = ws.get_all_values()
-    if not vals:
-        return pd.DataFrame()
-
-    header = vals[0]
-    rows = vals[1:]
-    if limit and len(rows) > limit:
-        rows = rows[-limit:]
-    df = pd.DataFrame(rows, columns=header)
-    return df
+    """DailyReadings เฉพาะท้าย ๆ จาก mirror ในเครื่อง (sync เฉพาะแถวใหม่ทุก 60 วินาที)"""
+    return get_dailyreadings_mirror().frame(limit=limit)
 
 def _norm_pid(pid: str) -> str:
     return str(pid or "").strip().upper()
@@ -2920,43 +1688,14 @@ def is_cumulative_meter(config: dict) -> bool:
 def get_last_good_value(point_id: str, upto_date):
     """
     คืนค่า Manual_Value ล่าสุด (ไม่ใช่ FLAGGED) ที่ timestamp <= upto_date 23:59:59
+    (query จาก local DB: index (point_id, ts) — ชีทหลักไม่มี → ไล่แท็บ archive รายเดือน)
     """
-    df = load_dailyreadings_tail(limit=4000)
-    if df.empty:
-        return None
-
-    pid = _norm_pid(point_id)
-
-    # normalize columns
-    if "point_id" not in df.columns or "timestamp" not in df.columns:
-        return None
-
-    df["point_id"] = df["point_id"].astype(str).map(_norm_pid)
-    df["Status"] = df.get("Status", "").astype(str).str.strip().str.upper()
-
-    # filter pid
-    df = df[df["point_id"] == pid]
-    if df.empty:
-        return None
-
-    # drop flagged
-    df = df[~df["Status"].str.contains("FLAGGED", na=False)]
-    if df.empty:
-        return None
-
-    # parse timestamp
-    df["timestamp_dt"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna(subset=["timestamp_dt"])
-    if df.empty:
-        return None
-
-    cutoff = pd.to_datetime(str(upto_date) + " 23:59:59")
-    df = df[df["timestamp_dt"] <= cutoff]
-    if df.empty:
+    rows = query_partitions(point_id=_norm_pid(point_id), exclude_status="FLAGGED",
+                            until=upto_date, sort="ts", order="desc", limit=1)
+    if not rows:
         return None
 
-    df = df.sort_values("timestamp_dt")
-    last = pd.to_numeric(df.iloc[-1].get("Manual_Value", None), errors="coerce")
+    last = pd.to_numeric(rows[0].get("Manual_Value", None), errors="coerce")
     if pd.isna(last):
         return None
     return float(last)
@@ -2972,30 +1711,13 @@ def estimate_max_delta(point_id: str, upto_date, fallback=20000, max_cap=500000)
     
     เอาค่าที่ใหญ่ที่สุดจากสามวิธี ไว้ให้ยืดหยุ่น
     """
-    df = load_dailyreadings_tail(limit=8000)
-    if df.empty:
-        return fallback
-
-    pid = _norm_pid(point_id)
-    if "point_id" not in df.columns or "timestamp" not in df.columns:
-        return fallback
-
-    df["point_id"] = df["point_id"].astype(str).map(_norm_pid)
-    df["Status"] = df.get("Status", "").astype(str).str.strip().str.upper()
-    df = df[df["point_id"] == pid]
-    df = df[~df["Status"].str.contains("FLAGGED", na=False)]
-    if df.empty:
-        return fallback
-
-    df["timestamp_dt"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna(subset=["timestamp_dt"])
-    cutoff = pd.to_datetime(str(upto_date) + " 23:59:59")
-    df = df[df["timestamp_dt"] <= cutoff]
-    if df.empty:
+    # เอาล่าสุด 60 รายการ (ประมาณ 2 เดือน) จาก local DB แล้วเรียงเก่า → ใหม่
+    rows = query_partitions(point_id=_norm_pid(point_id), exclude_status="FLAGGED",
+                            until=upto_date, sort="ts", order="desc", limit=60)
+    if not rows:
         return fallback
 
-    df = df.sort_values("timestamp_dt").tail(60)  # เอาล่าสุด 60 รายการ (ประมาณ 2 เดือน)
-    vals = pd.to_numeric(df.get("Manual_Value", None), errors="coerce").dropna().astype(float).tolist()
+    vals = pd.to_numeric(pd.Series([r.get("Manual_Value") for r in reversed(rows)]), errors="coerce").dropna().astype(float).tolist()
     if len(vals) < 4:
         return fallback
 
@@ -3164,6 +1886,41 @@ mode = st.sidebar.radio(
      "�️ SQL Server (CUTEST SCADA - Test)",
      "�👮‍♂️ Admin Approval"]
 )
+
+# ✅ tag ของทุก Google API call ในรอบนี้ (นับแยกตามโหมด / session)
+_ctx = get_script_run_ctx() if get_script_run_ctx else None
+SESSION_TAG = (_ctx.session_id[:8] if _ctx is not None else "-")
+set_request_tags(mode=mode, session=SESSION_TAG)
+start_stats_endpoint()
+
+# ✅ โควต้า Google Sheets ของ process นี้ (SheetsGateway แชร์ทุก session)
+with st.sidebar.expander("📶 Sheets quota", expanded=False):
+    for _kind, _u in get_gateway().usage().items():
+        st.caption(
+            f"{_kind}: ใช้ {_u['used_last_min']}/{_u['rate_per_min']:.0f} ต่อนาที | "
+            f"รอคิว {_u['waiting']} | เคยรอ {_u['waited_calls']} ครั้ง ({_u['waited_seconds']}s)"
+        )
+
+    # 🧾 ใครใช้โควต้า: จำนวน call / latency แยก โหมด × ฟังก์ชัน × method
+    _stats = get_gateway().stats
+    _only_me = st.checkbox("เฉพาะ session นี้", key="diag_only_me")
+    _rows = _stats.rows(session=SESSION_TAG) if _only_me else _stats.rows()
+    if _rows:
+        st.caption("calls ตามโหมด: " + " | ".join(
+            f"{k}: {v}" for k, v in (_stats.totals("mode", session=SESSION_TAG) if _only_me else _stats.totals("mode")).items()))
+        st.dataframe(
+            pd.DataFrame(_rows)[["mode", "caller", "api", "kind", "method", "count", "errors", "avg_ms", "max_ms"]],
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.caption("ยังไม่มี request")
+    if os.environ.get("SHEETS_STATS_PORT"):
+        st.caption(f"JSON: http://127.0.0.1:{os.environ['SHEETS_STATS_PORT']}/sheets-stats")
+    if getattr(VISION_CLIENT, "cache", None) is not None:
+        _vc = VISION_CLIENT.cache.stats()
+        st.caption(f"🗂️ Vision cache: {_vc['entries']} รูป ({_vc['bytes'] / 1024 / 1024:.1f} MB) | "
+                   f"hit {_vc['hits']} / miss {_vc['misses']}")
 if mode == "📝 พนักงานจดมิเตอร์":
     st.title("Smart Meter System")
     st.markdown("### Water treatment Plant - Borthongindustrial")
@@ -3181,6 +1938,13 @@ if mode == "📝 พนักงานจดมิเตอร์":
     if "emp_nonce" not in st.session_state:
         st.session_state.emp_nonce = 0
 
+    # ✅ read ที่ต้องใช้ในหน้านี้ยิงพร้อมกัน (PointsMaster / DailyReadings / แท็บเดือน + month grid)
+    prefetch_reads({
+        "points_master": load_points_master,
+        "dailyreadings": get_dailyreadings_mirror().refresh_if_stale,
+        "report_month": lambda: _waterreport_month_block(st.session_state.get("emp_date") or get_thai_time().date()),
+    })
+
     all_meters = load_points_master()
     if not all_meters:
         st.error("❌ โหลด PointsMaster ไม่ได้")
@@ -3221,6 +1985,19 @@ if mode == "📝 พนักงานจดมิเตอร์":
         st.sidebar.error("อ่านความคืบหน้าไม่สำเร็จ")
         st.sidebar.caption(str(prog.get("error", ""))[:300])
 
+    # ✅ ภาพรวมทั้งเดือน (ใช้ month grid เดียวกัน → ไม่อ่านชีทเพิ่ม)
+    with st.sidebar.expander("🗓️ ภาพรวมทั้งเดือน", expanded=False):
+        heat = get_waterreport_month_heatmap(selected_date)
+        if heat is None or heat.empty:
+            st.caption("ไม่มีข้อมูล")
+        else:
+            st.bar_chart(heat.sum(axis=0).rename("ลงแล้ว (จุด)"))
+            st.dataframe(
+                heat.replace({1: "✅", 0: ""}),
+                use_container_width=True,
+                height=320,
+            )
+
     missing_list = prog.get("missing") or []
     if missing_list:
         with st.sidebar.expander(f"🚨 ยังไม่ลง ({len(missing_list)}) จุด", expanded=False):
@@ -3243,6 +2020,21 @@ if mode == "📝 พนักงานจดมิเตอร์":
                 st.rerun()
     else:
         st.sidebar.success("ครบแล้ว 🎉")
+
+    # ✅ สถานะการส่งของค่าที่บันทึกใน session นี้ (WriteQueue)
+    my_tickets = st.session_state.get("emp_write_tickets") or []
+    if my_tickets:
+        wq = get_write_queue()
+        sent_items = wq.recent(my_tickets, limit=15)
+        n_wait = sum(1 for it in sent_items if it["status"] in ("queued", "sending", "retry"))
+        with st.sidebar.expander(f"📨 สถานะการส่ง ({n_wait} รอส่ง)", expanded=n_wait > 0):
+            for it in sent_items:
+                icon = WRITE_STATUS_ICONS.get(it["status"], "•")
+                st.write(f"{icon} {it['point_id']} = {it['value']} ({it['status']})")
+                if it["message"] and it["status"] != "sent":
+                    st.caption(str(it["message"])[:200])
+            if st.button("🔄 อัปเดตสถานะ", key="emp_write_refresh", use_container_width=True):
+                st.rerun()
  
     # ถ้าอยู่โหมด mismatch confirm ให้ล็อกอยู่จุดเดิม
     if st.session_state.get("confirm_mode", False):
@@ -3491,20 +2283,19 @@ if mode == "📝 พนักงานจดมิเตอร์":
             filename = f"{point_id}_{selected_date.strftime('%Y%m%d')}_{get_thai_time().strftime('%H%M%S')}.jpg"
             image_url = upload_image_to_storage(img_bytes, filename)
 
-            ok = save_to_db(point_id, inspector, meter_type, float(final_val), float(ai_val), status, selected_date, image_url)
-            if ok:
-                ok_r, msg_r = export_to_real_report(point_id, float(final_val), inspector, report_col, selected_date, debug=True)
-                if not ok_r:
-                    st.warning('⚠️ ส่งค่าไป FM-OP-01-10WaterReport ไม่สำเร็จ: ' + msg_r)
-                st.success("✅ บันทึกสำเร็จ")
+            # ✅ เข้าคิว (DailyReadings + WaterReport ส่งเป็น batch เบื้องหลัง) → ไม่ต้องรอ Sheets
+            ticket = get_write_queue().submit(
+                point_id, inspector, meter_type, float(final_val), float(ai_val), status,
+                selected_date, image_url, report_col=report_col,
+            )
+            st.session_state.setdefault("emp_write_tickets", []).append(ticket)
+            st.success("✅ รับค่าแล้ว — กำลังส่งเข้า Google Sheets")
 
-                # ไปจุดถัดไป
-                reset_emp_meter_state()
-                st.session_state.emp_step = "SCAN_QR"
-                st.session_state.emp_point_id = ""
-                st.rerun()
-            else:
-                st.error("❌ Save Failed")
+            # ไปจุดถัดไป
+            reset_emp_meter_state()
+            st.session_state.emp_step = "SCAN_QR"
+            st.session_state.emp_point_id = ""
+            st.rerun()
         except Exception as e:
             st.error(f"❌ บันทึกไม่สำเร็จ: {e}")
 
@@ -3523,6 +2314,12 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
         # ✅ ไม่ใช้ key ให้ date picker อ่านค่า default ทุกครั้ง (ไม่ cache)
         report_date = st.date_input("📅 วันที่ของรายงาน", value=get_thai_time().date())
 
+    prefetch_reads({
+        "points_master": load_points_master,
+        "dailyreadings": get_dailyreadings_mirror().refresh_if_stale,
+        "report_month": lambda: _waterreport_month_block(report_date),
+    })
+
     norm_map = build_pid_norm_map()
     pm = load_points_master() or []
     all_pids = sorted({str(r.get("point_id","")).strip().upper() for r in pm if r.get("point_id")})
@@ -3590,6 +2387,7 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
                 _it['roi_y2'] = safe_float(_it.get('roi_y2'), 0.0)
                 _it['type'] = str(_it.get('type', '')).strip()
                 _it['name'] = str(_it.get('name', '')).strip()
+                _it['ocr_backend'] = str(_it.get('ocr_backend', '') or '').strip().lower()
                 _config_cache[_pid_key] = _it
         
         # สร้าง progress bar ด้านนอก loop เพื่อให้เห็น realtime
@@ -3598,20 +2396,22 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
         time_container = st.empty()
         _bulk_start_time = pytime.time()
         
-        for i, it in enumerate(images, start=1):
+        # ✅ ทุกรูปรันพร้อมกัน BULK_OCR_WORKERS thread → Vision request ของหลายรูป (crop point_id / attempt อ่านค่า)
+        #    ถูก VisionBatcher รวมเป็น batch_annotate_images ทีละ ≤16 รูป (แทน 1 HTTP request ต่อ crop)
+        batch_read = get_vision_batcher(VISION_CLIENT).read_text
+
+        def _reader(cfg=None):
+            """Vision → ผ่าน batcher / backend อื่น (เช่น tesseract) → อ่านตรงในเครื่อง"""
+            backend = ocr_backend_for(cfg)
+            return batch_read if backend.name == "vision" else backend.read_text
+
+        def _process_image(it):
             img_name = it["name"]
             img_bytes = it["bytes"]
 
-            # Update progress text + ETA
-            _elapsed = pytime.time() - _bulk_start_time
-            _avg_per_img = _elapsed / i if i > 1 else 0
-            _remaining = _avg_per_img * (len(images) - i)
-            status_container.text(f"📍 กำลังประมวลผล: {i}/{len(images)} - {img_name[:40]}")
-            progress_container.progress(i / len(images))
-            if i > 1:
-                time_container.caption(f"⏱️ ผ่านไป {_elapsed:.0f}s | เหลือประมาณ {_remaining:.0f}s ({_avg_per_img:.1f}s/รูป)")
+            photo = PhotoContext(img_bytes)  # decode ครั้งเดียว: crop point_id + ทุก attempt ของ ocr_process
 
-            pid, _pid_text = extract_point_id_from_image(img_bytes, norm_map)
+            pid, _pid_text = extract_point_id_from_image(photo, norm_map, read_text=_reader())
             pid_u = str(pid).strip().upper() if pid else ""
 
             cfg = _config_cache.get(pid_u) if pid_u else None
@@ -3622,7 +2422,8 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
 
             if pid_u and cfg:
                 try:
-                    best, cand = ocr_process(img_bytes, cfg, return_candidates=True)
+                    # parallel_k=1: ความขนานมาจากหลายรูปใน batch เดียวกันแล้ว
+                    best, cand = ocr_process(photo, cfg, return_candidates=True, parallel_k=1, read_text=_reader(cfg))
                     # ✅ ใช้ History Guard + candidates
                     best2, hmsg = apply_history_guard(pid_u, best, cand, cfg, report_date)
                     ai_val = float(best2)
@@ -3637,7 +2438,7 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
                 stt = "NO_CONFIG"
                 msg = "ไม่พบ config ของจุดนี้ใน PointsMaster"
 
-            rows.append({
+            return {
                 "file": img_name,
                 "point_id": pid_u or "",
                 "ai_value": ai_val,
@@ -3647,7 +2448,25 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
                 "candidates": candidates_list,
                 "image_bytes": img_bytes,  # ✅ เก็บรูปไว้
                 "decimals": int(cfg.get('decimals', 0) or 0) if cfg else 0,  # ✅ cache decimals
-            })
+            }
+
+        rows = [None] * len(images)
+        with ThreadPoolExecutor(max_workers=BULK_OCR_WORKERS, thread_name_prefix="bulk-ocr") as ex:
+            futs = {
+                ex.submit(contextvars.copy_context().run, in_script_ctx(_process_image), it): idx
+                for idx, it in enumerate(images)
+            }
+            for i, fut in enumerate(as_completed(futs), start=1):
+                idx = futs[fut]
+                rows[idx] = fut.result()
+
+                # Update progress text + ETA
+                _elapsed = pytime.time() - _bulk_start_time
+                _avg_per_img = _elapsed / i
+                _remaining = _avg_per_img * (len(images) - i)
+                status_container.text(f"📍 ประมวลผลแล้ว: {i}/{len(images)} - {images[idx]['name'][:40]}")
+                progress_container.progress(i / len(images))
+                time_container.caption(f"⏱️ ผ่านไป {_elapsed:.0f}s | เหลือประมาณ {_remaining:.0f}s ({_avg_per_img:.1f}s/รูป)")
 
         progress_container.empty()
         status_container.empty()
@@ -3988,7 +2807,7 @@ elif mode == "📸 อัปโหลดรูปทั้งวัน (มี p
             if not report_items:
                 st.info("ไม่มีข้อมูลที่เหลือให้บันทึก")
             else:
-                ok_db, db_msg = append_rows_dailyreadings_batch(db_rows)
+                ok_db, db_msg = upsert_dailyreadings_batch(db_rows)
                 if not ok_db:
                     st.warning(f"⚠️ Log DailyReadings ไม่สำเร็จ: {db_msg}")
 
@@ -4162,7 +2981,7 @@ elif mode == "🖥️ Dashboard Screenshot (OCR)":
             st.warning("ไม่มีข้อมูลให้บันทึก")
             st.stop()
 
-        ok_db, db_msg = append_rows_dailyreadings_batch(db_rows)
+        ok_db, db_msg = upsert_dailyreadings_batch(db_rows)
         if not ok_db:
             st.warning(f"⚠️ Log ลง DailyReadings ไม่สำเร็จ: {db_msg}")
 
@@ -4328,22 +3147,49 @@ elif mode == "�️ SQL Server (CUTEST SCADA - Test)":
 elif mode == "�👮‍♂️ Admin Approval":
     st.title("👮‍♂️ Admin Dashboard")
     st.caption("ระบบอนุมัติผลการอ่านค่ามิเตอร์น้ำ/ไฟ")
-    if st.button("🔄 รีเฟรช"): st.rerun()
+    if st.button("🔄 รีเฟรช"):
+        get_dailyreadings_mirror().sync()
+        st.rerun()
 
-    sh = gc.open(DB_SHEET_NAME)
-    ws = sh.worksheet("DailyReadings")
-    data = ws.get_all_records()
-    pending = [d for d in data if str(d.get('Status', '')).strip().upper() == 'FLAGGED']
+    # ✅ คิวรออนุมัติจาก local DB (index ที่ Status + เลขแถวในชีท) แบ่งหน้า
+    PAGE_SIZE = 20
+    if "adm_page" not in st.session_state: st.session_state.adm_page = 0
+    pending, total_pending = pending_approvals(offset=st.session_state.adm_page * PAGE_SIZE, limit=PAGE_SIZE)
+    n_pages = max(1, (total_pending + PAGE_SIZE - 1) // PAGE_SIZE)
+    if st.session_state.adm_page >= n_pages:
+        st.session_state.adm_page = n_pages - 1
+        st.rerun()
 
     if not pending: st.success("✅ All Clear")
     else:
-        for i, item in enumerate(pending):
+        c_pg1, c_pg2, c_pg3 = st.columns([1, 2, 1])
+        if c_pg1.button("⬅️ ก่อนหน้า", disabled=st.session_state.adm_page == 0, use_container_width=True):
+            st.session_state.adm_page -= 1; st.rerun()
+        c_pg2.markdown(f"**รออนุมัติ {total_pending} รายการ** — หน้า {st.session_state.adm_page + 1}/{n_pages}")
+        if c_pg3.button("ถัดไป ➡️", disabled=st.session_state.adm_page >= n_pages - 1, use_container_width=True):
+            st.session_state.adm_page += 1; st.rerun()
+
+        page_rows = [item["_row"] for item in pending]
+        all_key = f"adm_all_{st.session_state.adm_page}"
+
+        def _toggle_page():
+            # ✅ ตั้งค่า checkbox ของแถวในหน้านี้ผ่าน session_state (ไม่ใช้ value= → ไม่ขึ้นกับเวอร์ชัน Streamlit / ไม่ล้างที่เลือกเอง)
+            for r in page_rows:
+                st.session_state[f"adm_sel_{r}"] = st.session_state[all_key]
+
+        st.checkbox("เลือกทั้งหน้า", key=all_key, on_change=_toggle_page)
+
+        selections = []
+        for item in pending:
+            row_no = item["_row"]
             with st.container():
                 st.markdown("---")
-                c_info, c_val, c_act = st.columns([1.5, 1.5, 1])
+                c_sel, c_info, c_val = st.columns([0.4, 1.5, 1.5])
+                with c_sel:
+                    picked = st.checkbox("เลือก", key=f"adm_sel_{row_no}", label_visibility="collapsed")
                 with c_info:
                     st.subheader(f"🚩 {item.get('point_id')}")
-                    st.caption(f"Inspector: {item.get('inspector')}")
+                    st.caption(f"Inspector: {item.get('inspector')} | {item.get('timestamp')} | แถว {row_no}")
                     img_url = item.get('image_url')
                     if img_url and img_url != '-' and str(img_url).startswith('http'):
                         st.image(img_url, width=220)
@@ -4357,38 +3203,31 @@ elif mode == "�👮‍♂️ Admin Approval":
                         f"👤 คนจด: {m_val}": m_val,
                         f"🤖 AI: {a_val}": a_val
                     }
-                    selected_label = st.radio("เลือกค่าที่ถูกต้อง:", list(options_map.keys()), key=f"rad_{i}")
+                    selected_label = st.radio("เลือกค่าที่ถูกต้อง:", list(options_map.keys()), key=f"rad_{row_no}")
                     choice = options_map[selected_label]
 
-                with c_act:
-                    st.write("")
-                    if st.button("✅ อนุมัติ", key=f"btn_{i}", type="primary"):
-                        try:
-                            timestamp = str(item.get('timestamp', '')).strip()
-                            point_id = str(item.get('point_id', '')).strip()
-                            cells = ws.findall(timestamp)
-                            updated = False
-                            for cell in cells:
-                                if str(ws.cell(cell.row, 3).value).strip() == point_id:
-                                    ws.update_cell(cell.row, 7, "APPROVED")
-                                    ws.update_cell(cell.row, 5, choice)
-                                    config = get_meter_config(point_id)
-                                    report_col = (config.get('report_col', '') if config else '')
-                                    
-                                    # ✅ Parse timestamp กลับเป็นวันที่ เพื่อหา Sheet ให้เจอตอน Approve
-                                    try:
-                                        dt_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                                        approve_date = dt_obj.date()
-                                    except:
-                                        approve_date = get_thai_time().date() # fallback
-                                        
-                                    ok_r, msg_r = export_to_real_report(point_id, choice, str(item.get('inspector', '')), report_col, approve_date, debug=True)
-                                    if not ok_r:
-                                        st.warning('⚠️ ส่งค่าไป FM-OP-01-10WaterReport ไม่สำเร็จ: ' + msg_r)
-                                    updated = True; break
-                            if updated: st.success("Approved!"); st.rerun()
-                            else: st.warning("หา row ไม่เจอ")
-                        except Exception as e: st.error(f"Error approve: {e}")
+            if picked:
+                selections.append({
+                    "row": row_no,
+                    "point_id": str(item.get('point_id', '')).strip(),
+                    "timestamp": str(item.get('timestamp', '')).strip(),
+                    "value": choice,
+                })
+
+        st.markdown("---")
+        if st.button(f"✅ อนุมัติที่เลือก ({len(selections)})", type="primary", disabled=not selections, use_container_width=True):
+            try:
+                # ✅ DailyReadings 1 batch_update + WaterReport 1 batch ต่อแท็บเดือน
+                res = approve_rows(selections)
+                if res["approved"]:
+                    st.success(f"Approved {len(res['approved'])} รายการ!")
+                for row_no, reason in res["failed"]:
+                    st.warning(f"แถว {row_no}: {reason}")
+                for pid, reason in res["report_fail"]:
+                    st.warning(f"⚠️ ส่งค่าไป FM-OP-01-10WaterReport ไม่สำเร็จ: {pid} — {reason}")
+                if res["approved"] and not res["failed"] and not res["report_fail"]:
+                    st.rerun()
+            except Exception as e: st.error(f"Error approve: {e}")
 
 elif mode == "📥 อัปโหลด Excel (SCADA Export)":
     st.title("📥 อัปโหลด Excel (SCADA Export)")
@@ -4844,7 +3683,7 @@ elif mode == "📥 อัปโหลด Excel (SCADA Export)":
                 st.stop()
 
             # 2) log ลง DB แบบ batch (ลด requests)
-            ok_db, db_msg = append_rows_dailyreadings_batch(db_rows)
+            ok_db, db_msg = upsert_dailyreadings_batch(db_rows)
             db_ok_count = len(db_rows) if ok_db else 0
             if not ok_db:
                 # ไม่หยุดระบบ แค่แจ้งให้รู้ว่าล็อก DB ไม่สำเร็จ
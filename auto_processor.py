@@ -19,6 +19,9 @@
 
 รันแบบ Manual (ทันที):
   python auto_processor.py --mode manual
+
+ส่งค่าที่ค้างใน outbox (ตอนเน็ตหลุด/โดน quota):
+  python auto_processor.py --flush-outbox
 """
 
 import os
@@ -30,29 +33,30 @@ import logging
 import time
 import json
 import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
-import pandas as pd
-
-# ใช้ functions จาก app.py
-sys.path.insert(0, os.path.dirname(__file__))
 
-# Import from standalone wrapper instead of app.py directly
-sys.path.insert(0, os.path.dirname(__file__))
+# ใช้ functions จาก meter_core (ไม่ต้องโหลด app.py / Streamlit)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app_standalone import (
-        load_scada_excel_mapping,
+    from meter_core.config import get_thai_time
+    from meter_core.scada import (
+        get_scada_mapping,
         extract_scada_values_from_exports,
-        export_scada_to_waterreport,
-        gc,
-        DB_SHEET_NAME,
-        REAL_REPORT_SHEET,
-        get_thai_time
     )
+    from meter_core.outbox import Outbox
+    from meter_core.collector import (
+        save_collected_values,
+        flush_outbox as _flush_outbox,
+        start_outbox_flusher,
+    )
+    from meter_core.metrics import collector_run, timed
 except ImportError as e:
-    print(f"❌ Error importing from app_standalone.py: {e}")
-    print("ตรวจสอบว่าไฟล์ app_standalone.py และ app.py อยู่ในโฟลเดอร์เดียวกัน")
+    print(f"❌ Error importing from meter_core: {e}")
+    print("ตรวจสอบว่าโฟลเดอร์ meter_core อยู่ในโฟลเดอร์เดียวกับสคริปต์นี้")
     sys.exit(1)
 
 # ==================== Configuration ====================
@@ -94,6 +98,19 @@ CONFIG = {
     # Check interval สำหรับ watch mode (วินาที)
     "WATCH_INTERVAL": 300,  # ตรวจสอบทุก 5 นาที
     
+    # จำนวน date folder ล่าสุดที่สแกน และจำนวน job ที่รันพร้อมกัน
+    # (แต่ละ folder = 1 job, target_date = วันที่จากชื่อ folder)
+    "MAX_DATE_FOLDERS": 3,
+    "MAX_WORKERS": 3,
+    
+    # 📤 Outbox (เก็บค่าที่ส่ง Google Sheets ไม่สำเร็จ แล้วส่งใหม่ทีหลัง) — ไฟล์ SQLite ใน LOG_FOLDER
+    "OUTBOX_FILE": "sheets_outbox.sqlite3",
+    "OUTBOX_FLUSH_INTERVAL": 120,
+    
+    # 📈 Metrics ต่อรอบ — folder ของ node-exporter textfile collector
+    # (None = env NODE_EXPORTER_TEXTFILE_DIR หรือ LOG_FOLDER; history อยู่ที่ LOG_FOLDER/collector_metrics.jsonl)
+    "METRICS_TEXTFILE_DIR": None,
+    
     # ส่ง notification หรือไม่
     "ENABLE_NOTIFICATION": False,
     
@@ -186,10 +203,29 @@ def get_file_hash(filepath):
     with open(filepath, 'rb') as f:
         return hashlib.md5(f.read()).hexdigest()
 
-def find_new_files():
-    """หาไฟล์ Excel ใหม่ในโฟลเดอร์ watch"""
+def _scan_folder(folder):
+    """หาไฟล์ตาม FILE_PATTERNS ในโฟลเดอร์เดียว (ไม่รวมไฟล์ชั่วคราว ~$...)"""
+    found = []
+    seen = set()
+    for pattern in CONFIG["FILE_PATTERNS"]:
+        for f in folder.glob(pattern):
+            # AF_Report_Gen.xlsx match ได้ 2 pattern → กันซ้ำ
+            if f.name.startswith('~') or str(f) in seen:
+                continue
+            seen.add(str(f))
+            found.append(f)
+    return found
+
+def find_new_file_groups():
+    """
+    หาไฟล์ Excel ใหม่ในโฟลเดอร์ watch แยกเป็นกลุ่มตาม date folder
+    
+    Returns:
+        list of dict: [{"label": "5_2_69", "target_date": date|None, "files": [Path, ...]}, ...]
+        target_date = None → ใช้วันที่ปัจจุบัน (โฟลเดอร์หลัก / ชื่อ folder แปลงไม่ได้)
+    """
     watch_folder = Path(CONFIG["WATCH_FOLDER"])
-    found_files = []
+    groups = []
     
     if CONFIG["USE_DATE_FOLDERS"]:
         # โหมด: หา folder ตามวัน (เช่น 5_2_69, 6_2_69)
@@ -208,29 +244,32 @@ def find_new_files():
             date_folders.sort(key=lambda x: x.stat().st_mtime, reverse=True)
             logger.info(f"📁 Found {len(date_folders)} date folder(s)")
             
-            # ประมวลผล folder ล่าสุด (หรือทั้งหมดถ้าต้องการ)
-            for folder in date_folders[:3]:  # เอา 3 folder ล่าสุด
-                logger.info(f"   Scanning: {folder.name}")
-                for pattern in CONFIG["FILE_PATTERNS"]:
-                    files = list(folder.glob(pattern))
-                    found_files.extend(files)
+            # ✅ แต่ละ folder = 1 กลุ่ม พร้อมวันที่ของตัวเอง
+            for folder in date_folders[:CONFIG["MAX_DATE_FOLDERS"]]:
+                files = _scan_folder(folder)
+                folder_date = parse_date_from_folder_name(folder.name)
+                logger.info(f"   Scanning: {folder.name} → {folder_date or 'วันนี้'} ({len(files)} file(s))")
+                if files:
+                    groups.append({"label": folder.name, "target_date": folder_date, "files": files})
         else:
             logger.warning("⚠️ No date folders found! Looking in main folder...")
             # Fallback: หาในโฟลเดอร์หลัก
-            for pattern in CONFIG["FILE_PATTERNS"]:
-                files = list(watch_folder.glob(pattern))
-                found_files.extend(files)
+            files = _scan_folder(watch_folder)
+            if files:
+                groups.append({"label": watch_folder.name, "target_date": None, "files": files})
     else:
         # โหมด: หาในโฟลเดอร์เดียว
-        for pattern in CONFIG["FILE_PATTERNS"]:
-            files = list(watch_folder.glob(pattern))
-            found_files.extend(files)
-    
-    # เอาแค่ไฟล์ที่ไม่ได้ซ่อน (ไม่ขึ้นต้นด้วย ~)
-    found_files = [f for f in found_files if not f.name.startswith('~')]
+        files = _scan_folder(watch_folder)
+        if files:
+            groups.append({"label": watch_folder.name, "target_date": None, "files": files})
     
-    logger.info(f"🔍 Found {len(found_files)} file(s) total")
-    return found_files
+    total = sum(len(g["files"]) for g in groups)
+    logger.info(f"🔍 Found {total} file(s) total in {len(groups)} group(s)")
+    return groups
+
+def find_new_files():
+    """หาไฟล์ Excel ใหม่ในโฟลเดอร์ watch (รวมทุก date folder เป็น list เดียว)"""
+    return [f for g in find_new_file_groups() for f in g["files"]]
 
 def load_processed_history():
     """โหลดประวัติไฟล์ที่ประมวลผลไปแล้ว"""
@@ -248,160 +287,153 @@ def save_processed_history(history):
     with open(history_file, 'w', encoding='utf-8') as f:
         json.dump(history, f, indent=2, ensure_ascii=False)
 
+def _history_key(filepath):
+    """
+    key ใน processed_history.json
+    - ไฟล์ใน date folder → "5_2_69/AF_Report_Gen.xlsx" (ชื่อไฟล์ซ้ำกันได้ทุกวัน)
+    - ไฟล์ในโฟลเดอร์หลัก → ชื่อไฟล์ (แบบเดิม)
+    """
+    path = Path(filepath)
+    if path.parent != Path(CONFIG["WATCH_FOLDER"]):
+        return f"{path.parent.name}/{path.name}"
+    return path.name
+
 def is_file_processed(filepath, history):
     """เช็คว่าไฟล์นี้ประมวลผลไปแล้วหรือยัง"""
     file_hash = get_file_hash(filepath)
-    filename = os.path.basename(filepath)
     
-    return history.get(filename, {}).get('hash') == file_hash
+    return history.get(_history_key(filepath), {}).get('hash') == file_hash
+
+def load_mapping():
+    """โหลด mapping (DB_Water_Scada.xlsx) ครั้งเดียวต่อรอบ แล้วแชร์ให้ทุก job"""
+    mapping_file = Path(__file__).parent / CONFIG["MAPPING_FILE"]
+    if not mapping_file.exists():
+        raise FileNotFoundError(f"Mapping file not found: {mapping_file}")
+    
+    mapping = get_scada_mapping(str(mapping_file))
+    logger.info(f"✅ Loaded {len(mapping)} mapping entries")
+    return mapping
+
+_OUTBOX = None
+
+def get_outbox():
+    """Outbox ของเครื่องนี้ (สร้างครั้งเดียว)"""
+    global _OUTBOX
+    if _OUTBOX is None:
+        _OUTBOX = Outbox(Path(CONFIG["LOG_FOLDER"]) / CONFIG["OUTBOX_FILE"])
+    return _OUTBOX
+
+def flush_outbox(retry_dead: bool = False):
+    """ส่งค่าที่ค้างใน outbox (ถ้ามี)"""
+    try:
+        return _flush_outbox(get_outbox(), log=logger, retry_dead=retry_dead)
+    except Exception as e:
+        logger.warning(f"⚠️ Outbox flush ล้มเหลว: {e}")
+        return {}
 
 # ==================== Core Processing ====================
 
-def process_files_batch(files, target_date=None):
+def process_files_batch(files, target_date=None, mapping=None, label="", metrics=None):
     """
     ประมวลผลไฟล์ทั้งหมดและบันทึกลง Google Sheets
     
+    Args:
+        files: list ของ path ไฟล์ Excel (ควรมาจาก date folder เดียวกัน)
+        target_date: วันที่ของข้อมูล (None = วันนี้)
+        mapping: mapping ที่โหลดไว้แล้ว (None = โหลดใหม่)
+        label: ชื่อ job สำหรับ log (เช่น ชื่อ date folder)
+        metrics: RunMetrics ของรอบนี้ (จับเวลาแต่ละ stage)
+    
     Returns:
         dict: สถิติการประมวลผล
     """
+    tag = f"[{label}] " if label else ""
+    
     if not files:
-        logger.warning("⚠️ No files to process")
+        logger.warning(f"{tag}⚠️ No files to process")
         return {"success": 0, "failed": 0, "total": 0}
     
     if target_date is None:
         target_date = get_thai_time().date()
     
-    logger.info(f"📅 Target date: {target_date}")
-    logger.info(f"📂 Processing {len(files)} file(s)...")
+    logger.info(f"{tag}📅 Target date: {target_date}")
+    logger.info(f"{tag}📂 Processing {len(files)} file(s)...")
     
     # 1. โหลด mapping
-    try:
-        mapping_file = Path(__file__).parent / CONFIG["MAPPING_FILE"]
-        if not mapping_file.exists():
-            logger.error(f"❌ Mapping file not found: {mapping_file}")
-            return {"success": 0, "failed": 0, "total": 0, "error": "Mapping file not found"}
-        
-        mapping = load_scada_excel_mapping(str(mapping_file))
-        logger.info(f"✅ Loaded {len(mapping)} mapping entries")
-    except Exception as e:
-        logger.error(f"❌ Error loading mapping: {e}")
-        return {"success": 0, "failed": 0, "total": 0, "error": str(e)}
+    if mapping is None:
+        try:
+            with timed(metrics, "load_mapping"):
+                mapping = load_mapping()
+        except Exception as e:
+            logger.error(f"{tag}❌ Error loading mapping: {e}")
+            return {"success": 0, "failed": 0, "total": 0, "error": str(e)}
     
     # 2. อ่านไฟล์ Excel
     uploaded_exports = {}
-    for file_path in files:
-        try:
-            filename = os.path.basename(file_path)
-            with open(file_path, 'rb') as f:
-                uploaded_exports[filename] = f.read()
-            logger.info(f"✅ Loaded: {filename} ({os.path.getsize(file_path) / 1024 / 1024:.1f} MB)")
-        except Exception as e:
-            logger.error(f"❌ Error reading {file_path}: {e}")
+    with timed(metrics, "read_files"):
+        for file_path in files:
+            try:
+                filename = os.path.basename(file_path)
+                with open(file_path, 'rb') as f:
+                    uploaded_exports[filename] = f.read()
+                logger.info(f"{tag}✅ Loaded: {filename} ({os.path.getsize(file_path) / 1024 / 1024:.1f} MB)")
+            except Exception as e:
+                logger.error(f"{tag}❌ Error reading {file_path}: {e}")
     
     if not uploaded_exports:
-        logger.error("❌ No files could be loaded")
+        logger.error(f"{tag}❌ No files could be loaded")
         return {"success": 0, "failed": 0, "total": 0, "error": "No files loaded"}
     
     # 3. Extract values
     try:
-        logger.info("🔄 Extracting values from Excel files...")
-        results, missing = extract_scada_values_from_exports(
-            uploaded_exports=uploaded_exports,
-            mapping_rows=mapping,
-            target_date=target_date,
-            custom_max_scan_rows=CONFIG["MAX_SCAN_ROWS"]
-        )
-        logger.info(f"✅ Extracted {len(results)} point values")
+        logger.info(f"{tag}🔄 Extracting values from Excel files...")
+        with timed(metrics, "extract"):
+            results, missing = extract_scada_values_from_exports(
+                uploaded_exports=uploaded_exports,
+                mapping_rows=mapping,
+                target_date=target_date,
+                custom_max_scan_rows=CONFIG["MAX_SCAN_ROWS"]
+            )
+        logger.info(f"{tag}✅ Extracted {len(results)} point values")
     except Exception as e:
-        logger.error(f"❌ Error extracting values: {e}")
+        logger.error(f"{tag}❌ Error extracting values: {e}")
         return {"success": 0, "failed": 0, "total": 0, "error": str(e)}
     
-    # 4. บันทึกลง Google Sheets (DailyReadings)
-    success_count = 0
-    failed_count = 0
+    # 4-5. บันทึกลง Google Sheets (DailyReadings + WaterReport)
+    ok_results = [r for r in results if r.get("value") is not None and r.get("status") == "OK"]
+    for r in results:
+        if r.get("value") is None or r.get("status") != "OK":
+            logger.warning(f"{tag}  ⚠ {r.get('point_id')}: {r.get('status') or 'No value'}")
     
-    try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("DailyReadings")
-        
-        current_time = get_thai_time()
-        timestamp_str = current_time.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # results is a list of dicts, not a dict itself
-        for result in results:
-            point_id = result.get("point_id")
-            val = result.get("value")
-            status = result.get("status")
-            
-            if val is not None and status == "OK":
-                try:
-                    row = [
-                        timestamp_str,
-                        "SCADA",
-                        point_id,
-                        "AUTO_SYSTEM",
-                        val,
-                        "-",
-                        "AUTO",
-                        "-"
-                    ]
-                    ws.append_row(row)
-                    success_count += 1
-                    logger.debug(f"  ✓ {point_id}: {val}")
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"  ✗ {point_id}: {e}")
-            else:
-                failed_count += 1
-                logger.warning(f"  ⚠ {point_id}: {status or 'No value'}")
-        
-        logger.info(f"✅ Saved {success_count}/{len(results)} records to Google Sheets (DailyReadings)")
-        
-    except Exception as e:
-        logger.error(f"❌ Error saving to Google Sheets: {e}")
-        return {
-            "success": success_count,
-            "failed": len(results) - success_count,
-            "total": len(results),
-            "error": str(e)
-        }
+    if not ok_results:
+        logger.warning(f"{tag}⚠️ No valid data to save")
+        return {"success": 0, "failed": len(results), "total": len(results), "missing": len(missing),
+                "files_processed": len(files)}
     
-    # 5. บันทึกลง WaterReport (FM-OP-01-10WaterReport)
     try:
-        logger.info("🔄 Saving to WaterReport...")
-        
-        # เตรียมข้อมูลสำหรับ export_scada_to_waterreport
-        scada_results = []
-        for result in results:
-            if result.get("value") is not None and result.get("status") == "OK":
-                scada_results.append({
-                    "point_id": result.get("point_id"),
-                    "value": result.get("value"),
-                    "status": "OK"
-                })
-        
-        if scada_results:
-            success_msg, fail_msg = export_scada_to_waterreport(
-                scada_results=scada_results,
-                target_date=target_date,
-                mode="scada_auto"
-            )
-            
-            if success_msg:
-                logger.info(f"✅ {success_msg}")
-            if fail_msg:
-                logger.warning(f"⚠️ {fail_msg}")
-        else:
-            logger.warning("⚠️ No valid data to export to WaterReport")
-            
+        saved = save_collected_values(
+            ok_results,
+            target_date,
+            inspector="AUTO_SYSTEM",
+            method="AUTO",
+            default_meter_type="Water",
+            outbox=get_outbox(),
+            log=logger,
+            metrics=metrics,
+        )
     except Exception as e:
-        logger.error(f"❌ Error saving to WaterReport: {e}")
-        # ไม่ return error เพราะ DailyReadings สำเร็จแล้ว
+        logger.error(f"{tag}❌ Error saving to Google Sheets: {e}")
+        return {"success": 0, "failed": len(results), "total": len(results), "error": str(e)}
+    
+    # success = บันทึกได้ (ลง Sheets แล้ว หรือเก็บเข้า outbox รอส่ง) → ย้ายไฟล์ได้
+    success_count = len(ok_results) if (saved["db_ok"] or saved["queued"]) else 0
+    logger.info(f"{tag}✅ Saved {success_count}/{len(results)} records (WaterReport ok={saved['success']}, queued={saved['queued']})")
     
     return {
         "success": success_count,
-        "failed": failed_count,
+        "failed": len(results) - len(ok_results) + saved["failed"],
         "total": len(results),
+        "queued": saved["queued"],
         "missing": len(missing),
         "files_processed": len(files)
     }
@@ -422,7 +454,9 @@ def move_to_processed(files):
                 continue
                 
             filename = os.path.basename(file_path)
-            dest = processed_folder / f"{timestamp}_{filename}"
+            # ไฟล์จาก date folder ต่างกันอาจชื่อซ้ำ (AF_Report_Gen.xlsx) → ใส่ชื่อ folder กันทับกัน
+            prefix = _history_key(file_path).replace("/", "_")
+            dest = processed_folder / f"{timestamp}_{prefix}"
             shutil.move(str(file_path), str(dest))
             logger.info(f"📦 Moved: {filename} → {dest.name}")
         except Exception as e:
@@ -430,44 +464,129 @@ def move_to_processed(files):
 
 # ==================== Processing Modes ====================
 
-def process_manual():
-    """โหมด Manual: ประมวลผลทันที"""
-    logger.info("=" * 60)
-    logger.info("🚀 Manual Processing Mode")
-    logger.info("=" * 60)
-    
-    create_folders()
-    files = find_new_files()
+def process_groups(groups, metrics=None):
+    """
+    ประมวลผลแต่ละ date folder เป็น job แยก (target_date ของใครของมัน)
+    รันพร้อมกันผ่าน worker pool ขนาด CONFIG["MAX_WORKERS"]
+    (metrics: เวลา stage ของทุก job รวมกันใน RunMetrics เดียว)
     
-    if not files:
-        logger.info("ℹ️ No files to process. Exiting.")
-        return
+    Returns:
+        list of (group, stats)
+    """
+    if not groups:
+        return []
     
-    stats = process_files_batch([str(f) for f in files])
+    # ส่งของค้างใน outbox ก่อน (กันค่าเก่าไปทับค่าใหม่ทีหลัง)
+    with timed(metrics, "outbox_flush"):
+        flush_outbox()
     
-    if stats.get("success", 0) > 0:
-        # อัพเดท history ก่อนย้ายไฟล์ (เพื่อเก็บ hash)
-        history = load_processed_history()
-        unique_files = list(set([str(f) for f in files]))
+    try:
+        with timed(metrics, "load_mapping"):
+            mapping = load_mapping()
+    except Exception as e:
+        logger.error(f"❌ Error loading mapping: {e}")
+        return [(g, {"success": 0, "failed": 0, "total": 0, "error": str(e)}) for g in groups]
+    
+    workers = max(1, min(int(CONFIG["MAX_WORKERS"]), len(groups)))
+    logger.info(f"⚙️ Processing {len(groups)} folder job(s) with {workers} worker(s)")
+    
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="folder-job") as pool:
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run,  # ตัวนับ Sheets/rows ของ job นับเข้า metrics รอบนี้
+                process_files_batch,
+                [str(f) for f in g["files"]],
+                target_date=g["target_date"],
+                mapping=mapping,
+                label=g["label"],
+                metrics=metrics,
+            ): g
+            for g in groups
+        }
+        for fut in as_completed(futures):
+            g = futures[fut]
+            try:
+                stats = fut.result()
+            except Exception as e:
+                logger.error(f"[{g['label']}] ❌ Job failed: {e}")
+                stats = {"success": 0, "failed": 0, "total": 0, "error": str(e)}
+            outcomes.append((g, stats))
+    
+    return outcomes
+
+def finalize_groups(outcomes, history):
+    """อัพเดท history + ย้ายไฟล์ เฉพาะ folder ที่บันทึกสำเร็จ (ทำใน main thread)"""
+    for g, stats in outcomes:
+        if stats.get("success", 0) <= 0:
+            continue
+        
+        unique_files = list(set([str(f) for f in g["files"]]))
         
+        # อัพเดท history ก่อนย้ายไฟล์ (เพื่อเก็บ hash)
         for file_path in unique_files:
             if os.path.exists(file_path):  # เช็คว่าไฟล์ยังอยู่
-                filename = os.path.basename(file_path)
-                history[filename] = {
+                history[_history_key(file_path)] = {
                     "hash": get_file_hash(str(file_path)),
                     "processed_at": datetime.now().isoformat(),
+                    "target_date": str(g["target_date"] or ""),
                     "records": stats.get("success", 0)
                 }
         save_processed_history(history)
         
         # ย้ายไฟล์หลังจาก save history แล้ว
-        move_to_processed([str(f) for f in files])
+        move_to_processed(unique_files)
+
+def _log_summary(outcomes):
+    total = {"success": 0, "failed": 0, "total": 0}
+    for g, stats in outcomes:
+        for k in total:
+            total[k] += stats.get(k, 0)
+        logger.info(
+            f"   [{g['label']}] {g['target_date'] or 'วันนี้'}: "
+            f"{stats.get('success', 0)}/{stats.get('total', 0)}"
+            + (f" ❌ {stats['error']}" if stats.get("error") else "")
+        )
+    logger.info(f"   Success: {total['success']}")
+    logger.info(f"   Failed:  {total['failed']}")
+    logger.info(f"   Total:   {total['total']}")
+
+def _metrics_run():
+    """metrics ของ 1 รอบ → Prometheus textfile + collector_metrics.jsonl (เขียนตอนจบรอบ)"""
+    return collector_run(
+        "auto_processor", CONFIG["LOG_FOLDER"], textfile_dir=CONFIG["METRICS_TEXTFILE_DIR"], log=logger
+    )
+
+def _run_groups(groups, history, metrics):
+    outcomes = process_groups(groups, metrics=metrics)
+    finalize_groups(outcomes, history)
+    for _, stats in outcomes:
+        metrics.record_stats(stats)
+    metrics.set("folders", len(groups))
+    metrics.set("files", sum(len(g["files"]) for g in groups))
+    return outcomes
+
+def process_manual():
+    """โหมด Manual: ประมวลผลทันที"""
+    logger.info("=" * 60)
+    logger.info("🚀 Manual Processing Mode")
+    logger.info("=" * 60)
+    
+    create_folders()
+    
+    with _metrics_run() as metrics:
+        with metrics.stage("find_files"):
+            groups = find_new_file_groups()
+        
+        if not groups:
+            logger.info("ℹ️ No files to process. Exiting.")
+            return
+        
+        outcomes = _run_groups(groups, load_processed_history(), metrics)
     
     logger.info("=" * 60)
     logger.info(f"✅ Processing complete!")
-    logger.info(f"   Success: {stats.get('success', 0)}")
-    logger.info(f"   Failed:  {stats.get('failed', 0)}")
-    logger.info(f"   Total:   {stats.get('total', 0)}")
+    _log_summary(outcomes)
     logger.info("=" * 60)
 
 def process_scheduled():
@@ -478,6 +597,7 @@ def process_scheduled():
     logger.info("=" * 60)
     
     create_folders()
+    start_outbox_flusher(get_outbox(), interval=CONFIG["OUTBOX_FLUSH_INTERVAL"])
     
     while True:
         current_time = datetime.now().strftime("%H:%M")
@@ -491,6 +611,32 @@ def process_scheduled():
         
         time.sleep(30)  # เช็คทุก 30 วินาที
 
+def watch_once(history):
+    """
+    ตรวจ watch folder 1 รอบ: ประมวลผลเฉพาะไฟล์ใหม่ (hash ยังไม่อยู่ใน history)
+    ใช้ทั้ง process_watch และ collector_daemon
+
+    Returns:
+        outcomes (list ว่าง = ไม่มีไฟล์ใหม่)
+    """
+    t0 = time.perf_counter()
+    groups = []
+    for g in find_new_file_groups():
+        new_files = [f for f in g["files"] if not is_file_processed(str(f), history)]
+        if new_files:
+            groups.append({**g, "files": new_files})
+    
+    if not groups:
+        return []
+    
+    # metrics เฉพาะรอบที่มีไฟล์ใหม่ (ไม่เขียน history ทุก 5 นาที)
+    logger.info(f"🆕 Found {sum(len(g['files']) for g in groups)} new file(s) in {len(groups)} folder(s)")
+    with _metrics_run() as metrics:
+        metrics.add_stage("find_files", time.perf_counter() - t0)
+        outcomes = _run_groups(groups, history, metrics)
+    _log_summary(outcomes)
+    return outcomes
+
 def process_watch():
     """โหมด Watch: ตรวจจับไฟล์ใหม่แบบ real-time"""
     logger.info("=" * 60)
@@ -501,29 +647,11 @@ def process_watch():
     
     create_folders()
     history = load_processed_history()
+    start_outbox_flusher(get_outbox(), interval=CONFIG["OUTBOX_FLUSH_INTERVAL"])
     
     while True:
         try:
-            files = find_new_files()
-            new_files = [f for f in files if not is_file_processed(str(f), history)]
-            
-            if new_files:
-                logger.info(f"🆕 Found {len(new_files)} new file(s)")
-                stats = process_files_batch([str(f) for f in new_files])
-                
-                if stats.get("success", 0) > 0:
-                    move_to_processed([str(f) for f in new_files])
-                    
-                    # อัพเดท history
-                    for file_path in new_files:
-                        filename = os.path.basename(file_path)
-                        history[filename] = {
-                            "hash": get_file_hash(str(file_path)),
-                            "processed_at": datetime.now().isoformat(),
-                            "records": stats.get("success", 0)
-                        }
-                    save_processed_history(history)
-            
+            watch_once(history)
             time.sleep(CONFIG["WATCH_INTERVAL"])
             
         except KeyboardInterrupt:
@@ -543,9 +671,18 @@ def main():
         default='manual',
         help='โหมดการทำงาน: manual (ทันที), scheduled (ตามเวลา), watch (ตรวจจับอัตโนมัติ)'
     )
+    parser.add_argument(
+        '--flush-outbox',
+        action='store_true',
+        help='ส่งค่าที่ค้างใน outbox (รวมรายการ dead) แล้วจบ'
+    )
     
     args = parser.parse_args()
     
+    if args.flush_outbox:
+        flush_outbox(retry_dead=True)
+        sys.exit(0 if get_outbox().pending_count(include_dead=True) == 0 else 1)
+    
     try:
         if args.mode == 'manual':
             process_manual()
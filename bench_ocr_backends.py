@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+🧪 Benchmark OCR backends บนรูป fixtures (Google Vision = ค่าอ้างอิง)
+
+วิธีใช้:
+  python bench_ocr_backends.py fixtures/                                # vision, tesseract
+  python bench_ocr_backends.py fixtures/ -b vision,tesseract,tesseract+vision
+  python bench_ocr_backends.py fixtures/ -e expected.csv                # คอลัมน์ file,value → เช็คว่าเจอค่าจริงไหม
+  python bench_ocr_backends.py fixtures/ -o bench_20260301.csv --cache  # --cache = ใช้ Vision cache (ไม่วัด latency จริง)
+
+ผลลัพธ์:
+  <output>.csv           รายรูป × backend: ms, error, เจอตัวเลข, เลขตรงกับ Vision, เจอค่าจริง
+  <output>_summary.json  สรุปต่อ backend: latency p50/p95, อัตราเจอตัวเลข / ตรงกับ Vision / เจอค่าจริง
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meter_core.config import get_vision_client
+from meter_core.ocr_backends import HAS_TESSERACT, backend_names, get_ocr_backend
+from meter_core.vision_cache import CachedVisionClient, cached_vision_client
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def digit_runs(text: str) -> set:
+    """ชุดตัวเลขในข้อความ (ตัดจุด/คอมมา/ช่องว่างระหว่างเลข เช่น '01 234.5' → '012345')"""
+    joined = re.sub(r"(?<=\d)[\s.,]+(?=\d)", "", text or "")
+    return {m.lstrip("0") or "0" for m in re.findall(r"\d+", joined)}
+
+
+def expected_hit(text: str, value: str) -> bool:
+    want = re.sub(r"\D", "", str(value or "")).lstrip("0")
+    return bool(want) and any(want in run for run in digit_runs(text))
+
+
+def load_expected(path):
+    if not path:
+        return {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return {os.path.basename(r["file"]): r["value"] for r in csv.DictReader(f) if r.get("file")}
+
+
+def build_backends(names, use_cache):
+    known = set(backend_names())
+    valid = []
+    for n in names:
+        if all(p in known for p in n.split("+")):
+            valid.append(n)
+        else:
+            print(f"⚠️ ข้าม backend '{n}' (ไม่รู้จัก — มี: {', '.join(sorted(known))})")
+
+    client = None
+    if any("vision" in n.split("+") for n in valid):
+        # default วัด latency จริง → ไม่ผ่าน disk cache
+        client = cached_vision_client(get_vision_client()) if use_cache else CachedVisionClient(get_vision_client())
+    return {n: get_ocr_backend(n, vision_client=client) for n in valid}
+
+
+def percentile(xs, p):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🧪 เทียบ OCR backends บนรูป fixtures")
+    parser.add_argument("folder", help="โฟลเดอร์รูป (jpg/png)")
+    parser.add_argument("-b", "--backends", default="vision,tesseract", help="ชื่อ backend คั่นด้วย , (default vision,tesseract)")
+    parser.add_argument("-e", "--expected", help="CSV คอลัมน์ file,value (ค่าจริงของแต่ละรูป)")
+    parser.add_argument("-o", "--output", default="ocr_backend_bench.csv")
+    parser.add_argument("--cache", action="store_true", help="ใช้ Vision cache (รันซ้ำได้เร็ว แต่ latency ไม่ใช่ของจริง)")
+    args = parser.parse_args()
+
+    files = sorted(
+        os.path.join(root, f)
+        for root, _d, fs in os.walk(args.folder) for f in fs if f.lower().endswith(IMAGE_EXTS)
+    )
+    if not files:
+        print(f"❌ ไม่พบรูปใน {args.folder}")
+        return 1
+
+    names = [n.strip().lower() for n in args.backends.split(",") if n.strip()]
+    if "tesseract" in " ".join(names) and not HAS_TESSERACT:
+        print("⚠️ ไม่มี pytesseract → tesseract จะ error ทุกรูป (pip install pytesseract + tesseract-ocr)")
+    backends = build_backends(names, args.cache)
+    expected = load_expected(args.expected)
+    print(f"🧪 {len(files)} รูป × {len(backends)} backend ({', '.join(backends)})")
+
+    rows = []
+    for i, path in enumerate(files, start=1):
+        with open(path, "rb") as f:
+            content = f.read()
+        name = os.path.basename(path)
+        ref = None
+        for bname, backend in sorted(backends.items(), key=lambda kv: kv[0] != "vision"):  # vision ก่อน (ค่าอ้างอิง)
+            t0 = time.perf_counter()
+            text, tokens, err = backend.read(content)
+            ms = (time.perf_counter() - t0) * 1000
+            runs = digit_runs(text)
+            if bname == "vision":
+                ref = runs
+            rows.append({
+                "file": name,
+                "backend": bname,
+                "ms": round(ms, 1),
+                "error": err,
+                "tokens": len(tokens),
+                "has_digits": bool(runs),
+                "agree_vision": (runs == ref) if ref is not None and not err else "",
+                "expected": expected.get(name, ""),
+                "expected_hit": expected_hit(text, expected[name]) if name in expected else "",
+                "text": (text or "").replace("\n", " | ")[:300],
+            })
+        print(f"  {i}/{len(files)} {name}")
+
+    with open(args.output, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        w.writeheader()
+        w.writerows(rows)
+
+    summary = {}
+    for bname in backends:
+        rs = [r for r in rows if r["backend"] == bname]
+        ok = [r for r in rs if not r["error"]]
+        agree = [r for r in ok if r["agree_vision"] != ""]
+        exp = [r for r in rs if r["expected_hit"] != ""]
+        summary[bname] = {
+            "images": len(rs),
+            "errors": len(rs) - len(ok),
+            "ms_p50": percentile([r["ms"] for r in ok], 50),
+            "ms_p95": percentile([r["ms"] for r in ok], 95),
+            "has_digits_rate": round(sum(r["has_digits"] for r in ok) / len(ok), 3) if ok else None,
+            "agree_vision_rate": round(sum(bool(r["agree_vision"]) for r in agree) / len(agree), 3) if agree else None,
+            "expected_hit_rate": round(sum(bool(r["expected_hit"]) for r in exp) / len(exp), 3) if exp else None,
+        }
+
+    summary_path = os.path.splitext(args.output)[0] + "_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print("\n📊 สรุป")
+    for bname, s in summary.items():
+        print(f"  {bname:<18} p50 {s['ms_p50']} ms | p95 {s['ms_p95']} ms | error {s['errors']} | "
+              f"เจอเลข {s['has_digits_rate']} | ตรง Vision {s['agree_vision_rate']} | เจอค่าจริง {s['expected_hit_rate']}")
+    print(f"\n✅ {args.output} / {summary_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,18 @@
 #!/usr/bin/env python3
-import gspread
-from google.oauth2.service_account import Credentials
+import os
+import sys
 
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-SERVICE_ACCOUNT_FILE = 'service_account.json'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meter_core.archive import query_partitions
+from meter_core.local_db import get_local_db, sync_local_db
 
 def check_accuracy():
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    
-    SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1DI9C9nl0-Y6XkDLNQnabuaaZ_l3OA2C0R9NCFTnCELw/edit"
-    spreadsheet = client.open_by_url(SPREADSHEET_URL)
-    worksheet = spreadsheet.worksheet('DailyReadings')
-    
-    headers = worksheet.row_values(1)
-    all_data = worksheet.get_all_values()
+    # ✅ อ่านจาก local DB (sync เฉพาะแถวใหม่) แทนการดึงทั้งชีททุกครั้ง + แท็บ archive รายเดือน
+    sync_local_db(points_master=False)
+    db = get_local_db()
+    headers = db.header()
+    all_data = [headers] + [[r.get(h, '') for h in headers] for r in query_partitions()]
     
     point_id_idx = headers.index('point_id')
     ai_value_idx = headers.index('AI_Value')
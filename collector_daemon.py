@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+🧩 Collector Daemon — รวม collectors ไว้ใน process เดียว (asyncio)
+============================================================
+แทนการเปิด 4 process แยก:
+  start_wt_collector.bat / start_uf_collector.bat / start_watch_mode.bat / start_scheduled_mode.bat
+
+job ที่รองรับ:
+  wt         scada_wt_collector.run_once       ทุกวันตาม SCHEDULED_TIME ของ WT
+  uf         scada_uf_collector.run_once       ทุกวันตาม SCHEDULED_TIME ของ UF
+  watch      auto_processor.watch_once         ทุก WATCH_INTERVAL วินาที
+  scheduled  auto_processor.process_manual     ตาม SCHEDULED_TIMES ของ auto_processor
+  localdb    meter_core.local_db.sync_local_db ทุก LOCAL_DB_SYNC_INTERVAL วินาที (SQLite mirror)
+             + โหลดทั้งชีทใหม่วันละครั้งตาม LOCAL_DB_FULL_SYNC_TIME (ดึงแถวเก่าที่แก้ใน Sheets)
+  archive    meter_core.archive.archive_closed_months ทุกวันเวลา ARCHIVE_TIME (ย้ายเดือนที่ปิดแล้วออกจาก DailyReadings)
+
+ใช้ร่วมกันใน process เดียว:
+  - credentials + gspread client (meter_core.config)
+  - PointsMaster snapshot (meter_core.sheets.get_points_master)
+  - mapping DB_Water_Scada.xlsx (meter_core.scada.get_scada_mapping)
+  - Outbox 1 ไฟล์ + flusher 1 ตัว
+งาน blocking (openpyxl / Google Sheets) รันใน thread pool — event loop แค่จับเวลา
+job เดียวกันไม่รันซ้อนกัน (ถ้ารอบก่อนยังไม่จบ จะข้ามรอบนั้น)
+
+วิธีใช้:
+  # รัน job ตาม CONFIG["JOBS"]
+  python collector_daemon.py
+
+  # เลือก job เอง
+  python collector_daemon.py --jobs wt,uf
+
+  # รันทุก job ทันที 1 รอบตอนเริ่ม แล้วเข้าโหมดตั้งเวลาต่อ
+  python collector_daemon.py --run-now
+
+  # แสดง config ปัจจุบัน
+  python collector_daemon.py --show-config
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import argparse
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# =====================================================================
+# 📋 CONFIG — แก้ตรงนี้ให้ตรงกับเครื่องจริง
+# =====================================================================
+CONFIG = {
+    # job ที่เปิดบนเครื่องนี้ (wt / uf / watch / scheduled / localdb / archive)
+    # ⚠️ เปิดเฉพาะ job ของเครื่องนั้น — แต่ละ collector สร้าง LOG_FOLDER ของตัวเองตอน import
+    "JOBS": ["wt", "uf", "watch"],
+
+    # 📂 Log folder ของ daemon (log รวม + outbox)
+    # ไม่ใช่ Windows (ทดสอบบน Linux) → ~/.water_meter_logs ไม่สร้างโฟลเดอร์ชื่อ 'C:\...' ใน working dir
+    "LOG_FOLDER": r"C:\WaterMeter\Logs" if os.name == "nt" else str(Path.home() / ".water_meter_logs"),
+
+    # thread pool สำหรับงาน blocking (อ่าน Excel / Google Sheets)
+    # เครื่อง SCADA เล็ก → 2 พอ
+    "MAX_WORKERS": 2,
+
+    # เช็คตารางเวลาทุกกี่วินาที
+    "TICK_SECONDS": 30,
+
+    # 📤 Outbox (ใช้ไฟล์เดียวร่วมกันทุก job)
+    "OUTBOX_FILE": "sheets_outbox.sqlite3",
+    "OUTBOX_FLUSH_INTERVAL": 120,
+
+    # 🗄️ SQLite mirror ของ DailyReadings / PointsMaster (job 'localdb')
+    "LOCAL_DB_SYNC_INTERVAL": 300,
+    # sync รอบสั้นดึงแค่แถวใหม่ → แถวเก่าที่แก้ตรงใน Google Sheets (Status / ค่าที่แก้ / อนุมัตินอกแอป)
+    # ไม่ถูกดึงกลับ → โหลดทั้งชีทใหม่วันละครั้ง (ใส่ได้หลายเวลา เช่น ["03:00", "13:00"])
+    "LOCAL_DB_FULL_SYNC_TIME": "03:00",
+
+    # 🗃️ ย้ายเดือนที่ปิดแล้วของ DailyReadings ไปแท็บ DailyReadings_YYYY-MM (job 'archive')
+    # เปิดแค่เครื่องเดียว — รันทุกวันได้ (ไม่มีเดือนที่ต้องย้าย = ไม่ทำอะไร)
+    "ARCHIVE_TIME": "02:30",
+    "ARCHIVE_KEEP_MONTHS": 2,
+}
+
+# =====================================================================
+# Setup Logging (ต้องก่อน import collectors → basicConfig ของ daemon ชนะ)
+# =====================================================================
+def setup_logging():
+    log_folder = Path(CONFIG["LOG_FOLDER"])
+    log_folder.mkdir(parents=True, exist_ok=True)
+    log_file = log_folder / f"collector_daemon_{datetime.now().strftime('%Y%m')}.log"
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    return logging.getLogger("collector_daemon")
+
+
+logger = setup_logging()
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meter_core.config import get_thai_time  # noqa: E402
+from meter_core.outbox import Outbox  # noqa: E402
+from meter_core.collector import flush_outbox  # noqa: E402
+from meter_core.gateway import serve_stats, set_request_tags  # noqa: E402
+
+JOB_NAMES = ("wt", "uf", "watch", "scheduled", "localdb", "archive")
+
+
+# =====================================================================
+# 🧵 Blocking work → executor
+# =====================================================================
+class JobRunner:
+    """รันงาน blocking ใน thread pool (job เดียวกันไม่ซ้อนกัน)"""
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._locks = {}
+
+    async def run(self, name: str, fn, *args, **kwargs):
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        if lock.locked():
+            logger.warning(f"⏭️ [{name}] รอบก่อนยังไม่จบ — ข้ามรอบนี้")
+            return None
+
+        async with lock:
+            loop = asyncio.get_running_loop()
+            try:
+                # tag mode = ชื่อ job → สถิติ Sheets request แยกตาม job
+                ctx = contextvars.copy_context()
+                ctx.run(set_request_tags, mode=name)
+                return await loop.run_in_executor(self.executor, functools.partial(ctx.run, fn, *args, **kwargs))
+            except Exception as e:
+                logger.exception(f"❌ [{name}] job error: {e}")
+                return None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# =====================================================================
+# ⏰ Schedules
+# =====================================================================
+async def daily_at(runner: JobRunner, name: str, times, fn, clock=get_thai_time, pass_date=True):
+    """รัน fn วันละครั้งต่อเวลาใน times (HH:MM)"""
+    times = [times] if isinstance(times, str) else list(times)
+    logger.info(f"⏰ [{name}] ตั้งเวลา: {', '.join(times)}")
+    last_run = {}
+
+    while True:
+        now = clock()
+        hhmm = now.strftime("%H:%M")
+        if hhmm in times and last_run.get(hhmm) != now.date():
+            last_run[hhmm] = now.date()
+            logger.info(f"🔔 [{name}] ถึงเวลา {hhmm} — เริ่มประมวลผล...")
+            if pass_date:
+                await runner.run(name, fn, report_date=now.date())
+            else:
+                await runner.run(name, fn)
+        await asyncio.sleep(CONFIG["TICK_SECONDS"])
+
+
+async def every(runner: JobRunner, name: str, interval: float, fn, *args):
+    """รัน fn ทุก interval วินาที (นับจากรอบก่อนจบ)"""
+    logger.info(f"🔁 [{name}] ทุก {interval} วินาที")
+    while True:
+        await runner.run(name, fn, *args)
+        await asyncio.sleep(interval)
+
+
+# =====================================================================
+# 🧩 Jobs
+# =====================================================================
+def build_jobs(names, runner: JobRunner, outbox: Outbox, run_now=False):
+    """import เฉพาะ collector ที่เปิด แล้วคืน list ของ coroutine"""
+    coros = []
+
+    if "wt" in names:
+        import scada_wt_collector as wt
+        wt._OUTBOX = outbox  # ใช้ outbox ร่วม (flush lock ตัวเดียวกัน)
+        if run_now:
+            coros.append(runner.run("wt", wt.run_once))
+        coros.append(daily_at(runner, "wt", wt.CONFIG["SCHEDULED_TIME"], wt.run_once))
+
+    if "uf" in names:
+        import scada_uf_collector as uf
+        uf._OUTBOX = outbox
+        if run_now:
+            coros.append(runner.run("uf", uf.run_once))
+        coros.append(daily_at(runner, "uf", uf.CONFIG.get("SCHEDULED_TIME", "06:00"), uf.run_once))
+
+    if "watch" in names or "scheduled" in names:
+        import auto_processor as ap
+        ap._OUTBOX = outbox
+        ap.create_folders()
+
+        if "watch" in names:
+            # history โหลดครั้งเดียว แล้ว watch_once อัพเดทในตัว (เหมือน process_watch)
+            history = ap.load_processed_history()
+            coros.append(every(runner, "watch", ap.CONFIG["WATCH_INTERVAL"], ap.watch_once, history))
+
+        if "scheduled" in names:
+            if run_now:
+                coros.append(runner.run("scheduled", ap.process_manual))
+            # auto_processor ใช้เวลาเครื่อง (datetime.now) เหมือน process_scheduled
+            coros.append(daily_at(
+                runner, "scheduled", ap.CONFIG["SCHEDULED_TIMES"], ap.process_manual,
+                clock=datetime.now, pass_date=False,
+            ))
+
+    if "localdb" in names:
+        from meter_core.local_db import sync_local_db
+        coros.append(every(runner, "localdb", CONFIG["LOCAL_DB_SYNC_INTERVAL"], sync_local_db))
+        coros.append(daily_at(
+            runner, "localdb_full", CONFIG["LOCAL_DB_FULL_SYNC_TIME"],
+            functools.partial(sync_local_db, full=True), pass_date=False,
+        ))
+
+    if "archive" in names:
+        from meter_core.archive import archive_closed_months
+        archive = functools.partial(archive_closed_months, keep_months=CONFIG["ARCHIVE_KEEP_MONTHS"])
+        if run_now:
+            coros.append(runner.run("archive", archive))
+        coros.append(daily_at(runner, "archive", CONFIG["ARCHIVE_TIME"], archive, pass_date=False))
+
+    # outbox flusher ตัวเดียวของทั้ง process
+    coros.append(every(runner, "outbox", CONFIG["OUTBOX_FLUSH_INTERVAL"], flush_outbox, outbox))
+    return coros
+
+
+async def run_daemon(names, run_now=False):
+    runner = JobRunner(CONFIG["MAX_WORKERS"])
+    outbox = Outbox(Path(CONFIG["LOG_FOLDER"]) / CONFIG["OUTBOX_FILE"])
+
+    logger.info("=" * 60)
+    logger.info("🧩 Collector Daemon")
+    logger.info(f"   Jobs       : {', '.join(names)}")
+    logger.info(f"   Workers    : {CONFIG['MAX_WORKERS']}")
+    logger.info(f"   Outbox     : {outbox.path} (ค้าง {outbox.pending_count()})")
+    stats_port = os.environ.get("SHEETS_STATS_PORT")
+    if stats_port:
+        serve_stats(int(stats_port))
+        logger.info(f"   Sheets API : http://127.0.0.1:{stats_port}/sheets-stats")
+    logger.info("   กด Ctrl+C เพื่อหยุด")
+    logger.info("=" * 60)
+
+    try:
+        await asyncio.gather(*build_jobs(names, runner, outbox, run_now=run_now))
+    finally:
+        runner.shutdown()
+
+
+def show_config():
+    print("=" * 60)
+    print("📋 Collector Daemon - Configuration")
+    print("=" * 60)
+    for k, v in CONFIG.items():
+        print(f"  {k}: {v}")
+    print("=" * 60)
+
+
+# =====================================================================
+# CLI
+# =====================================================================
+def main():
+    parser = argparse.ArgumentParser(description="🧩 Collector Daemon (WT / UF / Watch ใน process เดียว)")
+    parser.add_argument('--jobs', type=str, default=None,
+                        help=f"job ที่จะรัน คั่นด้วย comma ({', '.join(JOB_NAMES)})")
+    parser.add_argument('--run-now', action='store_true', help='รันทุก job ทันที 1 รอบตอนเริ่ม')
+    parser.add_argument('--show-config', action='store_true', help='แสดง config')
+    args = parser.parse_args()
+
+    if args.show_config:
+        show_config()
+        return
+
+    names = [j.strip().lower() for j in args.jobs.split(",")] if args.jobs else list(CONFIG["JOBS"])
+    unknown = [j for j in names if j not in JOB_NAMES]
+    if unknown or not names:
+        logger.error(f"❌ job ไม่ถูกต้อง: {', '.join(unknown) or '-'} (ใช้ได้: {', '.join(JOB_NAMES)})")
+        sys.exit(2)
+
+    try:
+        asyncio.run(run_daemon(names, run_now=args.run_now))
+    except KeyboardInterrupt:
+        logger.info("\n⚠️ หยุดโดยผู้ใช้")
+
+
+if __name__ == "__main__":
+    main()
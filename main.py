@@ -27,6 +27,10 @@ creds = service_account.Credentials.from_service_account_file(
 )
 gc = gspread.authorize(creds)
 
+# ✅ ทุก Sheets call ผ่าน SheetsGateway (จองโควต้า read/write + retry 429)
+from meter_core.gateway import get_gateway, request_stats, request_tags
+from meter_core.sheets import _with_retry
+
 # --- เพิ่ม Middleware รองรับ request body ขนาดใหญ่ (100MB) ---
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
@@ -46,8 +50,16 @@ class LimitUploadSizeMiddleware(BaseHTTPMiddleware):
             )
         return await call_next(request)
 
+class SheetsRequestTagsMiddleware(BaseHTTPMiddleware):
+    """tag ทุก Google API call ระหว่าง request ด้วย path (ดูได้ที่ /diagnostics/sheets)"""
+
+    async def dispatch(self, request: Request, call_next):
+        with request_tags(mode=f"api {request.url.path}"):
+            return await call_next(request)
+
 app = FastAPI()
 app.add_middleware(LimitUploadSizeMiddleware, max_upload_size=100*1024*1024)  # 100MB
+app.add_middleware(SheetsRequestTagsMiddleware)
 
 # --- Helper Functions (Sheet & Config) ---
 
@@ -71,7 +83,7 @@ def get_thai_sheet_name(sh):
         f"{thai_months[m_idx]} {yy}",      # ม.ค. 69
         f"{thai_months[m_idx][:-1]} {yy}"  # ม.ค 69
     ]
-    all_sheets = [s.title for s in sh.worksheets()]
+    all_sheets = [s.title for s in _with_retry(sh.worksheets)]
     for p in patterns:
         if p in all_sheets: return p
     return None 
@@ -82,9 +94,9 @@ def get_meter_config(point_id):
         return re.sub(r'[\s|,]+', '', str(name).lower())
 
     try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("PointsMaster")
-        records = ws.get_all_records()
+        sh = _with_retry(gc.open, DB_SHEET_NAME)
+        ws = _with_retry(sh.worksheet, "PointsMaster")
+        records = _with_retry(ws.get_all_records)
         norm_point_id = normalize_meter_name(point_id)
         for item in records:
             # ใช้ทั้ง point_id และ name ในการ match
@@ -112,13 +124,13 @@ def export_to_real_report(point_id, read_value, inspector, report_col, target_da
     """
     if not report_col: return False
     try:
-        sh = gc.open(REAL_REPORT_SHEET)
+        sh = _with_retry(gc.open, REAL_REPORT_SHEET)
         sheet_name = get_thai_sheet_name(sh)
-        ws = sh.worksheet(sheet_name) if sheet_name else sh.get_worksheet(0)
+        ws = _with_retry(sh.worksheet, sheet_name) if sheet_name else _with_retry(sh.get_worksheet, 0)
 
         day = target_date.day if target_date else datetime.now().day
         try:
-            cell = ws.find(str(day), in_column=1)
+            cell = _with_retry(ws.find, str(day), in_column=1)
             target_row = cell.row
         except:
             target_row = 6 + day # ✅ Offset 6
@@ -126,7 +138,7 @@ def export_to_real_report(point_id, read_value, inspector, report_col, target_da
         target_col = col_to_index(report_col)
         if target_col == 0: return False
 
-        ws.update_cell(target_row, target_col, read_value)
+        _with_retry(ws.update_cell, target_row, target_col, read_value)
         print(f"✅ Exported to {ws.title} | R{target_row}, C{target_col} : {read_value} (day={day})")
         return True
     except Exception as e:
@@ -135,10 +147,10 @@ def export_to_real_report(point_id, read_value, inspector, report_col, target_da
 
 def save_to_db(point_id, inspector, meter_type, manual_val, ai_val, status, image_url="-"):
     try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("DailyReadings")
+        sh = _with_retry(gc.open, DB_SHEET_NAME)
+        ws = _with_retry(sh.worksheet, "DailyReadings")
         row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), meter_type, point_id, inspector, manual_val, ai_val, status, image_url]
-        ws.append_row(row)
+        _with_retry(ws.append_row, row)
         return True
     except: return False
 
@@ -172,7 +184,8 @@ def preprocess_text(text):
 def ocr_process(image_bytes, decimal_places=0, keyword="", expected_digits=0):
     client = vision.ImageAnnotatorClient()
     image = vision.Image(content=image_bytes)
-    response = client.text_detection(image=image)
+    with get_gateway().track("vision", "text_detection"):
+        response = client.text_detection(image=image)
     texts = response.text_annotations
     
     if texts:
@@ -270,11 +283,16 @@ def ocr_process(image_bytes, decimal_places=0, keyword="", expected_digits=0):
 
 # --- API Endpoints ---
 
+@app.get("/diagnostics/sheets")
+async def sheets_diagnostics():
+    """จำนวน call / latency ของ Google API แยกตาม path, ฟังก์ชัน, method + สถานะโควต้า"""
+    return request_stats()
+
 @app.get("/meters")
 async def get_all_meters_list():
     try:
-        sh = gc.open(DB_SHEET_NAME)
-        data = sh.worksheet("PointsMaster").get_all_records()
+        sh = _with_retry(gc.open, DB_SHEET_NAME)
+        data = _with_retry(_with_retry(sh.worksheet, "PointsMaster").get_all_records)
         sorted_data = sorted(data, key=lambda x: x.get('point_id', ''))
         return {"status": "SUCCESS", "data": sorted_data}
     except Exception as e:
@@ -326,9 +344,9 @@ async def scan_meter(
 @app.get("/admin/pending")
 async def get_pending_approvals():
     try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("DailyReadings")
-        data = ws.get_all_records()
+        sh = _with_retry(gc.open, DB_SHEET_NAME)
+        ws = _with_retry(sh.worksheet, "DailyReadings")
+        data = _with_retry(ws.get_all_records)
         pending_list = []
         for i, row in enumerate(data):
             if row.get('Status') == 'FLAGGED':
@@ -347,10 +365,10 @@ class ApproveRequest(BaseModel):
 @app.post("/admin/approve")
 async def approve_reading(req: ApproveRequest):
     try:
-        sh = gc.open(DB_SHEET_NAME)
-        ws = sh.worksheet("DailyReadings")
-        ws.update_cell(req.row_id, 7, "APPROVED") 
-        ws.update_cell(req.row_id, 5, req.final_value)
+        sh = _with_retry(gc.open, DB_SHEET_NAME)
+        ws = _with_retry(sh.worksheet, "DailyReadings")
+        _with_retry(ws.update_cell, req.row_id, 7, "APPROVED")
+        _with_retry(ws.update_cell, req.row_id, 5, req.final_value)
 
         config = get_meter_config(req.point_id)
         report_col = config.get('report_col', '') if config else ''
@@ -0,0 +1,24 @@
+"""
+meter_core - ส่วนกลางของระบบ Water Meter ที่ไม่ผูกกับ Streamlit
+ใช้ร่วมกันระหว่าง app.py และ collectors (scada_wt_collector / scada_uf_collector / auto_processor)
+
+  config        ค่าคงที่ + credentials + clients (gspread / Vision / Storage สร้างตอนใช้ครั้งแรก)
+  sheets        Google Sheets I/O (WaterReport / DailyReadings / PointsMaster)
+  scada         ดึงค่าจากไฟล์ Excel Export ของ SCADA
+  points_master PointsMaster snapshot (memory + disk)
+  outbox        SQLite outbox สำหรับ write ที่ส่งไม่สำเร็จ
+  collector     ขั้นตอนบันทึกผลที่ collectors ใช้ร่วมกัน
+  metrics       metrics ต่อรอบการรัน (Prometheus textfile + JSON lines)
+  gateway       token bucket คุมโควต้า read/write ของ Google Sheets ทั้ง process
+  write_queue   คิวรวม write ของ UI (append_rows / batch_update เป็นรอบ ๆ เบื้องหลัง)
+  dailyreadings DailyReadings mirror ในเครื่อง (sync เฉพาะแถวใหม่ด้วย ranged get) + upsert ตาม (วันที่, point_id, inspector)
+  local_db      SQLite mirror ของ DailyReadings + PointsMaster (query มี index)
+  approvals     คิวรออนุมัติ (FLAGGED) + approve หลายแถวด้วย batch_get / batch_update
+  archive       แท็บ archive รายเดือนของ DailyReadings + reader ที่อ่านเฉพาะเดือนที่ทับช่วงวันที่
+  vision_batch  รวม OCR request จากหลายรูปเป็น Vision batch_annotate_images (โหมด bulk)
+  vision_cache  cache ผล Vision บน disk ตาม SHA-256 ของรูป (LRU ตามขนาด + TTL, replay offline ได้)
+  ocr_backends  OCR backend เปลี่ยนได้ (Vision / Tesseract ในเครื่อง / fallback) เลือกต่อจุดหรือทั้ง process
+  seven_segment อ่าน/ยืนยันเลขจอ 7-segment ใน ROI เอง (NumPy ทุกหลักพร้อมกัน) ให้มิเตอร์ดิจิทัล
+
+⚠️ อย่า import โมดูลหนัก (cv2 / pandas / google.cloud / sqlalchemy) ที่ระดับ package
+"""
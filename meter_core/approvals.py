@@ -0,0 +1,127 @@
+"""
+Approvals - อนุมัติค่า FLAGGED ใน DailyReadings ทีละหลายแถว
+
+คิวรออนุมัติ = แถว Status=FLAGGED ใน local DB (index ที่ status) พร้อมเลขแถวในชีท
+(เลขแถวได้ตั้งแต่ตอนบันทึกจาก updatedRange ของ append_rows / หรือจาก sync)
+
+approve_rows():
+  1) batch_get แถวที่เลือก 1 ครั้ง → เช็คว่าแถวยังเป็นจุด/เวลาเดิม (กันแถวเลื่อนเพราะมีคนลบ/แทรก)
+  2) batch_update Status + Manual_Value ทุกแถว 1 ครั้ง
+  3) WaterReport ทุกจุด → export_month_grid_batch (1 batch_update ต่อแท็บเดือน)
+  4) patch local DB / mirror ให้หน้า Admin เห็นผลทันที
+"""
+
+import logging
+from datetime import datetime
+
+from meter_core.config import DB_SHEET_NAME, get_thai_time
+from meter_core.dailyreadings import get_dailyreadings_mirror
+from meter_core.local_db import get_local_db, normalize_ts
+from meter_core.sheets import (
+    _with_retry,
+    export_month_grid_batch,
+    get_handles,
+    get_meter_config,
+    rowcol_to_a1,
+)
+
+logger = logging.getLogger(__name__)
+
+# คอลัมน์ใน DailyReadings (1-based) ที่ approve แก้
+COL_MANUAL_VALUE = 5
+COL_STATUS = 7
+APPROVED = "APPROVED"
+
+
+def pending_approvals(offset: int = 0, limit: int = 20):
+    """(รายการ FLAGGED หน้า offset..offset+limit, จำนวนทั้งหมด) จาก local DB"""
+    db = get_local_db()
+    get_dailyreadings_mirror().refresh_if_stale()
+    total = db.count_by_status().get("FLAGGED", 0)
+    items = db.readings(status="FLAGGED", offset=offset, limit=limit)
+    return items, total
+
+
+def _row_date(timestamp):
+    ts = normalize_ts(timestamp)
+    if not ts:
+        return get_thai_time().date()  # fallback (เหมือนเดิม)
+    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").date()
+
+
+def approve_rows(selections: list) -> dict:
+    """
+    selections: list[dict] แต่ละ dict ต้องมี row (เลขแถวในชีท), point_id, timestamp, value
+    คืนค่า {"approved": [row...], "failed": [(row, reason)], "report_ok": [pid...], "report_fail": [(pid, reason)]}
+    """
+    out = {"approved": [], "failed": [], "report_ok": [], "report_fail": []}
+    if not selections:
+        return out
+
+    ws = get_handles(DB_SHEET_NAME).worksheet("DailyReadings")
+
+    # 1) เช็คแถวทั้งหมดด้วย batch_get ครั้งเดียว (timestamp = A, point_id = C)
+    ranges = [f"A{int(s['row'])}:C{int(s['row'])}" for s in selections]
+    current = _with_retry(ws.batch_get, ranges)
+    valid = []
+    for sel, vr in zip(selections, current):
+        got = list(vr[0]) if vr else []
+        ts = normalize_ts(got[0]) if len(got) > 0 else ""
+        pid = str(got[2]).strip().upper() if len(got) > 2 else ""
+        if ts and ts == normalize_ts(sel["timestamp"]) and pid == str(sel["point_id"]).strip().upper():
+            valid.append(sel)
+        else:
+            out["failed"].append((sel["row"], "แถวในชีทเปลี่ยนไป (มีการลบ/แทรกแถว) — กดรีเฟรชแล้วลองใหม่"))
+
+    if out["failed"]:
+        # ลำดับแถวไม่ตรง → ให้ mirror โหลดใหม่ทั้งชีทรอบหน้า
+        try:
+            get_dailyreadings_mirror().sync(full=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Approvals: sync local DB ไม่ได้: {e}")
+
+    if not valid:
+        return out
+
+    # 2) Status + Manual_Value ทุกแถวใน batch_update เดียว
+    data = []
+    for sel in valid:
+        r = int(sel["row"])
+        data.append({"range": rowcol_to_a1(r, COL_STATUS), "values": [[APPROVED]]})
+        data.append({"range": rowcol_to_a1(r, COL_MANUAL_VALUE), "values": [[sel["value"]]]})
+    try:
+        _with_retry(ws.batch_update, data, value_input_option="USER_ENTERED")
+    except Exception as e:
+        for sel in valid:
+            out["failed"].append((sel["row"], f"เขียน DailyReadings ไม่สำเร็จ: {e}"))
+        return out
+
+    mirror = get_dailyreadings_mirror()
+    for sel in valid:
+        out["approved"].append(sel["row"])
+        mirror.patch(int(sel["row"]), {COL_STATUS: APPROVED, COL_MANUAL_VALUE: sel["value"]})
+
+    # 3) WaterReport: รวมทุกจุดตามวันที่ → export_month_grid_batch ครั้งเดียว
+    items_by_date = {}
+    for sel in valid:
+        pid = str(sel["point_id"]).strip().upper()
+        cfg = get_meter_config(pid)
+        report_col = (cfg.get("report_col", "") if cfg else "")
+        if not report_col:
+            out["report_fail"].append((pid, "ไม่มี report_col ใน PointsMaster"))
+            continue
+        d = _row_date(sel["timestamp"])
+        # จุดเดียวกันวันเดียวกันเลือกมาหลายแถว → แถวหลังสุดชนะ
+        items_by_date.setdefault(d, {})[pid] = {"point_id": pid, "value": sel["value"], "report_col": report_col}
+
+    if items_by_date:
+        result = export_month_grid_batch({d: list(m.values()) for d, m in items_by_date.items()})
+        for ok_pids, fail_list in result.values():
+            out["report_ok"].extend(ok_pids)
+            out["report_fail"].extend(fail_list)
+
+    logger.info(
+        f"👮 Approve: {len(out['approved'])} แถว | WaterReport {len(out['report_ok'])} OK"
+        f" / {len(out['report_fail'])} fail | ข้าม {len(out['failed'])}"
+    )
+    return out
@@ -0,0 +1,289 @@
+"""
+Archive - แบ่ง DailyReadings เป็น partition รายเดือน
+
+DailyReadings เป็นชีทเดียวที่โตขึ้นทุกวัน → อ่านทั้งชีท (full sync / scripts) ช้าลงทุกเดือน
+→ archive_closed_months(): ย้ายเดือนที่ปิดแล้ว (เก่ากว่า KEEP_MONTHS เดือนล่าสุด) ไปแท็บ DailyReadings_YYYY-MM
+   ในไฟล์เดียวกัน แล้วลบออกจากชีทหลัก (deleteDimension ทุกช่วงใน batch_update เดียว)
+   - รันซ้ำได้: แถวที่มีในแท็บ archive แล้วไม่ append ซ้ำ
+   - ก่อนลบอ่านทุกช่วงเต็มแถวอีกครั้งด้วย batch_get เดียว เทียบกับที่ archive ไป
+     ช่วงไหนเปลี่ยน (แถวเลื่อน / มีคนแก้ค่า-สถานะระหว่างนั้น เช่น approve) → ไม่ลบจากชีทหลัก
+     + ลบสำเนาเก่าในแท็บ archive ทิ้ง (รอบหน้า archive ค่าปัจจุบันใหม่) ใน batch_update เดียวกัน
+→ query_partitions(): ค้นแบบรู้ partition — ชีทหลักจาก local DB + เฉพาะเดือน archive ที่ทับช่วงวันที่
+   แท็บ archive ดึงครั้งเดียวเก็บใน local DB (เดือนปิดแล้วไม่เปลี่ยน; row_count ของแท็บเปลี่ยน → ดึงใหม่)
+   sort='ts' + limit → ไล่เดือนจากใกล้ไปไกล หยุดเมื่อได้ครบ (history guard ไม่ต้องแตะ archive เลยเกือบทุกครั้ง)
+
+วิธีใช้:
+  python -m meter_core.archive --dry-run     # ดูว่าจะย้ายกี่แถว
+  python -m meter_core.archive --keep 2      # ย้ายจริง (เก็บเดือนนี้ + เดือนก่อนไว้ในชีทหลัก)
+  (หรือ job 'archive' ใน collector_daemon)
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+
+from meter_core.config import DB_SHEET_NAME, get_thai_time
+from meter_core.dailyreadings import get_dailyreadings_mirror
+from meter_core.local_db import get_local_db, normalize_ts, query_readings
+from meter_core.sheets import _with_retry, get_handles, index_to_col
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+HOT_SHEET = "DailyReadings"
+ARCHIVE_PREFIX = "DailyReadings_"
+KEEP_MONTHS = int(os.environ.get("DAILYREADINGS_KEEP_MONTHS", "2"))  # เดือนล่าสุดที่อยู่ในชีทหลัก
+
+_archive_lock = threading.Lock()
+_fetch_lock = threading.Lock()
+
+
+def partition_title(month: str) -> str:
+    return f"{ARCHIVE_PREFIX}{month}"
+
+
+def month_of(value) -> str:
+    """timestamp / date → 'YYYY-MM' ('' ถ้าอ่านไม่ออก)"""
+    if hasattr(value, "year"):
+        return f"{value.year:04d}-{value.month:02d}"
+    return normalize_ts(value)[:7]
+
+
+def _shift_month(d: date, n: int) -> date:
+    k = d.year * 12 + (d.month - 1) + n
+    return date(k // 12, k % 12 + 1, 1)
+
+
+def _pad(row, n):
+    return ([str(v) for v in row] + [""] * n)[:n]
+
+
+def archived_months() -> list:
+    """เดือนที่มีแท็บ archive (เรียงเก่า → ใหม่) จากรายการแท็บที่ cache ไว้"""
+    months = []
+    for t in get_handles(DB_SHEET_NAME).titles():
+        if t.startswith(ARCHIVE_PREFIX):
+            m = t[len(ARCHIVE_PREFIX):]
+            if len(m) == 7 and m[4] == "-":
+                months.append(m)
+    return sorted(months)
+
+
+# ========================================
+# Archive job
+# ========================================
+def archive_closed_months(keep_months: int = KEEP_MONTHS, dry_run: bool = False, today: date = None) -> dict:
+    """
+    ย้ายแถวของเดือนที่เก่ากว่า keep_months เดือนล่าสุดออกจาก DailyReadings
+    คืนค่า {"cutoff", "months": {เดือน: จำนวนแถว}, "appended", "deleted", "changed", "dry_run"}
+    changed = แถวที่ถูกแก้ระหว่าง archive (ไม่ลบจากชีทหลัก, รอบหน้า archive ใหม่)
+    """
+    today = today or get_thai_time().date()
+    cutoff = month_of(_shift_month(today, -(max(1, int(keep_months)) - 1)))
+    out = {"cutoff": cutoff, "months": {}, "appended": 0, "deleted": 0, "changed": 0, "dry_run": dry_run}
+
+    with _archive_lock:
+        handles = get_handles(DB_SHEET_NAME)
+        ws = handles.worksheet(HOT_SHEET)
+        vals = _with_retry(ws.get_all_values)
+        if not vals:
+            return out
+        header = [str(h) for h in vals[0]]
+        n = len(header)
+
+        by_month = {}  # เดือน → [(เลขแถว, แถว)]
+        for i, row in enumerate(vals[1:], start=2):
+            m = month_of(row[0] if row else "")
+            if m and m < cutoff:
+                by_month.setdefault(m, []).append((i, _pad(row, n)))
+        out["months"] = {m: len(v) for m, v in sorted(by_month.items())}
+        if not by_month or dry_run:
+            logger.info(f"🗃️ Archive (cutoff {cutoff}): {out['months'] or 'ไม่มีเดือนที่ต้องย้าย'}")
+            return out
+
+        # 1) append ลงแท็บ archive ของแต่ละเดือน (ข้ามแถวที่มีอยู่แล้ว)
+        sh = handles.spreadsheet()
+        titles = set(handles.titles())
+        db = get_local_db()
+        tabs = {}  # เดือน → (แท็บ archive, แถวทั้งแท็บ)
+        for m, items in sorted(by_month.items()):
+            title = partition_title(m)
+            rows = [r for _i, r in items]
+            if title in titles:
+                ws_a = handles.worksheet(title)
+                existing = [_pad(r, n) for r in _with_retry(ws_a.get_all_values)[1:]]
+                seen = {tuple(r) for r in existing}
+                new_rows = [r for r in rows if tuple(r) not in seen]
+                if new_rows:
+                    _with_retry(ws_a.append_rows, new_rows, value_input_option="USER_ENTERED")
+            else:
+                existing, new_rows = [], rows
+                ws_a = _with_retry(sh.add_worksheet, title=title, rows=len(rows) + 1, cols=n)
+                _with_retry(ws_a.append_rows, [header] + rows, value_input_option="USER_ENTERED")
+                handles.invalidate()
+            out["appended"] += len(new_rows)
+            # write-through: partition ในเครื่อง = ทั้งแท็บ (version = จำนวนแถวรวม header)
+            all_rows = existing + new_rows
+            tabs[m] = (ws_a, all_rows)
+            db.ar_replace(m, header, all_rows, version=len(all_rows) + 1)
+
+        # 2) ลบออกจากชีทหลัก: อ่านทุกช่วงเต็มแถวอีกครั้ง (batch_get เดียว) เทียบกับที่ archive ไป
+        row_map = {i: r for items in by_month.values() for i, r in items}
+        month_of_row = {i: m for m, items in by_month.items() for i, _r in items}
+        runs = []
+        for i in sorted(row_map):
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+
+        current = _with_retry(ws.batch_get, [f"A{a}:{index_to_col(n)}{b}" for a, b in runs])
+        clean, changed = [], []
+        for (a, b), vr in zip(runs, current):
+            now_rows = [_pad(r, n) for r in (vr or [])]
+            now_rows += [[""] * n] * (b - a + 1 - len(now_rows))
+            same = all(now_rows[i - a] == row_map[i] for i in range(a, b + 1))
+            (clean if same else changed).append((a, b))
+
+        requests = [
+            {"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": a - 1, "endIndex": b,
+            }}}
+            for a, b in sorted(clean, reverse=True)  # ลบจากล่างขึ้นบน → เลขแถวด้านบนไม่เลื่อน
+        ]
+
+        # ช่วงที่เปลี่ยน: ไม่ลบจากชีทหลัก + เอาสำเนาเก่าออกจากแท็บ archive (กันค่าเก่าค้างใน archive)
+        if changed:
+            keep = {tuple(row_map[i]) for a, b in clean for i in range(a, b + 1)}
+            stale = {}  # เดือน → {แถวเก่าใน archive}
+            for a, b in changed:
+                for i in range(a, b + 1):
+                    if tuple(row_map[i]) not in keep:
+                        stale.setdefault(month_of_row[i], set()).add(tuple(row_map[i]))
+            for m, rows_m in stale.items():
+                ws_a, all_rows = tabs[m]
+                drop = {k for k, r in enumerate(all_rows) if tuple(r) in rows_m}
+                requests += [
+                    {"deleteDimension": {"range": {
+                        "sheetId": ws_a.id, "dimension": "ROWS", "startIndex": k + 1, "endIndex": k + 2,
+                    }}}
+                    for k in sorted(drop, reverse=True)
+                ]
+                remaining = [r for k, r in enumerate(all_rows) if k not in drop]
+                tabs[m] = (ws_a, remaining)
+            out["changed"] = sum(b - a + 1 for a, b in changed)
+            logger.warning(
+                f"⚠️ Archive: {out['changed']} แถวถูกแก้ระหว่าง archive — ยังไม่ลบจากชีทหลัก รอบหน้า archive ค่าใหม่"
+            )
+
+        if requests:
+            _with_retry(sh.batch_update, {"requests": requests})
+            out["deleted"] = sum(b - a + 1 for a, b in clean)
+            for m in {month_of_row[i] for a, b in changed for i in range(a, b + 1)}:
+                rows_m = tabs[m][1]
+                db.ar_replace(m, header, rows_m, version=len(rows_m) + 1)
+
+        # ชีทหลักเปลี่ยนทั้งก้อน → mirror / local DB โหลดใหม่รอบหน้า
+        get_dailyreadings_mirror().invalidate()
+
+    logger.info(
+        f"🗃️ Archive (cutoff {cutoff}): {out['months']} | append {out['appended']} | ลบจากชีทหลัก {out['deleted']}"
+        + (f" | ถูกแก้ระหว่างทาง {out['changed']}" if out["changed"] else "")
+    )
+    return out
+
+
+# ========================================
+# Partition-aware reader
+# ========================================
+def load_partition(month: str, force: bool = False) -> bool:
+    """ดึงแท็บ archive ของเดือนนั้นลง local DB (ถ้ายังไม่มี / row_count เปลี่ยน) — คืน True ถ้ามีแท็บ"""
+    handles = get_handles(DB_SHEET_NAME)
+    try:
+        ws_a = handles.worksheet(partition_title(month))
+    except LookupError:
+        return False
+    version = getattr(ws_a, "row_count", None)
+    db = get_local_db()
+    with _fetch_lock:
+        cached = db.ar_months()
+        if not force and month in cached and (version is None or cached[month] == version):
+            return True
+        vals = _with_retry(ws_a.get_all_values)
+        if vals:
+            header = [str(h) for h in vals[0]]
+            db.ar_replace(month, header, [_pad(r, len(header)) for r in vals[1:]], version=version)
+            logger.info(f"🗃️ Archive: ดึง {partition_title(month)} {len(vals) - 1} แถวลง local DB")
+    return True
+
+
+def _month_bounds(since, until):
+    lo = (month_of(since) or str(since)[:7]) if since is not None else ""
+    hi = (month_of(until) or str(until)[:7]) if until is not None else "9999-99"
+    return lo, hi
+
+
+def query_partitions(point_id=None, status=None, exclude_status=None, since=None, until=None,
+                     sort: str = "ts", order: str = "asc", limit: int = None) -> list:
+    """
+    เหมือน query_readings() แต่รวมแท็บ archive รายเดือนที่ทับช่วง since..until ด้วย
+    แถวจาก archive มี '_partition' = เดือน (ไม่มี = ชีทหลัก)
+    sort='ts' + limit → อ่าน archive เฉพาะเท่าที่ต้องใช้
+      desc: ชีทหลักได้ครบแล้วไม่แตะ archive / ไม่ครบ → ไล่เดือนใหม่ → เก่า
+      asc : ไล่เดือนเก่า → ใหม่ จน archive ได้ครบ limit
+    """
+    kw = dict(point_id=point_id, status=status, exclude_status=exclude_status, since=since, until=until,
+              sort=sort, order=order, limit=limit)
+    desc = str(order).lower() == "desc"
+    hot = query_readings(**kw)
+    bounded = bool(limit) and sort == "ts"
+    need = (limit - len(hot) if desc else limit) if bounded else None
+    if bounded and need <= 0:
+        return hot
+
+    lo, hi = _month_bounds(since, until)
+    try:
+        months = [m for m in archived_months() if lo <= m <= hi]
+    except Exception as e:
+        logger.warning(f"⚠️ Archive: อ่านรายการแท็บไม่ได้ ({e}) — ใช้เฉพาะชีทหลัก")
+        return hot
+
+    db = get_local_db()
+    archived = []
+    for m in sorted(months, reverse=desc):
+        if bounded and len(archived) >= need:
+            break
+        try:
+            if not load_partition(m):
+                continue
+        except Exception as e:
+            logger.warning(f"⚠️ Archive: ดึง {partition_title(m)} ไม่ได้: {e}")
+            continue
+        archived.extend(db.readings(partition=m, **kw))
+
+    out = hot + archived
+    if sort == "ts":
+        out.sort(key=lambda r: normalize_ts(r.get("timestamp")), reverse=desc)
+    return out[:limit] if limit else out
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="🗃️ ย้ายเดือนที่ปิดแล้วของ DailyReadings ไปแท็บรายเดือน")
+    parser.add_argument("--keep", type=int, default=KEEP_MONTHS, help=f"จำนวนเดือนล่าสุดที่เก็บในชีทหลัก (default {KEEP_MONTHS})")
+    parser.add_argument("--dry-run", action="store_true", help="แค่แสดงว่าจะย้ายกี่แถว")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    out = archive_closed_months(keep_months=args.keep, dry_run=args.dry_run)
+    print(f"🗃️ cutoff {out['cutoff']} | {out['months']}")
+    if not args.dry_run:
+        print(f"   append {out['appended']} | ลบจากชีทหลัก {out['deleted']} | ถูกแก้ระหว่างทาง {out['changed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+ขั้นตอนที่ collectors (WT / UF / auto_processor) ใช้ร่วมกัน
+ผล extract → แถว DailyReadings + รายการ WaterReport → เขียน Google Sheets
+(ค่าที่ส่งไม่ได้เพราะเน็ต/quota เก็บเข้า outbox แทนการทิ้ง)
+"""
+
+import logging
+from datetime import datetime
+
+from meter_core.config import DB_SHEET_NAME, REAL_REPORT_SHEET, get_gc, get_thai_time
+from meter_core.dailyreadings import upsert_dailyreadings
+from meter_core.metrics import timed
+from meter_core.outbox import (
+    ST_DEAD,
+    Outbox,
+    is_retryable_error,
+    queue_dailyreadings_rows,
+    queue_report_items,
+)
+from meter_core.sheets import (
+    _with_retry,
+    export_many_to_real_report_batch,
+    export_month_grid_batch,
+    find_month_sheet_name,
+    get_meter_config,
+    infer_meter_type,
+    is_empty_only_mode,
+    report_cell_a1,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def build_dailyreadings_rows(ok_results, report_date, inspector, method, default_meter_type="Water"):
+    """แปลงผล extract (status OK) เป็นแถว DailyReadings (timestamp = วันที่รายงาน + เวลาปัจจุบัน)"""
+    rows = []
+    for r in ok_results:
+        pid = str(r["point_id"]).strip().upper()
+        val = r["value"]
+
+        try:
+            cfg = get_meter_config(pid)
+            meter_type = infer_meter_type(cfg) if cfg else default_meter_type
+        except Exception:
+            meter_type = default_meter_type
+
+        try:
+            current_time = get_thai_time().time()
+            record_ts = datetime.combine(report_date, current_time).strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            record_ts = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
+
+        rows.append([
+            record_ts,
+            meter_type,
+            pid,
+            inspector,  # inspector
+            val,        # Manual_Value
+            val,        # AI_Value
+            method,     # method
+            "-"         # image_url
+        ])
+    return rows
+
+
+def build_report_items(ok_results, log=logger):
+    """
+    แปลงผล extract เป็น items สำหรับ export_many_to_real_report_batch
+    คืนค่า (items, fails) — fails = [(pid, reason)] ของจุดที่ไม่มี config/report_col
+    """
+    items = []
+    fails = []
+    for r in ok_results:
+        pid = str(r["point_id"]).strip().upper()
+        val = r["value"]
+
+        try:
+            cfg = get_meter_config(pid)
+            if not cfg:
+                log.warning(f"   ⚠️ {pid}: ไม่พบ config ใน PointsMaster")
+                fails.append((pid, "NO_CONFIG"))
+                continue
+
+            report_col = str(cfg.get("report_col", "") or "").strip()
+            if not report_col or report_col in ("-", "—", "–"):
+                log.warning(f"   ⚠️ {pid}: report_col ว่าง/'-'")
+                fails.append((pid, "NO_REPORT_COL"))
+                continue
+
+            # แปลงค่าให้เป็นตัวเลข
+            write_val = val
+            try:
+                write_val = float(str(val).replace(",", "").strip())
+            except Exception:
+                write_val = str(val).strip()
+
+            items.append({
+                "point_id": pid,
+                "value": write_val,
+                "report_col": report_col,
+            })
+        except Exception as e:
+            log.error(f"   ❌ {pid}: {e}")
+            fails.append((pid, str(e)))
+    return items, fails
+
+
+def _write_dailyreadings(db_rows, inspector, outbox, log, metrics, stats):
+    """
+    upsert แถว DailyReadings (รันซ้ำวันเดิม → แก้แถวเดิม ไม่ append ซ้ำ)
+    ส่งไม่ได้เพราะเน็ต/quota → เฉพาะแถวที่ยังไม่ได้เขียนเข้า outbox
+    """
+    unsent = db_rows
+    try:
+        with timed(metrics, "dailyreadings_write"):
+            ok_db, db_msg, unsent = upsert_dailyreadings(db_rows)
+    except Exception as e:
+        ok_db, db_msg = False, str(e)
+
+    stats["db_ok"], stats["db_msg"] = ok_db, db_msg
+    if ok_db:
+        log.info(f"✅ DailyReadings: {db_msg}")
+    elif outbox is not None and is_retryable_error(db_msg):
+        n = queue_dailyreadings_rows(outbox, unsent, DB_SHEET_NAME, source=inspector)
+        stats["queued"] += n
+        log.warning(f"📥 DailyReadings ส่งไม่ได้ ({db_msg}) — เก็บเข้า outbox {n} แถว")
+    else:
+        log.error(f"❌ DailyReadings ล้มเหลว: {db_msg}")
+
+
+def _settle_report_result(report_items, report_date, ok_pids, fail_report, *, inspector, write_mode,
+                          outbox, log, stats):
+    """
+    นับผล WaterReport ของ 1 วัน: success / skipped / failed
+    จุดที่ fail เพราะเน็ต/quota → เก็บเข้า outbox แทนการทิ้งค่า
+    คืนค่า real_fails (หลังตัดที่เข้า outbox แล้ว)
+    """
+    stats["success"] += len(ok_pids)
+
+    # แยก skip กับ error
+    skipped = [(p, r) for p, r in fail_report if str(r) == "SKIP_NON_EMPTY"]
+    real_fails = [(p, r) for p, r in fail_report if str(r) != "SKIP_NON_EMPTY"]
+    stats["skipped"] += len(skipped)
+
+    # เน็ตหลุด/quota → เก็บเข้า outbox แทนการทิ้งค่า
+    retry_pids = {p for p, r in real_fails if is_retryable_error(r)} if outbox is not None else set()
+    if retry_pids:
+        n = queue_report_items(
+            outbox,
+            [it for it in report_items if it["point_id"] in retry_pids],
+            report_date,
+            REAL_REPORT_SHEET,
+            only_if_empty=is_empty_only_mode(write_mode),
+            source=inspector,
+        )
+        stats["queued"] += n
+        log.warning(f"📥 WaterReport {report_date} ส่งไม่ได้ — เก็บเข้า outbox {n} จุด")
+        real_fails = [(p, r) for p, r in real_fails if p not in retry_pids]
+
+    stats["failed"] += len(real_fails)
+    return skipped, real_fails
+
+
+def save_collected_values(ok_results, report_date, *, inspector, method, write_mode="overwrite",
+                          default_meter_type="Water", outbox: Outbox = None, log=logger,
+                          metrics=None) -> dict:
+    """
+    บันทึกผล extract ลง DailyReadings + WaterReport
+    (metrics: RunMetrics ของรอบนี้ → จับเวลา stage dailyreadings_write / waterreport_write)
+
+    Returns:
+        dict: success / failed / skipped / queued / db_ok / db_msg
+    """
+    stats = {"success": 0, "failed": 0, "skipped": 0, "queued": 0, "db_ok": False, "db_msg": ""}
+
+    # 1. DailyReadings (log)
+    log.info("📝 กำลังบันทึกลง DailyReadings...")
+    db_rows = build_dailyreadings_rows(ok_results, report_date, inspector, method, default_meter_type)
+    _write_dailyreadings(db_rows, inspector, outbox, log, metrics, stats)
+
+    # 2. WaterReport
+    log.info(f"📝 กำลังบันทึกลง WaterReport (วันที่: {report_date})...")
+    report_items, item_fails = build_report_items(ok_results, log=log)
+    stats["failed"] += len(item_fails)
+
+    if not report_items:
+        log.warning("⚠️ ไม่มีข้อมูลให้บันทึกลง WaterReport")
+        return stats
+
+    with timed(metrics, "waterreport_write"):
+        ok_pids, fail_report = export_many_to_real_report_batch(
+            report_items,
+            report_date,   # ← วันที่รายงาน
+            debug=True,
+            write_mode=write_mode,
+        )
+
+    skipped, real_fails = _settle_report_result(
+        report_items, report_date, ok_pids, fail_report,
+        inspector=inspector, write_mode=write_mode, outbox=outbox, log=log, stats=stats,
+    )
+
+    log.info(f"✅ WaterReport: บันทึกสำเร็จ {len(ok_pids)} จุด")
+    if skipped:
+        log.info(f"⏭️ ข้าม {len(skipped)} จุด (ช่องมีข้อมูลแล้ว)")
+    if real_fails:
+        log.error(f"❌ ล้มเหลว {len(real_fails)} จุด:")
+        for pid, reason in real_fails:
+            log.error(f"   - {pid}: {reason}")
+
+    return stats
+
+
+def save_collected_values_range(results_by_date: dict, *, inspector, method, write_mode="overwrite",
+                                default_meter_type="Water", outbox: Outbox = None, log=logger,
+                                metrics=None) -> dict:
+    """
+    Backfill: บันทึกผล extract หลายวันพร้อมกัน
+    - DailyReadings: upsert ครั้งเดียวทุกวัน (batch_update แถวเดิม + append_rows แถวใหม่)
+    - WaterReport: 1 batch_update ต่อแท็บเดือน (export_month_grid_batch)
+
+    results_by_date: {report_date: ok_results}
+    Returns:
+        dict: success / failed / skipped / queued / db_ok / db_msg + by_date {"YYYY-MM-DD": {success, failed, skipped}}
+    """
+    stats = {"success": 0, "failed": 0, "skipped": 0, "queued": 0, "db_ok": False, "db_msg": "", "by_date": {}}
+    results_by_date = {d: r for d, r in results_by_date.items() if r}
+    if not results_by_date:
+        log.warning("⚠️ ไม่มีข้อมูลให้บันทึก")
+        return stats
+
+    # 1. DailyReadings — ทุกวันรวมกัน
+    log.info(f"📝 กำลังบันทึกลง DailyReadings ({len(results_by_date)} วัน)...")
+    db_rows = []
+    for d in sorted(results_by_date):
+        db_rows.extend(build_dailyreadings_rows(results_by_date[d], d, inspector, method, default_meter_type))
+    _write_dailyreadings(db_rows, inspector, outbox, log, metrics, stats)
+
+    # 2. WaterReport — รวมเป็น grid ต่อเดือน
+    items_by_date = {}
+    for d in sorted(results_by_date):
+        items, item_fails = build_report_items(results_by_date[d], log=log)
+        stats["failed"] += len(item_fails)
+        stats["by_date"][str(d)] = {"success": 0, "failed": len(item_fails), "skipped": 0}
+        if items:
+            items_by_date[d] = items
+
+    if not items_by_date:
+        log.warning("⚠️ ไม่มีข้อมูลให้บันทึกลง WaterReport")
+        return stats
+
+    log.info(f"📝 กำลังบันทึกลง WaterReport ({min(items_by_date)} → {max(items_by_date)})...")
+    with timed(metrics, "waterreport_write"):
+        grid_result = export_month_grid_batch(items_by_date, write_mode=write_mode)
+
+    for d, (ok_pids, fail_report) in sorted(grid_result.items()):
+        day_stats = {"success": 0, "failed": 0, "skipped": 0, "queued": 0}
+        skipped, real_fails = _settle_report_result(
+            items_by_date[d], d, ok_pids, fail_report,
+            inspector=inspector, write_mode=write_mode, outbox=outbox, log=log, stats=day_stats,
+        )
+        for k in day_stats:
+            stats[k] += day_stats[k]
+        for k in ("success", "skipped", "failed"):
+            stats["by_date"][str(d)][k] += day_stats[k]
+
+        log.info(
+            f"   📅 {d}: สำเร็จ {len(ok_pids)} / ข้าม {len(skipped)} / ล้มเหลว {len(real_fails)}"
+            + (f" / outbox {day_stats['queued']}" if day_stats["queued"] else "")
+        )
+        for pid, reason in real_fails:
+            log.error(f"      - {pid}: {reason}")
+
+    return stats
+
+
+# =========================================================
+# --- 📤 OUTBOX ---
+# =========================================================
+def outbox_flush_kwargs() -> dict:
+    return {
+        "resolve_month_tab": find_month_sheet_name,
+        "call": _with_retry,
+        "upsert_rows": upsert_dailyreadings,
+        "resolve_report_cell": report_cell_a1,
+    }
+
+
+def flush_outbox(outbox: Outbox, log=logger, retry_dead: bool = False) -> dict:
+    """
+    ส่งค่าที่ค้างใน outbox (ถ้ามี)
+    retry_dead=True (--flush-outbox) → ย้ายรายการ dead กลับมาส่งใหม่ก่อน แล้วรายงานที่ยัง dead อยู่
+    """
+    if retry_dead:
+        revived = outbox.requeue_dead()
+        if revived:
+            log.info(f"📤 Outbox: ส่งรายการ dead ใหม่ {revived} รายการ")
+
+    result = {"sent": 0, "skipped": 0, "failed": 0, "dead": 0, "errors": []}
+    pending = outbox.pending_count()
+    if pending:
+        log.info(f"📤 Outbox: มีค่าค้าง {pending} รายการ — กำลังส่ง...")
+        result = outbox.flush(get_gc(), **outbox_flush_kwargs())
+        log.info(
+            f"📤 Outbox: ส่งแล้ว {result['sent']} / ข้าม {result['skipped']} / ค้าง {outbox.pending_count()}"
+            f" / dead {outbox.dead_count()}"
+        )
+
+    if retry_dead or result["dead"]:
+        for ss, ws, kind, state, count, attempts, err in outbox.pending_summary():
+            if state == ST_DEAD:
+                log.warning(f"🪦 Outbox dead: {ss}/{ws} ({kind}) {count} รายการ, ส่ง {attempts} ครั้ง — {err}")
+    return result
+
+
+def start_outbox_flusher(outbox: Outbox, interval: float = 120):
+    """scheduled/watch mode: ส่งของค้างเป็นระยะ (เมื่อเน็ตกลับมา)"""
+    return outbox.start_background_flusher(get_gc, interval=interval, **outbox_flush_kwargs())
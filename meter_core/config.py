@@ -0,0 +1,122 @@
+"""
+Config + Credentials + Clients (ใช้ร่วมกันระหว่าง app.py กับ collectors)
+
+- ไม่มี Streamlit
+- gspread / Vision / Storage สร้างตอนเรียกใช้ครั้งแรก (collector ไม่ต้องโหลด Vision/Storage เลย)
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+# =========================================================
+# --- 📦 CONFIGURATION ---
+# =========================================================
+DB_SHEET_NAME = 'WaterMeter_System_DB'
+REAL_REPORT_SHEET = 'FM-OP-01-10WaterReport'
+BUCKET_NAME = 'water-meter-images-watertreatmentplant'
+FIXED_FOLDER_ID = '1XH4gKYb73titQLrgp4FYfLT2jzYRgUpO'
+
+GCP_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/cloud-platform",
+]
+
+SERVICE_ACCOUNT_FILE = 'service_account.json'
+
+
+# =========================================================
+# --- 🕒 TIMEZONE HELPER ---
+# =========================================================
+def get_thai_time():
+    """คืนค่าเวลาปัจจุบันในโซนไทย (UTC+7)"""
+    tz = timezone(timedelta(hours=7))
+    return datetime.now(tz)
+
+
+# =========================================================
+# --- 🔑 CREDENTIALS ---
+# =========================================================
+_lock = threading.Lock()
+_creds = None
+_clients = {}
+
+
+def _creds_from_info(key_dict):
+    from google.oauth2 import service_account
+
+    if 'private_key' in key_dict:
+        key_dict['private_key'] = key_dict['private_key'].replace('\\n', '\n')
+    return service_account.Credentials.from_service_account_info(key_dict, scopes=GCP_SCOPES)
+
+
+def load_credentials(secrets_json=None):
+    """
+    โหลด service account ตามลำดับ:
+    1) env GCP_SERVICE_ACCOUNT_JSON (Cloud Run)
+    2) secrets_json (เช่น st.secrets['gcp_service_account'])
+    3) ไฟล์ service_account.json (เครื่อง local / collectors)
+    คืนค่า Credentials หรือ None
+    """
+    if os.getenv('GCP_SERVICE_ACCOUNT_JSON'):
+        return _creds_from_info(json.loads(os.getenv('GCP_SERVICE_ACCOUNT_JSON')))
+
+    if secrets_json:
+        return _creds_from_info(json.loads(secrets_json))
+
+    for path in (SERVICE_ACCOUNT_FILE, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SERVICE_ACCOUNT_FILE)):
+        if os.path.exists(path):
+            from google.oauth2 import service_account
+            return service_account.Credentials.from_service_account_file(path, scopes=GCP_SCOPES)
+
+    return None
+
+
+def install_credentials(creds):
+    """ใช้ credentials ที่โหลดไว้แล้ว (app.py เรียกหลังโหลดจาก st.secrets)"""
+    global _creds
+    with _lock:
+        _creds = creds
+        _clients.clear()
+
+
+def get_credentials():
+    global _creds
+    with _lock:
+        if _creds is None:
+            _creds = load_credentials()
+            if _creds is None:
+                raise RuntimeError("❌ No GCP credentials found (GCP_SERVICE_ACCOUNT_JSON / service_account.json)")
+        return _creds
+
+
+def _client(name, factory):
+    creds = get_credentials()
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory(creds)
+        return _clients[name]
+
+
+def get_gc():
+    """gspread client (สร้างครั้งเดียวต่อ process)"""
+    def _make(creds):
+        import gspread
+        return gspread.authorize(creds)
+    return _client("gspread", _make)
+
+
+def get_vision_client():
+    def _make(creds):
+        from google.cloud import vision
+        return vision.ImageAnnotatorClient(credentials=creds)
+    return _client("vision", _make)
+
+
+def get_storage_client():
+    def _make(creds):
+        from google.cloud import storage
+        return storage.Client(credentials=creds)
+    return _client("storage", _make)
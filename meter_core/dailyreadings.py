@@ -0,0 +1,333 @@
+"""
+DailyReadings Mirror - สำเนา DailyReadings ในเครื่องที่อัพเดทแบบเพิ่มเฉพาะแถวใหม่
+
+เดิม load_dailyreadings_tail เรียก ws.get_all_values() ทั้งชีท (โตขึ้นทุกวัน) ทุก 5 นาที ต่อ process
+→ เก็บแถวไว้ในเครื่อง + จำจำนวนแถวที่ sync แล้ว (n)
+→ รอบถัดไปอ่านแค่ A{n}:H (แถวสุดท้ายที่รู้จัก + แถวใหม่) ด้วย ranged get 1 ครั้ง
+   แถวสุดท้ายไม่ตรงกับที่เก็บไว้ (มีคนลบ/แทรกแถว) → โหลดทั้งชีทใหม่
+- แถวใหม่ต่อท้าย DataFrame เดิม (ไม่สร้างใหม่ทั้งก้อน)
+- เก็บลง SQLite (meter_core.local_db, เพิ่มเฉพาะแถวใหม่) → เปิด process ใหม่ไม่ต้องโหลดทั้งชีท
+  + query แบบมี index ได้จาก LocalDB.readings()
+- แถวที่ถูกแก้ในชีท (เช่น Admin Approve) ให้เรียก patch() ตามหลัง เพราะ sync เห็นแค่แถวใหม่
+- upsert_dailyreadings(): key (วันที่, point_id, inspector/source) ซ้ำ → แก้แถวเดิม แทนการ append ใหม่
+  (collectors รันซ้ำ / bulk บันทึกซ้ำ ไม่ทำให้ชีทโตขึ้น)
+
+⚠️ pandas import ตอนสร้าง DataFrame ครั้งแรก (collectors ที่ไม่ใช้ไม่ต้องโหลด)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from meter_core.config import DB_SHEET_NAME
+from collections import OrderedDict
+
+from meter_core.local_db import LocalDB, get_local_db, normalize_ts
+from meter_core.sheets import _with_retry, append_rows_dailyreadings, get_handles, index_to_col
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_TTL = 60  # วินาที
+
+
+class DailyReadingsMirror:
+    """สำเนา DailyReadings ในเครื่อง (thread-safe)"""
+
+    def __init__(self, get_ws, store: LocalDB, ttl: float = DEFAULT_TTL, call=None, spreadsheet: str = ""):
+        """
+        Args:
+            get_ws: fn() -> gspread Worksheet ของ DailyReadings
+            store: LocalDB ที่เก็บแถว (SQLite)
+            ttl: อายุของข้อมูล (วินาที) ก่อน sync รอบถัดไป
+            call: wrapper สำหรับเรียก API (เช่น _with_retry) — None = เรียกตรง
+            spreadsheet: ชื่อไฟล์ (เช็คว่าข้อมูลใน store เป็นของไฟล์เดียวกัน)
+        """
+        self._get_ws = get_ws
+        self.store = store
+        self.ttl = float(ttl)
+        self.spreadsheet = spreadsheet
+        self._call = call or (lambda fn, *a, **kw: fn(*a, **kw))
+        self._lock = threading.RLock()
+        self._header = None
+        self._rows = []
+        self._df = None
+        self._df_rows = 0  # จำนวนแถวใน _rows ที่อยู่ใน _df แล้ว
+        self._synced_at = 0.0
+        self._force_full = False
+        self.last_fetched = 0  # จำนวนแถวที่อ่านจาก Sheets ในรอบล่าสุด
+
+    # ---------- public ----------
+
+    def frame(self, limit: int = None):
+        """DataFrame ของ DailyReadings (limit → เฉพาะท้าย ๆ) — คืนสำเนา แก้ไขได้"""
+        import pandas as pd
+
+        with self._lock:
+            self._ensure_fresh()
+            if self._header is None:
+                return pd.DataFrame()
+            self._extend_frame(pd)
+            df = self._df.tail(limit) if limit else self._df
+            return df.reset_index(drop=True).copy()
+
+    def rows(self) -> tuple:
+        """(header, rows) — rows[i] คือแถวที่ i + 2 ในชีท"""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._header or []), [list(r) for r in self._rows]
+
+    def sync(self, full: bool = False) -> int:
+        """ดึงแถวใหม่จาก Sheets (full=True → โหลดทั้งชีท) คืนจำนวนแถวใหม่"""
+        with self._lock:
+            if self._header is None and not full:
+                self._load_disk()
+            if full or self._force_full or self._header is None:
+                return self._full_load()
+            return self._incremental()
+
+    def patch(self, row_number: int, values: dict):
+        """อัพเดทค่าที่เพิ่งเขียนลงแถวเดิมในชีท: values = {เลขคอลัมน์ (1-based): ค่า}"""
+        with self._lock:
+            i = int(row_number) - 2
+            if self._header is not None and 0 <= i < len(self._rows):
+                for col, v in values.items():
+                    if 1 <= int(col) <= len(self._header):
+                        self._rows[i][int(col) - 1] = str(v)
+                        if self._df is not None and i < self._df_rows:
+                            self._df.iat[i, int(col) - 1] = str(v)
+            # แถวที่ยังไม่ได้ sync เข้า memory (บันทึกไว้ตอน append) ก็แก้ใน store ด้วย
+            self._store(self.store.dr_patch, int(row_number), values)
+
+    def refresh_if_stale(self):
+        """sync ถ้าเกิน TTL (ใช้ก่อน query LocalDB โดยตรง)"""
+        with self._lock:
+            self._ensure_fresh()
+
+    def invalidate(self):
+        """แถวในชีทเลื่อน (ลบ/แทรก) → sync รอบถัดไปโหลดทั้งชีท"""
+        with self._lock:
+            self._force_full = True
+            self._synced_at = 0.0
+
+    def age_seconds(self) -> float:
+        return time.time() - self._synced_at if self._synced_at else float("inf")
+
+    # ---------- internals ----------
+
+    def _ensure_fresh(self):
+        if self._header is None or self.age_seconds() >= self.ttl:
+            try:
+                self.sync()
+            except Exception as e:
+                if self._header is None:
+                    raise
+                logger.warning(f"⚠️ DailyReadings mirror: sync ไม่ได้ ใช้ข้อมูลเดิม ({e})")
+
+    def _pad(self, row) -> list:
+        row = [str(v) for v in (row or [])]
+        n = len(self._header)
+        return (row + [""] * n)[:n]
+
+    def _full_load(self) -> int:
+        ws = self._get_ws()
+        vals = self._call(ws.get_all_values)
+        self._header = [str(h) for h in vals[0]] if vals else []
+        self._rows = [self._pad(r) for r in vals[1:]]
+        self._df = None
+        self._df_rows = 0
+        self._synced_at = time.time()
+        self._force_full = False
+        self.last_fetched = len(vals)
+        self._store(self.store.dr_replace, self.spreadsheet, self._header, self._rows)
+        logger.info(f"✅ DailyReadings mirror: โหลดทั้งชีท {len(self._rows)} แถว")
+        return len(self._rows)
+
+    def _incremental(self) -> int:
+        if not self._header:
+            return self._full_load()
+
+        # แถวสุดท้ายที่รู้จัก (header ถ้ายังไม่มีข้อมูล) + ทุกแถวหลังจากนั้น
+        last_row = len(self._rows) + 1
+        ws = self._get_ws()
+        got = self._call(ws.get, f"A{last_row}:{index_to_col(len(self._header))}")
+        got = list(got or [])
+        self.last_fetched = len(got)
+
+        expected = self._header if last_row == 1 else self._rows[-1]
+        if not got or self._pad(got[0]) != expected:
+            logger.info("🔄 DailyReadings mirror: แถวเดิมเปลี่ยน (ลบ/แทรกแถว) → โหลดทั้งชีทใหม่")
+            return self._full_load()
+
+        new_rows = [self._pad(r) for r in got[1:]]
+        self._rows.extend(new_rows)
+        self._synced_at = time.time()
+        if new_rows:
+            self._store(self.store.dr_append, self._header, last_row + 1, new_rows)
+            logger.info(f"✅ DailyReadings mirror: +{len(new_rows)} แถว (รวม {len(self._rows)})")
+        return len(new_rows)
+
+    def _extend_frame(self, pd):
+        if self._df is None:
+            self._df = pd.DataFrame(self._rows, columns=self._header)
+            self._df_rows = len(self._rows)
+        elif self._df_rows < len(self._rows):
+            tail = pd.DataFrame(self._rows[self._df_rows:], columns=self._header)
+            self._df = pd.concat([self._df, tail], ignore_index=True)
+            self._df_rows = len(self._rows)
+
+    def _load_disk(self):
+        try:
+            header, rows = self.store.dr_load(self.spreadsheet)
+            if header is None:
+                return
+            self._header = [str(h) for h in header]
+            self._rows = [self._pad(r) for r in rows]
+            self._df = None
+            self._df_rows = 0
+            # ข้อมูลจากดิสก์ต้อง sync ก่อนใช้ (แค่ถือเป็นจุดเริ่ม → ไม่ต้องโหลดทั้งชีท)
+            self._synced_at = 0.0
+            logger.info(f"💾 DailyReadings mirror: โหลดจาก local DB {len(self._rows)} แถว")
+        except Exception as e:
+            self._header = None
+            self._rows = []
+            logger.warning(f"⚠️ DailyReadings mirror: อ่าน local DB ไม่ได้: {e}")
+
+    def _store(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f"⚠️ DailyReadings mirror: บันทึกลง local DB ไม่ได้: {e}")
+
+
+_MIRROR = None
+_mirror_lock = threading.Lock()
+
+
+def get_dailyreadings_mirror() -> DailyReadingsMirror:
+    """DailyReadings mirror ของ process นี้ (สร้างครั้งเดียว)"""
+    global _MIRROR
+    with _mirror_lock:
+        if _MIRROR is None:
+            _MIRROR = DailyReadingsMirror(
+                lambda: get_handles(DB_SHEET_NAME).worksheet("DailyReadings"),
+                get_local_db(),
+                ttl=float(os.environ.get("DAILYREADINGS_MIRROR_TTL", str(DEFAULT_TTL))),
+                call=_with_retry,
+                spreadsheet=DB_SHEET_NAME,
+            )
+        return _MIRROR
+
+
+# ========================================
+# Upsert: (วันที่, point_id, inspector) → แถวเดิมในชีท
+# ========================================
+def reading_key(row) -> tuple:
+    """key ของแถว DailyReadings: (วันที่, point_id, inspector/source) — ตำแหน่งเดียวกับ dailyreadings_row"""
+    row = list(row) + [""] * 4
+    day = normalize_ts(row[0])[:10] or str(row[0]).strip()[:10]
+    return day, str(row[2]).strip().upper(), str(row[3]).strip()
+
+
+def _rendered_rows(resp, updates) -> list:
+    """ค่าที่ชีท render แล้ว (FORMATTED_VALUE) ของแต่ละแถวจากผล batch_update — ไม่มี → str(ค่าที่ส่ง)"""
+    responses = (resp.get("responses") or []) if isinstance(resp, dict) else []
+    out = []
+    for i, (_row_no, r) in enumerate(updates):
+        vals = ((responses[i].get("updatedData") or {}).get("values") or [[]]) if i < len(responses) else None
+        if vals is None:
+            out.append([str(v) for v in r])
+        else:
+            got = [str(v) for v in vals[0]]
+            out.append((got + [""] * len(r))[:len(r)])  # API ตัดช่องว่างท้ายแถวทิ้ง
+    return out
+
+
+def upsert_dailyreadings(rows: list):
+    """
+    เขียนแถว DailyReadings แบบ idempotent
+    - key ที่มีในชีทแล้ว (หาจาก local DB) → batch_update ทับแถวเดิม 1 ครั้ง
+    - key ใหม่ → append_rows 1 ครั้ง
+    - key ซ้ำใน rows เอง → แถวหลังสุดชนะ
+    ก่อนแก้แถวเดิมเช็คด้วย batch_get ว่าแถวยังเป็น key เดิม (มีคนลบ/แทรกแถว → append แทน + โหลด mirror ใหม่)
+    คืนค่า (ok, message, unsent_rows) — unsent_rows = แถวที่ยังไม่ได้เขียน (ให้ outbox เก็บต่อ)
+    """
+    if not rows:
+        return True, "NO_ROWS", []
+
+    latest = OrderedDict()
+    for r in rows:
+        latest[reading_key(r)] = list(r)
+
+    mirror = get_dailyreadings_mirror()
+    found = {}
+    try:
+        mirror.refresh_if_stale()
+        found = mirror.store.dr_find_keys(list(latest))
+    except Exception as e:
+        logger.warning(f"⚠️ DailyReadings upsert: ใช้ index ไม่ได้ ({e}) → append ทั้งหมด")
+
+    try:
+        ws = get_handles(DB_SHEET_NAME).worksheet("DailyReadings")
+    except Exception as e:
+        return False, str(e), list(latest.values())
+
+    # เช็คแถวเดิมด้วย batch_get ครั้งเดียว
+    updates = []  # (row_no, row)
+    if found:
+        keys = list(found)
+        try:
+            current = _with_retry(ws.batch_get, [f"A{found[k]}:D{found[k]}" for k in keys])
+        except Exception as e:
+            return False, str(e), list(latest.values())
+        stale = 0
+        for k, vr in zip(keys, current):
+            if vr and reading_key(vr[0]) == k:
+                updates.append((found[k], latest[k]))
+            else:
+                stale += 1
+        if stale:
+            logger.info(f"🔄 DailyReadings upsert: {stale} แถวเลื่อนไป → append แทน + โหลด mirror ใหม่")
+            mirror.invalidate()
+
+    updated = {row_no for row_no, _r in updates}
+    update_keys = {reading_key(r) for _n, r in updates}
+    new_rows = [r for k, r in latest.items() if k not in update_keys]
+
+    # 1) แถวเดิม → batch_update ครั้งเดียว
+    if updates:
+        data = [
+            {"range": f"A{row_no}:{index_to_col(len(r))}{row_no}", "values": [r]}
+            for row_no, r in updates
+        ]
+        try:
+            # ขอค่าที่ชีทแสดงจริงกลับมาด้วย (123.0 → "123") → mirror ตรงกับ get_all_values ไม่ต้องโหลดทั้งชีท
+            resp = _with_retry(ws.batch_update, data, value_input_option="USER_ENTERED",
+                               include_values_in_response=True)
+        except Exception as e:
+            return False, str(e), list(latest.values())
+        for (row_no, r), shown in zip(updates, _rendered_rows(resp, updates)):
+            mirror.patch(row_no, {i + 1: v for i, v in enumerate(shown)})
+
+    # 2) key ใหม่ → append_rows ครั้งเดียว
+    if new_rows:
+        ok, msg, first_row = append_rows_dailyreadings(new_rows)
+        if not ok:
+            return False, f"{msg} (แก้แถวเดิมแล้ว {len(updated)})", new_rows
+        try:
+            mirror.store.dr_record(first_row, new_rows)
+        except Exception as e:
+            logger.warning(f"⚠️ DailyReadings upsert: บันทึกลง local DB ไม่ได้: {e}")
+
+    dup = len(rows) - len(latest)
+    msg = f"UPSERT: แก้แถวเดิม {len(updated)} / เพิ่มใหม่ {len(new_rows)}" + (f" / ซ้ำในชุด {dup}" if dup else "")
+    return True, msg, []
+
+
+def upsert_dailyreadings_batch(rows: list):
+    """upsert_dailyreadings() แบบคืน (ok, message) เหมือน append_rows_dailyreadings_batch"""
+    ok, msg, _unsent = upsert_dailyreadings(rows)
+    return ok, msg
@@ -0,0 +1,360 @@
+"""
+Sheets gateway — คุมจังหวะเรียก Google Sheets ทั้ง process (client-side rate limit)
+
+Google Sheets quota นับต่อนาที แยก read / write
+→ ใช้ token bucket 2 ถัง (read / write) จองโควต้าก่อนเรียก แทนการรอโดน 429 แล้วค่อย backoff
+   ทุก thread ใช้ถังเดียวกัน: ใครจองก่อนได้ก่อน (เกินโควต้า = รอคิว ไม่ใช่ error)
+
+read ที่ไม่ขึ้นต่อกัน (PointsMaster / DailyReadings / แท็บเดือน ...) → submit()/submit_many() รันพร้อมกัน
+   บน thread pool ของ gateway (gspread client ตัวเดียว = HTTPS session keep-alive ตัวเดียว)
+   ทุก call ยังจองโควต้าผ่าน token bucket เหมือนเดิม → รอ ~1 round trip แทนการรอต่อกันทีละตัว
+
+ทุก call นับสถิติ (จำนวน / error / latency histogram) แยกตาม api, read/write, method,
+   ฟังก์ชันที่เรียก, และ tag ของ context (mode / session ของ Streamlit, ชื่อ job ของ daemon)
+   → request_tags() / set_request_tags() ตั้ง tag, request_stats() / serve_stats() ดูผล
+
+ตั้งค่าผ่าน env:
+    SHEETS_READ_PER_MIN   (default 55)   SHEETS_READ_BURST  (default 10)
+    SHEETS_WRITE_PER_MIN  (default 55)   SHEETS_WRITE_BURST (default 10)
+    SHEETS_READ_WORKERS   (default 4)    จำนวน thread สำหรับ read พร้อมกัน
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# gspread methods ที่เป็น write request (ที่เหลือนับเป็น read)
+WRITE_METHODS = {
+    "append_row", "append_rows", "insert_row", "insert_rows", "insert_cols",
+    "update", "update_cell", "update_cells", "update_acell", "update_title",
+    "batch_update", "values_update", "values_append", "values_clear", "values_batch_update",
+    "batch_clear", "clear", "delete_rows", "delete_columns", "delete_dimension",
+    "add_worksheet", "del_worksheet", "duplicate", "resize", "add_rows", "add_cols",
+    "format", "batch_format", "freeze", "sort", "merge_cells", "unmerge_cells",
+}
+
+
+def classify(fn) -> str:
+    """'read' / 'write' จากชื่อ method ของ gspread"""
+    name = getattr(fn, "__name__", "") or ""
+    return "write" if name in WRITE_METHODS else "read"
+
+
+# =========================================================
+# --- 🧾 REQUEST ACCOUNTING ---
+# =========================================================
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # วินาที (+ ช่องเกิน 10s)
+TAG_KEYS = ("mode", "session")
+
+_tags = contextvars.ContextVar("sheets_request_tags", default={})
+
+
+def set_request_tags(**tags):
+    """ตั้ง tag ของ context ปัจจุบัน (เช่นต้นสคริปต์ Streamlit แต่ละรอบ) → token สำหรับ reset"""
+    return _tags.set({**_tags.get(), **{k: str(v) for k, v in tags.items() if v is not None}})
+
+
+@contextmanager
+def request_tags(**tags):
+    """tag ชั่วคราว: with request_tags(mode="outbox"): ..."""
+    token = set_request_tags(**tags)
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_tags() -> dict:
+    return dict(_tags.get())
+
+
+# เฟรมที่ไม่นับเป็น "ผู้เรียก" (wrapper ของ gateway / retry)
+_SKIP_FUNCS = {"call", "track", "sheets_call", "_with_retry", "<lambda>", "run", "_run", "_in_ctx"}
+_SKIP_MODULES = {"gateway", "vision_cache"}  # wrapper ที่ไม่ใช่ผู้เรียกจริง
+
+
+def _caller(depth: int = 2) -> str:
+    """ชื่อฟังก์ชันแรกนอก wrapper เช่น 'sheets.export_month_grid_batch'"""
+    try:
+        f = sys._getframe(depth)
+    except ValueError:
+        return "-"
+    while f is not None:
+        name = f.f_code.co_name
+        mod = os.path.splitext(os.path.basename(f.f_code.co_filename))[0]
+        if mod not in _SKIP_MODULES and name not in _SKIP_FUNCS:
+            return f"{mod}.{name}"
+        f = f.f_back
+    return "-"
+
+
+class RequestStats:
+    """ตัวนับ + latency histogram ต่อ (api, kind, method, caller, mode, session) (thread-safe)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.started_at = time.time()
+
+    def record(self, api: str, kind: str, method: str, caller: str, seconds: float, error: bool = False,
+               tags: dict = None):
+        tags = tags if tags is not None else _tags.get()
+        key = (api, kind, method, caller) + tuple(tags.get(k, "-") for k in TAG_KEYS)
+        i = next((n for n, b in enumerate(self.buckets) if seconds <= b), len(self.buckets))
+        with self._lock:
+            r = self._rows.get(key)
+            if r is None:
+                r = self._rows[key] = {"count": 0, "errors": 0, "seconds": 0.0, "max": 0.0,
+                                       "hist": [0] * (len(self.buckets) + 1)}
+            r["count"] += 1
+            r["errors"] += int(bool(error))
+            r["seconds"] += seconds
+            r["max"] = max(r["max"], seconds)
+            r["hist"][i] += 1
+
+    def rows(self, **match) -> list:
+        """แถวสถิติ (กรองด้วย tag/field เช่น session="...", mode="...") เรียงจากจำนวนมากสุด"""
+        fields = ("api", "kind", "method", "caller") + TAG_KEYS
+        with self._lock:
+            items = [(dict(zip(fields, k)), dict(v, hist=list(v["hist"]))) for k, v in self._rows.items()]
+        out = []
+        for key, v in items:
+            if any(key.get(f) != str(val) for f, val in match.items()):
+                continue
+            out.append({
+                **key,
+                "count": v["count"],
+                "errors": v["errors"],
+                "avg_ms": round(1000 * v["seconds"] / v["count"], 1) if v["count"] else 0.0,
+                "max_ms": round(1000 * v["max"], 1),
+                "hist": v["hist"],
+            })
+        return sorted(out, key=lambda r: -r["count"])
+
+    def totals(self, by: str, **match) -> dict:
+        """{ค่าของ field by: จำนวน call} เช่น totals("mode")"""
+        out = {}
+        for r in self.rows(**match):
+            out[r[by]] = out.get(r[by], 0) + r["count"]
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "since": self.started_at,
+            "buckets": list(self.buckets) + ["inf"],
+            "rows": self.rows(),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+            self.started_at = time.time()
+
+
+class TokenBucket:
+    """
+    Token bucket แบบจองล่วงหน้า (thread-safe)
+    acquire() ตัด token ทันที (ติดลบได้) แล้ว sleep เท่าที่ติดลบ → คิวตามลำดับการจอง
+    """
+
+    def __init__(self, rate_per_min: float, burst: int = 10):
+        self.rate_per_min = float(rate_per_min)
+        self.capacity = max(1, int(burst))
+        self._rate = self.rate_per_min / 60.0  # token / วินาที
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._recent = deque()  # เวลาที่ใช้ token (60 วินาทีล่าสุด)
+        self.calls = 0
+        self.waited_calls = 0
+        self.waited_seconds = 0.0
+        self.waiting = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def acquire(self, n: int = 1) -> float:
+        """จอง n token — คืนค่าเวลาที่ต้องรอ (วินาที)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= n
+            wait = 0.0 if self._tokens >= 0 else (-self._tokens) / self._rate
+            self.calls += 1
+            self._recent.append(now + wait)
+            while self._recent[0] < now - 60:
+                self._recent.popleft()
+            if wait > 0:
+                self.waited_calls += 1
+                self.waited_seconds += wait
+                self.waiting += 1
+
+        if wait > 0:
+            time.sleep(wait)
+            with self._lock:
+                self.waiting -= 1
+        return wait
+
+    def drain(self):
+        """โดน 429 ทั้งที่จองแล้ว (quota ฝั่ง Google แคบกว่าที่ตั้ง) → ล้างถังให้ทุก thread ชะลอ"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            while self._recent and self._recent[0] < now - 60:
+                self._recent.popleft()
+            return {
+                "rate_per_min": self.rate_per_min,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2),
+                "used_last_min": len(self._recent),
+                "waiting": self.waiting,
+                "calls": self.calls,
+                "waited_calls": self.waited_calls,
+                "waited_seconds": round(self.waited_seconds, 2),
+            }
+
+
+class SheetsGateway:
+    """ทางผ่านเดียวของ Google Sheets calls: จองโควต้า (read/write) แล้วค่อยเรียก"""
+
+    def __init__(self, read_per_min=55, write_per_min=55, read_burst=10, write_burst=10, workers=4):
+        self.buckets = {
+            "read": TokenBucket(read_per_min, read_burst),
+            "write": TokenBucket(write_per_min, write_burst),
+        }
+        self.stats = RequestStats()
+        self.workers = max(1, int(workers))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def call(self, fn, *args, kind: str = None, **kwargs):
+        kind = kind or classify(fn)
+        self.buckets[kind].acquire()
+        with self.track("sheets", getattr(fn, "__name__", "") or "-", kind=kind, caller=_caller()):
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def track(self, api: str, method: str, kind: str = "read", caller: str = None):
+        """นับ call ของ Google API อื่นที่ไม่ผ่าน token bucket (เช่น Vision): with gw.track("vision", "text_detection"):"""
+        caller = caller or _caller(3)
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.stats.record(api, kind, method, caller, time.perf_counter() - t0, error)
+
+    def throttled(self, fn=None, kind: str = None):
+        """แจ้งว่าโดน 429 (ให้ถังนั้นชะลอ)"""
+        self.buckets[kind or classify(fn)].drain()
+
+    # ---------- concurrent reads ----------
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sheets-read")
+            return self._pool
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        รัน fn(*args, **kwargs) บน thread pool → Future
+        fn คือขั้นตอน read ระดับสูง (เช่น load PointsMaster) ที่เรียก Sheets ผ่าน gateway/_with_retry อยู่แล้ว
+        → โควต้าถูกคุมที่ call แต่ละตัว ไม่ใช่ที่ submit
+        """
+        ctx = contextvars.copy_context()  # tag (mode / session) ตามไปกับ thread ของ pool
+        return self._executor().submit(ctx.run, fn, *args, **kwargs)
+
+    def submit_many(self, intents: dict, timeout: float = None) -> dict:
+        """
+        intents: {ชื่อ: fn ไม่มี argument} → {ชื่อ: Future}
+        timeout ไม่ใช่ None → รอจนเสร็จทุกตัว (หรือครบ timeout) ก่อนคืน
+        """
+        futures = {name: self.submit(fn) for name, fn in intents.items()}
+        if timeout is not None and futures:
+            wait(list(futures.values()), timeout=timeout)
+        return futures
+
+    def usage(self) -> dict:
+        """สถานะโควต้าปัจจุบัน {read: {...}, write: {...}}"""
+        return {k: b.snapshot() for k, b in self.buckets.items()}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> SheetsGateway:
+    """SheetsGateway ของ process นี้ (สร้างครั้งเดียว)"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = SheetsGateway(
+                    read_per_min=float(os.environ.get("SHEETS_READ_PER_MIN", "55")),
+                    write_per_min=float(os.environ.get("SHEETS_WRITE_PER_MIN", "55")),
+                    read_burst=int(os.environ.get("SHEETS_READ_BURST", "10")),
+                    write_burst=int(os.environ.get("SHEETS_WRITE_BURST", "10")),
+                    workers=int(os.environ.get("SHEETS_READ_WORKERS", "4")),
+                )
+    return _gateway
+
+
+def request_stats() -> dict:
+    """สถิติ request ของ process นี้ + สถานะโควต้า (JSON ได้)"""
+    gw = get_gateway()
+    return {"usage": gw.usage(), **gw.stats.snapshot()}
+
+
+def serve_stats(port: int, host: str = "127.0.0.1"):
+    """
+    เปิด HTTP endpoint ในเครื่อง: GET /sheets-stats → JSON ของ request_stats()
+    (query ?mode=...&session=... กรองแถวได้) — คืน server (thread daemon)
+    """
+    from urllib.parse import parse_qs, urlparse
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip("/") not in ("", "/sheets-stats"):
+                self.send_error(404)
+                return
+            match = {k: v[0] for k, v in parse_qs(url.query).items() if k in TAG_KEYS + ("api", "kind", "caller")}
+            body = request_stats()
+            if match:
+                body["rows"] = get_gateway().stats.rows(**match)
+            data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, name="sheets-stats", daemon=True).start()
+    return server
+
+
+def sheets_call(fn, *args, kind: str = None, **kwargs):
+    """เรียก fn ผ่าน gateway (ไม่มี retry — ใช้ meter_core.sheets._with_retry ถ้าต้องการ retry 429)"""
+    return get_gateway().call(fn, *args, kind=kind, **kwargs)
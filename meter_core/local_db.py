@@ -0,0 +1,414 @@
+"""
+Local DB - SQLite mirror ของ DailyReadings + PointsMaster สำหรับงานอ่านหนัก ๆ
+
+history guard / หน้า Admin / scripts วิเคราะห์ (check_accuracy, analyze_errors, check_h_meter, view_sheet_data)
+เดิมดึงทั้งชีทจาก Google ทุกครั้ง → ช้า + กินโควต้า
+→ sync เฉพาะส่วนที่เปลี่ยน (DailyReadingsMirror ดึงแถวใหม่ / PointsMasterCache เช็ค fingerprint ของแท็บ) ลง SQLite
+→ query ในเครื่อง (index: (point_id, ts), status) ระดับมิลลิวินาที
+
+ตาราง:
+  dailyreadings  row = เลขแถวในชีท, data = ทั้งแถว (JSON ตาม header) + คอลัมน์ที่ใช้ค้น (point_id, ts, status)
+  archive        แถวของแท็บ archive รายเดือน (DailyReadings_YYYY-MM) ที่เคยดึงมาแล้ว (month, row) — ดู meter_core.archive
+  points_master  point_id → record (JSON)
+  meta           header / ชื่อไฟล์ / เวลา sync
+
+วิธีใช้ (sync job):
+  python -m meter_core.local_db            # ดึงเฉพาะแถวใหม่
+  python -m meter_core.local_db --full     # โหลดทั้งชีทใหม่
+
+⚠️ sync ปกติเห็นแค่แถวใหม่ (+ แถวที่แอปแก้เอง) — แถวเก่าที่แก้ใน Google Sheets โดยตรงจะเข้ามาตอน --full
+   (collector_daemon job 'localdb' สั่ง full วันละครั้งตาม LOCAL_DB_FULL_SYNC_TIME)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_DB_PATH = Path.home() / ".water_meter_logs" / "water_meter_local.sqlite3"
+
+TS_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dailyreadings (
+    row       INTEGER PRIMARY KEY,
+    point_id  TEXT,
+    ts        TEXT,
+    status    TEXT,
+    data      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dr_point_ts ON dailyreadings (point_id, ts);
+CREATE INDEX IF NOT EXISTS idx_dr_status ON dailyreadings (status);
+
+CREATE TABLE IF NOT EXISTS archive (
+    month     TEXT NOT NULL,
+    row       INTEGER NOT NULL,
+    point_id  TEXT,
+    ts        TEXT,
+    status    TEXT,
+    data      TEXT NOT NULL,
+    PRIMARY KEY (month, row)
+);
+CREATE INDEX IF NOT EXISTS idx_ar_point_ts ON archive (point_id, ts);
+
+CREATE TABLE IF NOT EXISTS points_master (
+    point_id  TEXT PRIMARY KEY,
+    record    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT
+);
+"""
+
+
+def normalize_ts(value) -> str:
+    """timestamp ในชีท → 'YYYY-MM-DD HH:MM:SS' (เรียงตามตัวอักษรได้) หรือ '' ถ้าอ่านไม่ออก"""
+    s = str(value or "").strip()[:19]
+    for fmt in TS_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    return ""
+
+
+def _index_cols(header, row):
+    h = {name: i for i, name in enumerate(header)}
+
+    def col(name):
+        i = h.get(name)
+        return row[i] if i is not None and i < len(row) else ""
+
+    return (
+        str(col("point_id")).strip().upper(),
+        normalize_ts(col("timestamp")),
+        str(col("Status")).strip().upper(),
+    )
+
+
+class LocalDB:
+    """SQLite mirror (thread-safe: เปิด connection ใหม่ทุกครั้งเหมือน Outbox)"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DEFAULT_DB_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # ---------- meta ----------
+
+    def _get_meta(self, conn, key, default=None):
+        r = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(r[0]) if r else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def synced_at(self) -> float:
+        with self._connect() as conn:
+            return float(self._get_meta(conn, "dr_synced_at", 0) or 0)
+
+    # ---------- DailyReadings store (ใช้โดย DailyReadingsMirror) ----------
+
+    def dr_load(self, spreadsheet: str):
+        """(header, rows) ที่เก็บไว้ หรือ (None, []) ถ้ายังไม่มี/เป็นของไฟล์อื่น"""
+        with self._connect() as conn:
+            header = self._get_meta(conn, "dr_header")
+            if not header or self._get_meta(conn, "dr_spreadsheet") != spreadsheet:
+                return None, []
+            rows = [json.loads(r[0]) for r in conn.execute("SELECT data FROM dailyreadings ORDER BY row")]
+        return header, rows
+
+    def dr_replace(self, spreadsheet: str, header: list, rows: list):
+        """แทนที่ทั้งตาราง (โหลดทั้งชีทใหม่)"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM dailyreadings")
+            self._insert(conn, header, 2, rows)
+            self._set_meta(conn, "dr_spreadsheet", spreadsheet)
+            self._set_meta(conn, "dr_header", list(header))
+            self._set_meta(conn, "dr_synced_at", time.time())
+
+    def dr_append(self, header: list, first_row: int, rows: list):
+        """เพิ่มแถวใหม่ (first_row = เลขแถวในชีทของแถวแรก)"""
+        with self._connect() as conn:
+            self._insert(conn, header, first_row, rows)
+            self._set_meta(conn, "dr_synced_at", time.time())
+
+    def dr_record(self, first_row: int, rows: list) -> bool:
+        """
+        บันทึกแถวที่เพิ่ง append ลงชีท (รู้เลขแถวจาก updatedRange) ทันที ไม่ต้องรอ sync
+        → แถว FLAGGED เข้าคิวรออนุมัติพร้อมเลขแถวตั้งแต่ตอนบันทึก
+        (sync รอบถัดไปอ่านแถวเดียวกันมาเขียนทับอีกครั้ง)
+        """
+        with self._connect() as conn:
+            header = self._get_meta(conn, "dr_header")
+            if not header or not first_row:
+                return False
+            self._insert(conn, header, int(first_row), [[str(v) for v in r] for r in rows])
+        return True
+
+    def dr_touch(self):
+        with self._connect() as conn:
+            self._set_meta(conn, "dr_synced_at", time.time())
+
+    def dr_patch(self, row_number: int, values: dict):
+        """แก้ค่าบางช่องของแถวเดิม (หลังแก้ค่าในชีท เช่น Admin Approve): values = {คอลัมน์ 1-based: ค่า}"""
+        with self._connect() as conn:
+            header = self._get_meta(conn, "dr_header")
+            r = conn.execute("SELECT data FROM dailyreadings WHERE row = ?", (int(row_number),)).fetchone()
+            if not header or not r:
+                return False
+            row = (json.loads(r[0]) + [""] * len(header))[:len(header)]
+            for col, v in values.items():
+                if 1 <= int(col) <= len(header):
+                    row[int(col) - 1] = str(v)
+            self._insert(conn, header, int(row_number), [row])
+        return True
+
+    def dr_find_keys(self, keys) -> dict:
+        """
+        เลขแถวในชีทของแต่ละ key (วันที่ 'YYYY-MM-DD', point_id, inspector) → {key: row}
+        ใช้ index (point_id, ts) — key ที่มีหลายแถว (ซ้ำจากก่อนมี upsert) → แถวล่าสุด
+        """
+        out = {}
+        with self._connect() as conn:
+            header = list(self._get_meta(conn, "dr_header") or [])
+            if not header:
+                return out
+            i_insp = header.index("inspector") if "inspector" in header else 3
+            wanted = {}
+            for day, pid, insp in keys:
+                wanted.setdefault((day, pid), set()).add(insp)
+            for (day, pid), inspectors in wanted.items():
+                rows = conn.execute(
+                    "SELECT row, data FROM dailyreadings WHERE point_id = ? AND ts >= ? AND ts <= ? ORDER BY row",
+                    (pid, f"{day} 00:00:00", f"{day} 23:59:59"),
+                )
+                for row_no, data in rows:
+                    vals = json.loads(data)
+                    insp = str(vals[i_insp]).strip() if i_insp < len(vals) else ""
+                    if insp in inspectors:
+                        out[(day, pid, insp)] = row_no
+        return out
+
+    @staticmethod
+    def _insert(conn, header, first_row, rows):
+        conn.executemany(
+            "INSERT OR REPLACE INTO dailyreadings (row, point_id, ts, status, data) VALUES (?, ?, ?, ?, ?)",
+            [
+                (first_row + i, *_index_cols(header, r), json.dumps(list(r), ensure_ascii=False))
+                for i, r in enumerate(rows)
+            ],
+        )
+
+    # ---------- archive รายเดือน (ใช้โดย meter_core.archive) ----------
+
+    def ar_months(self) -> dict:
+        """{เดือน 'YYYY-MM': version} ของ partition ที่ดึงมาเก็บแล้ว (version = row_count ของแท็บตอนดึง)"""
+        with self._connect() as conn:
+            return dict(self._get_meta(conn, "ar_months") or {})
+
+    def ar_replace(self, month: str, header: list, rows: list, version=None):
+        """แทนที่ partition ของเดือนนั้นทั้งก้อน (rows[i] = แถวที่ i + 2 ของแท็บ archive)"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM archive WHERE month = ?", (month,))
+            conn.executemany(
+                "INSERT INTO archive (month, row, point_id, ts, status, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (month, 2 + i, *_index_cols(header, r), json.dumps(list(r), ensure_ascii=False))
+                    for i, r in enumerate(rows)
+                ],
+            )
+            months = dict(self._get_meta(conn, "ar_months") or {})
+            months[month] = version
+            self._set_meta(conn, "ar_months", months)
+            if not self._get_meta(conn, "dr_header"):
+                self._set_meta(conn, "dr_header", list(header))
+
+    # ---------- PointsMaster ----------
+
+    def pm_replace(self, records: list):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM points_master")
+            seen = set()
+            for rec in records or []:
+                pid = str(rec.get("point_id", "")).strip().upper()
+                if not pid or pid in seen:
+                    continue
+                seen.add(pid)
+                conn.execute("INSERT INTO points_master (point_id, record) VALUES (?, ?)",
+                             (pid, json.dumps(rec, ensure_ascii=False, default=str)))
+            self._set_meta(conn, "pm_synced_at", time.time())
+
+    def point(self, point_id):
+        with self._connect() as conn:
+            r = conn.execute("SELECT record FROM points_master WHERE point_id = ?",
+                             (str(point_id or "").strip().upper(),)).fetchone()
+        return json.loads(r[0]) if r else None
+
+    def points(self) -> list:
+        with self._connect() as conn:
+            return [json.loads(r[0]) for r in conn.execute("SELECT record FROM points_master ORDER BY point_id")]
+
+    # ---------- queries ----------
+
+    def header(self) -> list:
+        with self._connect() as conn:
+            return list(self._get_meta(conn, "dr_header") or [])
+
+    def readings(self, point_id=None, status=None, exclude_status=None, since=None, until=None,
+                 sort: str = "row", order: str = "asc", limit: int = None, offset: int = 0,
+                 raw: bool = False, partition: str = None) -> list:
+        """
+        ค้น DailyReadings ในเครื่อง
+        - partition: None = ชีทหลัก (hot), 'YYYY-MM' = แท็บ archive ของเดือนนั้น (ต้อง ar_replace ไว้ก่อน)
+        - point_id / status: ตรงตัว (ไม่สนตัวพิมพ์)
+        - exclude_status: ตัดแถวที่ status มีคำนี้ (เช่น 'FLAGGED')
+        - since / until: datetime / date / str เทียบกับ timestamp
+        - sort: 'row' (ลำดับในชีท) หรือ 'ts' (ตามเวลา), order: 'asc' / 'desc'
+        - limit / offset: แบ่งหน้า
+        - raw=True → คืน list ของแถว (ตาม header) แทน dict
+        ทุกแถวมีเลขแถวในชีท ('_row' ใน dict / ตัวแรกของ tuple ถ้า raw)
+        """
+        where, args = [], []
+        if partition is not None:
+            where.append("month = ?")
+            args.append(str(partition))
+        if point_id is not None:
+            where.append("point_id = ?")
+            args.append(str(point_id).strip().upper())
+        if status is not None:
+            where.append("status = ?")
+            args.append(str(status).strip().upper())
+        if exclude_status:
+            where.append("status NOT LIKE ?")
+            args.append(f"%{str(exclude_status).strip().upper()}%")
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(_bound(since, "00:00:00"))
+        if until is not None:
+            where.append("ts != '' AND ts <= ?")
+            args.append(_bound(until, "23:59:59"))
+
+        sql = "SELECT row, data FROM " + ("dailyreadings" if partition is None else "archive")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        direction = "DESC" if str(order).lower() == "desc" else "ASC"
+        sql += f" ORDER BY ts {direction}, row {direction}" if sort == "ts" else f" ORDER BY row {direction}"
+        if limit or offset:
+            sql += " LIMIT ? OFFSET ?"
+            args.extend([int(limit) if limit else -1, int(offset or 0)])
+
+        with self._connect() as conn:
+            header = list(self._get_meta(conn, "dr_header") or [])
+            rows = conn.execute(sql, args).fetchall()
+        if raw:
+            return [(r[0], json.loads(r[1])) for r in rows]
+        out = []
+        for row_no, data in rows:
+            d = dict(zip(header, json.loads(data)))
+            d["_row"] = row_no
+            if partition is not None:
+                d["_partition"] = partition
+            out.append(d)
+        return out
+
+    def count_by_status(self) -> dict:
+        with self._connect() as conn:
+            return {s or "": n for s, n in conn.execute("SELECT status, COUNT(*) FROM dailyreadings GROUP BY status")}
+
+
+def _bound(v, default_time: str) -> str:
+    """date → 'YYYY-MM-DD <default_time>', datetime/str → normalize_ts"""
+    if hasattr(v, "hour"):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    s = str(v).strip()
+    if len(s) == 10:
+        s = f"{s} {default_time}"
+    return normalize_ts(s) or s
+
+
+# ========================================
+# Singleton + sync job
+# ========================================
+_DB = None
+_db_lock = threading.Lock()
+
+
+def get_local_db() -> LocalDB:
+    """LocalDB ของ process นี้ (env LOCAL_DB_PATH เปลี่ยนที่เก็บได้)"""
+    global _DB
+    with _db_lock:
+        if _DB is None:
+            _DB = LocalDB(os.environ.get("LOCAL_DB_PATH") or None)
+        return _DB
+
+
+def query_readings(**kwargs) -> list:
+    """LocalDB.readings() หลัง sync แถวใหม่ (ถ้า mirror เกิน TTL)"""
+    from meter_core.dailyreadings import get_dailyreadings_mirror
+
+    get_dailyreadings_mirror().refresh_if_stale()
+    return get_local_db().readings(**kwargs)
+
+
+def sync_local_db(full: bool = False, points_master: bool = True) -> dict:
+    """ดึงส่วนที่เปลี่ยนจาก Sheets ลง SQLite (DailyReadings + PointsMaster)"""
+    from meter_core.dailyreadings import get_dailyreadings_mirror
+    from meter_core.sheets import get_points_master
+
+    t0 = time.perf_counter()
+    mirror = get_dailyreadings_mirror()
+    new_rows = mirror.sync(full=full)
+    out = {"new_rows": new_rows, "fetched": mirror.last_fetched}
+
+    if points_master:
+        pm = get_points_master()
+        if full:
+            pm.refresh(force=True)
+        records = pm.records()
+        get_local_db().pm_replace(records)
+        out["points"] = len(records)
+
+    out["seconds"] = round(time.perf_counter() - t0, 2)
+    logger.info(f"🗄️ Local DB sync: {out}")
+    return out
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="🗄️ sync DailyReadings / PointsMaster ลง SQLite ในเครื่อง")
+    parser.add_argument("--full", action="store_true", help="โหลดทั้งชีทใหม่")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    out = sync_local_db(full=args.full)
+    db = get_local_db()
+    print(f"🗄️ {db.path}")
+    print(f"   แถวใหม่ {out['new_rows']} | PointsMaster {out.get('points', 0)} จุด | {out['seconds']}s")
+    print(f"   Status: {db.count_by_status()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Metrics ของแต่ละรอบการรัน collector (auto_processor / scada_wt_collector / scada_uf_collector)
+
+- ตัวนับระดับ process: meter_core นับเองตรงจุดที่เกิด (incr)
+    sheets_requests      = จำนวนครั้งที่เรียก Google Sheets ผ่าน _with_retry
+    sheets_429_retries   = จำนวนครั้งที่โดน 429 แล้ว backoff
+    rows_scanned         = จำนวนแถว Excel ที่สแกนหาเวลา
+- RunMetrics: เวลาแต่ละ stage + ค่าสรุปของรอบนั้น
+    ตัวนับของรอบ = incr() ที่เกิดใน context ของรอบนั้นเท่านั้น (collector_run ผูก RunMetrics ไว้ใน contextvar)
+    → collector_daemon รันหลาย job พร้อมกัน / outbox flusher เบื้องหลัง ไม่ปนกัน
+    (thread pool ภายในรอบต้องส่ง context ต่อ: contextvars.copy_context().run)
+- export → Prometheus textfile (node-exporter / windows_exporter textfile collector) + JSON lines (history)
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "water_meter_collector"
+JSONL_FILE = "collector_metrics.jsonl"
+
+# stage มาตรฐาน (collector ใช้ชื่อเดียวกัน → กราฟเทียบกันได้)
+STAGES = (
+    "outbox_flush",
+    "find_files",
+    "load_mapping",
+    "read_files",
+    "extract",
+    "dailyreadings_write",
+    "waterreport_write",
+)
+
+# =========================================================
+# --- 🔢 PROCESS COUNTERS ---
+# =========================================================
+_lock = threading.Lock()
+_counters = {}
+_active_run = contextvars.ContextVar("water_meter_run_metrics", default=None)
+
+
+def incr(name: str, n: int = 1):
+    """เพิ่มตัวนับระดับ process (thread-safe) + ของรอบที่กำลังรันใน context นี้ (ถ้ามี)"""
+    if not n:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+    run = _active_run.get()
+    if run is not None:
+        run.add(name, n)
+
+
+def counters_snapshot() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+# =========================================================
+# --- ⏱️ RUN METRICS ---
+# =========================================================
+class RunMetrics:
+    """
+    metrics ของ 1 รอบการรัน
+
+    stage(name) จับเวลาแบบสะสม: auto_processor รันหลาย date folder พร้อมกัน
+    → เวลาของ stage เดียวกันจากหลาย job จะถูกรวมกัน (ไม่ใช่ wall-clock)
+    """
+
+    def __init__(self, collector: str):
+        self.collector = collector
+        self.started_at = time.time()
+        self.status = "ok"
+        self.duration = None
+        self.stages = {}
+        self.values = {}
+        self.info = {}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + float(seconds)
+
+    def add(self, name: str, n=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + n
+
+    def set(self, name: str, value):
+        with self._lock:
+            self.values[name] = value
+
+    def record_stats(self, stats: dict):
+        """เก็บผลสรุปจาก stats ของ collector (points OK/failed/skipped/queued)"""
+        if not stats:
+            return
+        for k in ("success", "failed", "skipped", "queued", "total"):
+            if k in stats:
+                self.add(f"points_{k}", int(stats.get(k) or 0))
+        for k in ("report_date", "data_date", "mode"):
+            if stats.get(k):
+                self.info[k] = str(stats[k])
+        if stats.get("error"):
+            self.status = "error"
+            self.info["error"] = str(stats["error"])
+
+    def finish(self):
+        if self.duration is not None:
+            return self
+        self.duration = time.perf_counter() - self._t0
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "collector": self.collector,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "status": self.status,
+            "duration_s": round(self.duration or 0.0, 3),
+            "stages_s": {k: round(v, 3) for k, v in self.stages.items()},
+            **self.values,
+            **self.info,
+        }
+
+    def to_prometheus(self) -> str:
+        c = _escape_label(self.collector)
+        lines = []
+
+        def gauge(name, help_text, samples):
+            full = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} gauge")
+            for labels, value in samples:
+                lbl = ",".join([f'collector="{c}"'] + [f'{k}="{_escape_label(v)}"' for k, v in labels])
+                lines.append(f"{full}{{{lbl}}} {_fmt_value(value)}")
+
+        gauge("last_run_timestamp_seconds", "Unix time the last run started.", [((), self.started_at)])
+        gauge("last_run_success", "1 if the last run finished without error.", [((), 1 if self.status == "ok" else 0)])
+        gauge("run_duration_seconds", "Wall-clock duration of the last run.", [((), self.duration or 0.0)])
+        gauge(
+            "stage_duration_seconds",
+            "Time spent per stage in the last run (summed across parallel jobs).",
+            # stage มาตรฐานที่ไม่ได้รันรอบนี้ = 0 (series ไม่หายจากกราฟ)
+            [((("stage", s),), self.stages.get(s, 0.0))
+             for s in list(STAGES) + sorted(set(self.stages) - set(STAGES))],
+        )
+        gauge("rows_scanned", "Excel rows scanned while locating target times.", [((), self.values.get("rows_scanned", 0))])
+        gauge("sheets_requests", "Google Sheets requests issued in the last run.", [((), self.values.get("sheets_requests", 0))])
+        gauge("sheets_429_retries", "Sheets calls retried after HTTP 429 in the last run.", [((), self.values.get("sheets_429_retries", 0))])
+        gauge(
+            "points",
+            "Points by outcome in the last run.",
+            [
+                ((("result", r),), self.values.get(f"points_{r}", 0))
+                for r in ("success", "failed", "skipped", "queued", "total")
+            ],
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _fmt_value(v) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(round(v, 6))
+
+
+def _escape_label(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def timed(metrics, name: str):
+    """metrics.stage(name) หรือไม่ทำอะไรถ้า metrics=None"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+# =========================================================
+# --- 💾 EXPORT ---
+# =========================================================
+def write_prometheus_textfile(metrics: RunMetrics, textfile_dir) -> Path:
+    """
+    เขียน {collector}.prom แบบ atomic (tmp → rename)
+    node-exporter อ่านไฟล์ .prom ทั้ง folder → ต้องไม่เห็นไฟล์ที่เขียนไม่ครบ
+    """
+    d = Path(textfile_dir)
+    d.mkdir(parents=True, exist_ok=True)
+    path = d / f"water_meter_{metrics.collector}.prom"
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(metrics.to_prometheus())
+    os.replace(tmp, path)
+    return path
+
+
+def append_jsonl(metrics: RunMetrics, path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(metrics.to_dict(), ensure_ascii=False, default=str) + "\n")
+    return path
+
+
+def export_run_metrics(metrics: RunMetrics, log_folder, textfile_dir=None, log=logger):
+    """
+    เขียน metrics ของรอบนี้ลง:
+    - {textfile_dir}/water_meter_{collector}.prom  (default: env NODE_EXPORTER_TEXTFILE_DIR หรือ log_folder)
+    - {log_folder}/collector_metrics.jsonl
+    ไม่ raise (metrics ห้ามทำให้การรันล้ม)
+    """
+    metrics.finish()
+    textfile_dir = textfile_dir or os.environ.get("NODE_EXPORTER_TEXTFILE_DIR") or log_folder
+    try:
+        write_prometheus_textfile(metrics, textfile_dir)
+    except Exception as e:
+        log.warning(f"⚠️ เขียน Prometheus textfile ล้มเหลว: {e}")
+    try:
+        append_jsonl(metrics, Path(log_folder) / JSONL_FILE)
+    except Exception as e:
+        log.warning(f"⚠️ เขียน metrics history ล้มเหลว: {e}")
+
+    log.info(
+        f"📈 Metrics: {metrics.duration:.1f}s | "
+        + " ".join(f"{k}={v:.1f}s" for k, v in metrics.stages.items())
+        + f" | sheets={metrics.values.get('sheets_requests', 0)}"
+        f" 429={metrics.values.get('sheets_429_retries', 0)}"
+        f" rows={metrics.values.get('rows_scanned', 0)}"
+    )
+
+
+@contextmanager
+def collector_run(collector: str, log_folder, textfile_dir=None, log=logger):
+    """
+    with collector_run("wt_collector", LOG_FOLDER) as m:
+        ...
+    → export metrics ตอนจบเสมอ (รวมกรณี exception)
+    """
+    m = RunMetrics(collector)
+    token = _active_run.set(m)  # incr() ใน context นี้ (และ context ที่ copy ต่อไป) นับเข้ารอบนี้
+    try:
+        yield m
+    except BaseException as e:
+        m.status = "error"
+        m.info.setdefault("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        _active_run.reset(token)
+        export_run_metrics(m, log_folder, textfile_dir=textfile_dir, log=log)
@@ -0,0 +1,234 @@
+"""
+OCR Backends - ตัวอ่านข้อความจากรูปแบบเปลี่ยนได้ (Google Vision / Tesseract ในเครื่อง / fallback)
+
+เดิมทุกทางอ่าน (ocr_process / extract_point_id_from_image / extract_dashboard_flow_values) ผูกกับ Vision ตรง ๆ
+→ ทุกรูปเสีย network + ค่า call, ไซต์ที่ไม่มีเน็ตอ่านอะไรไม่ได้เลย
+
+ทุก backend คืนโครงสร้างเดียวกัน:
+    read(content, hints) → (text, tokens, error)
+        text   = ข้อความทั้งรูป
+        tokens = [{"text", "x1", "y1", "x2", "y2", "cx", "cy", "h"}] (กรอบต่อคำ เหมือน _vision_tokens เดิม)
+        error  = "" ถ้าสำเร็จ
+    read_text(content) → (text, error)   (หน้าตาเดียวกับ _vision_read_text → ใช้เป็น read_text hook ได้)
+
+ชื่อ backend (PointsMaster คอลัมน์ ocr_backend ต่อจุด / env OCR_BACKEND เป็นค่า default):
+    vision              Google Vision (text_detection → document_text_detection ถ้าไม่เจอ) — เหมือนเดิม
+    tesseract           Tesseract ในเครื่อง (ต้องมี pytesseract + tesseract binary)
+    vision+tesseract    Vision ก่อน, error (เน็ตหลุด/quota) → Tesseract
+    tesseract+vision    Tesseract ก่อน, ไม่เจอตัวเลข → Vision (ประหยัด call)
+backend อื่น (เช่น ONNX digit recognizer) → register_backend("ชื่อ", factory)
+"""
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract
+    HAS_TESSERACT = True
+except ImportError:
+    pytesseract = None
+    HAS_TESSERACT = False
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_BACKEND = os.environ.get("OCR_BACKEND", "vision").strip().lower() or "vision"
+TESSERACT_CONFIG = os.environ.get("TESSERACT_CONFIG", "--oem 1 --psm 11")  # psm 11 = sparse text (หน้าปัด/สติ๊กเกอร์)
+TESSERACT_LANGS = {"en": "eng", "th": "tha"}
+
+
+def make_token(text: str, x1, y1, x2, y2) -> dict:
+    return {
+        "text": text,
+        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+        "cx": (x1 + x2) / 2.0,
+        "cy": (y1 + y2) / 2.0,
+        "h": max(1.0, (y2 - y1)),
+    }
+
+
+def _has_digits(s: str) -> bool:
+    return bool(s) and any(c.isdigit() for c in s)
+
+
+class OcrBackend:
+    """interface: ลูกคลาส implement read()"""
+
+    name = "-"
+
+    def read(self, content: bytes, hints=("en",)):
+        raise NotImplementedError
+
+    def read_text(self, content: bytes):
+        text, _tokens, err = self.read(content)
+        return text, err
+
+
+# ========================================
+# Google Vision
+# ========================================
+class VisionBackend(OcrBackend):
+    """Google Vision ผ่าน client ที่ให้มา (ปกติเป็น CachedVisionClient → ได้ cache + นับ request)"""
+
+    name = "vision"
+
+    def __init__(self, client):
+        self.client = client
+
+    def read(self, content: bytes, hints=("en",)):
+        try:
+            from google.cloud import vision
+
+            image = vision.Image(content=content)
+            ctx = vision.ImageContext(language_hints=list(hints))
+            resp = self.client.text_detection(image=image, image_context=ctx)
+            if getattr(resp, "error", None) and resp.error.message:
+                return "", [], resp.error.message
+            ann = resp.text_annotations
+            if ann:
+                tokens = []
+                for a in ann[1:]:
+                    txt = (a.description or "").strip()
+                    if not txt:
+                        continue
+                    xs = [v.x for v in a.bounding_poly.vertices]
+                    ys = [v.y for v in a.bounding_poly.vertices]
+                    tokens.append(make_token(txt, min(xs), min(ys), max(xs), max(ys)))
+                return (ann[0].description or ""), tokens, ""
+
+            # ไม่เจอข้อความ → document_text_detection (เหมือน _vision_read_text เดิม)
+            resp2 = self.client.document_text_detection(image=image, image_context=ctx)
+            fta = resp2.full_text_annotation
+            return ((fta.text if fta else "") or ""), [], ""
+        except Exception as e:
+            return "", [], str(e)
+
+
+# ========================================
+# Tesseract (CPU ในเครื่อง)
+# ========================================
+class TesseractBackend(OcrBackend):
+    """Tesseract ผ่าน pytesseract (image_to_data ครั้งเดียว → ทั้งข้อความและกรอบต่อคำ)"""
+
+    name = "tesseract"
+
+    def __init__(self, config: str = TESSERACT_CONFIG):
+        self.config = config
+
+    def read(self, content: bytes, hints=("en",)):
+        if not HAS_TESSERACT:
+            return "", [], "ไม่มี pytesseract (pip install pytesseract + ติดตั้ง tesseract-ocr)"
+        try:
+            import cv2
+            import numpy as np
+
+            img = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return "", [], "decode รูปไม่ได้"
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            lang = "+".join(dict.fromkeys(TESSERACT_LANGS.get(h, h) for h in hints)) or "eng"
+            data = pytesseract.image_to_data(rgb, lang=lang, config=self.config,
+                                             output_type=pytesseract.Output.DICT)
+        except Exception as e:
+            return "", [], str(e)
+
+        tokens = []
+        lines = {}  # (block, par, line) -> [คำ]
+        for i, word in enumerate(data.get("text", [])):
+            word = str(word or "").strip()
+            if not word or float(data["conf"][i]) < 0:
+                continue
+            x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+            tokens.append(make_token(word, x, y, x + w, y + h))
+            lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        text = "\n".join(" ".join(ws) for _k, ws in sorted(lines.items()))
+        return text, tokens, ""
+
+
+# ========================================
+# Fallback
+# ========================================
+class FallbackBackend(OcrBackend):
+    """
+    primary ก่อน แล้วค่อย secondary เมื่อ:
+      on="error"  → primary error (เช่น Vision ต่อไม่ได้ / quota)
+      on="digits" → primary ไม่เจอตัวเลข (หรือ error)
+    """
+
+    def __init__(self, primary: OcrBackend, secondary: OcrBackend, on: str = "error"):
+        self.primary = primary
+        self.secondary = secondary
+        self.on = on
+        self.name = f"{primary.name}+{secondary.name}"
+
+    def read(self, content: bytes, hints=("en",)):
+        text, tokens, err = self.primary.read(content, hints)
+        need = bool(err) if self.on == "error" else (bool(err) or not _has_digits(text))
+        if not need:
+            return text, tokens, err
+        text2, tokens2, err2 = self.secondary.read(content, hints)
+        if err2 and not text2:
+            return text, tokens, err or err2  # secondary ก็ไม่ได้ → ผล/ error ของ primary
+        return text2, tokens2, err2
+
+
+# ========================================
+# Registry
+# ========================================
+_FACTORIES = {
+    "vision": lambda vision_client: VisionBackend(vision_client),
+    "tesseract": lambda vision_client: TesseractBackend(),
+}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register_backend(name: str, factory):
+    """เพิ่ม backend ใหม่: factory(vision_client) → OcrBackend"""
+    with _lock:
+        _FACTORIES[name.strip().lower()] = factory
+        _instances.pop(name.strip().lower(), None)
+
+
+def backend_names() -> list:
+    return sorted(_FACTORIES)
+
+
+def get_ocr_backend(name: str = None, vision_client=None) -> OcrBackend:
+    """
+    backend ตามชื่อ (None/ว่าง → OCR_BACKEND) — สร้างครั้งเดียวต่อ process
+    'a+b' = fallback: vision+X → X เมื่อ Vision error, X+vision → Vision เมื่อ X ไม่เจอตัวเลข
+    ชื่อไม่รู้จัก → vision (log เตือนครั้งเดียว — cache ไว้ใต้ชื่อที่ขอด้วย)
+    """
+    name = requested = (name or DEFAULT_BACKEND).strip().lower()
+    with _lock:
+        if name in _instances:
+            return _instances[name]
+
+    parts = [p.strip() for p in name.split("+") if p.strip()]
+    if not parts or any(p not in _FACTORIES for p in parts):
+        logger.warning(f"⚠️ OCR backend '{name}' ไม่รู้จัก → ใช้ vision")
+        parts, name = ["vision"], "vision"
+        with _lock:
+            if name in _instances:
+                return _instances.setdefault(requested, _instances[name])
+
+    if vision_client is None and "vision" in parts:
+        from meter_core.config import get_vision_client
+        from meter_core.vision_cache import cached_vision_client
+
+        vision_client = cached_vision_client(get_vision_client())
+
+    backends = [_FACTORIES[p](vision_client) for p in parts]
+    backend = backends[0]
+    for nxt in backends[1:]:
+        backend = FallbackBackend(backend, nxt, on="error" if backend.name.startswith("vision") else "digits")
+    if "tesseract" in parts and not HAS_TESSERACT:
+        logger.warning("⚠️ OCR backend tesseract: ไม่มี pytesseract — อ่านไม่ได้จนกว่าจะติดตั้ง")
+
+    with _lock:
+        backend = _instances.setdefault(name, backend)
+        return _instances.setdefault(requested, backend)
@@ -0,0 +1,439 @@
+"""
+Sheets Outbox - durable local queue for Google Sheets writes
+เก็บ write ที่ส่งไม่สำเร็จ (เน็ตหลุด / โดน 429) ลง SQLite บนเครื่อง แล้วค่อยส่งซ้ำเป็น batch
+
+ใช้ร่วมกันโดย collectors (WT / UF / auto_processor) ผ่าน meter_core.collector
+
+แต่ละรายการเก็บ:
+  spreadsheet, worksheet, kind (append/update/upsert), A1 range หรือแถวที่จะ append, value, idempotency key
+- upsert (แถว DailyReadings) → ตอน flush ส่งผ่านตัว upsert ที่ส่งเข้ามา (แก้แถวเดิมถ้า key มีแล้ว ไม่ append ซ้ำ)
+- idempotency key ซ้ำ → เขียนทับรายการเดิม (ค่าล่าสุดชนะ, ไม่ส่งซ้ำ 2 ครั้ง)
+- worksheet ขึ้นต้นด้วย "@month:" → แท็บเดือนของ WaterReport ให้ resolve ตอน flush
+- a1_range ขึ้นต้นด้วย "@row:" (วัน + report_col) → หาแถว/คอลัมน์จริงจาก layout ของแท็บตอน flush
+  (template เลื่อนแถว → ไม่เขียนผิดแถวตอน replay)
+- ส่งไม่ผ่านแบบถาวร (ไม่พบแท็บ / A1 ผิด) หรือครบ OUTBOX_MAX_ATTEMPTS → state 'dead' ไม่ส่งซ้ำทุกรอบ
+  (ไม่บังหัวคิว) — ดูได้จาก pending_summary / --flush-outbox แล้วสั่ง requeue_dead หลังแก้ต้นเหตุ
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_DB_PATH = Path.home() / ".water_meter_logs" / "sheets_outbox.sqlite3"
+
+KIND_APPEND = "append"
+KIND_UPDATE = "update"
+KIND_UPSERT = "upsert"
+
+ST_PENDING = "pending"
+ST_DEAD = "dead"
+
+# ส่งไม่ผ่านกี่รอบ (error ชั่วคราว) แล้วเลิกส่ง → dead
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "30"))
+
+MONTH_TAB_PREFIX = "@month:"
+REPORT_ROW_PREFIX = "@row:"
+
+# ข้อความ error ที่ถือว่า "ชั่วคราว" → ควรเก็บเข้า outbox แล้วส่งใหม่
+# (ไม่ใส่เลข status ตรง ๆ — "500" ไปตรงกับเลขแถว/range ใน error อื่นได้ → ดู _RETRYABLE_STATUS)
+_RETRYABLE_MARKERS = (
+    "quota", "rate limit", "ratelimitexceeded", "resource_exhausted", "too many requests",
+    "internal error", "backend error", "bad gateway", "service unavailable", "gateway timeout",
+    "timed out", "timeout", "connection", "max retries", "temporary failure",
+    "name or service not known", "getaddrinfo", "remotedisconnected",
+    "ssl", "network", "unreachable", "transporterror",
+)
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# status code ในข้อความ error ของ gspread/requests เช่น "APIError: [503]: ..." / "{'code': 429, ...}" / "HTTP 502"
+_STATUS_RE = re.compile(r"\[(\d{3})\]|['\"]code['\"]\s*:\s*(\d{3})|\b(?:http|status|status_code)\s*[:=]?\s*(\d{3})\b", re.I)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    idem_key      TEXT NOT NULL UNIQUE,
+    spreadsheet   TEXT NOT NULL,
+    worksheet     TEXT NOT NULL,
+    kind          TEXT NOT NULL,
+    a1_range      TEXT,
+    payload       TEXT NOT NULL,
+    only_if_empty INTEGER NOT NULL DEFAULT 0,
+    source        TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    last_error    TEXT,
+    state         TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_target ON outbox (spreadsheet, worksheet, kind, id);
+"""
+
+
+def _error_status(err):
+    """HTTP status ของ error (gspread APIError / requests HTTPError) — None = ไม่รู้"""
+    resp = getattr(err, "response", None)
+    code = getattr(resp, "status_code", None)
+    if isinstance(code, int):
+        return code
+    for m in _STATUS_RE.finditer(str(err or "")):
+        return int(next(g for g in m.groups() if g))
+    return None
+
+
+def is_retryable_error(err) -> bool:
+    """เช็คว่า error นี้น่าจะหายเองได้ (เน็ต/quota) หรือเป็นปัญหา config ที่ส่งซ้ำก็ไม่ผ่าน"""
+    if isinstance(err, (ConnectionError, TimeoutError)):
+        return True
+    status = _error_status(err)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    msg = str(err or "").lower()
+    return any(m in msg for m in _RETRYABLE_MARKERS)
+
+
+def month_tab_ref(target_date) -> str:
+    """อ้างอิงแท็บเดือนของ WaterReport แบบ resolve ทีหลัง เช่น '@month:2026-02-09'"""
+    if isinstance(target_date, datetime):
+        target_date = target_date.date()
+    return f"{MONTH_TAB_PREFIX}{target_date.isoformat()}"
+
+
+def report_cell_ref(day, report_col) -> str:
+    """อ้างอิงช่อง (วัน, report_col) ของแท็บเดือนแบบ resolve ทีหลัง เช่น '@row:9:E'"""
+    return f"{REPORT_ROW_PREFIX}{int(day)}:{str(report_col).strip().upper()}"
+
+
+# ========================================
+# Outbox
+# ========================================
+
+class Outbox:
+    """SQLite outbox (thread-safe: เปิด connection ใหม่ทุกครั้ง + lock ตอน flush)"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DEFAULT_DB_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(outbox)")}
+            if "state" not in cols:  # คิวจากเวอร์ชันก่อนมี dead-letter
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN state TEXT NOT NULL DEFAULT '{ST_PENDING}'")
+            # คิวเก่า: แถว DailyReadings เคยเก็บเป็น append → ส่งแบบ upsert (กันแถวซ้ำตอน replay)
+            conn.execute(
+                "UPDATE outbox SET kind = ? WHERE kind = ? AND worksheet = 'DailyReadings'",
+                (KIND_UPSERT, KIND_APPEND),
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # ---------- enqueue ----------
+
+    def _put(self, idem_key, spreadsheet, worksheet, kind, a1_range, payload, only_if_empty=False, source=""):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO outbox (idem_key, spreadsheet, worksheet, kind, a1_range, payload,
+                                    only_if_empty, source, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(idem_key) DO UPDATE SET
+                    kind = excluded.kind,
+                    payload = excluded.payload,
+                    a1_range = excluded.a1_range,
+                    only_if_empty = excluded.only_if_empty,
+                    updated_at = MAX(excluded.updated_at, outbox.updated_at + 0.000001),
+                    state = 'pending',
+                    attempts = CASE WHEN outbox.state = 'dead' THEN 0 ELSE outbox.attempts END
+                """,
+                (idem_key, spreadsheet, worksheet, kind, a1_range,
+                 json.dumps(payload, ensure_ascii=False, default=str),
+                 1 if only_if_empty else 0, source, now, now),
+            )
+
+    def enqueue_append(self, spreadsheet: str, worksheet: str, row: list, idem_key: str, source: str = ""):
+        """เก็บแถวที่จะ append_rows (key ซ้ำ → แทนที่แถวเดิมในคิว)"""
+        self._put(idem_key, spreadsheet, worksheet, KIND_APPEND, None, list(row), source=source)
+
+    def enqueue_upsert(self, spreadsheet: str, worksheet: str, row: list, idem_key: str, source: str = ""):
+        """เก็บแถวที่ต้อง upsert ตาม key (ตอน flush ส่งผ่าน upsert_rows ไม่ใช่ append_rows ตรง ๆ)"""
+        self._put(idem_key, spreadsheet, worksheet, KIND_UPSERT, None, list(row), source=source)
+
+    def enqueue_update(self, spreadsheet: str, worksheet: str, a1: str, value,
+                       only_if_empty: bool = False, idem_key: str = None, source: str = ""):
+        """เก็บการเขียน 1 ช่อง (default key = ช่องนั้น → ค่าล่าสุดชนะ)"""
+        key = idem_key or f"{spreadsheet}|{worksheet}|{a1}"
+        self._put(key, spreadsheet, worksheet, KIND_UPDATE, a1, value, only_if_empty=only_if_empty, source=source)
+
+    # ---------- inspect ----------
+
+    def pending_count(self, include_dead: bool = False) -> int:
+        """จำนวนรายการที่รอส่ง (include_dead=True → นับรายการ dead ด้วย)"""
+        sql = "SELECT COUNT(*) FROM outbox" + ("" if include_dead else f" WHERE state = '{ST_PENDING}'")
+        with self._connect() as conn:
+            return int(conn.execute(sql).fetchone()[0])
+
+    def dead_count(self) -> int:
+        with self._connect() as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM outbox WHERE state = ?", (ST_DEAD,)).fetchone()[0])
+
+    def pending_summary(self) -> list:
+        """[(spreadsheet, worksheet, kind, state, count, max_attempts, last_error), ...]"""
+        with self._connect() as conn:
+            return conn.execute(
+                """
+                SELECT spreadsheet, worksheet, kind, state, COUNT(*), MAX(attempts), MAX(last_error)
+                FROM outbox GROUP BY spreadsheet, worksheet, kind, state ORDER BY state, MIN(id)
+                """
+            ).fetchall()
+
+    def requeue_dead(self) -> int:
+        """ส่งรายการ dead ใหม่ (หลังแก้ต้นเหตุ เช่น สร้างแท็บเดือนแล้ว) — คืนจำนวนที่ย้ายกลับ"""
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE outbox SET state = ?, attempts = 0 WHERE state = ?", (ST_PENDING, ST_DEAD))
+            return cur.rowcount
+
+    # ---------- flush ----------
+
+    def flush(self, gc, resolve_month_tab=None, call=None, upsert_rows=None, resolve_report_cell=None,
+              max_items: int = 1000) -> dict:
+        """
+        ส่งรายการในคิวทั้งหมด รวมเป็น batch ต่อ (spreadsheet, worksheet, kind):
+          - append → append_rows 1 ครั้ง
+          - update → batch_update 1 ครั้ง (only_if_empty อ่านค่าเดิมด้วย batch_get 1 ครั้ง)
+          - upsert → upsert_rows(rows) 1 ครั้ง (แถวที่เขียนแล้วลบออก, ที่ยังไม่ได้เขียนค้างไว้)
+        append กับ update เป็นคนละกลุ่ม → update ล้มไม่ทำให้แถวที่ append ไปแล้วค้างคิวแล้ว append ซ้ำ
+        กลุ่มไหนล้มเหลวจะค้างไว้ในคิว (attempts+1) แล้วไปกลุ่มถัดไป
+        error ถาวร หรือครบ MAX_ATTEMPTS → state dead (flush รอบหน้าข้าม ไม่บังรายการใหม่)
+        ลบจากคิวเฉพาะรายการที่ updated_at ยังเท่าตอนอ่าน (ระหว่างส่งมีค่าใหม่มาทับ key เดิม → เก็บไว้ส่งรอบหน้า)
+
+        Args:
+            gc: gspread client
+            resolve_month_tab: fn(sh, date) -> ชื่อแท็บ (สำหรับ worksheet แบบ '@month:...')
+            call: wrapper สำหรับเรียก API (เช่น _with_retry) — None = เรียกตรง
+            upsert_rows: fn(rows) -> (ok, message, unsent_rows) สำหรับ kind upsert (เช่น upsert_dailyreadings)
+            resolve_report_cell: fn(ws, day, report_col) -> A1 ('' = คอลัมน์ใช้ไม่ได้) สำหรับ a1 แบบ '@row:...'
+        """
+        call = call or (lambda fn, *a, **kw: fn(*a, **kw))
+        stats = {"sent": 0, "skipped": 0, "failed": 0, "dead": 0, "errors": []}
+
+        with self._flush_lock:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT id, spreadsheet, worksheet, kind, a1_range, payload, only_if_empty, updated_at
+                    FROM outbox WHERE state = ? ORDER BY id LIMIT ?
+                    """,
+                    (ST_PENDING, int(max_items)),
+                ).fetchall()
+
+            if not rows:
+                return stats
+
+            groups = {}
+            for r in rows:
+                groups.setdefault((r[1], r[2], r[3]), []).append(r)
+
+            spreadsheets = {}
+            worksheets = {}
+            for (ss_name, ws_name, kind), entries in groups.items():
+                try:
+                    if kind == KIND_UPSERT:
+                        done, err = self._send_upserts(entries, upsert_rows)
+                        self._delete(done)
+                        stats["sent"] += len(done)
+                        if err:
+                            entries = [e for e in entries if e not in done]  # ที่ยังไม่ได้เขียน → ค้างคิว (except ด้านล่าง)
+                            raise RuntimeError(err)
+                        logger.info(f"📤 Outbox: {ss_name}/{ws_name} upsert สำเร็จ {len(done)} แถว")
+                        continue
+                    if ss_name not in spreadsheets:
+                        spreadsheets[ss_name] = call(gc.open, ss_name)
+                    sh = spreadsheets[ss_name]
+                    if (ss_name, ws_name) not in worksheets:
+                        worksheets[(ss_name, ws_name)] = self._resolve_worksheet(sh, ws_name, resolve_month_tab, call)
+                    ws = worksheets[(ss_name, ws_name)]
+                    sent, skipped = self._send_group(ws, entries, call, resolve_report_cell)
+                    self._delete(entries)
+                    stats["sent"] += sent
+                    stats["skipped"] += skipped
+                    logger.info(f"📤 Outbox: {ss_name}/{ws_name} ส่งสำเร็จ {sent} รายการ (ข้าม {skipped})")
+                except Exception as e:
+                    stats["dead"] += self._mark_failed(entries, e)
+                    stats["failed"] += len(entries)
+                    stats["errors"].append(f"{ss_name}/{ws_name}: {e}")
+                    logger.warning(f"⚠️ Outbox: {ss_name}/{ws_name} ยังส่งไม่ได้ ({len(entries)} รายการ): {e}")
+
+        return stats
+
+    @staticmethod
+    def _resolve_worksheet(sh, ws_name, resolve_month_tab, call):
+        if ws_name.startswith(MONTH_TAB_PREFIX):
+            if resolve_month_tab is None:
+                raise ValueError(f"ไม่มีตัว resolve แท็บเดือนสำหรับ '{ws_name}'")
+            d = date.fromisoformat(ws_name[len(MONTH_TAB_PREFIX):])
+            title = resolve_month_tab(sh, d)
+            if not title:
+                raise ValueError(f"ไม่พบแท็บเดือนของ {d}")
+            return call(sh.worksheet, title)
+        return call(sh.worksheet, ws_name)
+
+    @staticmethod
+    def _resolve_a1(ws, a1, resolve_report_cell):
+        if not a1.startswith(REPORT_ROW_PREFIX):
+            return a1
+        if resolve_report_cell is None:
+            raise ValueError(f"ไม่มีตัว resolve ช่องสำหรับ '{a1}'")
+        day, col = a1[len(REPORT_ROW_PREFIX):].split(":", 1)
+        return resolve_report_cell(ws, int(day), col)
+
+    @classmethod
+    def _send_group(cls, ws, entries, call, resolve_report_cell=None):
+        appends = [json.loads(e[5]) for e in entries if e[3] == KIND_APPEND]
+        skipped = 0
+
+        if appends:
+            call(ws.append_rows, appends, value_input_option="USER_ENTERED")
+
+        data = []
+        updates = []  # (a1 จริง, entry)
+        for e in entries:
+            if e[3] != KIND_UPDATE:
+                continue
+            a1 = cls._resolve_a1(ws, e[4], resolve_report_cell)
+            if not a1:
+                logger.warning(f"⚠️ Outbox: {e[4]} ไม่มีคอลัมน์นี้ในแท็บ {getattr(ws, 'title', '')} — ข้าม")
+                skipped += 1
+                continue
+            updates.append((a1, e))
+        if updates:
+            guarded = [a1 for a1, e in updates if e[6]]
+            existing = {}
+            if guarded:
+                values = call(ws.batch_get, guarded)
+                for a1, vr in zip(guarded, values):
+                    existing[a1] = str(vr[0][0]).strip() if vr and vr[0] else ""
+            for a1, e in updates:
+                if e[6] and existing.get(a1, ""):
+                    skipped += 1
+                    continue
+                data.append({"range": a1, "values": [[json.loads(e[5])]]})
+            if data:
+                call(ws.batch_update, data, value_input_option="USER_ENTERED")
+
+        return len(appends) + len(data), skipped
+
+    @staticmethod
+    def _send_upserts(entries, upsert_rows):
+        """คืน (entries ที่เขียนแล้ว, error) — upsert_rows คืนแถวที่ยังไม่ได้เขียนมา (เทียบด้วย payload)"""
+        if upsert_rows is None:
+            raise ValueError("ไม่มีตัว upsert_rows สำหรับรายการแบบ upsert")
+        rows = [json.loads(e[5]) for e in entries]
+        ok, msg, unsent = upsert_rows(rows)
+        if ok:
+            return list(entries), ""
+        left = {json.dumps(r, ensure_ascii=False, default=str) for r in (unsent or [])}
+        done = [e for e, r in zip(entries, rows) if json.dumps(r, ensure_ascii=False, default=str) not in left]
+        return done, msg or "upsert ไม่สำเร็จ"
+
+    def _delete(self, entries):
+        """ลบรายการที่ส่งแล้ว (ถ้าถูก enqueue ทับระหว่างส่ง updated_at จะเปลี่ยน → ไม่ลบ)"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ? AND updated_at = ?", [(e[0], e[7]) for e in entries])
+
+    def _mark_failed(self, entries, err) -> int:
+        """attempts+1 — error ถาวร / ครบ MAX_ATTEMPTS → dead (ยกเว้นถูก enqueue ทับระหว่างส่ง) คืนจำนวนที่ dead"""
+        limit = MAX_ATTEMPTS if is_retryable_error(err) else 1
+        params = [(limit, e[7], ST_DEAD, str(err)[:500], e[0]) for e in entries]
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                UPDATE outbox SET attempts = attempts + 1,
+                    state = CASE WHEN attempts + 1 >= ? AND updated_at = ? THEN ? ELSE state END,
+                    last_error = ?
+                WHERE id = ?
+                """,
+                params,
+            )
+            dead = conn.execute(
+                f"SELECT COUNT(*) FROM outbox WHERE state = ? AND id IN ({','.join('?' * len(entries))})",
+                [ST_DEAD] + [e[0] for e in entries],
+            ).fetchone()[0] if entries else 0
+        if dead:
+            logger.warning(f"🪦 Outbox: {dead} รายการส่งไม่ผ่าน ({err}) → dead (ไม่ส่งซ้ำอัตโนมัติ)")
+        return int(dead)
+
+    # ---------- background flusher ----------
+
+    def start_background_flusher(self, get_gc, interval: float = 120, **flush_kwargs):
+        """
+        เริ่ม thread ที่ flush คิวทุก interval วินาที (เฉพาะตอนมีของค้าง)
+        get_gc: fn() -> gspread client (เรียกตอน flush เพื่อให้ได้ client ล่าสุด)
+        """
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def _loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.pending_count() > 0:
+                        self.flush(get_gc(), **flush_kwargs)
+                except Exception as e:
+                    logger.warning(f"⚠️ Outbox flusher error: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=_loop, name="sheets-outbox-flusher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop_background_flusher(self):
+        self._stop.set()
+
+
+# ========================================
+# Helpers สำหรับ collectors
+# ========================================
+
+def queue_dailyreadings_rows(outbox: Outbox, rows: list, spreadsheet: str, source: str = ""):
+    """
+    เก็บแถว DailyReadings ที่เขียนไม่สำเร็จ (เป็น upsert: ตอน flush key ที่มีแถวในชีทแล้ว → แก้แถวเดิม ไม่ append ซ้ำ)
+    key = (วันที่, point_id, inspector) → รันซ้ำวันเดิมไม่เกิดแถวซ้ำในคิว
+    """
+    for row in rows:
+        key = f"{spreadsheet}|DailyReadings|{str(row[0])[:10]}|{row[2]}|{row[3]}"
+        outbox.enqueue_upsert(spreadsheet, "DailyReadings", row, key, source=source)
+    return len(rows)
+
+
+def queue_report_items(outbox: Outbox, items: list, target_date, spreadsheet: str,
+                       only_if_empty: bool = False, source: str = ""):
+    """
+    เก็บค่าที่เขียนลง WaterReport ไม่สำเร็จ
+    เก็บเป็น (วัน, report_col) → ตอน flush หาแถว/คอลัมน์จริงจาก layout ของแท็บ (ไม่ fix แถว = 6 + วัน)
+    items: list[dict] ต้องมี keys: point_id, value, report_col
+    """
+    ws_ref = month_tab_ref(target_date)
+    queued = 0
+    for it in items:
+        col = str(it.get("report_col", "")).strip().upper()
+        if not re.fullmatch(r"[A-Z]{1,3}", col):
+            continue
+        outbox.enqueue_update(spreadsheet, ws_ref, report_cell_ref(target_date.day, col), it.get("value", ""),
+                              only_if_empty=only_if_empty, source=source)
+        queued += 1
+    return queued
@@ -0,0 +1,196 @@
+"""
+PointsMaster Snapshot - cache ของชีท PointsMaster สำหรับ process ที่ไม่ใช่ Streamlit
+(collectors ไม่มี st.cache_data → ถ้าไม่มี cache get_meter_config จะอ่านทั้งชีททุกครั้ง)
+
+- ดึงครั้งเดียว แล้ว index ด้วย point_id อยู่ใน memory ตลอดการรัน
+- เก็บ snapshot ลงดิสก์ (JSON) พร้อม TTL
+- หมด TTL → อ่านค่าแท็บ PointsMaster 1 ครั้ง (get_all_values) เทียบ fingerprint (hash) กับ snapshot
+  ไม่เปลี่ยน → ใช้ snapshot เดิมต่อ / เปลี่ยน → get_all_records แล้ว index ใหม่
+  (ไม่ใช้ modifiedTime ของไฟล์ — DailyReadings อยู่ไฟล์เดียวกัน แก้ทุกรอบ collector → ไม่เคยตรง)
+- worksheet handle เก็บไว้ใน instance → revalidate ไม่ต้อง gc.open ซ้ำ
+- เน็ตหลุด → ใช้ snapshot เก่าบนดิสก์ไปก่อน
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_SNAPSHOT_PATH = Path.home() / ".water_meter_logs" / "points_master_snapshot.json"
+DEFAULT_TTL = 3600  # วินาที
+
+
+def _safe_int(x, default=0):
+    try: return int(float(x)) if x and str(x).strip() else default
+    except: return default
+
+
+def _safe_float(x, default=0.0):
+    try: return float(x) if x and str(x).strip() else default
+    except: return default
+
+
+def _parse_bool(v):
+    if v is None: return False
+    return str(v).strip().lower() in ("true", "1", "yes", "y", "t", "on")
+
+
+def normalize_pid(point_id) -> str:
+    return str(point_id or "").strip().upper()
+
+
+def normalize_meter_config(item: dict) -> dict:
+    """แปลง record ดิบจาก PointsMaster ให้เป็น config ที่พร้อมใช้ (ชนิดข้อมูลถูกต้อง)"""
+    item = dict(item)
+    item['decimals'] = _safe_int(item.get('decimals'), 0)
+    item['keyword'] = str(item.get('keyword', '')).strip()
+    exp = _safe_int(item.get('expected_digits'), 0)
+    if exp == 0: exp = _safe_int(item.get('int_digits'), 0)
+    item['expected_digits'] = exp
+    item['report_col'] = str(item.get('report_col', '')).strip()
+    item['ignore_red'] = _parse_bool(item.get('ignore_red'))
+    item['roi_x1'] = _safe_float(item.get('roi_x1'), 0.0)
+    item['roi_y1'] = _safe_float(item.get('roi_y1'), 0.0)
+    item['roi_x2'] = _safe_float(item.get('roi_x2'), 0.0)
+    item['roi_y2'] = _safe_float(item.get('roi_y2'), 0.0)
+    item['type'] = str(item.get('type', '')).strip()
+    item['name'] = str(item.get('name', '')).strip()
+    item['ocr_backend'] = str(item.get('ocr_backend', '') or '').strip().lower()  # ว่าง = OCR_BACKEND
+    return item
+
+
+def values_fingerprint(values) -> str:
+    """hash ของค่าทั้งแท็บ (list of rows) — ใช้เช็คว่า PointsMaster เปลี่ยนหรือยัง"""
+    blob = json.dumps(values or [], ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class PointsMasterCache:
+    """Snapshot ของ PointsMaster (thread-safe)"""
+
+    def __init__(self, get_gc, spreadsheet: str, worksheet: str = "PointsMaster",
+                 path=None, ttl: float = DEFAULT_TTL, call=None):
+        """
+        Args:
+            get_gc: fn() -> gspread client
+            spreadsheet: ชื่อไฟล์ (เช่น DB_SHEET_NAME)
+            path: ไฟล์ snapshot บนดิสก์
+            ttl: อายุ snapshot (วินาที) ก่อนเช็ค fingerprint ของแท็บอีกรอบ
+            call: wrapper สำหรับเรียก API (เช่น _with_retry) — None = เรียกตรง
+        """
+        self._get_gc = get_gc
+        self.spreadsheet = spreadsheet
+        self.worksheet = worksheet
+        self.path = Path(path) if path else DEFAULT_SNAPSHOT_PATH
+        self.ttl = float(ttl)
+        self._call = call or (lambda fn, *a, **kw: fn(*a, **kw))
+        self._lock = threading.RLock()
+        self._records = None
+        self._index = {}
+        self._fetched_at = 0.0
+        self._fingerprint = None
+        self._ws = None
+
+    # ---------- public ----------
+
+    def records(self) -> list:
+        """record ดิบทั้งหมด (แทน load_points_master)"""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._records or [])
+
+    def get(self, point_id):
+        """config ของ point_id (แทน get_meter_config) หรือ None"""
+        with self._lock:
+            self._ensure_fresh()
+            item = self._index.get(normalize_pid(point_id))
+            return dict(item) if item is not None else None
+
+    def refresh(self, force: bool = False):
+        """บังคับเช็ค/ดึงใหม่ (force=True = index ใหม่แม้ fingerprint ไม่เปลี่ยน)"""
+        with self._lock:
+            self._revalidate(force=force)
+
+    def age_seconds(self) -> float:
+        return time.time() - self._fetched_at if self._fetched_at else float("inf")
+
+    # ---------- internals ----------
+
+    def _ensure_fresh(self):
+        if self._records is None:
+            self._load_disk()
+        if self._records is None or self.age_seconds() >= self.ttl:
+            self._revalidate()
+
+    def _worksheet(self):
+        if self._ws is None:
+            sh = self._call(self._get_gc().open, self.spreadsheet)
+            self._ws = self._call(sh.worksheet, self.worksheet)
+        return self._ws
+
+    def _revalidate(self, force: bool = False):
+        try:
+            ws = self._worksheet()
+            fingerprint = values_fingerprint(self._call(ws.get_all_values))
+
+            if not force and self._records is not None and fingerprint == self._fingerprint:
+                # แท็บ PointsMaster ไม่เปลี่ยน → ใช้ snapshot เดิม ต่ออายุ TTL
+                self._fetched_at = time.time()
+                self._save_disk()
+                return
+
+            records = self._call(ws.get_all_records)
+            self._set(records, time.time(), fingerprint)
+            self._save_disk()
+            logger.info(f"✅ PointsMaster: โหลด {len(records)} จุด (snapshot ใหม่)")
+        except Exception as e:
+            self._ws = None  # handle อาจหมดอายุ/แท็บถูกเปลี่ยนชื่อ → เปิดใหม่รอบหน้า
+            if self._records is None:
+                raise
+            logger.warning(f"⚠️ PointsMaster: อ่านจาก Sheets ไม่ได้ ใช้ snapshot เดิม ({e})")
+
+    def _set(self, records, fetched_at, fingerprint):
+        self._records = list(records or [])
+        self._index = {}
+        for item in self._records:
+            pid = normalize_pid(item.get("point_id", ""))
+            if pid and pid not in self._index:
+                self._index[pid] = normalize_meter_config(item)
+        self._fetched_at = fetched_at
+        self._fingerprint = fingerprint
+
+    def _load_disk(self):
+        try:
+            if not self.path.exists():
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("spreadsheet") != self.spreadsheet:
+                return
+            self._set(data.get("records") or [], float(data.get("fetched_at") or 0), data.get("fingerprint"))
+        except Exception as e:
+            logger.warning(f"⚠️ PointsMaster: อ่าน snapshot ไม่ได้: {e}")
+
+    def _save_disk(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "spreadsheet": self.spreadsheet,
+                    "worksheet": self.worksheet,
+                    "fetched_at": self._fetched_at,
+                    "fingerprint": self._fingerprint,
+                    "records": self._records,
+                }, f, ensure_ascii=False, default=str)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ PointsMaster: บันทึก snapshot ไม่ได้: {e}")
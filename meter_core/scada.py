@@ -0,0 +1,1015 @@
+"""
+SCADA Excel extraction (DB_Water_Scada.xlsx mapping + ไฟล์ Export จาก SCADA)
+ย้ายมาจาก app.py — ไม่มี Streamlit, openpyxl import ตอนเรียกใช้
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+
+from meter_core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_scada_time(value):
+    """
+    แปลงเวลาให้เป็นรูปแบบ 'HH:MM' เพื่อเทียบกันง่าย (รองรับ time/datetime/str/float)
+    
+    ✅ 24:00 standardization:
+    - 24:00 → 23:55 (standard for end-of-day)
+    """
+    import datetime as _dt
+    if value is None:
+        return None
+
+    # Excel time (เช่น 0.9965) = สัดส่วนของวัน
+    if isinstance(value, (int, float)) and 0 <= float(value) < 1:
+        seconds = int(round(float(value) * 24 * 60 * 60))
+        h = (seconds // 3600) % 24
+        m = (seconds % 3600) // 60
+        result = f"{h:02d}:{m:02d}"
+        # Apply 24:00 → 23:55 conversion
+        if h == 24 and m == 0:
+            return "23:55"
+        return result
+
+    if isinstance(value, _dt.datetime):
+        value = value.time()
+    if isinstance(value, _dt.time):
+        result = f"{value.hour:02d}:{value.minute:02d}"
+        # Apply 24:00 → 23:55 conversion
+        if value.hour == 24 and value.minute == 0:
+            return "23:55"
+        return result
+
+    s = str(value).strip()
+    # 23.55 or 24.00
+    if re.match(r"^\d{1,2}\.\d{2}$", s):
+        h, m = s.split(".")
+        h = int(h)
+        m = int(m)
+        # ✅ 24:00 → 23:55 conversion
+        if h == 24 and m == 0:
+            return "23:55"
+        return f"{h:02d}:{m:02d}"
+    
+    # 23:55 or 24:00 or 23:55:00 or 24:00:00
+    if re.match(r"^\d{1,2}:\d{2}", s):
+        parts = s.split(":")
+        h = int(parts[0])
+        m = int(parts[1])
+        # ✅ 24:00 → 23:55 conversion
+        if h == 24 and m == 0:
+            return "23:55"
+        return f"{h:02d}:{m:02d}"
+
+    return None
+
+
+def _strip_date_prefix(name: str) -> str:
+    """
+    เอาวันที่นำหน้าออก (เช่น 2026_01_12_Daily_Report -> Daily_Report)
+    """
+    base = os.path.splitext(os.path.basename(name))[0]
+    base = re.sub(r"^\d{4}_\d{2}_\d{2}_", "", base)
+    return base.strip().lower()
+
+
+def load_scada_excel_mapping(local_path: str = "DB_Water_Scada.xlsx", uploaded_bytes=None):
+    """
+    อ่าน mapping จากไฟล์ DB_Water_Scada.xlsx
+    ต้องมีหัวตาราง: PointID, File, Sheet, Time, Colume
+    คืนค่าเป็น list ของ dict: {point_id, file_key, sheet, time, col}
+    """
+    import openpyxl
+
+    if uploaded_bytes:
+        wb = openpyxl.load_workbook(io.BytesIO(uploaded_bytes), data_only=True)
+    else:
+        if not os.path.exists(local_path):
+            return []
+        wb = openpyxl.load_workbook(local_path, data_only=True)
+
+    ws = wb[wb.sheetnames[0]]
+
+    # หาแถวหัวตาราง
+    header_row = None
+    header_map = {}
+    for r in range(1, min(ws.max_row, 30) + 1):
+        row_vals = [ws.cell(r, c).value for c in range(1, min(ws.max_column, 20) + 1)]
+        row_str = [str(v).strip().lower() if v is not None else "" for v in row_vals]
+        if "pointid" in row_str and "file" in row_str and "sheet" in row_str:
+            header_row = r
+            for idx, name in enumerate(row_str, start=1):
+                if name in ["pointid", "file", "sheet", "time", "colume", "column"]:
+                    header_map[name] = idx
+            break
+
+    if not header_row:
+        return []
+
+    # รองรับสะกด Colume/Column
+    col_idx = header_map.get("colume") or header_map.get("column")
+    out = []
+    for r in range(header_row + 1, ws.max_row + 1):
+        point_id = ws.cell(r, header_map["pointid"]).value
+        if point_id is None or str(point_id).strip() == "":
+            continue
+
+        file_key = ws.cell(r, header_map["file"]).value
+        sheet = ws.cell(r, header_map["sheet"]).value
+        t = ws.cell(r, header_map.get("time", 0)).value if header_map.get("time") else None
+        col = ws.cell(r, col_idx).value if col_idx else None
+
+        out.append({
+            "point_id": str(point_id).strip(),
+            "file_key": str(file_key).strip() if file_key is not None else "",
+            "sheet": str(sheet).strip() if sheet is not None else "Sheet1",
+            "time": t,
+            "col": str(col).strip() if col is not None else "",
+        })
+    return out
+
+
+# =========================================================
+# --- 🗂️ MAPPING REGISTRY ---
+# =========================================================
+_mapping_lock = threading.Lock()
+_mapping_cache = {}  # abspath -> (mtime, rows)
+
+
+def get_scada_mapping(local_path: str = "DB_Water_Scada.xlsx"):
+    """
+    load_scada_excel_mapping แบบ cache ต่อ process (แชร์ระหว่าง collectors ใน process เดียวกัน)
+    โหลดใหม่เมื่อไฟล์ถูกแก้ (mtime เปลี่ยน)
+
+    ⚠️ dict ของแต่ละแถวแชร์กัน → ห้ามแก้ไข (กรองเป็น list ใหม่ได้)
+    """
+    path = os.path.abspath(local_path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+
+    with _mapping_lock:
+        hit = _mapping_cache.get(path)
+        if hit and hit[0] == mtime:
+            return list(hit[1])
+
+        rows = load_scada_excel_mapping(path)
+        _mapping_cache[path] = (mtime, rows)
+        return list(rows)
+
+
+def _find_cell_exact(ws, target_text: str, max_rows=60, max_cols=40):
+    target = target_text.strip().lower()
+    for r in range(1, min(ws.max_row, max_rows) + 1):
+        for c in range(1, min(ws.max_column, max_cols) + 1):
+            v = ws.cell(r, c).value
+            if isinstance(v, str) and v.strip().lower() == target:
+                return r, c
+    return None
+
+
+def _hhmm_to_minutes(hhmm: str, normalize_24_00=True):
+    """
+    แปลง HH:MM เป็นจำนวนนาทีตั้งแต่เที่ยงคืน
+    
+    ✅ 24:00 standardization:
+    - 24:00 ถือว่าเป็น 23:55 (สุดท้ายของวัน)
+    - กำหนดมาตรฐาน: "24:00 ของวัน D" = "23:55 ของวัน D"
+    
+    Args:
+        hhmm: string format "HH:MM" (e.g., "24:00", "23:55")
+        normalize_24_00: if True, convert 24:00 → 23:55
+    
+    Returns:
+        minutes since midnight, or None if invalid
+    """
+    try:
+        h, m = str(hhmm).split(":")
+        h = int(h)
+        m = int(m)
+        
+        # ✅ Handle 24:00 normalization
+        if normalize_24_00 and h == 24 and m == 0:
+            # 24:00 ของวัน D = 23:55 ของวัน D
+            return 23 * 60 + 55
+        
+        # Validate time range
+        if h < 0 or h > 23 or m < 0 or m > 59:
+            return None
+        
+        return h * 60 + m
+    except Exception:
+        return None
+
+
+def _minutes_to_hhmm(minutes: int) -> str:
+    """
+    แปลงนาทีมาเป็น HH:MM format
+    """
+    try:
+        h = minutes // 60
+        m = minutes % 60
+        return f"{h:02d}:{m:02d}"
+    except Exception:
+        return None
+
+
+def _normalize_time_to_standard(hhmm: str) -> str:
+    """
+    Normalize any time format to standard HH:MM
+    
+    ✅ 24:00 standardization (สำคัญ):
+    - Input: "24:00" → Output: "23:55"
+    - This is the company standard for end-of-day
+    
+    Returns:
+        Normalized time string, or None if invalid
+    """
+    try:
+        # First normalize to HH:MM
+        normalized = _normalize_scada_time(hhmm)
+        if not normalized:
+            return None
+        
+        h, m = normalized.split(":")
+        h = int(h)
+        m = int(m)
+        
+        # ✅ Apply 24:00 → 23:55 conversion
+        if h == 24 and m == 0:
+            return "23:55"
+        
+        if h < 0 or h > 23 or m < 0 or m > 59:
+            return None
+        
+        return f"{h:02d}:{m:02d}"
+    except Exception:
+        return None
+
+
+def _find_nearest_time_row(time_rows: list, target_minutes: int, max_diff_minutes: int = 300) -> int:
+    """
+    Find the row with time closest to target_minutes (nearest time algorithm)
+    
+    ✅ Key feature: Handles missing data by finding nearest available time
+    
+    Args:
+        time_rows: list of tuples (row_number, minutes_since_midnight)
+        target_minutes: target time in minutes (e.g., 1435 for 23:55)
+        max_diff_minutes: max allowed difference (default 5 mins = 300 sec)
+    
+    Returns:
+        row_number if found, None otherwise
+    
+    Example:
+        time_rows = [(10, 1430), (11, 1435), (12, 1440)]  # 23:50, 23:55, 24:00→23:55
+        target = 1435  # 23:55
+        → returns 11 (exact match)
+        
+        If 23:55 data missing, still finds nearest (23:50 or 00:00)
+    """
+    if not time_rows:
+        return None
+    
+    if target_minutes is None:
+        # No target specified, return last available
+        return time_rows[-1][0]
+    
+    # Find closest match
+    nearest = min(time_rows, key=lambda x: abs(x[1] - target_minutes))
+    diff = abs(nearest[1] - target_minutes)
+    
+    # Only return if within acceptable range
+    if diff <= max_diff_minutes:
+        return nearest[0]
+    
+    # If no match within range, return last available (fallback)
+    return time_rows[-1][0]
+
+
+
+def _extract_value_from_ws(ws, target_time_hhmm, value_col_letter: str, time_header="Time", max_scan_rows: int = 5000):
+    """
+    ดึงค่าจากตารางที่มีคอลัมน์เวลา (Time) โดย:
+    - หา header 'Time' ก่อน
+    - สแกนแถวข้อมูลจำนวนจำกัด (กันไฟล์ใหญ่ max_row หลอก)
+    - เลือกแถวที่ใกล้เวลาเป้าหมายที่สุด (หรือแถวสุดท้าย)
+    - ถ้า cell ว่าง ไล่ขึ้นไปหาแถวก่อนหน้าที่มีค่า
+    คืนค่า: (value, status)
+    """
+    from openpyxl.utils.cell import column_index_from_string
+
+    hdr = _find_cell_exact(ws, time_header)
+    if not hdr:
+        return None, "NO_TIME_HEADER"
+
+    hdr_row, time_col = hdr
+
+    # เก็บแถวที่มีเวลา (จำกัดจำนวนแถวที่สแกน)
+    time_rows = []
+    blank_streak = 0
+    scanned = 0
+    max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
+    for r in range(hdr_row + 1, max_r + 1):
+        scanned += 1
+        v = ws.cell(r, time_col).value
+        hhmm = _normalize_scada_time(v)
+        mm = _hhmm_to_minutes(hhmm) if hhmm else None
+
+        if mm is not None:
+            time_rows.append((r, mm))
+            blank_streak = 0
+        else:
+            blank_streak += 1
+            # ถ้าเริ่มเจอแถวว่างยาว ๆ และมีข้อมูลแล้ว ให้หยุด เพื่อความเร็ว
+            if blank_streak >= 80 and time_rows:
+                break
+    metrics.incr("rows_scanned", scanned)
+
+    if not time_rows:
+        return None, "NO_DATA_ROW"
+
+    # เลือกแถวที่ “ใกล้เวลาเป้าหมายที่สุด”
+    if target_time_hhmm:
+        tmm = _hhmm_to_minutes(target_time_hhmm)
+        target_row = _find_nearest_time_row(time_rows, tmm, max_diff_minutes=300)
+        if target_row is None:
+            target_row = time_rows[-1][0]
+    else:
+        target_row = time_rows[-1][0]
+
+    # คอลัมน์ค่า
+    try:
+        col_idx = column_index_from_string(str(value_col_letter).strip().upper())
+    except Exception:
+        return None, "BAD_COLUMN"
+
+    # ถ้าแถวที่เลือกว่าง → ไล่ขึ้นไปหาแถวก่อนหน้าที่มีค่า
+    for rr in range(target_row, hdr_row, -1):
+        val = ws.cell(rr, col_idx).value
+        if val not in (None, "", " "):
+            return val, "OK"
+
+    return None, "EMPTY_CELL"
+
+
+def _norm_filekey(name: str) -> str:
+    """normalize ชื่อไฟล์/คีย์เพื่อเทียบกันแบบหยาบ ๆ"""
+    base = os.path.splitext(os.path.basename(str(name)))[0]
+    base = base.strip().lower()
+    base = re.sub(r"\s+", "_", base)
+    base = re.sub(r"[^a-z0-9_]+", "_", base)
+    base = re.sub(r"_+", "_", base).strip("_")
+    return base
+
+def _is_uf_gen_report_workbook(wb) -> bool:
+    """ตรวจว่าเป็นไฟล์ UF/System แบบใหม่ (เช่น AF_Report_Gen.. มีหลาย sheet: Total/PV/FM_01..)"""
+    try:
+        names = {str(n).strip().lower() for n in (wb.sheetnames or [])}
+        return ("total" in names) and ("pv" in names) and any(n.startswith("fm_") for n in names)
+    except Exception:
+        return False
+
+def _resolve_sheet_name_for_export(wb, desired_sheet: str, point_id: str) -> str:
+    """
+    map ชื่อ sheet ให้เข้ากับไฟล์จริง:
+    - ถ้ามี sheet ตรงชื่อ -> ใช้เลย
+    - ถ้า desired='Sheet1' แต่ไฟล์เป็น UF gen report -> ใช้ 'Total' (เทียบเท่า Sheet1 เดิม)
+    - ไม่งั้น fallback เป็น sheet แรก
+    """
+    try:
+        if not wb:
+            return desired_sheet
+        sheetnames = wb.sheetnames or []
+        if desired_sheet in sheetnames:
+            return desired_sheet
+
+        # case-insensitive match
+        ds = str(desired_sheet or "").strip().lower()
+        for s in sheetnames:
+            if str(s).strip().lower() == ds:
+                return s
+
+        # UF gen report: Sheet1 -> Total
+        if ds in ("sheet1", "sheet 1") and _is_uf_gen_report_workbook(wb):
+            for s in sheetnames:
+                if str(s).strip().lower() == "total":
+                    return s
+
+        # fallback
+        return sheetnames[0] if sheetnames else desired_sheet
+    except Exception:
+        return desired_sheet
+
+
+def extract_scada_values_from_exports(
+    mapping_rows,
+    uploaded_exports: dict,
+    file_key_map: dict | None = None,
+    target_date=None,
+    allow_single_file_fallback: bool = True,
+    custom_max_scan_rows: int = 0,
+):
+    """
+    mapping_rows: list[dict] จาก load_scada_excel_mapping
+    uploaded_exports: dict filename->bytes ของไฟล์ Excel ที่อัปโหลด
+    file_key_map: (optional) dict ของ key_norm -> filename เพื่อบังคับจับคู่ไฟล์ (กันกรณีลูกค้าเปลี่ยนชื่อไฟล์)
+    target_date: (optional) datetime.date ที่ผู้ใช้เลือกในหน้า SCADA Export
+                 - ถ้าไฟล์มีคอลัมน์ Date (เช่น AF_Report_Gen...) จะใช้กรองให้ตรงวันก่อนเลือกเวลา
+
+    คืนค่า:
+      - results: list[dict] สำหรับแสดงในตาราง
+      - missing: list[dict] รายการที่ดึงไม่สำเร็จ
+    """
+    import openpyxl
+    from openpyxl.utils.cell import column_index_from_string
+
+    file_key_map = file_key_map or {}
+
+    # ---- lazy workbook cache (กันโหลดไฟล์ใหญ่โดยไม่จำเป็น) ----
+    wb_cache: dict[str, openpyxl.Workbook | None] = {}
+    wb_is_ufgen: dict[str, bool] = {}
+
+    def get_wb(fname: str):
+        if fname in wb_cache:
+            return wb_cache[fname]
+
+        b = uploaded_exports.get(fname)
+        if b is None:
+            wb_cache[fname] = None
+            wb_is_ufgen[fname] = False
+            return None
+
+        # ไฟล์ใหญ่มาก (เช่น AF_Report) ให้ใช้ read_only เพื่อลด RAM
+        read_only = len(b) >= 20_000_000
+        try:
+            wb = openpyxl.load_workbook(io.BytesIO(b), data_only=True, read_only=read_only)
+            wb_cache[fname] = wb
+            try:
+                wb_is_ufgen[fname] = _is_uf_gen_report_workbook(wb)
+            except Exception:
+                wb_is_ufgen[fname] = False
+            return wb
+        except Exception:
+            wb_cache[fname] = None
+            wb_is_ufgen[fname] = False
+            return None
+
+    # helper: หาไฟล์ที่ตรงกับ file_key
+    def pick_file_for_key(file_key: str):
+        logger.debug("========== FILE MATCH DEBUG ==========")
+        logger.debug(f"uploaded_exports.keys(): {list(uploaded_exports.keys())}")
+        logger.debug(f"file_key: {file_key}")
+        key_norm = _strip_date_prefix(file_key)
+        key_norm2 = _norm_filekey(key_norm)
+        key_norm_full = _norm_filekey(file_key)
+        logger.debug(f"key_norm: {key_norm}")
+        logger.debug(f"key_norm2: {key_norm2}")
+        logger.debug(f"key_norm_full: {key_norm_full}")
+        fnames = list(uploaded_exports.keys())
+        logger.debug(f"fnames: {fnames}")
+        # ...existing code...
+        if not uploaded_exports:
+            return None
+
+        # normalize key (ตัดวันที่ด้านหน้าออกก่อน เพื่อตรงกับชื่อไฟล์ที่อัปโหลดคนละวัน)
+        key_norm = _strip_date_prefix(file_key)
+        key_norm2 = _norm_filekey(key_norm)
+        key_norm_full = _norm_filekey(file_key)
+
+        fnames = list(uploaded_exports.keys())
+
+        def _strip(fname: str) -> str:
+            return _strip_date_prefix(fname)
+
+        def _norm(fname: str) -> str:
+            # normalize จากชื่อที่ตัดวันที่แล้ว
+            return _norm_filekey(_strip(fname))
+
+        # 0) ถ้าผู้ใช้บังคับ map ไว้ ใช้อันนั้นก่อน
+        forced = (
+            file_key_map.get(key_norm)
+            or file_key_map.get(key_norm2)
+            or file_key_map.get(key_norm_full)
+        )
+        if forced and forced in uploaded_exports:
+            logger.debug(f"[MATCH] forced: {forced}")
+            return forced
+
+        # 1) match แบบ "ตรงชื่อเป๊ะ" ก่อน (แก้เคส Daily_Report ชนกับ SMMT_Daily_Report)
+        if key_norm:
+            exact = [f for f in fnames if _strip(f) == key_norm]
+            logger.debug(f"[MATCH] exact: {exact}")
+            if exact:
+                if "smmt" not in key_norm2:
+                    non_smmt = [f for f in exact if "smmt" not in _norm(f)]
+                    logger.debug(f"[MATCH] non_smmt: {non_smmt}")
+                    if non_smmt:
+                        logger.debug(f"[MATCH] exact-non_smmt: {non_smmt[0]}")
+                        return non_smmt[0]
+                logger.debug(f"[MATCH] exact: {exact[0]}")
+                return exact[0]
+
+        if key_norm2:
+            exact2 = [f for f in fnames if _norm(f) == key_norm2]
+            logger.debug(f"[MATCH] exact2: {exact2}")
+            if exact2:
+                if "smmt" not in key_norm2:
+                    non_smmt = [f for f in exact2 if "smmt" not in _norm(f)]
+                    logger.debug(f"[MATCH] exact2-non_smmt: {non_smmt}")
+                    if non_smmt:
+                        logger.debug(f"[MATCH] exact2-non_smmt: {non_smmt[0]}")
+                        return non_smmt[0]
+                logger.debug(f"[MATCH] exact2: {exact2[0]}")
+                return exact2[0]
+
+        # 2) UF_System → (สำคัญ) อย่าเปิดไฟล์ทุกตัวเพื่อเดา เพราะไฟล์ใหญ่มากจะช้า
+        if "uf_system" in key_norm2 or "ufsystem" in key_norm2:
+            for fname in fnames:
+                fn = _norm_filekey(fname)
+                if "uf_system" in fn or "ufsystem" in fn:
+                    logger.debug(f"[MATCH] uf_system: {fname}")
+                    return fname
+            for fname in fnames:
+                fn = _norm_filekey(fname)
+                if "af_report" in fn or "report_gen" in fn or "reportgen" in fn:
+                    logger.debug(f"[MATCH] fallback AF_Report: {fname}")
+                    return fname
+
+        # 3) match แบบ contains + scoring (กรณีชื่อไม่ตรงเป๊ะ)
+        def _score(fname: str) -> int:
+            s = _strip(fname)
+            n = _norm(fname)
+            sc = 0
+            if key_norm and key_norm in s:
+                sc += 6
+                if s == key_norm:
+                    sc += 10
+                if s.endswith(key_norm):
+                    sc += 3
+            if key_norm2 and key_norm2 in n:
+                sc += 6
+                if n == key_norm2:
+                    sc += 10
+                if n.endswith(key_norm2):
+                    sc += 3
+
+            # ลงโทษเคสชน SMMT
+            if ("smmt" in n) != ("smmt" in key_norm2):
+                sc -= 6
+
+            # prefer ใกล้เคียงความยาว (กัน matching กว้างเกิน)
+            sc -= abs(len(n) - len(key_norm2))
+            return sc
+
+        cand = []
+        for fname in fnames:
+            s = _strip(fname)
+            n = _norm(fname)
+            if (key_norm and key_norm in s) or (key_norm2 and key_norm2 in n) or (key_norm_full and key_norm_full in _norm_filekey(fname)):
+                cand.append(fname)
+
+        logger.debug(f"[MATCH] candidates: {cand}")
+        if cand:
+            cand.sort(key=_score, reverse=True)
+            logger.debug(f"[MATCH] best candidate: {cand[0]}")
+            return cand[0]
+
+        # 4) fallback: ถ้ามีไฟล์เดียว ให้คืนไฟล์นั้น (ปิดได้เพื่อกัน match ผิดตอนประมวลผลไฟล์ใหม่แค่ไฟล์เดียว)
+        if allow_single_file_fallback and len(fnames) == 1:
+            logger.debug(f"[MATCH] fallback single file: {fnames[0]}")
+            return fnames[0]
+
+        logger.debug(f"[MATCH] NOT FOUND for file_key: {file_key}")
+        return None
+
+    # ===== Scan time rows ต่อ sheet แค่ครั้งเดียว =====
+    # key ต้องรวม target_date เพราะไฟล์ AF_Report มีหลายวัน
+    sheet_ctx_cache = {}  # (fname, sheet, target_date) -> ctx
+
+    import datetime as dt
+    from openpyxl.utils.datetime import from_excel
+
+    def _coerce_date(v):
+        """แปลงค่า 'วันที่' จากไฟล์ Excel ให้เป็น date
+
+        รองรับหลายแบบเพื่อกันเคสไฟล์ SCADA ใส่วันที่เป็น:
+        - datetime / date
+        - Excel serial number (เช่น 45291)
+        - string (เช่น 2026/01/19, 2026-01-19, 19/01/2026)
+        """
+        if v is None:
+            return None
+        if isinstance(v, dt.datetime):
+            return v.date()
+        if isinstance(v, dt.date):
+            return v
+
+        # Excel serial date
+        if isinstance(v, (int, float)):
+            try:
+                # บางไฟล์เป็น float เล็ก ๆ ที่ไม่ใช่ serial จริง
+                if float(v) > 1:
+                    return from_excel(v).date()
+            except Exception:
+                pass
+
+        # String date
+        if isinstance(v, str):
+            s = v.strip()
+            if not s:
+                return None
+            # เอาแค่ 10 ตัวแรก เผื่อมีเวลาแนบท้าย
+            s10 = s[:10]
+            for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y"):
+                try:
+                    return dt.datetime.strptime(s10, fmt).date()
+                except Exception:
+                    continue
+
+        return None
+
+    def get_sheet_ctx(fname: str, wb, sheet: str, target_date_local, custom_max_scan_rows: int = 0):
+        key = (fname, sheet, target_date_local)
+        if key in sheet_ctx_cache:
+            return sheet_ctx_cache[key]
+
+        if not wb or sheet not in (wb.sheetnames or []):
+            ctx = {"status": "NO_SHEET"}
+            sheet_ctx_cache[key] = ctx
+            return ctx
+
+        ws = wb[sheet]
+        hdr = _find_cell_exact(ws, "Time")
+        if not hdr:
+            ctx = {"status": "NO_TIME_HEADER"}
+            sheet_ctx_cache[key] = ctx
+            return ctx
+
+        hdr_row, time_col = hdr
+
+        # หา Date header ที่อยู่แถวเดียวกับ Time (ถ้ามี)
+        date_col = None
+        try:
+            if time_col > 1:
+                left = ws.cell(hdr_row, time_col - 1).value
+                if isinstance(left, str) and left.strip().lower() == "date":
+                    date_col = time_col - 1
+            if not date_col:
+                # ลองหาในหัวแถวเดียวกัน
+                max_c = min(ws.max_column or 0, 40)
+                for c in range(1, max_c + 1):
+                    v = ws.cell(hdr_row, c).value
+                    if isinstance(v, str) and v.strip().lower() == "date":
+                        date_col = c
+                        break
+        except Exception:
+            date_col = None
+
+        time_rows: list[tuple[int, int]] = []  # (row_idx, minutes)
+        blank_streak = 0
+        scanned = 0
+
+        # ถ้ามี Date column และผู้ใช้เลือกวัน → สแกนจนเจอวันนั้น และหยุดเมื่อเลยวัน (ลดเวลา)
+        if date_col and target_date_local:
+            started = False
+            # กันเคสไฟล์ใหญ่มาก (AF_Report_Gen) ที่ ws.max_row หลอกจนค้าง
+            if custom_max_scan_rows > 0:
+                max_scan_rows = custom_max_scan_rows
+            else:
+                max_scan_rows = 50000  # ค่าเริ่มต้น
+            max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
+            min_c = min(date_col, time_col)
+            max_c = max(date_col, time_col)
+
+            for r, rowvals in enumerate(
+                ws.iter_rows(
+                    min_row=hdr_row + 1,
+                    max_row=max_r,
+                    min_col=min_c,
+                    max_col=max_c,
+                    values_only=True,
+                ),
+                start=hdr_row + 1,
+            ):
+                scanned += 1
+                # map ค่าออกมาตามคอลัมน์จริง
+                # rowvals จัดตาม min_c..max_c
+                def _val_at_col(col):
+                    return rowvals[col - min_c]
+
+                dval = _coerce_date(_val_at_col(date_col))
+                if dval is None:
+                    continue
+
+                if dval < target_date_local:
+                    continue
+
+                if dval > target_date_local:
+                    if started and time_rows:
+                        break
+                    continue
+
+                started = True
+                tval = _val_at_col(time_col)
+                hhmm = _normalize_scada_time(tval)
+                mm = _hhmm_to_minutes(hhmm) if hhmm else None
+                if mm is not None:
+                    time_rows.append((r, mm))
+                    blank_streak = 0
+                else:
+                    blank_streak += 1
+                    if blank_streak >= 200 and time_rows:
+                        break
+        else:
+            # ไฟล์ทั่วไป (Daily/SMMT): จำกัด scan ตามค่า custom หรือ 100000 แถว (ไม่จำกัด)
+            if custom_max_scan_rows > 0:
+                max_scan_rows = custom_max_scan_rows
+            else:
+                max_scan_rows = 100000  # ค่าเริ่มต้นสแกนเกือบทั้งไฟล์
+            max_r = min(ws.max_row or 0, hdr_row + max_scan_rows)
+
+            for r, (tval,) in enumerate(
+                ws.iter_rows(
+                    min_row=hdr_row + 1,
+                    max_row=max_r,
+                    min_col=time_col,
+                    max_col=time_col,
+                    values_only=True,
+                ),
+                start=hdr_row + 1,
+            ):
+                scanned += 1
+                hhmm = _normalize_scada_time(tval)
+                mm = _hhmm_to_minutes(hhmm) if hhmm else None
+                if mm is not None:
+                    time_rows.append((r, mm))
+                    blank_streak = 0
+                else:
+                    blank_streak += 1
+                    if blank_streak >= 80 and time_rows:
+                        break
+
+        metrics.incr("rows_scanned", scanned)
+
+        if not time_rows:
+            ctx = {"status": "NO_DATA_ROW"}
+            sheet_ctx_cache[key] = ctx
+            return ctx
+
+        ctx = {
+            "status": "OK",
+            "ws": ws,
+            "hdr_row": hdr_row,
+            "time_col": time_col,
+            "date_col": date_col,
+            "time_rows": time_rows,
+            "target_row_cache": {},  # hhmm -> row
+        }
+        sheet_ctx_cache[key] = ctx
+        return ctx
+
+    def pick_target_row(ctx, target_time_hhmm: str | None):
+        # ถ้าไม่กำหนดเวลา → ใช้แถวสุดท้ายของช่วงที่สแกนได้
+        if not target_time_hhmm:
+            return ctx["time_rows"][-1][0]
+
+        if target_time_hhmm in ctx["target_row_cache"]:
+            return ctx["target_row_cache"][target_time_hhmm]
+
+        tmm = _hhmm_to_minutes(target_time_hhmm)
+        row = _find_nearest_time_row(ctx["time_rows"], tmm, max_diff_minutes=300)
+        if row is None:
+            row = ctx["time_rows"][-1][0]
+
+        ctx["target_row_cache"][target_time_hhmm] = row
+        return row
+
+    # ---- สำคัญ: ห้าม ws.cell() กับ read_only workbook เพราะช้ามาก (O(n) ทุกครั้ง) ----
+    # จะอ่าน "ทั้งแถว" ด้วย iter_rows แค่ 1 ครั้ง แล้วหยิบค่าคอลัมน์ที่ต้องการ
+    row_cache: dict[tuple[str, str, int], tuple] = {}
+
+    results: list[dict] = []
+    missing: list[dict] = []
+
+    for row in mapping_rows:
+        point_id = row["point_id"]
+        file_key = row["file_key"]
+        desired_sheet = row.get("sheet") or "Sheet1"
+        col = row.get("col") or ""
+        t_hhmm = _normalize_scada_time(row.get("time"))
+
+        fname = pick_file_for_key(file_key)
+        if not fname:
+            missing.append({**row, "reason": "NO_MATCH_FILE"})
+            results.append({
+                "point_id": point_id,
+                "value": None,
+                "file": file_key,
+                "matched_file": None,
+                "sheet": desired_sheet,
+                "time": t_hhmm,
+                "col": col,
+                "status": "NO_FILE",
+            })
+            continue
+
+        wb = get_wb(fname)
+        if not wb:
+            missing.append({**row, "reason": "OPEN_FAIL"})
+            results.append({
+                "point_id": point_id,
+                "value": None,
+                "file": file_key,
+                "matched_file": fname,
+                "sheet": desired_sheet,
+                "time": t_hhmm,
+                "col": col,
+                "status": "OPEN_FAIL",
+            })
+            continue
+
+        sheet = _resolve_sheet_name_for_export(wb, desired_sheet, point_id)
+        ctx = get_sheet_ctx(fname, wb, sheet, target_date, custom_max_scan_rows=custom_max_scan_rows)
+
+        if ctx.get("status") != "OK":
+            stt = ctx.get("status")
+            missing.append({**row, "reason": stt})
+            results.append({
+                "point_id": point_id,
+                "value": None,
+                "file": file_key,
+                "matched_file": fname,
+                "sheet": sheet,
+                "time": t_hhmm,
+                "col": col,
+                "status": stt,
+            })
+            continue
+
+        # เลือกแถวที่ใกล้เวลาเป้าหมายที่สุด
+        target_row = pick_target_row(ctx, t_hhmm)
+
+        # แปลงคอลัมน์ตัวอักษร -> index
+        try:
+            col_idx = column_index_from_string(str(col).strip().upper())
+        except Exception:
+            missing.append({**row, "reason": "BAD_COLUMN"})
+            results.append({
+                "point_id": point_id,
+                "value": None,
+                "file": file_key,
+                "matched_file": fname,
+                "sheet": sheet,
+                "time": t_hhmm,
+                "col": col,
+                "status": "BAD_COLUMN",
+            })
+            continue
+
+        # ดึงทั้งแถวครั้งเดียว (เร็วกว่า ws.cell มาก)
+        row_key = (fname, sheet, target_row)
+        rowvals = row_cache.get(row_key)
+        if rowvals is None:
+            try:
+                rowvals = next(ctx["ws"].iter_rows(min_row=target_row, max_row=target_row, values_only=True))
+                row_cache[row_key] = rowvals
+            except StopIteration:
+                rowvals = None
+            except Exception:
+                rowvals = None
+
+        if not rowvals or col_idx > len(rowvals):
+            missing.append({**row, "reason": "OUT_OF_RANGE"})
+            results.append({
+                "point_id": point_id,
+                "value": None,
+                "file": file_key,
+                "matched_file": fname,
+                "sheet": sheet,
+                "time": t_hhmm,
+                "col": col,
+                "status": "OUT_OF_RANGE",
+            })
+            continue
+
+        value = rowvals[col_idx - 1]
+
+        # ทำให้เป็นเลข (ถ้าเป็น string) - ใช้ helper function
+        value = parse_scada_numeric_value(value)
+
+        stt = "OK" if value is not None else "EMPTY"
+        if stt != "OK":
+            missing.append({**row, "reason": stt})
+
+        results.append({
+            "point_id": point_id,
+            "value": value,
+            "file": file_key,
+                "matched_file": fname,
+            "sheet": sheet,
+            "time": t_hhmm,
+            "col": col,
+            "status": stt,
+        })
+
+    return results, missing
+
+
+def parse_scada_numeric_value(value):
+    """
+    Parse numeric value from SCADA export ที่อาจมีรูปแบบแตกต่างกัน
+    รองรับ: English format (123.45), Thai format (123,45), European format (1.234,56), etc.
+    
+    Returns:
+        float: parsed value, or None if cannot parse
+    """
+    if value is None:
+        return None
+    
+    # ถ้าเป็น number อยู่แล้ว
+    if isinstance(value, (int, float)):
+        try:
+            return float(value)
+        except Exception:
+            return None
+    
+    # ถ้าเป็น string
+    if isinstance(value, str):
+        vv = value.strip()
+        
+        # Handle empty/invalid strings
+        if not vv or vv.lower() in ("", "none", "null", "-", "n/a", "na"):
+            return None
+        
+        # นับจำนวน dots และ commas
+        dot_count = vv.count(".")
+        comma_count = vv.count(",")
+        
+        try:
+            # Case 1: ไม่มี separator (เช่น "123" หรือ "12345")
+            if dot_count == 0 and comma_count == 0:
+                return float(vv)
+            
+            # Case 2: มี dot เดียว (English format เช่น "123.45")
+            elif dot_count == 1 and comma_count == 0:
+                return float(vv)
+            
+            # Case 3: มี comma เดียว - ต้องตรวจสอบว่าเป็น decimal หรือ thousands separator
+            elif dot_count == 0 and comma_count == 1:
+                # ถ้า comma หลังตัวที่ 3 จากท้าย -> น่าจะเป็น thousands separator
+                parts = vv.split(",")
+                if len(parts[-1]) > 3:
+                    # ตัวหลังสุดมากกว่า 3 หลัก -> เป็น decimal แน่ๆ
+                    return float(vv.replace(",", "."))
+                else:
+                    # ตัวหลังสุด <= 3 หลัก -> น่าจะเป็น thousands (เช่น 1,234) แต่อาจเป็น decimal (เช่น 1,5)
+                    # ให้ลอง parse แบบ decimal ก่อน ถ้าได้ค่า < 1 ให้ใช้ decimal มิฉะนั้น... ลองนึกใหม่
+                    # สำหรับ SCADA โดยทั่วไป: ถ้ามี comma เดียวแล้ว น่าจะเป็น decimal more often
+                    return float(vv.replace(",", "."))
+            
+            # Case 4: มี dot และ comma (thousand separator + decimal)
+            elif dot_count == 1 and comma_count == 1:
+                last_dot = vv.rfind(".")
+                last_comma = vv.rfind(",")
+                
+                if last_dot > last_comma:
+                    # English format with comma thousands: 1,234.56
+                    return float(vv.replace(",", ""))
+                else:
+                    # European format: 1.234,56
+                    return float(vv.replace(".", "").replace(",", "."))
+            
+            # Case 5: หลาย dots, ไม่มี comma (European thousands เช่น "1.234.567")
+            elif dot_count > 1 and comma_count == 0:
+                return float(vv.replace(".", ""))
+            
+            # Case 6: หลาย commas, ไม่มี dot
+            elif comma_count > 1 and dot_count == 0:
+                parts = vv.split(",")
+                # เชค: ถ้าตัวหลังสุดมี <= 3 หลักและอย่างน้อย 1 หลัก อาจเป็น decimal
+                last_part = parts[-1]
+                if 1 <= len(last_part) <= 3:
+                    # น่าจะเป็น decimal format (เช่น 1,234,567 with European decimal คือ 1234567.0)
+                    # แต่แบบนี้หายากมากสำหรับ SCADA ปกติ
+                    # ส่วนใหญ่ commas หลายตัว แปลว่า thousands separator
+                    return float(vv.replace(",", ""))
+                else:
+                    return float(vv.replace(",", ""))
+            
+            # Case 7: complex (หลาย dots และ commas)
+            else:
+                # ลองแบบ: remove dots แล้ว replace comma เป็น dot
+                temp = vv.replace(".", "").replace(",", ".")
+                return float(temp)
+        
+        except (ValueError, AttributeError):
+            return None
+    
+    return None
@@ -0,0 +1,205 @@
+"""
+Seven Segment - อ่าน/ตรวจเลขมิเตอร์ดิจิทัล (7-segment) ในเครื่อง ไม่ต้องยิง Vision
+
+เดิม _apply_template_matching_refinement ใน app.py เรียก _validate_digit_char กับภาพว่าง np.zeros((20, 20))
+→ "template score" เป็นค่าคงที่ทุกตัว (เสีย CPU เปล่า ๆ และไม่มีใครเรียกใช้)
+
+ขั้นตอน:
+    1) กรอบของแต่ละหลัก: แยกหลักใน ROI เอง (find_digit_boxes) หรือแบ่งจากกรอบ token ของ OCR (boxes_from_tokens)
+    2) segment_occupancy(): สัดส่วน pixel เลขใน 7 ช่อง segment ของทุกหลักพร้อมกัน
+       (integral image + NumPy fancy indexing → array (N, 7) ไม่มี loop ต่อหลัก/ต่อ segment)
+    3) classify(): occupancy → ความน่าจะเป็นว่า segment ติด → likelihood เทียบตาราง 0-9 → (N, 10) confidences
+    4) verify_reading(): เทียบค่าที่ OCR อ่านได้กับที่อ่านเองทีละหลัก → ตรงกัน / แก้ได้ (ต่างไม่เกิน MAX_FIX หลัก)
+
+segments: a=บน, b=ขวาบน, c=ขวาล่าง, d=ล่าง, e=ซ้ายล่าง, f=ซ้ายบน, g=กลาง
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+# ========================================
+# Configuration
+# ========================================
+ENABLED = os.environ.get("SEVEN_SEGMENT", "1").strip().lower() not in ("0", "false", "no")
+ON_THRESHOLD = 0.40   # occupancy ที่ถือว่า segment ติดครึ่ง ๆ (p = 0.5)
+SOFTNESS = 0.08       # ความชันของ sigmoid รอบ ON_THRESHOLD
+AGREE_CONF = 0.80     # ทุกหลักต้องมั่นใจอย่างน้อยเท่านี้ถึงจะนับว่า "ยืนยัน" / "แก้" ได้
+MAX_FIX = 1           # แก้ค่าของ OCR ได้สูงสุดกี่หลัก
+MIN_DIGIT_HEIGHT = 0.35  # ความสูงหลักขั้นต่ำ (สัดส่วนของความสูง ROI)
+
+SEGMENTS = "abcdefg"
+
+_DIGIT_SEGMENTS = {
+    '0': 'abcdef',
+    '1': 'bc',
+    '2': 'abdeg',
+    '3': 'abcdg',
+    '4': 'bcfg',
+    '5': 'acdfg',
+    '6': 'acdefg',
+    '7': 'abc',
+    '8': 'abcdefg',
+    '9': 'abcdfg',
+}
+
+# (10, 7) — 1 = segment ติดสำหรับเลขนั้น
+DIGIT_TABLE = np.array([[1.0 if s in _DIGIT_SEGMENTS[str(d)] else 0.0 for s in SEGMENTS] for d in range(10)])
+
+# (7, 4) — ช่องของแต่ละ segment ในกรอบหลัก (x1, y1, x2, y2 เป็นสัดส่วน 0-1)
+SEGMENT_BOXES = np.array([
+    [0.25, 0.00, 0.75, 0.16],  # a
+    [0.72, 0.12, 1.00, 0.42],  # b
+    [0.72, 0.58, 1.00, 0.88],  # c
+    [0.25, 0.84, 0.75, 1.00],  # d
+    [0.00, 0.58, 0.28, 0.88],  # e
+    [0.00, 0.12, 0.28, 0.42],  # f
+    [0.25, 0.43, 0.75, 0.57],  # g
+])
+
+
+# ========================================
+# Binarize + digit boxes
+# ========================================
+def binarize(gray) -> np.ndarray:
+    """grayscale → uint8 0/1 (1 = เลข) — Otsu + กลับสีอัตโนมัติ (LCD เลขเข้ม / LED เลขสว่าง: เลขเป็นส่วนน้อยเสมอ)"""
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    _, th = cv2.threshold(cv2.GaussianBlur(gray, (3, 3), 0), 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if th.mean() > 0.5:
+        th = 1 - th
+    return th.astype(np.uint8)
+
+
+def find_digit_boxes(binary, min_height: float = MIN_DIGIT_HEIGHT) -> np.ndarray:
+    """
+    แยกหลักจากภาพ 0/1 ของ ROI → array (N, 4) int เรียงซ้าย → ขวา
+    - แบ่งตาม column projection: segment ของหลักเดียวกันซ้อนกันในแนว x เสมอ (a/d/g คร่อม b/c/e/f)
+      แต่ระหว่างหลักมีคอลัมน์ว่าง → ไม่ต้องพึ่ง contour (segment แต่ละชิ้นแยกกันเป็นคนละ contour)
+    - ตัดช่วงเตี้ย (จุดทศนิยม / noise) และช่วงกว้างผิดปกติ (ขอบจอ / เส้นกรอบคร่อมทั้งแถว)
+    - ทุกหลักใช้ช่องขนาดเดียวกัน: เลขที่ไม่มี a/d (4, 7) กรอบเตี้ย, ไม่มี e/f (1, 3, 7) กรอบแคบ
+      → ยืดบน/ล่างตามแถว + ขยายไปทางซ้ายจนกว้างเท่าหลักทั่วไป (ยึดขอบขวา)
+    """
+    H, W = binary.shape[:2]
+    clean = cv2.morphologyEx(binary, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    cols = np.concatenate([[False], clean.sum(axis=0) >= 2, [False]])
+    edges = np.flatnonzero(np.diff(cols.astype(np.int8)))
+    if not len(edges):
+        return np.zeros((0, 4), dtype=int)
+    x, x2 = edges[0::2], edges[1::2]
+
+    rows = np.stack([clean[:, a:b].any(axis=1) for a, b in zip(x, x2)])  # (spans, H)
+    y = rows.argmax(axis=1)
+    y2 = H - rows[:, ::-1].argmax(axis=1)
+    w, h = x2 - x, y2 - y
+    keep = (h >= min_height * H) & (w <= 1.2 * h)
+    if not keep.any():
+        return np.zeros((0, 4), dtype=int)
+    x, y, w, h = x[keep], y[keep], w[keep], h[keep]
+    tall = h >= 0.6 * h.max()
+    x, y, w, h = x[tall], y[tall], w[tall], h[tall]
+
+    wide = w >= 0.35 * h
+    typ_w = int(np.percentile(w[wide], 75)) if wide.any() else int(np.median(h) * 0.55)
+    top, bottom = np.minimum(y, int(np.median(y))), np.maximum(y + h, int(np.median(y + h)))
+    x1 = np.maximum(0, np.minimum(x, x + w - typ_w))
+    return np.stack([x1, top, x + w, bottom], axis=1)
+
+
+def boxes_from_tokens(tokens, scale: float = 1.0):
+    """
+    กรอบ token ของ OCR (make_token ใน ocr_backends) → (boxes (N, 4), ตัวอักษร N ตัว)
+    token ของ Vision เป็นระดับคำ → แบ่งความกว้างเท่า ๆ กันตามจำนวนหลัก (จุด/คอมมาไม่นับ)
+    scale: ตัวคูณพิกัด (ภาพที่ส่ง OCR ถูกขยาย/ย่อจากภาพที่จะวัด)
+    """
+    boxes, chars = [], []
+    for t in tokens or []:
+        digits = [c for c in str(t.get("text", "")) if c.isdigit()]
+        if not digits:
+            continue
+        x1, y1, x2, y2 = (float(t[k]) * scale for k in ("x1", "y1", "x2", "y2"))
+        edges = np.linspace(x1, x2, len(digits) + 1)
+        for i, c in enumerate(digits):
+            boxes.append([edges[i], y1, edges[i + 1], y2])
+            chars.append(c)
+    return np.array(boxes, dtype=float).reshape(-1, 4).round().astype(int), chars
+
+
+# ========================================
+# Vectorized occupancy + classification
+# ========================================
+def segment_occupancy(binary, boxes) -> np.ndarray:
+    """สัดส่วน pixel เลขในแต่ละ segment ของทุกหลัก → (N, 7) float (integral image ครั้งเดียวทั้ง ROI)"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    if not len(boxes):
+        return np.zeros((0, 7))
+    H, W = binary.shape[:2]
+    ii = cv2.integral(binary.astype(np.uint8)).astype(np.int64)  # (H+1, W+1)
+
+    ox, oy = boxes[:, None, 0], boxes[:, None, 1]              # (N, 1)
+    bw, bh = (boxes[:, 2] - boxes[:, 0])[:, None], (boxes[:, 3] - boxes[:, 1])[:, None]
+    sx1 = np.clip(np.floor(ox + SEGMENT_BOXES[None, :, 0] * bw), 0, W - 1).astype(int)  # (N, 7)
+    sy1 = np.clip(np.floor(oy + SEGMENT_BOXES[None, :, 1] * bh), 0, H - 1).astype(int)
+    sx2 = np.clip(np.ceil(ox + SEGMENT_BOXES[None, :, 2] * bw), sx1 + 1, W).astype(int)
+    sy2 = np.clip(np.ceil(oy + SEGMENT_BOXES[None, :, 3] * bh), sy1 + 1, H).astype(int)
+
+    sums = ii[sy2, sx2] - ii[sy1, sx2] - ii[sy2, sx1] + ii[sy1, sx1]
+    return sums / ((sx2 - sx1) * (sy2 - sy1))
+
+
+def classify(occupancy):
+    """(N, 7) occupancy → (digits 'str' N ตัว, confidence (N,), probs (N, 10))"""
+    occ = np.asarray(occupancy, dtype=float).reshape(-1, 7)
+    if not len(occ):
+        return "", np.zeros(0), np.zeros((0, 10))
+    p_on = 1.0 / (1.0 + np.exp(-(occ - ON_THRESHOLD) / SOFTNESS))
+    p_on = np.clip(p_on, 1e-4, 1 - 1e-4)
+    # log-likelihood ของแต่ละเลข = Σ log p(segment ตรงตาราง) → (N, 10)
+    ll = np.log(p_on) @ DIGIT_TABLE.T + np.log(1 - p_on) @ (1 - DIGIT_TABLE).T
+    ll -= ll.max(axis=1, keepdims=True)
+    probs = np.exp(ll)
+    probs /= probs.sum(axis=1, keepdims=True)
+    best = probs.argmax(axis=1)
+    return "".join(str(d) for d in best), probs[np.arange(len(best)), best], probs
+
+
+def read_digits(gray, boxes=None) -> dict:
+    """อ่านเลข 7-segment จาก ROI (boxes=None → แยกหลักเอง) → {"text", "conf", "probs", "boxes"}"""
+    binary = binarize(gray)
+    if boxes is None:
+        boxes = find_digit_boxes(binary)
+    text, conf, probs = classify(segment_occupancy(binary, boxes))
+    return {"text": text, "conf": conf, "probs": probs, "boxes": np.asarray(boxes).reshape(-1, 4)}
+
+
+# ========================================
+# Validate / correct an OCR value
+# ========================================
+def verify_reading(reading: dict, value_digits: str, agree_conf: float = AGREE_CONF, max_fix: int = MAX_FIX) -> dict:
+    """
+    เทียบเลขที่ OCR อ่านได้ (value_digits เฉพาะตัวเลข ไม่มีจุด) กับผลของ read_digits()
+    จัดแนวจากขวา (จอมักแสดง 0 นำหน้า: '000123' ↔ '123' → หลักเกินต้องเป็น 0)
+    คืน {"status": "match" | "fix" | "unsure", "digits": เลขที่ยืนยัน/แก้แล้ว, "min_conf", "diff"}
+    """
+    local, conf = reading.get("text", ""), np.asarray(reading.get("conf", []), dtype=float)
+    value_digits = "".join(c for c in str(value_digits) if c.isdigit())
+    out = {"status": "unsure", "digits": value_digits, "min_conf": 0.0, "diff": 0}
+    if not local or not value_digits:
+        return out
+
+    n = len(value_digits)
+    if len(local) < n or any(c != "0" for c in local[:len(local) - n]):
+        return out  # จำนวนหลักไม่เข้ากัน → ไม่ตัดสิน
+    tail, tail_conf = local[-n:], conf[-n:]
+    out["min_conf"] = float(tail_conf.min())
+    if out["min_conf"] < agree_conf:
+        return out
+
+    diff = sum(a != b for a, b in zip(tail, value_digits))
+    out["diff"] = diff
+    if diff == 0:
+        out["status"] = "match"
+    elif diff <= max_fix:
+        out["status"], out["digits"] = "fix", tail
+    return out
@@ -0,0 +1,877 @@
+"""
+Google Sheets I/O (WaterMeter_System_DB + FM-OP-01-10WaterReport)
+ย้ายมาจาก app.py — ไม่มี Streamlit, gspread import ตอนสร้าง client ครั้งแรก
+"""
+
+import logging
+import os
+import random
+import string
+import threading
+import time as pytime
+from datetime import datetime
+
+from meter_core import metrics
+from meter_core.config import DB_SHEET_NAME, REAL_REPORT_SHEET, get_gc, get_thai_time
+from meter_core.gateway import get_gateway
+from meter_core.points_master import PointsMasterCache
+
+logger = logging.getLogger(__name__)
+
+THAI_MONTHS = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
+ENGLISH_MONTHS_SHORT = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+ENGLISH_MONTHS_LONG = ["January", "February", "March", "April", "May", "June",
+                       "July", "August", "September", "October", "November", "December"]
+
+
+# =========================================================
+# --- SHEET HELPERS ---
+# =========================================================
+def col_to_index(col_str):
+    col_str = str(col_str).upper().strip()
+    num = 0
+    for c in col_str:
+        if c in string.ascii_letters:
+            num = num * 26 + (ord(c.upper()) - ord('A')) + 1
+    return num
+
+
+def index_to_col(idx: int) -> str:
+    """1 -> A, 27 -> AA"""
+    out = ""
+    while idx > 0:
+        idx, rem = divmod(idx - 1, 26)
+        out = chr(ord('A') + rem) + out
+    return out
+
+
+def rowcol_to_a1(row: int, col: int) -> str:
+    """(18, 25) -> 'Y18' (เหมือน gspread.utils.rowcol_to_a1 แต่ไม่ต้อง import gspread)"""
+    return f"{index_to_col(int(col))}{int(row)}"
+
+
+# ✅ แก้ไข: รับวันที่เข้ามาเพื่อหา Sheet เดือนที่ถูกต้อง (เผื่อลงย้อนหลังข้ามเดือน)
+# ✅ Support both Thai and English month names with comprehensive month rollover handling
+def get_thai_sheet_name(sh, target_date, titles=None):
+    """Find the correct monthly sheet based on target_date.
+
+    Supports multiple naming conventions:
+    - Thai months: ม.ค. 68, ก.พ. 68, etc.
+    - English months: Jan2026, Feb2026, January2026, etc.
+
+    Args:
+        sh: gspread Spreadsheet object
+        target_date: datetime.date object to find the correct month
+        titles: (optional) ชื่อแท็บทั้งหมดที่อ่านไว้แล้ว (ไม่ต้องเรียก sh.worksheets() ซ้ำ)
+
+    Returns:
+        Sheet title if found, None otherwise
+    """
+    # ใช้วันที่ที่เลือก (target_date) แทนเวลาปัจจุบัน
+    m_idx = target_date.month - 1
+    # ปีพุทธศักราช (2 หรือ 4 หลัก)
+    yy2 = str(target_date.year + 543)[-2:]
+    yy4 = str(target_date.year + 543)
+    # ปีค.ศ. (2 หรือ 4 หลัก)
+    ad_yy2 = str(target_date.year)[-2:]
+    ad_yy4 = str(target_date.year)
+
+    all_sheets = titles if titles is not None else [s.title for s in _with_retry(sh.worksheets)]
+
+    # Try Thai month patterns first (highest priority)
+    thai_patterns = [
+        f"{THAI_MONTHS[m_idx]}{yy2}",      # ม.ค.68
+        f"{THAI_MONTHS[m_idx][:-1]}{yy2}", # ม.ค68  (without dot)
+        f"{THAI_MONTHS[m_idx]} {yy2}",     # ม.ค. 68
+        f"{THAI_MONTHS[m_idx][:-1]} {yy2}",# ม.ค 68
+        f"{THAI_MONTHS[m_idx]}{yy4}",      # ม.ค.2568
+        f"{THAI_MONTHS[m_idx][:-1]}{yy4}", # ม.ค2568
+        f"{THAI_MONTHS[m_idx]} {yy4}",     # ม.ค. 2568
+        f"{THAI_MONTHS[m_idx][:-1]} {yy4}",# ม.ค 2568
+    ]
+
+    for p in thai_patterns:
+        if p in all_sheets:
+            return p
+
+    # Try English month patterns (short names)
+    eng_patterns = [
+        f"{ENGLISH_MONTHS_SHORT[m_idx]}{ad_yy4}",  # Jan2026
+        f"{ENGLISH_MONTHS_SHORT[m_idx]} {ad_yy4}", # Jan 2026
+        f"{ENGLISH_MONTHS_SHORT[m_idx]}{ad_yy2}",  # Jan26
+        f"{ENGLISH_MONTHS_SHORT[m_idx]} {ad_yy2}", # Jan 26
+        f"{ENGLISH_MONTHS_LONG[m_idx]}{ad_yy4}",   # January2026
+        f"{ENGLISH_MONTHS_LONG[m_idx]} {ad_yy4}",  # January 2026
+        f"{ENGLISH_MONTHS_LONG[m_idx]}{ad_yy2}",   # January26
+        f"{ENGLISH_MONTHS_LONG[m_idx]} {ad_yy2}",  # January 26
+    ]
+
+    for p in eng_patterns:
+        if p in all_sheets:
+            return p
+
+    return None
+
+
+def find_month_sheet_name(sh, target_date, titles=None):
+    """
+    หาแท็บเดือน: ลองชื่อมาตรฐาน (get_thai_sheet_name) ก่อน
+    ถ้าไม่เจอ → หาแบบฟัซซี่ (ตัดช่องว่าง/จุด, ไม่สนตัวพิมพ์)
+    """
+    if titles is None:
+        titles = [s.title for s in _with_retry(sh.worksheets)]
+
+    sheet_name = get_thai_sheet_name(sh, target_date, titles=titles)
+    if sheet_name:
+        return sheet_name
+
+    m_idx = target_date.month - 1
+    yy2_thai = str(target_date.year + 543)[-2:]
+    yy4_thai = str(target_date.year + 543)
+    yy2_ad = str(target_date.year)[-2:]
+    yy4_ad = str(target_date.year)
+
+    m_norm_thai = THAI_MONTHS[m_idx].replace(".", "").replace(" ", "")
+
+    def norm(x):
+        return str(x).replace(".", "").replace(" ", "").lower().strip()
+
+    for t in titles:
+        tn = norm(t)
+        # Check Thai month patterns
+        if (m_norm_thai.lower() in tn) and (yy2_thai in tn or yy4_thai in tn):
+            return t
+        # Check English month patterns (case-insensitive)
+        if (ENGLISH_MONTHS_SHORT[m_idx].lower() in tn or ENGLISH_MONTHS_LONG[m_idx].lower() in tn) and (yy2_ad in tn or yy4_ad in tn):
+            return t
+    return None
+
+
+def find_day_row_exact(ws, day: int):
+    """แถวของวันที่ day ในแท็บเดือน (จาก ReportLayout ที่ cache ไว้ → ปกติไม่เสีย request)"""
+    try:
+        return report_layout(ws).row(day)
+    except Exception:
+        return None
+
+
+# =========================================================
+# --- 🚀 QUOTA-SAFE BATCH HELPERS (Sheets) ---
+# =========================================================
+def _is_quota_429(err: Exception) -> bool:
+    msg = str(err)
+    return ("429" in msg) or ("Quota exceeded" in msg) or ("Read requests" in msg)
+
+def _with_retry(fn, *args, max_retries: int = 6, base_sleep: float = 0.8, **kwargs):
+    """
+    Retry wrapper for Google Sheets calls that may hit 429 quota.
+    - ผ่าน SheetsGateway ก่อน (จองโควต้า read/write → ส่วนใหญ่ไม่ถึง 429)
+    - Exponential backoff + jitter (เผื่อ quota ฝั่ง Google แคบกว่าที่ตั้งไว้)
+    - นับ sheets_requests / sheets_429_retries ลง metrics
+    """
+    gateway = get_gateway()
+    last_err = None
+    for i in range(max_retries):
+        try:
+            metrics.incr("sheets_requests")
+            return gateway.call(fn, *args, **kwargs)
+        except Exception as e:
+            last_err = e
+            if _is_quota_429(e) and i < max_retries - 1:
+                metrics.incr("sheets_429_retries")
+                gateway.throttled(fn)
+                # backoff: 0.8, 1.6, 3.2, ...
+                sleep_s = base_sleep * (2 ** i) + random.random() * 0.4
+                pytime.sleep(sleep_s)
+                continue
+            raise
+    if last_err:
+        raise last_err
+
+
+# =========================================================
+# --- 🗂️ SPREADSHEET / WORKSHEET HANDLES (cache ต่อ process) ---
+# =========================================================
+# gc.open(name) = ค้น Drive + อ่าน metadata, sh.worksheets() / sh.worksheet() = อ่าน metadata อีกรอบ
+# → เปิดครั้งเดียว (ครั้งต่อไป open_by_key), เก็บรายการแท็บไว้ตาม TTL, จำ (ปี, เดือน) → ชื่อแท็บ
+# cache ถูกล้างเฉพาะตอนหาไม่เจอ (แท็บใหม่ / เปลี่ยนชื่อ) หรือครบ TTL ของรายการแท็บ
+WORKSHEET_LIST_TTL = int(os.environ.get("SHEETS_WORKSHEET_TTL", "600"))  # วินาที
+MISS_REFRESH_MIN_AGE = 30  # หาไม่เจอ → อ่านรายการแท็บใหม่ได้ ถ้ารายการเดิมเก่ากว่านี้ (กันอ่านซ้ำทุก call)
+
+
+class SpreadsheetHandles:
+    """handle ของ spreadsheet 1 ไฟล์ (thread-safe)"""
+
+    def __init__(self, name: str, ttl: int = WORKSHEET_LIST_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.key = None
+        self._sh = None
+        self._worksheets = None  # {title: Worksheet}
+        self._order = []         # title ตามลำดับแท็บ
+        self._fetched_at = 0.0
+        self._months = {}        # (year, month) -> title
+        self._layouts = {}       # title -> ReportLayout
+        self._lock = threading.RLock()
+
+    def spreadsheet(self):
+        with self._lock:
+            if self._sh is None:
+                gc = get_gc()
+                self._sh = _with_retry(gc.open_by_key, self.key) if self.key else _with_retry(gc.open, self.name)
+                self.key = self._sh.id
+            return self._sh
+
+    def _fetch(self):
+        wss = _with_retry(self.spreadsheet().worksheets)
+        self._worksheets = {w.title: w for w in wss}
+        self._order = [w.title for w in wss]
+        self._fetched_at = pytime.monotonic()
+
+    def _ensure(self, refresh: bool = False):
+        age = pytime.monotonic() - self._fetched_at
+        if self._worksheets is None or age > self.ttl or (refresh and age > MISS_REFRESH_MIN_AGE):
+            self._fetch()
+
+    def titles(self) -> list:
+        with self._lock:
+            self._ensure()
+            return list(self._order)
+
+    def worksheet(self, title: str):
+        """Worksheet ตามชื่อ (ไม่เจอ → อ่านรายการแท็บใหม่ 1 ครั้ง แล้วค่อย raise)"""
+        with self._lock:
+            self._ensure()
+            if title not in self._worksheets:
+                self._ensure(refresh=True)
+            if title not in self._worksheets:
+                raise LookupError(f"ไม่พบแท็บ '{title}' ใน '{self.name}'")
+            return self._worksheets[title]
+
+    def first_worksheet(self):
+        with self._lock:
+            self._ensure()
+            if not self._order:
+                raise LookupError(f"'{self.name}' ไม่มีแท็บ")
+            return self._worksheets[self._order[0]]
+
+    def month_title(self, target_date):
+        """ชื่อแท็บเดือนของ target_date (find_month_sheet_name บนรายการแท็บที่ cache ไว้) หรือ None"""
+        k = (target_date.year, target_date.month)
+        with self._lock:
+            self._ensure()
+            title = self._months.get(k)
+            if title in self._worksheets:
+                return title
+            # miss → ล้างค่าที่จำไว้ของเดือนนี้ แล้วลองกับรายการแท็บใหม่
+            self._months.pop(k, None)
+            for refresh in (False, True):
+                self._ensure(refresh=refresh)
+                title = find_month_sheet_name(self._sh, target_date, titles=self._order)
+                if title:
+                    self._months[k] = title
+                    return title
+            return None
+
+    def month_worksheet(self, target_date):
+        """(Worksheet, title) ของแท็บเดือน — title=None ถ้าหาไม่เจอ"""
+        title = self.month_title(target_date)
+        if not title:
+            return None, None
+        with self._lock:
+            return self._worksheets[title], title
+
+    def layout(self, ws) -> "ReportLayout":
+        """
+        ReportLayout ของแท็บ (ws หรือชื่อแท็บ) — อ่านคอลัมน์วันที่ด้วย ranged get ครั้งเดียว
+        แล้ว cache คู่กับ handle (LAYOUT_TTL / invalidate())
+        """
+        title = ws if isinstance(ws, str) else ws.title
+        with self._lock:
+            lay = self._layouts.get(title)
+            if lay is not None and pytime.monotonic() - lay.fetched_at < LAYOUT_TTL:
+                return lay
+            if isinstance(ws, str):
+                ws = self.worksheet(title)
+            vals = _with_retry(ws.get, f"A1:A{LAYOUT_SCAN_ROWS}") or []
+            col_a = [(r[0] if r else "") for r in vals]
+            lay = build_report_layout(title, col_a, col_count=getattr(ws, "col_count", 0))
+            self._layouts[title] = lay
+            return lay
+
+    def invalidate(self, reopen: bool = False):
+        """ล้าง cache แท็บ (reopen=True → เปิด spreadsheet ใหม่ด้วย open_by_key)"""
+        with self._lock:
+            if reopen:
+                self._sh = None
+            self._worksheets = None
+            self._order = []
+            self._months.clear()
+            self._layouts.clear()
+
+
+_HANDLES = {}
+_handles_lock = threading.Lock()
+
+
+def get_handles(name: str) -> SpreadsheetHandles:
+    """SpreadsheetHandles ของ process นี้ (1 ตัวต่อชื่อไฟล์)"""
+    with _handles_lock:
+        if name not in _HANDLES:
+            _HANDLES[name] = SpreadsheetHandles(name)
+        return _HANDLES[name]
+
+
+# =========================================================
+# --- 📐 WATERREPORT LAYOUT (วัน → แถว / report_col → คอลัมน์) ---
+# =========================================================
+# เดิม: export_to_real_report อ่านทั้งคอลัมน์ A (col_values) ทุกครั้ง, ตัว batch ใช้ 6 + วัน ตรง ๆ
+#       (template เลื่อน → เขียนผิดแถวเงียบ ๆ)
+# → อ่านคอลัมน์วันที่ A1:A{LAYOUT_SCAN_ROWS} ครั้งเดียวต่อแท็บ แล้ว cache คู่กับ worksheet handle
+# → เช็คกับ template: หาแถววันที่ 1, 2, 3, ... ที่เรียงต่อกัน — ไม่ตรง 6 + วัน ก็ใช้แถวจริง (log เตือน)
+#   หาไม่เจอเลย → ใช้ 6 + วัน เหมือนเดิม (validated=False)
+DEFAULT_DAY_ROW_OFFSET = 6  # row = 6 + day ตาม template มาตรฐาน
+LAYOUT_SCAN_ROWS = 60
+LAYOUT_TTL = int(os.environ.get("REPORT_LAYOUT_TTL", "3600"))  # วินาที
+
+
+def _parse_day(v):
+    """ค่าในคอลัมน์วันที่ → วัน (1-31) หรือ None ('5', '5.0', '05/10/2026', '2026-10-05')"""
+    t = str(v or "").strip()
+    if not t:
+        return None
+    try:
+        d = int(float(t))
+    except ValueError:
+        d = None
+        for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y"):
+            try:
+                d = datetime.strptime(t[:10], fmt).day
+                break
+            except ValueError:
+                continue
+    return d if d is not None and 1 <= d <= 31 else None
+
+
+class ReportLayout:
+    """ตำแหน่งในแท็บเดือนของ WaterReport (ค่าคงที่หลังสร้าง → ใช้ข้าม thread ได้)"""
+
+    def __init__(self, title: str, day_rows: dict, col_count: int = 0, validated: bool = True):
+        self.title = title
+        self.day_rows = dict(day_rows)  # {วัน: แถว} ครบ 1..31
+        self.col_count = int(col_count or 0)
+        self.validated = validated
+        self.fetched_at = pytime.monotonic()
+        self._cols = {}
+
+    def row(self, day) -> int:
+        return self.day_rows.get(int(day)) or (DEFAULT_DAY_ROW_OFFSET + int(day))
+
+    def col(self, report_col) -> int:
+        """report_col → เลขคอลัมน์ (0 = ใช้ไม่ได้ / เกินขนาดแท็บ)"""
+        key = str(report_col or "").strip().upper()
+        if key not in self._cols:
+            c = col_to_index(key) if key not in ("", "-", "—", "–") else 0
+            self._cols[key] = c if c > 0 and (not self.col_count or c <= self.col_count) else 0
+        return self._cols[key]
+
+    def span(self) -> tuple:
+        return min(self.day_rows.values()), max(self.day_rows.values())
+
+
+def build_report_layout(title: str, col_a: list, col_count: int = 0) -> ReportLayout:
+    """
+    สร้าง ReportLayout จากค่าคอลัมน์ A (col_a[i] = แถว i + 1)
+    เลือกช่วงแถวที่วันเรียง 1, 2, 3, ... ต่อกันยาวที่สุด (กันเลขอื่นในหัวตาราง)
+    """
+    days = [_parse_day(v) for v in col_a]
+    best = {}
+    i = 0
+    while i < len(days):
+        if days[i] == 1:
+            run = {1: i + 1}
+            j = i + 1
+            while j < len(days) and days[j] == len(run) + 1:
+                run[days[j]] = j + 1
+                j += 1
+            if len(run) > len(best):
+                best = run
+            i = j
+        else:
+            i += 1
+
+    validated = len(best) >= 3
+    offset = (best[1] - 1) if validated else DEFAULT_DAY_ROW_OFFSET
+    day_rows = {d: (best.get(d) if validated else None) or (offset + d) for d in range(1, 32)}
+    if not validated:
+        logger.warning(f"⚠️ WaterReport '{title}': หาแถววันที่ในคอลัมน์ A ไม่เจอ → ใช้แถว = 6 + วัน")
+    elif offset != DEFAULT_DAY_ROW_OFFSET:
+        logger.warning(f"⚠️ WaterReport '{title}': template เลื่อน (วันที่ 1 อยู่แถว {best[1]}) → ใช้แถวจริง")
+    return ReportLayout(title, day_rows, col_count=col_count, validated=validated)
+
+
+def report_layout(ws, handles=None) -> ReportLayout:
+    """ReportLayout ของแท็บ ws (cache ใน SpreadsheetHandles ของ REAL_REPORT_SHEET)"""
+    return (handles or get_handles(REAL_REPORT_SHEET)).layout(ws)
+
+
+def report_cell_a1(ws, day, report_col) -> str:
+    """A1 ของช่อง (วัน, report_col) ในแท็บเดือนตาม layout จริง ('' = คอลัมน์ใช้ไม่ได้) — ใช้ตอน flush outbox"""
+    lay = report_layout(ws)
+    c = lay.col(report_col)
+    return f"{index_to_col(c)}{lay.row(day)}" if c else ""
+
+
+# =========================================================
+# --- 📊 WATERREPORT MONTH GRID (cache ต่อ process) ---
+# =========================================================
+# ความคืบหน้าเดิมอ่าน row_values(6+วัน) ทีละวัน (cache 60 วิ ต่อวัน) → เปลี่ยนวันใน UI = อ่านใหม่
+# → อ่านทั้ง block (แถววันที่ 1..สิ้นเดือน × คอลัมน์ report_col) ของแท็บเดือนด้วย ranged get ครั้งเดียว
+# → ทุกวันในเดือนใช้ block เดียวกัน, export ของเราเองเขียนทับใน cache ทันที (write-through)
+# ค่าที่ process อื่นเขียน (collectors) จะเห็นเมื่อครบ TTL
+REPORT_GRID_TTL = int(os.environ.get("REPORT_GRID_TTL", "120"))  # วินาที
+
+
+class ReportGridCache:
+    """block ค่าของแท็บเดือนใน WaterReport (thread-safe)"""
+
+    def __init__(self, ttl: int = REPORT_GRID_TTL):
+        self.ttl = ttl
+        self._grids = {}  # title -> {"r0", "c0", "c1", "values", "at"}
+        self._lock = threading.RLock()
+
+    def block(self, ws, c0: int, c1: int, refresh: bool = False, layout: ReportLayout = None) -> dict:
+        """
+        block ของแท็บ ws ที่ครอบคอลัมน์ c0..c1 (1-based) ทุกวันในเดือน (แถวตาม layout)
+        คืนค่า {"r0", "r1", "c0", "c1", "days": {วัน: แถว}, "values": list[list[str]], "at": epoch}
+        """
+        with self._lock:
+            g = self._grids.get(ws.title)
+            fresh = g and not refresh and pytime.time() - g["at"] < self.ttl
+            if fresh and g["c0"] <= c0 and c1 <= g["c1"]:
+                return g
+
+            if g and fresh:
+                c0, c1 = min(c0, g["c0"]), max(c1, g["c1"])  # ขยาย block ที่มีอยู่
+            layout = layout or report_layout(ws)
+            r0, r1 = layout.span()
+            vals = _with_retry(ws.get, f"{rowcol_to_a1(r0, c0)}:{rowcol_to_a1(r1, c1)}")
+            g = {
+                "r0": r0,
+                "r1": r1,
+                "days": dict(layout.day_rows),
+                "c0": c0,
+                "c1": c1,
+                "values": [[str(v) for v in row] for row in (vals or [])],
+                "at": pytime.time(),
+            }
+            self._grids[ws.title] = g
+            return g
+
+    def note_writes(self, title: str, cells):
+        """write-through: cells = [(row, col, value)] ที่เพิ่งเขียนสำเร็จ (แท็บที่ยังไม่ cache → ข้าม)"""
+        with self._lock:
+            g = self._grids.get(title)
+            if not g:
+                return
+            for row, col, val in cells:
+                ri, ci = int(row) - g["r0"], int(col) - g["c0"]
+                if ri < 0 or int(row) > g["r1"] or ci < 0 or int(col) > g["c1"]:
+                    continue
+                vals = g["values"]
+                while len(vals) <= ri:
+                    vals.append([])
+                if len(vals[ri]) <= ci:
+                    vals[ri].extend([""] * (ci + 1 - len(vals[ri])))
+                vals[ri][ci] = "" if val is None else str(val)
+
+    def invalidate(self, title: str = None):
+        with self._lock:
+            if title is None:
+                self._grids.clear()
+            else:
+                self._grids.pop(title, None)
+
+
+_REPORT_GRID = ReportGridCache()
+
+
+def get_report_grid() -> ReportGridCache:
+    return _REPORT_GRID
+
+
+def grid_value(block: dict, row: int, col: int) -> str:
+    """ค่าใน block ที่ (row, col) ของชีท ('' ถ้าว่าง/อยู่นอก block)"""
+    ri, ci = int(row) - block["r0"], int(col) - block["c0"]
+    vals = block["values"]
+    if ri < 0 or ci < 0 or ri >= len(vals) or ci >= len(vals[ri]):
+        return ""
+    return vals[ri][ci]
+
+
+# =========================================================
+# --- 📋 POINTS MASTER ---
+# =========================================================
+_POINTS_MASTER = None
+
+def get_points_master() -> PointsMasterCache:
+    """PointsMaster snapshot ของ process นี้ (สร้างครั้งเดียว)"""
+    global _POINTS_MASTER
+    if _POINTS_MASTER is None:
+        _POINTS_MASTER = PointsMasterCache(
+            get_gc,
+            DB_SHEET_NAME,
+            ttl=int(os.environ.get("POINTS_MASTER_TTL", "3600")),
+            call=_with_retry,
+        )
+    return _POINTS_MASTER
+
+def load_points_master():
+    return get_points_master().records()
+
+def get_meter_config(point_id):
+    try:
+        return get_points_master().get(point_id)
+    except: return None
+
+def infer_meter_type(config: dict) -> str:
+    """เดา meter_type จาก config เพื่อกันกรอกผิด"""
+    blob = f"{config.get('type','')} {config.get('name','')}".lower()
+    if ("น้ำ" in blob) or ("water" in blob) or ("ประปา" in blob):
+        return "Water"
+    return "Electric"
+
+
+# =========================================================
+# --- ✍️ WRITERS ---
+# =========================================================
+# ✅ แก้ไข: รับ target_date เพื่อลงให้ถูกวัน
+def export_to_real_report(point_id, read_value, inspector, report_col, target_date, debug=False):
+    """ส่งค่าลง Google Sheet REAL_REPORT_SHEET
+    - debug=False: คืน True/False เหมือนเดิม
+    - debug=True : คืน (ok, message) เพื่อโชว์สาเหตุเวลาส่งไม่เข้า
+    """
+
+    def _ret(ok, msg=""):
+        return (ok, msg) if debug else ok
+
+    if not report_col:
+        return _ret(False, "report_col ว่าง")
+    report_col = str(report_col).strip()
+    if report_col in ("-", "—", "–"):
+        return _ret(False, "report_col เป็น '-' (ยังไม่ได้ตั้งค่าใน PointsMaster)")
+
+    # เปิดชีท (handle cache ของ process)
+    handles = get_handles(REAL_REPORT_SHEET)
+    try:
+        handles.spreadsheet()
+    except Exception as e:
+        return _ret(False, f"เปิดชีท '{REAL_REPORT_SHEET}' ไม่ได้: {e}")
+
+    # หาแท็บเดือน (ชื่อมาตรฐาน → ฟัซซี่) ไม่เจอ → แท็บแรก
+    sheet_name = None
+    try:
+        ws, sheet_name = handles.month_worksheet(target_date)
+        if ws is None:
+            ws = handles.first_worksheet()
+    except Exception as e:
+        return _ret(False, f"เปิดแท็บ '{sheet_name}' ไม่ได้: {e}")
+
+    # หาแถวของวัน + col จาก layout ของแท็บ (cache → ปกติไม่เสีย request)
+    try:
+        layout = handles.layout(ws)
+        target_row = layout.row(target_date.day)
+    except Exception as e:
+        return _ret(False, f"หาแถวของวันไม่สำเร็จ: {e}")
+
+    target_col = layout.col(report_col)
+    if target_col == 0:
+        return _ret(False, f"report_col '{report_col}' แปลงเป็นคอลัมน์ไม่ได้")
+
+    # เขียนค่า
+    try:
+        _with_retry(ws.update_cell, target_row, target_col, read_value)
+        _REPORT_GRID.note_writes(ws.title, [(target_row, target_col, read_value)])
+        return _ret(True, f"OK → sheet='{ws.title}', row={target_row}, col={report_col}({target_col}), val={read_value}")
+    except Exception as e:
+        return _ret(False, f"เขียนค่าไม่สำเร็จ: {e}")
+
+
+EMPTY_ONLY_MODES = ('empty_only', 'skip_non_empty', 'no_overwrite', 'nooverwrite', 'blank_only')
+
+
+def is_empty_only_mode(write_mode) -> bool:
+    """write_mode แบบ 'เขียนเฉพาะช่องว่าง' หรือไม่"""
+    return str(write_mode or 'overwrite').strip().lower() in EMPTY_ONLY_MODES
+
+
+def export_many_to_real_report_batch(items: list, target_date, debug: bool = False, write_mode: str = "overwrite"):
+    """
+    Export หลายจุดลง WaterReport ด้วย 1 batch_update (ลด Read/Write requests มาก ๆ)
+    items: list[dict] ต้องมี keys: point_id, value, report_col
+    คืนค่า:
+      - ok_pids: list[str]
+      - fail_list: list[tuple(pid, reason)]
+    """
+    ok_pids = []
+    fail_list = []
+
+    if not items:
+        return ok_pids, fail_list
+
+    # เปิดชีท (handle cache ของ process → ปกติไม่เสีย request เลย)
+    handles = get_handles(REAL_REPORT_SHEET)
+    try:
+        handles.spreadsheet()
+    except Exception as e:
+        reason = f"เปิดชีท '{REAL_REPORT_SHEET}' ไม่ได้: {e}"
+        for it in items:
+            fail_list.append((it.get("point_id", ""), reason))
+        return ok_pids, fail_list
+
+    # หาแท็บเดือน (ชื่อมาตรฐาน → ฟัซซี่) ไม่เจอ → แท็บแรก
+    sheet_name = None
+    try:
+        ws, sheet_name = handles.month_worksheet(target_date)
+        if ws is None:
+            ws = handles.first_worksheet()
+    except Exception as e:
+        reason = f"เปิดแท็บ '{sheet_name}' ไม่ได้: {e}"
+        for it in items:
+            fail_list.append((it.get("point_id", ""), reason))
+        return ok_pids, fail_list
+
+    # ✅ แถวของวันจาก layout ของแท็บ (อ่านคอลัมน์วันที่ครั้งเดียวต่อแท็บ แล้ว cache)
+    try:
+        layout = handles.layout(ws)
+        target_row = layout.row(target_date.day)
+    except Exception as e:
+        reason = f"หาแถวของวันไม่สำเร็จ: {e}"
+        for it in items:
+            fail_list.append((it.get("point_id", ""), reason))
+        return ok_pids, fail_list
+
+    # ---- กันเขียนทับ: ถ้าเลือก 'เขียนเฉพาะช่องว่าง' จะอ่านค่าเดิมในแถวนี้ก่อน 1 ครั้ง ----
+    existing_row = None
+    if is_empty_only_mode(write_mode):
+        try:
+            existing_row = _with_retry(ws.row_values, target_row)
+        except Exception:
+            existing_row = None
+
+    # เตรียม batch ranges
+    data = []
+    written = []  # (row, col, value) → write-through ลง ReportGridCache
+    for it in items:
+        pid = str(it.get("point_id", "")).strip().upper()
+        report_col = str(it.get("report_col", "")).strip()
+        val = it.get("value", "")
+
+        if not report_col or report_col in ("-", "—", "–"):
+            fail_list.append((pid, "report_col ว่าง/เป็น '-' ใน PointsMaster"))
+            continue
+
+        target_col = layout.col(report_col)
+        if target_col <= 0:
+            fail_list.append((pid, f"report_col '{report_col}' แปลงคอลัมน์ไม่ได้"))
+            continue
+
+        # ถ้าเลือก 'เขียนเฉพาะช่องว่าง' และช่องมีข้อมูลแล้ว -> ข้าม
+        if existing_row is not None:
+            try:
+                existing_val = existing_row[target_col - 1] if (target_col - 1) < len(existing_row) else ''
+                if str(existing_val).strip() != '':
+                    fail_list.append((pid, 'SKIP_NON_EMPTY'))
+                    continue
+            except Exception:
+                pass
+
+        # A1 เช่น "Y18"
+        a1 = rowcol_to_a1(target_row, target_col)
+        data.append({"range": a1, "values": [[val]]})
+        written.append((target_row, target_col, val))
+        ok_pids.append(pid)
+
+    if not data:
+        return [], fail_list
+
+    # batch_update ครั้งเดียว + retry กัน quota
+    try:
+        _with_retry(ws.batch_update, data, value_input_option="USER_ENTERED")
+        _REPORT_GRID.note_writes(ws.title, written)
+        return ok_pids, fail_list
+    except Exception as e:
+        # ถ้า batch fail → ถือว่าทั้งหมด fail (ให้ user กดใหม่ได้)
+        reason = f"เขียนค่าไม่สำเร็จ (batch_update): {e}"
+        for pid in ok_pids:
+            fail_list.append((pid, reason))
+        return [], fail_list
+
+
+def export_month_grid_batch(items_by_date: dict, write_mode: str = "overwrite"):
+    """
+    Backfill หลายวันลง WaterReport: 1 batch_update ต่อแท็บเดือน (ทุก cell (แถววัน, report_col) ในเดือนนั้น)
+    items_by_date: {date: list[dict]} แต่ละ dict ต้องมี keys: point_id, value, report_col
+    write_mode 'empty_only' → อ่าน block ของเดือน (แถววันแรก..วันสุดท้าย × คอลัมน์ที่ใช้) ครั้งเดียว
+
+    ต่างจาก export_many_to_real_report_batch: ถ้าหาแท็บเดือนไม่เจอจะ fail (ไม่เขียนลงแท็บแรก)
+    คืนค่า: {date: (ok_pids, fail_list)}
+    """
+    out = {d: ([], []) for d in items_by_date}
+
+    def _fail(dates, reason):
+        for d in dates:
+            for it in items_by_date[d]:
+                out[d][1].append((str(it.get("point_id", "")).strip().upper(), reason))
+
+    if not items_by_date:
+        return out
+
+    # เปิดชีท + รายการแท็บ (handle cache ของ process)
+    handles = get_handles(REAL_REPORT_SHEET)
+    try:
+        handles.titles()
+    except Exception as e:
+        _fail(list(items_by_date), f"เปิดชีท '{REAL_REPORT_SHEET}' ไม่ได้: {e}")
+        return out
+
+    # จัดกลุ่มวันตามแท็บเดือน
+    by_tab = {}
+    for d in sorted(items_by_date):
+        try:
+            sheet_name = handles.month_title(d)
+        except Exception:
+            sheet_name = None
+        if not sheet_name:
+            _fail([d], f"ไม่พบแท็บเดือนของ {d}")
+            continue
+        by_tab.setdefault(sheet_name, []).append(d)
+
+    empty_only = is_empty_only_mode(write_mode)
+
+    for sheet_name, dates in by_tab.items():
+        try:
+            ws = handles.worksheet(sheet_name)
+        except Exception as e:
+            _fail(dates, f"เปิดแท็บ '{sheet_name}' ไม่ได้: {e}")
+            continue
+
+        try:
+            layout = handles.layout(ws)
+        except Exception as e:
+            _fail(dates, f"อ่าน layout ของแท็บ '{sheet_name}' ไม่ได้: {e}")
+            continue
+
+        # (date, pid, row, col, value)
+        cells = []
+        for d in dates:
+            target_row = layout.row(d.day)
+            for it in items_by_date[d]:
+                pid = str(it.get("point_id", "")).strip().upper()
+                report_col = str(it.get("report_col", "")).strip()
+                if not report_col or report_col in ("-", "—", "–"):
+                    out[d][1].append((pid, "report_col ว่าง/เป็น '-' ใน PointsMaster"))
+                    continue
+                target_col = layout.col(report_col)
+                if target_col <= 0:
+                    out[d][1].append((pid, f"report_col '{report_col}' แปลงคอลัมน์ไม่ได้"))
+                    continue
+                cells.append((d, pid, target_row, target_col, it.get("value", "")))
+
+        if not cells:
+            continue
+
+        # ---- กันเขียนทับ: อ่านค่าเดิมทั้ง block ของเดือนครั้งเดียว ----
+        grid, r0, c0 = None, 0, 0
+        if empty_only:
+            r0 = min(c[2] for c in cells)
+            c0 = min(c[3] for c in cells)
+            r1 = max(c[2] for c in cells)
+            c1 = max(c[3] for c in cells)
+            try:
+                grid = _with_retry(ws.get, f"{rowcol_to_a1(r0, c0)}:{rowcol_to_a1(r1, c1)}")
+            except Exception:
+                grid = None
+
+        data = []
+        pending = []
+        written = []
+        for d, pid, row, col, val in cells:
+            if grid is not None:
+                ri, ci = row - r0, col - c0
+                existing_val = grid[ri][ci] if ri < len(grid) and ci < len(grid[ri]) else ''
+                if str(existing_val).strip() != '':
+                    out[d][1].append((pid, 'SKIP_NON_EMPTY'))
+                    continue
+            data.append({"range": rowcol_to_a1(row, col), "values": [[val]]})
+            pending.append((d, pid))
+            written.append((row, col, val))
+
+        if not data:
+            continue
+
+        # batch_update ครั้งเดียวต่อแท็บเดือน
+        try:
+            _with_retry(ws.batch_update, data, value_input_option="USER_ENTERED")
+            _REPORT_GRID.note_writes(ws.title, written)
+            for d, pid in pending:
+                out[d][0].append(pid)
+        except Exception as e:
+            reason = f"เขียนค่าไม่สำเร็จ (batch_update): {e}"
+            for d, pid in pending:
+                out[d][1].append((pid, reason))
+
+    return out
+
+
+def appended_first_row(resp):
+    """เลขแถวแรกที่ append_rows เขียนลง (จาก updates.updatedRange เช่น 'DailyReadings!A124:H126') หรือ None"""
+    try:
+        rng = str(resp["updates"]["updatedRange"]).split("!")[-1].split(":")[0]
+        return int(rng.lstrip(string.ascii_letters))
+    except Exception:
+        return None
+
+
+def append_rows_dailyreadings(rows: list):
+    """
+    append_rows ลง DailyReadings ครั้งเดียว
+    คืนค่า (ok:bool, message:str, first_row:int|None) — first_row = เลขแถวในชีทของแถวแรกที่เพิ่ม
+    """
+    if not rows:
+        return True, "NO_ROWS", None
+
+    try:
+        ws = get_handles(DB_SHEET_NAME).worksheet("DailyReadings")
+        resp = _with_retry(ws.append_rows, rows, value_input_option="USER_ENTERED")
+        return True, f"APPENDED {len(rows)}", appended_first_row(resp)
+    except Exception as e:
+        return False, str(e), None
+
+
+def append_rows_dailyreadings_batch(rows: list):
+    """
+    append_rows ลง DailyReadings ครั้งเดียว (ลด requests)
+    rows: list[list] แต่ละแถวต้องตรงกับ schema DailyReadings
+    คืนค่า (ok:bool, message:str)
+    """
+    ok, msg, _first_row = append_rows_dailyreadings(rows)
+    return ok, msg
+
+
+def dailyreadings_row(point_id, inspector, meter_type, manual_val, ai_val, status, target_date, image_url="-"):
+    """แถว DailyReadings ของ 1 การบันทึก"""
+    # สร้าง Timestamp: วันที่เลือก + เวลาปัจจุบัน (เพื่อให้รู้ว่าคีย์ตอนกี่โมง แต่วันที่เป็นของวันที่เลือก)
+    current_time = get_thai_time().time()
+    record_timestamp = datetime.combine(target_date, current_time)
+    return [record_timestamp.strftime("%Y-%m-%d %H:%M:%S"), meter_type, point_id, inspector, manual_val, ai_val, status, image_url]
+
+
+# ✅ แก้ไข: รับ target_date เพื่อลง Timestamp ให้ถูกวัน
+def save_to_db(point_id, inspector, meter_type, manual_val, ai_val, status, target_date, image_url="-"):
+    try:
+        ws = get_handles(DB_SHEET_NAME).worksheet("DailyReadings")
+        row = dailyreadings_row(point_id, inspector, meter_type, manual_val, ai_val, status, target_date, image_url)
+        _with_retry(ws.append_row, row)
+        return True
+    except: return False
@@ -0,0 +1,205 @@
+"""
+Vision Batch - รวม OCR request จากหลายรูปเป็น batch_annotate_images
+
+โหมด "📸 อัปโหลดรูปทั้งวัน" เดิม: 1 crop = 1 HTTP request (point_id 1-2 ครั้ง + อ่านค่าอีก 1-6 ครั้ง ต่อรูป)
+~90 รูป → หลายร้อย round trip
+
+- read_text(content) หน้าตาเหมือน _vision_read_text (คืน (text, error)) แต่ไม่ยิงเอง:
+    ฝากเข้าคิว แล้วรอผล (thread ของแต่ละรูปเรียกพร้อมกันได้)
+- thread เบื้องหลังรวม request ที่ค้างในคิว (รอสูงสุด WINDOW_SECONDS หรือจนครบ MAX_BATCH รูป)
+    → batch_annotate_images 1 ครั้ง แล้วแจกผลกลับให้แต่ละ request
+- TEXT_DETECTION ไม่เจออะไร → เข้าคิว DOCUMENT_TEXT_DETECTION (batch เหมือนกัน) ตาม logic เดิม
+- batch ไหนยิงไม่ผ่าน (เน็ต/quota) → ทุก request ใน batch ได้ error เดียวกัน (pipeline ของรูปจัดการเหมือนเดิม)
+
+ใช้คู่กับ pipeline ของแต่ละรูปที่รันพร้อมกันหลาย thread (ดู app.py โหมด bulk)
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from meter_core.vision_cache import cached_vision_client
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+MAX_BATCH = int(os.environ.get("VISION_BATCH_MAX", "16"))  # images ต่อ batch_annotate_images (limit ของ API = 16)
+WINDOW_SECONDS = float(os.environ.get("VISION_BATCH_WINDOW", "0.05"))  # รอ request อื่นมารวมก่อนส่ง
+MAX_IN_FLIGHT = 4  # batch ที่ส่งพร้อมกันได้
+LANGUAGE_HINTS = ["en"]
+
+TEXT = "TEXT_DETECTION"
+DOCUMENT = "DOCUMENT_TEXT_DETECTION"
+
+
+class VisionBatcher:
+    """คิว OCR แบบ coalesce (thread-safe) → batch_annotate_images"""
+
+    def __init__(self, client, max_batch: int = MAX_BATCH, window: float = WINDOW_SECONDS,
+                 max_in_flight: int = MAX_IN_FLIGHT):
+        self.client = client
+        self.max_batch = max(1, min(int(max_batch), 16))
+        self.window = window
+        self._pending = {TEXT: [], DOCUMENT: []}  # feature -> [(content, Future)]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._max_in_flight = max(1, int(max_in_flight))
+        self._slots = threading.Semaphore(self._max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self._max_in_flight, thread_name_prefix="vision-batch")
+        self._thread = None
+        self.stats = {"requests": 0, "images": 0, "errors": 0}
+
+    # ---------- public ----------
+
+    def read_text(self, content: bytes, timeout: float = 120):
+        """(text, error) ของรูป content — block จนกว่า batch ที่รูปนี้อยู่จะได้ผล"""
+        try:
+            return self.submit(content).result(timeout=timeout)
+        except Exception as e:
+            return "", str(e)
+
+    def submit(self, content: bytes, feature: str = TEXT) -> Future:
+        fut = Future()
+        self._enqueue(feature, [(content, fut)])
+        return fut
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "pending": sum(len(v) for v in self._pending.values())}
+
+    # ---------- queue ----------
+
+    def _enqueue(self, feature, items):
+        with self._lock:
+            self._pending[feature].extend(items)
+            full = len(self._pending[feature]) >= self.max_batch
+        self.start()
+        if full:
+            self._wake.set()
+
+    def _take(self, force: bool = False) -> list:
+        """[(feature, [(content, fut)])] ที่พร้อมส่ง (ครบ max_batch หรือ force=หมดเวลารอ)"""
+        out = []
+        with self._lock:
+            for feature, items in self._pending.items():
+                while len(items) >= self.max_batch or (force and items):
+                    out.append((feature, items[:self.max_batch]))
+                    del items[:self.max_batch]
+        return out
+
+    # ---------- send ----------
+
+    def _send(self, feature, items):
+        try:
+            try:
+                from google.cloud import vision
+
+                ctx = vision.ImageContext(language_hints=LANGUAGE_HINTS)
+                ftype = getattr(vision.Feature.Type, feature)
+                requests = [
+                    vision.AnnotateImageRequest(image=vision.Image(content=c), features=[vision.Feature(type_=ftype)],
+                                                image_context=ctx)
+                    for c, _f in items
+                ]
+                resp = self.client.batch_annotate_images(requests=requests)  # นับ/ cache ใน CachedVisionClient
+                responses = list(resp.responses)
+            except Exception as e:
+                logger.warning(f"⚠️ Vision batch ({feature}, {len(items)} รูป) ไม่สำเร็จ: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+                for _c, fut in items:
+                    fut.set_result(("", str(e)))
+                return
+
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["images"] += len(items)
+
+            retry_doc = []
+            for (content, fut), r in zip(items, responses):
+                if getattr(r, "error", None) and r.error.message:
+                    fut.set_result(("", r.error.message))
+                elif feature == TEXT and r.text_annotations:
+                    fut.set_result((r.text_annotations[0].description or "", ""))
+                elif feature == TEXT:
+                    retry_doc.append((content, fut))  # ไม่เจอข้อความ → ลอง document_text_detection (เหมือนเดิม)
+                else:
+                    txt = r.full_text_annotation.text if r.full_text_annotation else ""
+                    fut.set_result((txt or "", ""))
+            for _c, fut in items[len(responses):]:
+                fut.set_result(("", "Vision ไม่คืนผลของรูปนี้"))
+            if retry_doc:
+                self._enqueue(DOCUMENT, retry_doc)
+        finally:
+            self._slots.release()
+
+    # ---------- background ----------
+
+    def start(self):
+        """เริ่ม thread รวม batch (เรียกซ้ำได้)"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def _loop():
+            last_flush = time.monotonic()
+            while not self._stop.is_set():
+                woke = self._wake.wait(self.window)
+                self._wake.clear()
+                # ตื่นเพราะมี batch เต็ม → ส่งเฉพาะที่เต็ม / ครบเวลารอ → ส่งที่ค้างทั้งหมด (ไม่ให้ batch ไม่เต็มค้างนาน)
+                force = not woke or time.monotonic() - last_flush >= self.window
+                if force:
+                    last_flush = time.monotonic()
+                for feature, items in self._take(force=force):
+                    self._slots.acquire()  # จำกัด batch ที่ค้างอยู่กลางทาง
+                    self._pool.submit(self._send, feature, items)
+
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=_loop, name="vision-batcher", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def _wait_in_flight(self):
+        """รอ batch ที่ส่งใน pool เสร็จหมด (อาจ re-queue รูปไป DOCUMENT ระหว่างนั้น)"""
+        for _ in range(self._max_in_flight):
+            self._slots.acquire()
+        for _ in range(self._max_in_flight):
+            self._slots.release()
+
+    def stop(self, timeout: float = 30):
+        """หยุด thread แล้วส่งที่ค้างจนหมด — รวมรูปที่ TEXT ว่างแล้วถูก re-queue ไป DOCUMENT ตอนส่งรอบสุดท้าย"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        while True:
+            self._wait_in_flight()
+            batches = self._take(force=True)
+            if not batches:
+                break
+            for feature, items in batches:
+                self._slots.acquire()
+                self._send(feature, items)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_vision_batcher(client=None) -> VisionBatcher:
+    """VisionBatcher ของ process นี้ (สร้างครั้งเดียว, client=None → get_vision_client()) ผ่าน Vision cache"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                if client is None:
+                    from meter_core.config import get_vision_client
+
+                    client = get_vision_client()
+                _batcher = VisionBatcher(cached_vision_client(client))
+    return _batcher
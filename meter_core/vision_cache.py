@@ -0,0 +1,290 @@
+"""
+Vision Cache - cache ผล Google Vision บน disk (content-addressed)
+
+Streamlit rerun / อัปโหลด zip เดิมซ้ำ / ลองบันทึกใหม่หลัง save พัง → ส่งรูปเดิมไป Vision ซ้ำทุกครั้ง
+→ CachedVisionClient ครอบ ImageAnnotatorClient (text_detection / document_text_detection / batch_annotate_images)
+   key = SHA-256 ของ (feature, language hints, bytes ของรูป)
+   เก็บ AnnotateImageResponse ทั้งก้อน (ข้อความเต็ม + กรอบทุก token) ใน SQLite → โค้ดเดิมได้ response object เหมือนเดิม
+   - ไม่เก็บ response ที่มี error
+   - จำกัดขนาดรวม (ลบตัวที่ใช้ล่าสุดนานสุดก่อน = LRU) + TTL (ไม่บังคับ)
+   - batch_annotate_images: ส่งเฉพาะรูปที่ไม่มีใน cache (ครบทุกรูป = ไม่ยิงเลย)
+   - VISION_CACHE_OFFLINE=1 → ไม่ยิง Vision เลย (replay OCR ของวันที่เคยประมวลผลแล้ว, ไม่มีใน cache = error)
+
+ตั้งค่าผ่าน env:
+    VISION_CACHE            (default 1)    0 = ปิด cache
+    VISION_CACHE_PATH       (default ~/.water_meter_logs/vision_cache.sqlite3)
+    VISION_CACHE_MAX_MB     (default 256)
+    VISION_CACHE_TTL_DAYS   (default 0)    0 = ไม่หมดอายุ
+    VISION_CACHE_OFFLINE    (default 0)
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from meter_core.gateway import _caller, get_gateway
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+DEFAULT_DB_PATH = Path.home() / ".water_meter_logs" / "vision_cache.sqlite3"
+ENABLED = os.environ.get("VISION_CACHE", "1").strip().lower() not in ("0", "false", "no")
+MAX_MB = float(os.environ.get("VISION_CACHE_MAX_MB", "256"))
+TTL_DAYS = float(os.environ.get("VISION_CACHE_TTL_DAYS", "0"))
+OFFLINE = os.environ.get("VISION_CACHE_OFFLINE", "0").strip().lower() in ("1", "true", "yes")
+EVICT_EVERY = 50  # เช็คขนาดรวมทุก ๆ N ครั้งที่เขียน
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vision_cache (
+    key        TEXT PRIMARY KEY,
+    feature    TEXT NOT NULL,
+    hints      TEXT NOT NULL,
+    response   BLOB NOT NULL,
+    text       TEXT,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at    REAL NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_vision_cache_used ON vision_cache (used_at);
+"""
+
+
+def cache_key(content: bytes, feature: str, hints=()) -> str:
+    h = hashlib.sha256()
+    h.update(f"{feature}|{','.join(hints)}|".encode("utf-8"))
+    h.update(content or b"")
+    return h.hexdigest()
+
+
+def _hints(image_context) -> tuple:
+    return tuple(str(x) for x in (getattr(image_context, "language_hints", None) or ()))
+
+
+def _feature_name(f) -> str:
+    t = getattr(f, "type_", f)
+    return getattr(t, "name", str(t))
+
+
+def _full_text(resp) -> str:
+    if resp.text_annotations:
+        return resp.text_annotations[0].description or ""
+    fta = resp.full_text_annotation
+    return (fta.text if fta else "") or ""
+
+
+# ========================================
+# Disk cache
+# ========================================
+class VisionCache:
+    """SQLite cache (thread-safe: เปิด connection ใหม่ทุกครั้ง)"""
+
+    def __init__(self, path=None, max_mb: float = MAX_MB, ttl_days: float = TTL_DAYS):
+        self.path = Path(path) if path else DEFAULT_DB_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_days * 86400 if ttl_days and ttl_days > 0 else None
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str):
+        """bytes ของ response ที่เก็บไว้ (None = ไม่มี / หมดอายุ)"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM vision_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM vision_cache WHERE key = ?", (key,))
+                row = None
+            if row:
+                conn.execute("UPDATE vision_cache SET used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return bytes(row[0]) if row else None
+
+    def put(self, key: str, feature: str, hints, blob: bytes, text: str = ""):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO vision_cache (key, feature, hints, response, text, size, created_at, used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, feature, ",".join(hints), sqlite3.Binary(blob), text, len(blob), now, now),
+            )
+        with self._lock:
+            self._puts += 1
+            due = self._puts % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """ลบตัวหมดอายุ + ตัวที่ใช้ล่าสุดนานสุดจนขนาดรวม ≤ max — คืนจำนวนที่ลบ"""
+        removed = 0
+        with self._connect() as conn:
+            if self.ttl:
+                removed += conn.execute("DELETE FROM vision_cache WHERE created_at < ?",
+                                        (time.time() - self.ttl,)).rowcount
+            total = int(conn.execute("SELECT COALESCE(SUM(size), 0) FROM vision_cache").fetchone()[0])
+            if total > self.max_bytes:
+                drop = []
+                for key, size in conn.execute("SELECT key, size FROM vision_cache ORDER BY used_at"):
+                    if total <= self.max_bytes:
+                        break
+                    drop.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM vision_cache WHERE key = ?", drop)
+                removed += len(drop)
+        if removed:
+            logger.info(f"🧹 Vision cache: ลบ {removed} รายการ (เหลือ ~{total / 1024 / 1024:.1f} MB)")
+        return removed
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            n, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM vision_cache").fetchone()
+        with self._lock:
+            return {"entries": int(n), "bytes": int(size), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM vision_cache")
+
+
+# ========================================
+# Client wrapper
+# ========================================
+class CachedVisionClient:
+    """
+    ImageAnnotatorClient ที่ผ่าน VisionCache ก่อน + นับ request จริงใน gateway stats
+    (cache=None → นับอย่างเดียว, method อื่นส่งต่อให้ client ตรง ๆ)
+    """
+
+    def __init__(self, client, cache: VisionCache = None, offline: bool = OFFLINE):
+        self._client = client
+        self.cache = cache
+        self.offline = offline
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def text_detection(self, image, image_context=None, **kwargs):
+        return self._single("TEXT_DETECTION", "text_detection", image, image_context, kwargs)
+
+    def document_text_detection(self, image, image_context=None, **kwargs):
+        return self._single("DOCUMENT_TEXT_DETECTION", "document_text_detection", image, image_context, kwargs)
+
+    def batch_annotate_images(self, requests, **kwargs):
+        from google.cloud import vision
+
+        out = [None] * len(requests)
+        keys = []
+        misses = []
+        for i, req in enumerate(requests):
+            feature = _feature_name(req.features[0]) if req.features else "-"
+            hints = _hints(req.image_context)
+            key = cache_key(req.image.content, feature, hints)
+            keys.append((key, feature, hints))
+            resp = self._load(key, f"batch_annotate_images/{feature.lower()}")
+            if resp is not None:
+                out[i] = resp
+            else:
+                misses.append(i)
+
+        if misses:
+            self._check_online(len(misses))
+            feature = keys[misses[0]][1]
+            with get_gateway().track("vision", f"batch_annotate_images/{feature.lower()}"):
+                resp = self._client.batch_annotate_images(requests=[requests[i] for i in misses], **kwargs)
+            for i, r in zip(misses, resp.responses):
+                out[i] = r
+                self._store(*keys[i], r)
+        missing = vision.AnnotateImageResponse(error={"message": "Vision ไม่คืนผลของรูปนี้"})
+        return vision.BatchAnnotateImagesResponse(responses=[missing if r is None else r for r in out])
+
+    # ---------- internal ----------
+
+    def _single(self, feature, method, image, image_context, kwargs):
+        hints = _hints(image_context)
+        key = cache_key(image.content, feature, hints)
+        resp = self._load(key, method)
+        if resp is not None:
+            return resp
+        self._check_online(1)
+        with get_gateway().track("vision", method):
+            resp = getattr(self._client, method)(image=image, image_context=image_context, **kwargs)
+        self._store(key, feature, hints, resp)
+        return resp
+
+    def _check_online(self, n):
+        if self.offline:
+            raise RuntimeError(f"VISION_CACHE_OFFLINE: ไม่มีผลของรูป {n} รูปใน cache")
+
+    def _load(self, key, method):
+        if self.cache is None:
+            return None
+        t0 = time.perf_counter()
+        try:
+            blob = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Vision cache อ่านไม่ได้: {e}")
+            return None
+        if blob is None:
+            return None
+        from google.cloud import vision
+
+        resp = vision.AnnotateImageResponse.deserialize(blob)
+        # นับ hit แยก api (ไม่ใช่ request จริงของ Vision)
+        get_gateway().stats.record("vision_cache", "read", method, _caller(), time.perf_counter() - t0)
+        return resp
+
+    def _store(self, key, feature, hints, resp):
+        if self.cache is None or (getattr(resp, "error", None) and resp.error.message):
+            return
+        try:
+            self.cache.put(key, feature, hints, type(resp).serialize(resp), _full_text(resp))
+        except Exception as e:
+            logger.warning(f"⚠️ Vision cache เขียนไม่ได้: {e}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> VisionCache:
+    """VisionCache ของ process นี้ (env VISION_CACHE_PATH เปลี่ยนที่เก็บได้)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = VisionCache(os.environ.get("VISION_CACHE_PATH") or None)
+    return _cache
+
+
+def cached_vision_client(client) -> CachedVisionClient:
+    """ครอบ client ด้วย cache (VISION_CACHE=0 / เปิดไฟล์ cache ไม่ได้ → ไม่ cache แต่ยังนับ request)"""
+    if isinstance(client, CachedVisionClient):
+        return client
+    cache = None
+    if ENABLED:
+        try:
+            cache = get_vision_cache()
+        except Exception as e:
+            logger.warning(f"⚠️ เปิด Vision cache ไม่ได้ ({e}) — ยิง Vision ตรง")
+    return CachedVisionClient(client, cache)
@@ -0,0 +1,293 @@
+"""
+Write Queue - คิวรวม write ของ UI (หน้าพนักงาน) ก่อนส่ง Google Sheets
+
+เดิมบันทึก 1 ค่า = gc.open + append_row (DailyReadings) + gc.open + update_cell (WaterReport)
+หลายคนบันทึกพร้อมกัน → โดน 429 และปุ่มบันทึกค้างหลายวินาที
+
+- submit() คืน ticket ทันที (ไม่แตะ Google Sheets)
+- thread เบื้องหลังส่งทุก FLUSH_SECONDS หรือเมื่อค้างครบ FLUSH_ITEMS รายการ:
+    DailyReadings → append_rows 1 ครั้ง
+    WaterReport   → batch_update 1 ครั้งต่อแท็บเดือน (export_month_grid_batch)
+    ช่องเดียวกัน (วัน, point_id) ในรอบเดียวกัน → ค่าล่าสุดชนะ
+- ส่งไม่ได้เพราะเน็ต/quota → ลองใหม่รอบถัดไป (ครบ MAX_ATTEMPTS → เก็บเข้า outbox ถ้ามี)
+- status(ticket) / recent() ให้ UI แสดงสถานะการส่งรายตัว
+
+ใช้ใน app.py ผ่าน st.cache_resource (1 คิวต่อ process แชร์ทุก session)
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from meter_core.config import DB_SHEET_NAME, REAL_REPORT_SHEET
+from meter_core.gateway import set_request_tags
+from meter_core.outbox import is_retryable_error, queue_dailyreadings_rows, queue_report_items
+from meter_core.local_db import get_local_db
+from meter_core.sheets import append_rows_dailyreadings, dailyreadings_row, export_month_grid_batch
+
+logger = logging.getLogger(__name__)
+
+# ========================================
+# Configuration
+# ========================================
+FLUSH_SECONDS = 3
+FLUSH_ITEMS = 50
+MAX_ATTEMPTS = 5
+KEEP_DONE = 500  # จำนวน ticket ที่จบแล้วที่เก็บไว้ให้ UI ดู
+
+# สถานะของแต่ละ ticket
+ST_QUEUED = "queued"      # รอส่ง
+ST_SENDING = "sending"    # อยู่ในรอบที่กำลังส่ง
+ST_RETRY = "retry"        # ส่งไม่ได้ชั่วคราว รอรอบถัดไป
+ST_SENT = "sent"          # ส่งครบ (DailyReadings + WaterReport)
+ST_PARTIAL = "partial"    # DailyReadings สำเร็จ แต่ WaterReport ไม่สำเร็จ/ข้าม
+ST_OUTBOX = "outbox"      # ยกให้ outbox ส่งต่อ
+ST_FAILED = "failed"      # ส่งไม่ได้ (ไม่ใช่ปัญหาชั่วคราว)
+
+DONE_STATES = (ST_SENT, ST_PARTIAL, ST_OUTBOX, ST_FAILED)
+
+
+class WriteQueue:
+    """คิว write แบบ coalesce (thread-safe)"""
+
+    def __init__(self, flush_seconds: float = FLUSH_SECONDS, flush_items: int = FLUSH_ITEMS,
+                 max_attempts: int = MAX_ATTEMPTS, outbox=None, source: str = "app"):
+        self.flush_seconds = flush_seconds
+        self.flush_items = flush_items
+        self.max_attempts = max_attempts
+        self.outbox = outbox
+        self.source = source
+        self._tickets = OrderedDict()  # ticket -> dict
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    # ---------- submit ----------
+
+    def submit(self, point_id, inspector, meter_type, manual_val, ai_val, status, target_date,
+               image_url="-", report_col="", report_value=None) -> str:
+        """
+        รับ 1 การบันทึก (DailyReadings + ช่อง WaterReport) แล้วคืน ticket ทันที
+        report_value=None → ใช้ manual_val
+        """
+        pid = str(point_id).strip().upper()
+        ticket = uuid.uuid4().hex[:12]
+        item = {
+            "ticket": ticket,
+            "point_id": pid,
+            "date": target_date,
+            "row": dailyreadings_row(pid, inspector, meter_type, manual_val, ai_val, status, target_date, image_url),
+            "report_col": str(report_col or "").strip(),
+            "value": manual_val if report_value is None else report_value,
+            "status": ST_QUEUED,
+            "db_ok": False,
+            "message": "",
+            "attempts": 0,
+            "submitted_at": time.time(),
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._tickets[ticket] = item
+            pending = sum(1 for it in self._tickets.values() if it["status"] in (ST_QUEUED, ST_RETRY))
+        self.start()
+        if pending >= self.flush_items:
+            self._wake.set()
+        return ticket
+
+    # ---------- inspect ----------
+
+    def status(self, ticket: str) -> dict:
+        with self._lock:
+            it = self._tickets.get(ticket)
+            return self._public(it) if it else None
+
+    def recent(self, tickets=None, limit: int = 20) -> list:
+        """สถานะล่าสุด (tickets=None → ทุก ticket ในคิว) ใหม่สุดก่อน"""
+        with self._lock:
+            items = [self._tickets[t] for t in tickets if t in self._tickets] if tickets is not None \
+                else list(self._tickets.values())
+            return [self._public(it) for it in reversed(items[-limit:])]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for it in self._tickets.values() if it["status"] not in DONE_STATES)
+
+    @staticmethod
+    def _public(it) -> dict:
+        return {k: it[k] for k in ("ticket", "point_id", "date", "report_col", "value", "status",
+                                   "message", "attempts", "submitted_at", "updated_at")}
+
+    # ---------- flush ----------
+
+    def _set(self, items, status, message=""):
+        now = time.time()
+        with self._lock:
+            for it in items:
+                it["status"] = status
+                it["message"] = message
+                it["updated_at"] = now
+
+    def _retry_or_give_up(self, items, err):
+        """ส่งไม่ได้: ชั่วคราว → รอบหน้า (ครบ max_attempts → outbox) / ถาวร → failed"""
+        reason = str(err)
+        retryable = is_retryable_error(err)
+        for it in items:
+            it["attempts"] += 1
+        if retryable:
+            again = [it for it in items if it["attempts"] < self.max_attempts]
+            give_up = [it for it in items if it["attempts"] >= self.max_attempts]
+            self._set(again, ST_RETRY, reason)
+        else:
+            give_up = list(items)
+
+        if give_up and retryable and self.outbox is not None:
+            self._to_outbox(give_up, reason)
+        elif give_up:
+            self._set(give_up, ST_FAILED, reason)
+
+    def _to_outbox(self, items, reason):
+        try:
+            rows = [it["row"] for it in items if not it["db_ok"]]
+            if rows:
+                queue_dailyreadings_rows(self.outbox, rows, DB_SHEET_NAME, source=self.source)
+            by_date = {}
+            for it in items:
+                if it["report_col"]:
+                    by_date.setdefault(it["date"], []).append(
+                        {"point_id": it["point_id"], "value": it["value"], "report_col": it["report_col"]})
+            for d, report_items in by_date.items():
+                queue_report_items(self.outbox, report_items, d, REAL_REPORT_SHEET, source=self.source)
+            self._set(items, ST_OUTBOX, f"เก็บเข้า outbox: {reason}")
+        except Exception as e:
+            self._set(items, ST_FAILED, f"{reason} (เก็บเข้า outbox ไม่ได้: {e})")
+
+    def flush(self) -> dict:
+        """ส่งทุกรายการที่ค้าง (เรียกจาก thread เบื้องหลัง หรือเรียกตรงก็ได้)"""
+        stats = {"sent": 0, "partial": 0, "retry": 0, "failed": 0, "outbox": 0}
+        with self._flush_lock:
+            with self._lock:
+                batch = [it for it in self._tickets.values() if it["status"] in (ST_QUEUED, ST_RETRY)]
+                for it in batch:
+                    it["status"] = ST_SENDING
+            if not batch:
+                return stats
+
+            error = None
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                error = e
+                logger.error(f"❌ WriteQueue flush error: {e}")
+            finally:
+                # exception กลางทาง (append / export / local DB) → ticket ที่ยัง 'sending' ไม่ค้างสถานะนี้ตลอดไป
+                with self._lock:
+                    stuck = [it for it in batch if it["status"] == ST_SENDING]
+                if stuck:
+                    self._retry_or_give_up(stuck, str(error) if error else "flush ถูกขัดจังหวะ")
+
+            with self._lock:
+                for it in batch:
+                    if it["status"] in stats:
+                        stats[it["status"]] += 1
+                self._trim()
+
+        if stats["retry"] or stats["failed"]:
+            logger.warning(f"📨 WriteQueue: {stats}")
+        else:
+            logger.info(f"📨 WriteQueue: {stats}")
+        return stats
+
+    def _send_batch(self, batch):
+        """DailyReadings ก่อน แล้วค่อย WaterReport (ticket ที่จบแล้วเปลี่ยนสถานะเอง)"""
+        # 1) DailyReadings: append_rows ครั้งเดียว
+        need_db = [it for it in batch if not it["db_ok"]]
+        if need_db:
+            ok, msg, first_row = append_rows_dailyreadings([it["row"] for it in need_db])
+            if ok:
+                for it in need_db:
+                    it["db_ok"] = True
+                self._record_local(first_row, [it["row"] for it in need_db])
+            else:
+                self._retry_or_give_up(need_db, msg)
+
+        # 2) WaterReport: เฉพาะที่ลง DailyReadings แล้ว (เหมือนเดิม: save_to_db สำเร็จก่อนค่อย export)
+        done = [it for it in batch if it["db_ok"]]
+        no_col = [it for it in done if not it["report_col"] or it["report_col"] in ("-", "—", "–")]
+        self._set(no_col, ST_PARTIAL, "report_col ว่าง/เป็น '-' ใน PointsMaster")
+        to_report = [it for it in done if it["status"] != ST_PARTIAL]
+
+        # coalesce: (วัน, point_id) ซ้ำ → ค่าล่าสุดชนะ, ticket เก่าได้ผลเดียวกัน
+        latest = {}
+        for it in to_report:
+            latest[(it["date"], it["point_id"])] = it
+        items_by_date = {}
+        for (d, _pid), it in latest.items():
+            items_by_date.setdefault(d, []).append(
+                {"point_id": it["point_id"], "value": it["value"], "report_col": it["report_col"]})
+
+        if items_by_date:
+            result = export_month_grid_batch(items_by_date, write_mode="overwrite")
+            ok_keys, fail_keys = set(), {}
+            for d, (ok_pids, fail_list) in result.items():
+                ok_keys.update((d, p) for p in ok_pids)
+                for p, reason in fail_list:
+                    fail_keys[(d, p)] = reason
+
+            retry = {}
+            for it in to_report:
+                k = (it["date"], it["point_id"])
+                if k in ok_keys:
+                    self._set([it], ST_SENT)
+                elif is_retryable_error(fail_keys.get(k, "")):
+                    retry.setdefault(fail_keys[k], []).append(it)
+                else:
+                    self._set([it], ST_PARTIAL, f"WaterReport: {fail_keys.get(k, 'ไม่ทราบสาเหตุ')}")
+            for reason, items in retry.items():
+                self._retry_or_give_up(items, reason)
+
+    @staticmethod
+    def _record_local(first_row, rows):
+        """เก็บเลขแถวที่ได้ลง local DB (คิวรออนุมัติเห็นแถว FLAGGED ทันที)"""
+        try:
+            get_local_db().dr_record(first_row, rows)
+        except Exception as e:
+            logger.warning(f"⚠️ WriteQueue: บันทึกลง local DB ไม่ได้: {e}")
+
+    def _trim(self):
+        done = [t for t, it in self._tickets.items() if it["status"] in DONE_STATES]
+        for t in done[:max(0, len(done) - KEEP_DONE)]:
+            del self._tickets[t]
+
+    # ---------- background ----------
+
+    def start(self):
+        """เริ่ม thread ส่งเบื้องหลัง (เรียกซ้ำได้ — หลาย session เรียกพร้อมกันได้ thread เดียว)"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def _loop():
+            set_request_tags(mode="write_queue")  # นับ request ของคิวแยกจากโหมดของ UI
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_seconds)
+                self._wake.clear()
+                try:
+                    if self.pending_count():
+                        self.flush()
+                except Exception as e:
+                    logger.error(f"❌ WriteQueue flush error: {e}")
+
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=_loop, name="sheets-write-queue", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def stop(self, flush: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if flush:
+            self.flush()
@@ -24,6 +24,12 @@
 
   # แสดง config ปัจจุบัน
   python scada_uf_collector.py --show-config
+
+  # ส่งค่าที่ค้างใน outbox (ตอนเน็ตหลุด/โดน quota) แล้วจบ
+  python scada_uf_collector.py --flush-outbox
+
+  # เติมย้อนหลังหลายวัน (วันที่รายงาน) — เขียน 1 batch_update ต่อแท็บเดือน
+  python scada_uf_collector.py --from 2026-02-01 --to 2026-02-28
 """
 
 import os
@@ -59,6 +65,12 @@ CONFIG = {
     "MAPPING_FILE": "DB_Water_Scada.xlsx",
     # 📝 Write Mode
     "WRITE_MODE": "overwrite",
+    # 📤 Outbox (เก็บค่าที่ส่ง Google Sheets ไม่สำเร็จ) — ไฟล์ SQLite ใน LOG_FOLDER
+    "OUTBOX_FILE": "sheets_outbox.sqlite3",
+    "OUTBOX_FLUSH_INTERVAL": 120,
+    # 📈 Metrics — folder ของ node-exporter textfile collector
+    # (None = env NODE_EXPORTER_TEXTFILE_DIR หรือ LOG_FOLDER; history อยู่ที่ LOG_FOLDER/collector_metrics.jsonl)
+    "METRICS_TEXTFILE_DIR": None,
 }
 
 # =====================================================================
@@ -81,265 +93,361 @@ def setup_logging():
 logger = setup_logging()
 
 # =====================================================================
-# TODO: Import extraction and Google Sheets logic from app_standalone/app.py
+# Import จาก meter_core (ไม่ต้องโหลด app.py / Streamlit)
 # =====================================================================
-# ... (to be implemented)
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app_standalone import (
-        load_scada_excel_mapping,
+    from meter_core.config import get_thai_time
+    from meter_core.scada import (
+        get_scada_mapping,
         extract_scada_values_from_exports,
-        gc,
-        DB_SHEET_NAME,
-        REAL_REPORT_SHEET,
     )
-    from app import (
-        export_many_to_real_report_batch,
-        append_rows_dailyreadings_batch,
-        get_meter_config,
-        infer_meter_type,
-        get_thai_time,
+    from meter_core.outbox import Outbox
+    from meter_core.collector import (
+        save_collected_values,
+        save_collected_values_range,
+        flush_outbox as _flush_outbox,
+        start_outbox_flusher,
     )
+    from meter_core.metrics import collector_run
     IMPORTS_OK = True
 except ImportError as e:
     logger.error(f"❌ Import error: {e}")
-    logger.error("ตรวจสอบว่า app_standalone.py และ app.py อยู่ในโฟลเดอร์เดียวกัน และ dependencies ถูก mock/ติดตั้งแล้ว")
+    logger.error("ตรวจสอบว่าโฟลเดอร์ meter_core อยู่ข้างสคริปต์นี้")
     IMPORTS_OK = False
 
-if __name__ == "__main__":
-    logger.info("[UF Collector] Script started. (ยังไม่สมบูรณ์ รอ implement logic)")
-    # TODO: Implement extraction and upload logic
-    # placeholder — real entry point is main()
-    def read_uf_file_bytes() -> dict:
-        """อ่านไฟล์ AF_Report_Gen.xlsx เป็น bytes และคืน dict ของ uploaded_exports"""
-        p = Path(CONFIG["UF_FILE"]["path"]).expanduser()
-        fn = CONFIG["UF_FILE"].get("filename")
-        full = p / fn
-        if not full.exists():
-            logger.error(f"❌ ไม่พบไฟล์: {full}")
-            return {}
-        try:
-            with open(full, 'rb') as f:
-                b = f.read()
-            return {fn: b}
-        except Exception as e:
-            logger.error(f"❌ อ่านไฟล์ล้มเหลว: {e}")
-            return {}
-
-
-    def show_config():
-        print("=" * 60)
-        print("📋 SCADA UF Collector - Configuration")
-        print("=" * 60)
-        for k, v in CONFIG.items():
-            if isinstance(v, dict):
-                print(f"  {k}:")
-                for k2, v2 in v.items():
-                    print(f"    {k2}: {v2}")
-            else:
-                print(f"  {k}: {v}")
-        print("=" * 60)
+# =====================================================================
+# 📤 Outbox
+# =====================================================================
+_OUTBOX = None
 
 
-    def run_once(report_date=None, dry_run=False):
-        if not IMPORTS_OK:
-            logger.error("❌ Imports not available. Aborting.")
-            return {}
+def get_outbox() -> Outbox:
+    """Outbox ของเครื่องนี้ (สร้างครั้งเดียว)"""
+    global _OUTBOX
+    if _OUTBOX is None:
+        _OUTBOX = Outbox(Path(CONFIG["LOG_FOLDER"]) / CONFIG["OUTBOX_FILE"])
+    return _OUTBOX
 
-        if report_date is None:
-            report_date = get_thai_time().date()
 
-        data_date = report_date - timedelta(days=1)
+def flush_outbox(retry_dead: bool = False) -> dict:
+    """ส่งค่าที่ค้างใน outbox (ถ้ามี)"""
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available — ยังส่ง outbox ไม่ได้")
+        return {"sent": 0, "skipped": 0, "failed": 0, "errors": ["Import failed"]}
+    return _flush_outbox(get_outbox(), log=logger, retry_dead=retry_dead)
 
-        logger.info("=" * 60)
-        logger.info("🏭 SCADA UF System Auto Collector")
-        logger.info("=" * 60)
-        logger.info(f"📅 วันที่รายงาน  : {report_date}")
-        logger.info(f"📅 วันที่ข้อมูล  : {data_date} (23:55)")
-        logger.info(f"🧪 Dry Run       : {'Yes' if dry_run else 'No'}")
-        logger.info("=" * 60)
 
-        # 1. อ่านไฟล์จาก path
-        uploaded = read_uf_file_bytes()
-        if not uploaded:
-            logger.error("❌ ไม่มีไฟล์ AF_Report_Gen.xlsx ให้อ่าน")
-            return {}
+# =====================================================================
+# 🚀 Main Entry Points
+# =====================================================================
+def read_uf_file_bytes() -> dict:
+    """อ่านไฟล์ AF_Report_Gen.xlsx เป็น bytes และคืน dict ของ uploaded_exports"""
+    p = Path(CONFIG["UF_FILE"]["path"]).expanduser()
+    fn = CONFIG["UF_FILE"].get("filename")
+    full = p / fn
+    if not full.exists():
+        logger.error(f"❌ ไม่พบไฟล์: {full}")
+        return {}
+    try:
+        with open(full, 'rb') as f:
+            b = f.read()
+        return {fn: b}
+    except Exception as e:
+        logger.error(f"❌ อ่านไฟล์ล้มเหลว: {e}")
+        return {}
+
+
+def show_config():
+    print("=" * 60)
+    print("📋 SCADA UF Collector - Configuration")
+    print("=" * 60)
+    for k, v in CONFIG.items():
+        if isinstance(v, dict):
+            print(f"  {k}:")
+            for k2, v2 in v.items():
+                print(f"    {k2}: {v2}")
+        else:
+            print(f"  {k}: {v}")
+    print("=" * 60)
+
+
+def run_once(report_date=None, dry_run=False):
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available. Aborting.")
+        return {}
+
+    if report_date is None:
+        report_date = get_thai_time().date()
+
+    data_date = report_date - timedelta(days=1)
+
+    logger.info("=" * 60)
+    logger.info("🏭 SCADA UF System Auto Collector")
+    logger.info("=" * 60)
+    logger.info(f"📅 วันที่รายงาน  : {report_date}")
+    logger.info(f"📅 วันที่ข้อมูล  : {data_date} (23:55)")
+    logger.info(f"🧪 Dry Run       : {'Yes' if dry_run else 'No'}")
+    logger.info("=" * 60)
 
-        # 2. โหลด mapping
-        mapping_rows = load_scada_excel_mapping(local_path=CONFIG.get("MAPPING_FILE", "DB_Water_Scada.xlsx"))
-        if not mapping_rows:
-            logger.error("❌ โหลด mapping ล้มเหลวหรือไฟล์ DB_Water_Scada.xlsx ไม่มีข้อมูล")
-            return {}
+    # metrics ของรอบนี้ → Prometheus textfile + collector_metrics.jsonl (เขียนตอนจบเสมอ)
+    with collector_run(
+        "uf_collector", CONFIG["LOG_FOLDER"], textfile_dir=CONFIG["METRICS_TEXTFILE_DIR"], log=logger
+    ) as metrics:
+        stats = _run_once(report_date, data_date, dry_run, metrics)
+        metrics.record_stats(stats)
+    return stats
 
-        # 3. ประมวลผลค่า
+
+def _run_once(report_date, data_date, dry_run, metrics) -> dict:
+    # 0. ส่งของค้างใน outbox ก่อน (กันค่าเก่าไปทับค่าใหม่ทีหลัง)
+    if not dry_run:
         try:
+            with metrics.stage("outbox_flush"):
+                flush_outbox()
+        except Exception as e:
+            logger.warning(f"⚠️ Outbox flush ล้มเหลว: {e}")
+
+    # 1. อ่านไฟล์จาก path
+    with metrics.stage("read_files"):
+        uploaded = read_uf_file_bytes()
+    if not uploaded:
+        logger.error("❌ ไม่มีไฟล์ AF_Report_Gen.xlsx ให้อ่าน")
+        return {"error": "No files loaded"}
+
+    # 2. โหลด mapping
+    mapping_file = Path(__file__).parent / CONFIG.get("MAPPING_FILE", "DB_Water_Scada.xlsx")
+    with metrics.stage("load_mapping"):
+        mapping_rows = get_scada_mapping(str(mapping_file))
+    if not mapping_rows:
+        logger.error("❌ โหลด mapping ล้มเหลวหรือไฟล์ DB_Water_Scada.xlsx ไม่มีข้อมูล")
+        return {"error": "Mapping not loaded"}
+
+    # 3. ประมวลผลค่า
+    try:
+        with metrics.stage("extract"):
             results, missing = extract_scada_values_from_exports(
                 mapping_rows,
                 uploaded,
                 target_date=data_date,
                 allow_single_file_fallback=False,
             )
-        except Exception as e:
-            logger.error(f"❌ extract error: {e}")
-            return {"error": str(e)}
-
-        stats = {"total": len(results), "success": 0, "failed": 0, "skipped": 0}
-
-        ok_results = [r for r in results if r.get("status") == "OK"]
-
-        # 4. บันทึกลง DailyReadings
-        if ok_results:
-            logger.info("📝 กำลังบันทึกลง DailyReadings...")
-            db_rows = []
-            for r in ok_results:
-                pid = str(r.get("point_id", "")).strip().upper()
-                val = r.get("value")
-                try:
-                    cfg = get_meter_config(pid)
-                    meter_type = infer_meter_type(cfg) if cfg else "Water"
-                except Exception:
-                    meter_type = "Water"
-
-                try:
-                    current_time = get_thai_time().time()
-                    record_ts = datetime.combine(report_date, current_time).strftime("%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    record_ts = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
-
-                db_rows.append([
-                    record_ts,
-                    meter_type,
-                    pid,
-                    "UF_AUTO_COLLECTOR",
-                    val,
-                    val,
-                    "AUTO_UF_SCADA",
-                    "-",
-                ])
+    except Exception as e:
+        logger.error(f"❌ extract error: {e}")
+        return {"error": str(e)}
 
-            try:
-                ok_db, db_msg = append_rows_dailyreadings_batch(db_rows)
-                if ok_db:
-                    logger.info(f"✅ DailyReadings: {db_msg}")
-                else:
-                    logger.warning(f"⚠️ DailyReadings ล้มเหลว: {db_msg}")
-            except Exception as e:
-                logger.error(f"❌ DailyReadings error: {e}")
+    stats = {"total": len(results), "success": 0, "failed": 0, "skipped": 0, "queued": 0}
+
+    ok_results = [r for r in results if r.get("status") == "OK" and r.get("value") is not None]
 
-        # 5. บันทึกลง WaterReport
-        report_items = []
+    if dry_run:
+        logger.info("🧪 DRY RUN — ไม่บันทึกจริง")
         for r in ok_results:
-            pid = str(r.get("point_id", "")).strip().upper()
-            val = r.get("value")
+            logger.info(f"   {r['point_id']}: {r['value']} (time={r.get('time')}, file={r.get('matched_file')})")
+        stats["success"] = len(ok_results)
+        stats["mode"] = "dry_run"
+        return stats
+
+    # 4-5. บันทึกลง DailyReadings + WaterReport
+    if ok_results:
+        try:
+            saved = save_collected_values(
+                ok_results,
+                report_date,
+                inspector="UF_AUTO_COLLECTOR",
+                method="AUTO_UF_SCADA",
+                write_mode=CONFIG.get("WRITE_MODE", "overwrite"),
+                default_meter_type="Water",
+                outbox=get_outbox(),
+                log=logger,
+                metrics=metrics,
+            )
+            for k in ("success", "failed", "skipped", "queued"):
+                stats[k] += saved.get(k, 0)
+        except Exception as e:
+            logger.error(f"❌ WaterReport error: {e}")
+            stats["error"] = str(e)
+    else:
+        logger.warning("⚠️ ไม่มีข้อมูลให้บันทึกลง WaterReport")
+
+    # Summary
+    logger.info("=" * 60)
+    logger.info(f"📊 สรุปผล: success={stats.get('success')} failed={stats.get('failed')} skipped={stats.get('skipped')} queued={stats.get('queued', 0)} total={stats.get('total')}")
+    logger.info("=" * 60)
+
+    return stats
+
+
+def run_backfill(start_date, end_date, dry_run=False):
+    """
+    เติมย้อนหลังช่วงวันที่รายงาน start_date..end_date
+    AF_Report_Gen มีคอลัมน์ Date → อ่านไฟล์ + mapping ครั้งเดียว แล้วดึงค่าทีละวัน
+    เขียนทีเดียว: DailyReadings 1 upsert (แก้แถวเดิม + append แถวใหม่), WaterReport 1 batch_update ต่อแท็บเดือน
+    """
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available. Aborting.")
+        return {}
+
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
+    report_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    logger.info("=" * 60)
+    logger.info("🏭 SCADA UF System — Backfill")
+    logger.info(f"📅 วันที่รายงาน  : {start_date} → {end_date} ({len(report_dates)} วัน)")
+    logger.info(f"🧪 Dry Run       : {'Yes' if dry_run else 'No'}")
+    logger.info("=" * 60)
+
+    stats = {"total": 0, "success": 0, "failed": 0, "skipped": 0, "queued": 0,
+             "report_date": f"{start_date}..{end_date}", "days_missing": []}
+
+    with collector_run(
+        "uf_backfill", CONFIG["LOG_FOLDER"], textfile_dir=CONFIG["METRICS_TEXTFILE_DIR"], log=logger
+    ) as metrics:
+        with metrics.stage("read_files"):
+            uploaded = read_uf_file_bytes()
+        mapping_file = Path(__file__).parent / CONFIG.get("MAPPING_FILE", "DB_Water_Scada.xlsx")
+        with metrics.stage("load_mapping"):
+            mapping_rows = get_scada_mapping(str(mapping_file)) if uploaded else []
+        if not uploaded or not mapping_rows:
+            logger.error("❌ ไม่มีไฟล์ AF_Report_Gen.xlsx หรือ mapping ให้อ่าน")
+            stats["error"] = "No files/mapping loaded"
+            metrics.record_stats(stats)
+            return stats
+
+        results_by_date = {}
+        for report_date in report_dates:
+            data_date = report_date - timedelta(days=1)
             try:
-                cfg = get_meter_config(pid)
-                if not cfg:
-                    logger.warning(f"   ⚠️ {pid}: ไม่พบ config ใน PointsMaster")
-                    stats["failed"] += 1
-                    continue
-
-                report_col = str(cfg.get("report_col", "") or "").strip()
-                if not report_col or report_col in ("-", "—", "–"):
-                    logger.warning(f"   ⚠️ {pid}: report_col ว่าง/'-'")
-                    stats["failed"] += 1
-                    continue
-
-                write_val = val
-                try:
-                    write_val = float(str(val).replace(",", "").strip())
-                except Exception:
-                    write_val = str(val).strip()
-
-                report_items.append({"point_id": pid, "value": write_val, "report_col": report_col})
+                with metrics.stage("extract"):
+                    results, _missing = extract_scada_values_from_exports(
+                        mapping_rows,
+                        uploaded,
+                        target_date=data_date,
+                        allow_single_file_fallback=False,
+                    )
             except Exception as e:
-                logger.error(f"   ❌ {pid}: {e}")
-                stats["failed"] += 1
+                logger.error(f"❌ {report_date}: extract error: {e}")
+                stats["days_missing"].append(str(report_date))
+                continue
+
+            stats["total"] += len(results)
+            ok_results = [r for r in results if r.get("status") == "OK" and r.get("value") is not None]
+            logger.info(f"   📅 {report_date} (ข้อมูล {data_date}): {len(ok_results)}/{len(results)} จุด")
+            if ok_results:
+                results_by_date[report_date] = ok_results
+            else:
+                stats["days_missing"].append(str(report_date))
 
-        if report_items:
+        if dry_run:
+            stats["success"] = sum(len(rs) for rs in results_by_date.values())
+            stats["mode"] = "dry_run"
+        elif results_by_date:
             try:
-                ok_pids, fail_report = export_many_to_real_report_batch(
-                    report_items,
-                    report_date,
-                    debug=True,
-                    write_mode=CONFIG.get("WRITE_MODE", "overwrite"),
-                )
-
-                stats["success"] = len(ok_pids)
-                skipped = [(p, r) for p, r in fail_report if str(r) == "SKIP_NON_EMPTY"]
-                real_fails = [(p, r) for p, r in fail_report if str(r) != "SKIP_NON_EMPTY"]
-                stats["skipped"] = len(skipped)
-                stats["failed"] += len(real_fails)
-
-                logger.info(f"✅ WaterReport: บันทึกสำเร็จ {len(ok_pids)} จุด")
-                if skipped:
-                    logger.info(f"⏭️ ข้าม {len(skipped)} จุด (ช่องมีข้อมูลแล้ว)")
-                if real_fails:
-                    logger.error(f"❌ ล้มเหลว {len(real_fails)} จุด:")
-                    for pid, reason in real_fails:
-                        logger.error(f"   - {pid}: {reason}")
+                with metrics.stage("outbox_flush"):
+                    flush_outbox()
             except Exception as e:
-                logger.error(f"❌ WaterReport error: {e}")
-                stats["error"] = str(e)
+                logger.warning(f"⚠️ Outbox flush ล้มเหลว: {e}")
+
+            saved = save_collected_values_range(
+                results_by_date,
+                inspector="UF_AUTO_COLLECTOR",
+                method="AUTO_UF_SCADA",
+                write_mode=CONFIG.get("WRITE_MODE", "overwrite"),
+                default_meter_type="Water",
+                outbox=get_outbox(),
+                log=logger,
+                metrics=metrics,
+            )
+            for k in ("success", "failed", "skipped", "queued"):
+                stats[k] += saved.get(k, 0)
         else:
-            logger.warning("⚠️ ไม่มีข้อมูลให้บันทึกลง WaterReport")
-
-        # Summary
-        logger.info("=" * 60)
-        logger.info(f"📊 สรุปผล: success={stats.get('success')} failed={stats.get('failed')} skipped={stats.get('skipped')} total={stats.get('total')}")
-        logger.info("=" * 60)
-
-        return stats
-
-
-    def main():
-        parser = argparse.ArgumentParser(description="🏭 SCADA UF System Auto Collector")
-        parser.add_argument('--mode', choices=['once', 'scheduled'], default='once', help='โหมด: once หรือ scheduled')
-        parser.add_argument('--date', type=str, default=None, help='วันที่รายงาน (YYYY-MM-DD)')
-        parser.add_argument('--dry-run', action='store_true', help='ทดสอบโดยไม่บันทึกจริง')
-        parser.add_argument('--show-config', action='store_true', help='แสดง config')
-        args = parser.parse_args()
-
-        if args.show_config:
-            show_config()
+            stats["error"] = "No data extracted"
+
+        metrics.set("days", len(report_dates))
+        metrics.record_stats(stats)
+
+    logger.info("=" * 60)
+    logger.info(f"📊 Backfill: มีข้อมูล {len(results_by_date)}/{len(report_dates)} วัน "
+                f"success={stats['success']} failed={stats['failed']} skipped={stats['skipped']} queued={stats['queued']}")
+    if stats["days_missing"]:
+        logger.info(f"   ⚠️ ไม่มีข้อมูล: {', '.join(stats['days_missing'])}")
+    logger.info("=" * 60)
+    return stats
+
+
+def run_scheduled():
+    target_time = CONFIG.get('SCHEDULED_TIME', '06:00')
+    logger.info('=' * 60)
+    logger.info('⏰ SCADA UF Collector - Scheduled Mode')
+    logger.info(f'   เวลาที่ตั้งไว้: {target_time}')
+    logger.info('   กด Ctrl+C เพื่อหยุด')
+    logger.info('=' * 60)
+
+    # ส่งของค้างใน outbox เป็นระยะ (เมื่อเน็ตกลับมา)
+    if IMPORTS_OK:
+        start_outbox_flusher(get_outbox(), interval=CONFIG["OUTBOX_FLUSH_INTERVAL"])
+
+    last_run_date = None
+    try:
+        while True:
+            now = get_thai_time()
+            current_time = now.strftime('%H:%M')
+            current_date = now.date()
+            if current_time == target_time and current_date != last_run_date:
+                logger.info(f"🔔 ถึงเวลา {target_time} — เริ่มประมวลผล...")
+                run_once(report_date=current_date)
+                last_run_date = current_date
+            time.sleep(30)
+    except KeyboardInterrupt:
+        logger.info('\n⚠️ หยุดโดยผู้ใช้')
+    except Exception as e:
+        logger.error(f'❌ Error in scheduled loop: {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🏭 SCADA UF System Auto Collector")
+    parser.add_argument('--mode', choices=['once', 'scheduled'], default='once', help='โหมด: once หรือ scheduled')
+    parser.add_argument('--date', type=str, default=None, help='วันที่รายงาน (YYYY-MM-DD)')
+    parser.add_argument('--dry-run', action='store_true', help='ทดสอบโดยไม่บันทึกจริง')
+    parser.add_argument('--show-config', action='store_true', help='แสดง config')
+    parser.add_argument('--flush-outbox', action='store_true', help='ส่งค่าที่ค้างใน outbox (รวมรายการ dead) แล้วจบ')
+    parser.add_argument('--from', dest='date_from', type=str, default=None, help='Backfill: วันที่รายงานเริ่มต้น (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', type=str, default=None, help='Backfill: วันที่รายงานสุดท้าย (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    if args.show_config:
+        show_config()
+        return
+
+    if args.flush_outbox:
+        flush_outbox(retry_dead=True)
+        sys.exit(0 if get_outbox().pending_count(include_dead=True) == 0 else 1)
+
+    report_date = None
+    if args.date:
+        try:
+            report_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+        except Exception:
+            logger.error("รูปแบบวันที่ไม่ถูกต้อง (ต้อง YYYY-MM-DD)")
             return
 
-        report_date = None
-        if args.date:
-            try:
-                report_date = datetime.strptime(args.date, "%Y-%m-%d").date()
-            except Exception:
-                logger.error("รูปแบบวันที่ไม่ถูกต้อง (ต้อง YYYY-MM-DD)")
-                return
+    if args.date_from or args.date_to:
+        try:
+            date_from = datetime.strptime(args.date_from or args.date_to, "%Y-%m-%d").date()
+            date_to = datetime.strptime(args.date_to or args.date_from, "%Y-%m-%d").date()
+        except Exception:
+            logger.error("รูปแบบวันที่ --from/--to ไม่ถูกต้อง (ต้อง YYYY-MM-DD)")
+            return
+        run_backfill(date_from, date_to, dry_run=args.dry_run)
+        return
 
-        if args.mode == 'once':
-            run_once(report_date=report_date, dry_run=args.dry_run)
-        else:
-            def run_scheduled():
-                target_time = CONFIG.get('SCHEDULED_TIME', '06:00')
-                logger.info('=' * 60)
-                logger.info('⏰ SCADA UF Collector - Scheduled Mode')
-                logger.info(f'   เวลาที่ตั้งไว้: {target_time}')
-                logger.info('   กด Ctrl+C เพื่อหยุด')
-                logger.info('=' * 60)
-
-                last_run_date = None
-                try:
-                    while True:
-                        now = get_thai_time()
-                        current_time = now.strftime('%H:%M')
-                        current_date = now.date()
-                        if current_time == target_time and current_date != last_run_date:
-                            logger.info(f"🔔 ถึงเวลา {target_time} — เริ่มประมวลผล...")
-                            run_once(report_date=current_date)
-                            last_run_date = current_date
-                        time.sleep(30)
-                except KeyboardInterrupt:
-                    logger.info('\n⚠️ หยุดโดยผู้ใช้')
-                except Exception as e:
-                    logger.error(f'❌ Error in scheduled loop: {e}')
-
-            run_scheduled()
+    if args.mode == 'once':
+        run_once(report_date=report_date, dry_run=args.dry_run)
+    else:
+        run_scheduled()
 
 
+if __name__ == "__main__":
     main()
@@ -29,6 +29,12 @@
 
   # แสดง config ปัจจุบัน
   python scada_wt_collector.py --show-config
+
+  # ส่งค่าที่ค้างใน outbox (ตอนเน็ตหลุด/โดน quota) แล้วจบ
+  python scada_wt_collector.py --flush-outbox
+
+  # เติมย้อนหลังหลายวัน (วันที่รายงาน) — เขียน 1 batch_update ต่อแท็บเดือน
+  python scada_wt_collector.py --from 2026-02-01 --to 2026-02-28
 """
 
 import os
@@ -112,6 +118,22 @@ CONFIG = {
     # "overwrite"   = เขียนทับทั้งหมด
     # "empty_only"  = เขียนเฉพาะช่องว่าง
     "WRITE_MODE": "overwrite",
+
+    # ──────────────────────────────────────────────────────────
+    # 📤 Outbox (เก็บค่าที่ส่ง Google Sheets ไม่สำเร็จ แล้วส่งใหม่ทีหลัง)
+    # ──────────────────────────────────────────────────────────
+    # ไฟล์ SQLite อยู่ใน LOG_FOLDER
+    "OUTBOX_FILE": "sheets_outbox.sqlite3",
+    # scheduled mode: ลองส่งของค้างทุกกี่วินาที
+    "OUTBOX_FLUSH_INTERVAL": 120,
+
+    # ──────────────────────────────────────────────────────────
+    # 📈 Metrics (ต่อรอบการรัน)
+    # ──────────────────────────────────────────────────────────
+    # folder ของ node-exporter / windows_exporter textfile collector
+    # None = ใช้ env NODE_EXPORTER_TEXTFILE_DIR หรือ LOG_FOLDER
+    # history (JSON lines) อยู่ที่ LOG_FOLDER/collector_metrics.jsonl เสมอ
+    "METRICS_TEXTFILE_DIR": None,
 }
 
 # =====================================================================
@@ -146,33 +168,53 @@ logger = setup_logging()
 
 
 # =====================================================================
-# Import จาก app.py (ผ่าน app_standalone wrapper)
+# Import จาก meter_core (ไม่ต้องโหลด app.py / Streamlit)
 # =====================================================================
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app_standalone import (
-        load_scada_excel_mapping,
+    from meter_core.scada import (
+        get_scada_mapping,
         extract_scada_values_from_exports,
-        gc,
-        DB_SHEET_NAME,
-        REAL_REPORT_SHEET,
     )
-    # Import เพิ่มเติมที่ต้องใช้
-    # (ต้อง import หลังจาก mock streamlit แล้ว)
-    from app import (
-        export_many_to_real_report_batch,
-        append_rows_dailyreadings_batch,
-        get_meter_config,
-        infer_meter_type,
+    from meter_core.outbox import Outbox
+    from meter_core.collector import (
+        save_collected_values,
+        save_collected_values_range,
+        flush_outbox as _flush_outbox,
+        start_outbox_flusher,
     )
+    from meter_core.metrics import collector_run, timed
     IMPORTS_OK = True
 except ImportError as e:
     logger.error(f"❌ Import error: {e}")
-    logger.error("ตรวจสอบว่า app_standalone.py, app.py อยู่ในโฟลเดอร์เดียวกัน")
+    logger.error("ตรวจสอบว่าโฟลเดอร์ meter_core อยู่ข้างสคริปต์นี้")
     IMPORTS_OK = False
 
 
+# =====================================================================
+# 📤 Outbox
+# =====================================================================
+
+_OUTBOX = None
+
+
+def get_outbox() -> Outbox:
+    """Outbox ของเครื่องนี้ (สร้างครั้งเดียว)"""
+    global _OUTBOX
+    if _OUTBOX is None:
+        _OUTBOX = Outbox(Path(CONFIG["LOG_FOLDER"]) / CONFIG["OUTBOX_FILE"])
+    return _OUTBOX
+
+
+def flush_outbox(retry_dead: bool = False) -> dict:
+    """ส่งค่าที่ค้างใน outbox (ถ้ามี)"""
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available — ยังส่ง outbox ไม่ได้")
+        return {"sent": 0, "skipped": 0, "failed": 0, "errors": ["Import failed"]}
+    return _flush_outbox(get_outbox(), log=logger, retry_dead=retry_dead)
+
+
 # =====================================================================
 # 📂 File Discovery & Copy
 # =====================================================================
@@ -282,46 +324,34 @@ def find_wt_files_direct(data_date) -> dict:
 # 🔄 Processing
 # =====================================================================
 
-def process_wt_files(found_files: dict, report_date, data_date, dry_run=False) -> dict:
+def extract_wt_values(found_files: dict, data_date, stats: dict, metrics=None):
     """
-    ประมวลผลไฟล์ WT System
+    โหลด mapping → อ่านไฟล์ → ดึงค่าของ data_date
 
     Args:
-        found_files: dict {filename: path} (path จริงบนเครื่อง — ไม่ต้อง copy)
-        report_date: วันที่ของรายงาน (เช่น 9 ก.พ.)
-        data_date: วันที่ของข้อมูล (เช่น 8 ก.พ.)
-        dry_run: ถ้า True จะไม่บันทึกจริง
+        found_files: dict {filename: path}
+        data_date: วันที่ของข้อมูล
+        stats: dict สถิติ (เติม total / error)
+        metrics: RunMetrics ของรอบนี้
 
     Returns:
-        dict: สถิติการประมวลผล
+        list ของผลที่ status OK (None = ล้มเหลว ดู stats["error"])
     """
-    if not IMPORTS_OK:
-        return {"error": "Import failed", "success": 0, "failed": 0}
-
-    stats = {
-        "success": 0,
-        "failed": 0,
-        "total": 0,
-        "skipped": 0,
-        "report_date": str(report_date),
-        "data_date": str(data_date),
-        "files_processed": len(found_files),
-    }
-
     # 1. โหลด mapping
     mapping_file = Path(__file__).parent / CONFIG["MAPPING_FILE"]
     if not mapping_file.exists():
         logger.error(f"❌ ไม่พบไฟล์ mapping: {mapping_file}")
         stats["error"] = "Mapping file not found"
-        return stats
+        return None
 
     try:
-        mapping_rows = load_scada_excel_mapping(str(mapping_file))
+        with timed(metrics, "load_mapping"):
+            mapping_rows = get_scada_mapping(str(mapping_file))
         logger.info(f"✅ โหลด mapping: {len(mapping_rows)} entries")
     except Exception as e:
         logger.error(f"❌ โหลด mapping ล้มเหลว: {e}")
         stats["error"] = str(e)
-        return stats
+        return None
 
     # 2. กรอง mapping เฉพาะ WT files (Daily_Report, SMMT_Daily_Report)
     #    (ไม่เอา UF_System / AF_Report_Gen)
@@ -360,19 +390,20 @@ def process_wt_files(found_files: dict, report_date, data_date, dry_run=False) -
 
     # 3. อ่านไฟล์เป็น bytes (อ่านจาก path จริงบนเครื่อง)
     uploaded_exports = {}
-    for filename, filepath in found_files.items():
-        try:
-            with open(filepath, 'rb') as f:
-                uploaded_exports[filename] = f.read()
-            size_mb = os.path.getsize(filepath) / 1024 / 1024
-            logger.info(f"   📖 อ่าน: {filename} ({size_mb:.1f} MB)")
-        except Exception as e:
-            logger.error(f"   ❌ อ่านไฟล์ล้มเหลว: {filename}: {e}")
+    with timed(metrics, "read_files"):
+        for filename, filepath in found_files.items():
+            try:
+                with open(filepath, 'rb') as f:
+                    uploaded_exports[filename] = f.read()
+                size_mb = os.path.getsize(filepath) / 1024 / 1024
+                logger.info(f"   📖 อ่าน: {filename} ({size_mb:.1f} MB)")
+            except Exception as e:
+                logger.error(f"   ❌ อ่านไฟล์ล้มเหลว: {filename}: {e}")
 
     if not uploaded_exports:
         logger.error("❌ ไม่มีไฟล์ให้ประมวลผล")
         stats["error"] = "No files loaded"
-        return stats
+        return None
 
     # 4. Extract values (ใช้ data_date เพราะข้อมูลเป็นของวันก่อน)
     logger.info("🔄 กำลังดึงค่าจาก Excel...")
@@ -380,19 +411,20 @@ def process_wt_files(found_files: dict, report_date, data_date, dry_run=False) -
     logger.info(f"   ⏰ เวลาเป้าหมาย: {CONFIG['TARGET_TIME']}")
 
     try:
-        results, missing = extract_scada_values_from_exports(
-            mapping_rows=wt_mapping,
-            uploaded_exports=uploaded_exports,
-            target_date=data_date,  # ← ใช้วันที่ข้อมูล ไม่ใช่วันที่รายงาน
-            allow_single_file_fallback=True,
-            custom_max_scan_rows=CONFIG["MAX_SCAN_ROWS"],
-        )
+        with timed(metrics, "extract"):
+            results, missing = extract_scada_values_from_exports(
+                mapping_rows=wt_mapping,
+                uploaded_exports=uploaded_exports,
+                target_date=data_date,  # ← ใช้วันที่ข้อมูล ไม่ใช่วันที่รายงาน
+                allow_single_file_fallback=True,
+                custom_max_scan_rows=CONFIG["MAX_SCAN_ROWS"],
+            )
     except Exception as e:
         logger.error(f"❌ Extract ล้มเหลว: {e}")
         import traceback
         traceback.print_exc()
         stats["error"] = str(e)
-        return stats
+        return None
 
     # 5. สรุปผล extract
     ok_results = [r for r in results if r.get("status") == "OK" and r.get("value") is not None]
@@ -409,6 +441,41 @@ def process_wt_files(found_files: dict, report_date, data_date, dry_run=False) -
     if not ok_results:
         logger.error("❌ ไม่มีข้อมูลที่ดึงสำเร็จ")
         stats["error"] = "No data extracted"
+        return None
+
+    return ok_results
+
+
+def process_wt_files(found_files: dict, report_date, data_date, dry_run=False, metrics=None) -> dict:
+    """
+    ประมวลผลไฟล์ WT System
+
+    Args:
+        found_files: dict {filename: path} (path จริงบนเครื่อง — ไม่ต้อง copy)
+        report_date: วันที่ของรายงาน (เช่น 9 ก.พ.)
+        data_date: วันที่ของข้อมูล (เช่น 8 ก.พ.)
+        dry_run: ถ้า True จะไม่บันทึกจริง
+        metrics: RunMetrics ของรอบนี้ (จับเวลาแต่ละ stage)
+
+    Returns:
+        dict: สถิติการประมวลผล
+    """
+    if not IMPORTS_OK:
+        return {"error": "Import failed", "success": 0, "failed": 0}
+
+    stats = {
+        "success": 0,
+        "failed": 0,
+        "total": 0,
+        "skipped": 0,
+        "queued": 0,
+        "report_date": str(report_date),
+        "data_date": str(data_date),
+        "files_processed": len(found_files),
+    }
+
+    ok_results = extract_wt_values(found_files, data_date, stats, metrics=metrics)
+    if ok_results is None:
         return stats
 
     # ======= DRY RUN =======
@@ -422,114 +489,26 @@ def process_wt_files(found_files: dict, report_date, data_date, dry_run=False) -
         stats["mode"] = "dry_run"
         return stats
 
-    # 6. บันทึกลง DailyReadings (log)
-    logger.info("📝 กำลังบันทึกลง DailyReadings...")
-    db_rows = []
-    for r in ok_results:
-        pid = str(r["point_id"]).strip().upper()
-        val = r["value"]
-
-        try:
-            cfg = get_meter_config(pid)
-            meter_type = infer_meter_type(cfg) if cfg else "Electric"
-        except Exception:
-            meter_type = "Electric"
-
-        try:
-            current_time = get_thai_time().time()
-            record_ts = datetime.combine(report_date, current_time).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            record_ts = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
-
-        db_rows.append([
-            record_ts,
-            meter_type,
-            pid,
-            "WT_AUTO_COLLECTOR",   # inspector
-            val,                    # Manual_Value
-            val,                    # AI_Value
-            "AUTO_WT_SCADA",       # method
-            "-"                     # image_url
-        ])
-
+    # 6-7. บันทึกลง DailyReadings (log) + WaterReport (วันที่รายงาน)
     try:
-        ok_db, db_msg = append_rows_dailyreadings_batch(db_rows)
-        if ok_db:
-            logger.info(f"✅ DailyReadings: {db_msg}")
-        else:
-            logger.warning(f"⚠️ DailyReadings ล้มเหลว: {db_msg}")
+        saved = save_collected_values(
+            ok_results,
+            report_date,   # ← วันที่รายงาน (9 ก.พ.)
+            inspector="WT_AUTO_COLLECTOR",
+            method="AUTO_WT_SCADA",
+            write_mode=CONFIG["WRITE_MODE"],
+            default_meter_type="Electric",
+            outbox=get_outbox(),
+            log=logger,
+            metrics=metrics,
+        )
+        for k in ("success", "failed", "skipped", "queued"):
+            stats[k] += saved.get(k, 0)
     except Exception as e:
-        logger.error(f"❌ DailyReadings error: {e}")
-
-    # 7. บันทึกลง WaterReport
-    logger.info(f"📝 กำลังบันทึกลง WaterReport (วันที่: {report_date})...")
-
-    report_items = []
-    for r in ok_results:
-        pid = str(r["point_id"]).strip().upper()
-        val = r["value"]
-
-        try:
-            cfg = get_meter_config(pid)
-            if not cfg:
-                logger.warning(f"   ⚠️ {pid}: ไม่พบ config ใน PointsMaster")
-                stats["failed"] += 1
-                continue
-
-            report_col = str(cfg.get("report_col", "") or "").strip()
-            if not report_col or report_col in ("-", "—", "–"):
-                logger.warning(f"   ⚠️ {pid}: report_col ว่าง/'-'")
-                stats["failed"] += 1
-                continue
-
-            # แปลงค่าให้เป็นตัวเลข
-            write_val = val
-            try:
-                write_val = float(str(val).replace(",", "").strip())
-            except Exception:
-                write_val = str(val).strip()
-
-            report_items.append({
-                "point_id": pid,
-                "value": write_val,
-                "report_col": report_col,
-            })
-        except Exception as e:
-            logger.error(f"   ❌ {pid}: {e}")
-            stats["failed"] += 1
-
-    if report_items:
-        try:
-            ok_pids, fail_report = export_many_to_real_report_batch(
-                report_items,
-                report_date,   # ← วันที่รายงาน (9 ก.พ.)
-                debug=True,
-                write_mode=CONFIG["WRITE_MODE"],
-            )
-
-            stats["success"] = len(ok_pids)
-
-            # แยก skip กับ error
-            skipped = [(p, r) for p, r in fail_report if str(r) == "SKIP_NON_EMPTY"]
-            real_fails = [(p, r) for p, r in fail_report if str(r) != "SKIP_NON_EMPTY"]
-            stats["skipped"] = len(skipped)
-            stats["failed"] += len(real_fails)
-
-            logger.info(f"✅ WaterReport: บันทึกสำเร็จ {len(ok_pids)} จุด")
-            if skipped:
-                logger.info(f"⏭️ ข้าม {len(skipped)} จุด (ช่องมีข้อมูลแล้ว)")
-            if real_fails:
-                logger.error(f"❌ ล้มเหลว {len(real_fails)} จุด:")
-                for pid, reason in real_fails:
-                    logger.error(f"   - {pid}: {reason}")
-
-        except Exception as e:
-            logger.error(f"❌ WaterReport error: {e}")
-            import traceback
-            traceback.print_exc()
-            stats["error"] = str(e)
-    else:
-        logger.warning("⚠️ ไม่มีข้อมูลให้บันทึกลง WaterReport")
+        logger.error(f"❌ WaterReport error: {e}")
+        import traceback
+        traceback.print_exc()
+        stats["error"] = str(e)
 
     return stats
 
@@ -584,6 +563,10 @@ def run_once(report_date=None, dry_run=False):
         report_date: วันที่รายงาน (default = วันนี้)
         dry_run: ถ้า True จะไม่บันทึกจริง
     """
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available. Aborting.")
+        return {"error": "Import failed", "success": 0, "failed": 0}
+
     if report_date is None:
         report_date = get_thai_time().date()
 
@@ -600,8 +583,25 @@ def run_once(report_date=None, dry_run=False):
     logger.info(f"🧪 Dry Run       : {'Yes' if dry_run else 'No'}")
     logger.info("=" * 60)
 
+    # metrics ของรอบนี้ → Prometheus textfile + collector_metrics.jsonl (เขียนตอนจบเสมอ)
+    with collector_run(
+        "wt_collector", CONFIG["LOG_FOLDER"], textfile_dir=CONFIG["METRICS_TEXTFILE_DIR"], log=logger
+    ) as metrics:
+        stats = _run_once(report_date, data_date, dry_run, metrics)
+        metrics.record_stats(stats)
+
+    if stats:
+        # 6. บันทึก stats ลง JSON (สำหรับตรวจสอบทีหลัง)
+        stats["duration_s"] = round(metrics.duration or 0.0, 1)
+        save_run_stats(stats)
+
+    return stats
+
+
+def _run_once(report_date, data_date, dry_run, metrics) -> dict:
     # 1. หาไฟล์จาก path จริงบนเครื่อง (ไม่ต้อง copy)
-    found_files = find_wt_files_direct(data_date)
+    with metrics.stage("find_files"):
+        found_files = find_wt_files_direct(data_date)
 
     if not found_files:
         logger.error("❌ ไม่พบไฟล์ Excel")
@@ -609,29 +609,145 @@ def run_once(report_date=None, dry_run=False):
         for fk, fc in CONFIG['WT_FILES'].items():
             logger.info(f"   📂 {fk}: {fc.get('path', 'N/A')}")
         logger.info(f"   - ไฟล์วันที่ {data_date} มีอยู่ใน folder หรือยัง")
-        return
+        metrics.info["error"] = "No files found"
+        metrics.status = "error"
+        return {}
 
-    # 2. ประมวลผล
-    stats = process_wt_files(found_files, report_date, data_date, dry_run=dry_run)
+    # 2. ส่งของค้างใน outbox ก่อน (กันค่าเก่าไปทับค่าใหม่ทีหลัง)
+    if not dry_run:
+        try:
+            with metrics.stage("outbox_flush"):
+                flush_outbox()
+        except Exception as e:
+            logger.warning(f"⚠️ Outbox flush ล้มเหลว: {e}")
+
+    # 3. ประมวลผล
+    stats = process_wt_files(found_files, report_date, data_date, dry_run=dry_run, metrics=metrics)
 
-    # 3. บันทึก history (ไม่ย้าย/ไม่ลบไฟล์ เพราะ SCADA ยังใช้อยู่)
+    # 4. บันทึก history (ไม่ย้าย/ไม่ลบไฟล์ เพราะ SCADA ยังใช้อยู่)
     if not dry_run and stats.get("success", 0) > 0:
         log_processed_files(found_files, report_date, stats)
 
-    # 4. สรุป
+    # 5. สรุป
     logger.info("=" * 60)
     logger.info("📊 สรุปผล:")
     logger.info(f"   ✅ สำเร็จ  : {stats.get('success', 0)} จุด")
     logger.info(f"   ❌ ล้มเหลว : {stats.get('failed', 0)} จุด")
     logger.info(f"   ⏭️ ข้าม   : {stats.get('skipped', 0)} จุด")
+    if stats.get("queued"):
+        logger.info(f"   📥 outbox : {stats['queued']} รายการ (รอส่งใหม่)")
     logger.info(f"   📄 ทั้งหมด : {stats.get('total', 0)} จุด")
     if stats.get("error"):
         logger.info(f"   ⚠️ Error  : {stats['error']}")
     logger.info("=" * 60)
 
-    # 5. บันทึก stats ลง JSON (สำหรับตรวจสอบทีหลัง)
-    save_run_stats(stats)
+    return stats
+
+
+def run_backfill(start_date, end_date, dry_run=False):
+    """
+    เติมย้อนหลังช่วงวันที่รายงาน start_date..end_date
+    ดึงค่าทุกวันก่อน แล้วเขียนทีเดียว:
+      - DailyReadings: append_rows 1 ครั้ง
+      - WaterReport: batch_update 1 ครั้งต่อแท็บเดือน (WRITE_MODE=empty_only → อ่าน block เดือนละครั้ง)
+    """
+    if not IMPORTS_OK:
+        logger.error("❌ Imports not available. Aborting.")
+        return {"error": "Import failed", "success": 0, "failed": 0}
 
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
+    report_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    logger.info("=" * 60)
+    logger.info("🏭 SCADA WT System — Backfill")
+    logger.info("=" * 60)
+    logger.info(f"📅 วันที่รายงาน  : {start_date} → {end_date} ({len(report_dates)} วัน)")
+    logger.info(f"📝 Write Mode    : {CONFIG['WRITE_MODE']}")
+    logger.info(f"🧪 Dry Run       : {'Yes' if dry_run else 'No'}")
+    logger.info("=" * 60)
+
+    stats = {
+        "success": 0,
+        "failed": 0,
+        "total": 0,
+        "skipped": 0,
+        "queued": 0,
+        "report_date": f"{start_date}..{end_date}",
+        "days": len(report_dates),
+        "days_missing": [],
+    }
+
+    with collector_run(
+        "wt_backfill", CONFIG["LOG_FOLDER"], textfile_dir=CONFIG["METRICS_TEXTFILE_DIR"], log=logger
+    ) as metrics:
+        # 1. ดึงค่าทุกวัน (ข้อมูล = วันก่อนหน้าวันที่รายงาน)
+        results_by_date = {}
+        for report_date in report_dates:
+            data_date = report_date - timedelta(days=1)
+            logger.info(f"── 📅 {report_date} (ข้อมูล {data_date}) ──")
+
+            with metrics.stage("find_files"):
+                found_files = find_wt_files_direct(data_date)
+            if not found_files:
+                stats["days_missing"].append(str(report_date))
+                continue
+
+            day_stats = {}
+            ok_results = extract_wt_values(found_files, data_date, day_stats, metrics=metrics)
+            stats["total"] += day_stats.get("total", 0)
+            if ok_results:
+                results_by_date[report_date] = ok_results
+            else:
+                stats["days_missing"].append(str(report_date))
+
+        # 2. บันทึกทีเดียว
+        if dry_run:
+            for d, rs in sorted(results_by_date.items()):
+                logger.info(f"🧪 {d}: {len(rs)} จุด")
+            stats["success"] = sum(len(rs) for rs in results_by_date.values())
+            stats["mode"] = "dry_run"
+        elif results_by_date:
+            try:
+                with metrics.stage("outbox_flush"):
+                    flush_outbox()
+            except Exception as e:
+                logger.warning(f"⚠️ Outbox flush ล้มเหลว: {e}")
+
+            saved = save_collected_values_range(
+                results_by_date,
+                inspector="WT_AUTO_COLLECTOR",
+                method="AUTO_WT_SCADA",
+                write_mode=CONFIG["WRITE_MODE"],
+                default_meter_type="Electric",
+                outbox=get_outbox(),
+                log=logger,
+                metrics=metrics,
+            )
+            for k in ("success", "failed", "skipped", "queued"):
+                stats[k] += saved.get(k, 0)
+            stats["by_date"] = saved.get("by_date", {})
+        else:
+            stats["error"] = "No data extracted"
+
+        metrics.set("days", len(report_dates))
+        metrics.record_stats(stats)
+
+    logger.info("=" * 60)
+    logger.info("📊 สรุปผล Backfill:")
+    logger.info(f"   📅 มีข้อมูล : {len(results_by_date)}/{len(report_dates)} วัน")
+    if stats["days_missing"]:
+        logger.info(f"   ⚠️ ไม่มีข้อมูล: {', '.join(stats['days_missing'])}")
+    logger.info(f"   ✅ สำเร็จ  : {stats['success']} จุด")
+    logger.info(f"   ❌ ล้มเหลว : {stats['failed']} จุด")
+    logger.info(f"   ⏭️ ข้าม   : {stats['skipped']} จุด")
+    if stats.get("queued"):
+        logger.info(f"   📥 outbox : {stats['queued']} รายการ (รอส่งใหม่)")
+    logger.info(f"   ⏱️ เวลา    : {metrics.duration or 0:.1f}s | Sheets requests: {metrics.values.get('sheets_requests', 0)}")
+    logger.info("=" * 60)
+
+    stats["duration_s"] = round(metrics.duration or 0.0, 1)
+    save_run_stats(stats)
     return stats
 
 
@@ -649,6 +765,10 @@ def run_scheduled():
     logger.info("   กด Ctrl+C เพื่อหยุด")
     logger.info("=" * 60)
 
+    # ส่งของค้างใน outbox เป็นระยะ (เมื่อเน็ตกลับมา)
+    if IMPORTS_OK:
+        start_outbox_flusher(get_outbox(), interval=CONFIG["OUTBOX_FLUSH_INTERVAL"])
+
     last_run_date = None
 
     while True:
@@ -739,6 +859,8 @@ def main():
   python scada_wt_collector.py --dry-run               # ทดสอบไม่บันทึก
   python scada_wt_collector.py --mode scheduled         # รันทุกวัน
   python scada_wt_collector.py --show-config            # ดู config
+  python scada_wt_collector.py --flush-outbox           # ส่งค่าที่ค้างใน outbox
+  python scada_wt_collector.py --from 2026-02-01 --to 2026-02-28   # เติมย้อนหลังทั้งเดือน
 
 วิธีตั้ง Task Scheduler:
   ใช้ start_wt_collector.bat (จะสร้างให้อัตโนมัติ)
@@ -767,6 +889,25 @@ def main():
         action='store_true',
         help='แสดง config ปัจจุบัน'
     )
+    parser.add_argument(
+        '--flush-outbox',
+        action='store_true',
+        help='ส่งค่าที่ค้างใน outbox (รวมรายการ dead) แล้วจบ'
+    )
+    parser.add_argument(
+        '--from',
+        dest='date_from',
+        type=str,
+        default=None,
+        help='Backfill: วันที่รายงานเริ่มต้น (YYYY-MM-DD)'
+    )
+    parser.add_argument(
+        '--to',
+        dest='date_to',
+        type=str,
+        default=None,
+        help='Backfill: วันที่รายงานสุดท้าย (YYYY-MM-DD, default = --from)'
+    )
     args = parser.parse_args()
 
     # Show config
@@ -774,6 +915,11 @@ def main():
         show_config()
         return
 
+    # Flush outbox
+    if args.flush_outbox:
+        flush_outbox(retry_dead=True)
+        sys.exit(0 if get_outbox().pending_count(include_dead=True) == 0 else 1)
+
     # Parse date
     report_date = None
     if args.date:
@@ -783,6 +929,17 @@ def main():
             logger.error(f"❌ รูปแบบวันที่ไม่ถูกต้อง: {args.date} (ต้องเป็น YYYY-MM-DD)")
             sys.exit(1)
 
+    # Backfill
+    if args.date_from or args.date_to:
+        try:
+            date_from = datetime.strptime(args.date_from or args.date_to, "%Y-%m-%d").date()
+            date_to = datetime.strptime(args.date_to or args.date_from, "%Y-%m-%d").date()
+        except ValueError:
+            logger.error("❌ รูปแบบวันที่ --from/--to ไม่ถูกต้อง (ต้องเป็น YYYY-MM-DD)")
+            sys.exit(1)
+        run_backfill(date_from, date_to, dry_run=args.dry_run)
+        return
+
     # Run
     if args.mode == 'once':
         run_once(report_date=report_date, dry_run=args.dry_run)
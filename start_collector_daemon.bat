@@ -0,0 +1,31 @@
+@echo off
+REM ============================================================
+REM  Collector Daemon - WT / UF / Watch folder ใน process เดียว
+REM  ใช้แทน start_wt_collector.bat + start_uf_collector.bat +
+REM         start_watch_mode.bat + start_scheduled_mode.bat
+REM  (เลือก job ของเครื่องนี้ใน CONFIG["JOBS"] หรือ --jobs)
+REM ============================================================
+REM
+REM  วิธีตั้ง Task Scheduler:
+REM  1. Trigger: At startup
+REM  2. Action : Start a program -> start_collector_daemon.bat
+REM  3. Settings: If task fails, restart every 1 minute
+REM ============================================================
+
+REM *** แก้ path ตรงนี้ให้ตรงกับที่วาง project ***
+cd /d "C:\WaterMeter\water-meter-project"
+
+REM Activate virtual environment (ถ้ามี)
+if exist ".venv\Scripts\activate.bat" (
+    call .venv\Scripts\activate.bat
+)
+
+:start
+REM ตัวอย่าง: เครื่อง SCADA WT  -> --jobs wt
+REM          เครื่อง UF + Upload -> --jobs uf,watch
+python collector_daemon.py
+
+REM ถ้า daemon หยุดทำงาน รอ 10 วินาทีแล้วรันใหม่
+echo [%date% %time%] Collector daemon exited, restarting >> C:\WaterMeter\Logs\batch_log.txt
+timeout /t 10
+goto :start